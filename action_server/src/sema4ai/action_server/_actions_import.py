@@ -418,7 +418,7 @@ cli.main(["{command}"])
             db.insert(action_package)
             for action in actions:
                 log.info("Found new action: %s", action.name)
-                db.insert(action)
+            db.insert_many(actions)
 
             if disable_not_imported:
                 for action in all_previously_existing_actions:
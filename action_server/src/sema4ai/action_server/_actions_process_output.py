@@ -0,0 +1,324 @@
+"""
+Output pump for the processes in the process pool.
+
+Instead of having dedicated threads blocking on `readline()` for the
+stdout/stderr of each process, a single thread multiplexes all the pipes
+(with a selector -- i.e.: `epoll` on Linux) and forwards the contents read
+in chunks to the registered callbacks (which write them to the output of the
+run).
+
+Echoing the output to the console is optional (`--worker-output-echo`): it
+may be `on` (every line is printed), `off` (nothing is printed) or `limited`
+(at most `_ECHO_MAX_LINES_PER_SECOND` lines are printed per second for each
+process and the number of lines skipped is reported afterwards).
+
+Note: on Windows pipes can't be used with a selector, so, a thread is still
+used for each pipe there.
+"""
+
+import logging
+import os
+import selectors
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+ECHO_ON = "on"
+ECHO_OFF = "off"
+ECHO_LIMITED = "limited"
+ECHO_MODES = (ECHO_ON, ECHO_OFF, ECHO_LIMITED)
+
+_READ_SIZE = 64 * 1024
+
+_ECHO_MAX_LINES_PER_SECOND = 20
+
+
+def is_selector_supported() -> bool:
+    return sys.platform != "win32"
+
+
+class _Echo:
+    """
+    Prints the output of a process to the console (handling partial lines
+    and the rate limiting).
+    """
+
+    def __init__(self, pid: int, mode: str):
+        self._pid = pid
+        self._mode = mode
+        self._partial = b""
+        self._window_start = 0.0
+        self._window_lines = 0
+        self._skipped = 0
+
+    def on_data(self, data: bytes) -> None:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._print_line(line)
+
+    def flush(self) -> None:
+        if self._partial:
+            self._print_line(self._partial)
+            self._partial = b""
+        self._report_skipped()
+
+    def _print_line(self, line_bytes: bytes) -> None:
+        if self._mode == ECHO_LIMITED:
+            now = time.monotonic()
+            if now - self._window_start >= 1:
+                self._report_skipped()
+                self._window_start = now
+                self._window_lines = 0
+
+            if self._window_lines >= _ECHO_MAX_LINES_PER_SECOND:
+                self._skipped += 1
+                return
+            self._window_lines += 1
+
+        self._print(line_bytes.decode("utf-8", "replace").strip())
+
+    def _report_skipped(self) -> None:
+        if self._skipped:
+            skipped = self._skipped
+            self._skipped = 0
+            self._print(f"({skipped} lines not shown)")
+
+    def _print(self, line_as_str: str) -> None:
+        from termcolor import colored
+
+        print(
+            colored(f"output (pid: {self._pid}): ", attrs=["dark"])
+            + f"{line_as_str}\n",
+            end="",
+        )
+
+
+class _RegisteredStream:
+    def __init__(
+        self,
+        stream,
+        on_output: Callable[[bytes], None],
+        echo: Optional[_Echo],
+    ):
+        self.stream = stream
+        self.on_output = on_output
+        self.echo = echo
+
+    def on_data(self, data: bytes) -> None:
+        if self.echo is not None:
+            try:
+                self.echo.on_data(data)
+            except Exception:
+                log.exception("Error echoing process output.")
+
+        try:
+            self.on_output(data)
+        except Exception:
+            log.exception("Error handling process output.")
+
+    def on_eof(self) -> None:
+        if self.echo is not None:
+            try:
+                self.echo.flush()
+            except Exception:
+                log.exception("Error echoing process output.")
+
+        try:
+            self.stream.close()
+        except Exception:
+            pass
+
+
+class OutputPump:
+    def __init__(self, echo: str = ECHO_ON):
+        """
+        Args:
+            echo: Whether the output is echoed to the console (see: `ECHO_MODES`).
+        """
+        if echo not in ECHO_MODES:
+            raise ValueError(
+                f"Invalid echo mode: {echo!r} "
+                f"(expected one of: {', '.join(ECHO_MODES)})."
+            )
+        self._echo_mode = echo
+        self._lock = threading.Lock()
+        self._disposed = False
+
+        # Streams registered which must still be added to the selector (this
+        # is done in the pump thread).
+        self._pending: List[Tuple[int, _RegisteredStream]] = []
+        self._fd_to_registered: Dict[int, _RegisteredStream] = {}
+
+        self._thread: Optional[threading.Thread] = None
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._wakeup_read = -1
+        self._wakeup_write = -1
+
+    def register(
+        self,
+        stream,
+        pid: int,
+        on_output: Callable[[bytes], None],
+        echo: bool = True,
+    ) -> None:
+        """
+        Starts reading the given stream (the stdout or stderr of a process).
+
+        Args:
+            stream: The stream to be read (it's closed when EOF is reached).
+            pid: The pid of the process (used when echoing the output).
+            on_output: Called (in the pump thread) with the contents read.
+            echo: If False the output is never echoed to the console
+                (regardless of the echo mode of the pump).
+        """
+        if not echo or self._echo_mode == ECHO_OFF:
+            echo_handler = None
+        else:
+            echo_handler = _Echo(pid, self._echo_mode)
+        registered = _RegisteredStream(stream, on_output, echo_handler)
+
+        if not is_selector_supported():
+            t = threading.Thread(
+                target=self._read_in_thread, args=(registered,), daemon=True
+            )
+            t.name = f"Output reader (pid: {pid})"
+            t.start()
+            return
+
+        with self._lock:
+            if self._disposed:
+                registered.on_eof()
+                return
+
+            self._start_unlocked()
+            self._pending.append((stream.fileno(), registered))
+        self._wakeup()
+
+    def _read_in_thread(self, registered: _RegisteredStream) -> None:
+        stream = registered.stream
+        read = getattr(stream, "read1", stream.read)
+        try:
+            while True:
+                data = read(_READ_SIZE)
+                if not data:
+                    break
+                registered.on_data(data)
+        except Exception:
+            pass
+        registered.on_eof()
+
+    def _start_unlocked(self) -> None:
+        if self._thread is not None:
+            return
+
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = os.pipe()
+        os.set_blocking(self._wakeup_write, False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.name = "Process Pool Output Pump"
+        self._thread.start()
+
+    def _wakeup(self) -> None:
+        with self._lock:
+            if self._wakeup_write == -1:
+                return
+            try:
+                os.write(self._wakeup_write, b"x")
+            except OSError:
+                # The pipe is full (so, it'll wake up anyways).
+                pass
+
+    def _run(self) -> None:
+        selector = self._selector
+        assert selector is not None
+        try:
+            while True:
+                for key, _mask in selector.select():
+                    fd = key.fd
+                    if fd == self._wakeup_read:
+                        os.read(fd, _READ_SIZE)
+                        if not self._on_wakeup():
+                            return
+                        continue
+
+                    registered = self._fd_to_registered.get(fd)
+                    if registered is None:
+                        continue
+
+                    try:
+                        data = os.read(fd, _READ_SIZE)
+                    except OSError:
+                        data = b""
+
+                    if data:
+                        registered.on_data(data)
+                    else:
+                        selector.unregister(fd)
+                        del self._fd_to_registered[fd]
+                        registered.on_eof()
+        except Exception:
+            log.exception("Error in process output pump.")
+        finally:
+            self._close()
+
+    def _on_wakeup(self) -> bool:
+        """
+        Returns:
+            False if the pump was disposed (and should stop).
+        """
+        with self._lock:
+            if self._disposed:
+                return False
+            pending = self._pending
+            self._pending = []
+
+        assert self._selector is not None
+        for fd, registered in pending:
+            self._fd_to_registered[fd] = registered
+            self._selector.register(fd, selectors.EVENT_READ)
+        return True
+
+    def _close(self) -> None:
+        with self._lock:
+            self._disposed = True
+            pending = self._pending
+            self._pending = []
+            wakeup_fds = (self._wakeup_read, self._wakeup_write)
+            self._wakeup_read = self._wakeup_write = -1
+
+        for _fd, registered in pending:
+            registered.on_eof()
+
+        for registered in self._fd_to_registered.values():
+            registered.on_eof()
+        self._fd_to_registered.clear()
+
+        if self._selector is not None:
+            self._selector.close()
+        for fd in wakeup_fds:
+            os.close(fd)
+
+    def get_registered_count(self) -> int:
+        """
+        Returns:
+            The number of streams currently being read by the pump thread.
+        """
+        with self._lock:
+            return len(self._fd_to_registered) + len(self._pending)
+
+    def dispose(self) -> None:
+        with self._lock:
+            if self._disposed:
+                return
+            self._disposed = True
+            thread = self._thread
+
+        if thread is not None:
+            self._wakeup()
+            thread.join(5)
@@ -5,21 +5,48 @@ import socket as socket_module
 import subprocess
 import sys
 import threading
+import time
 from collections import namedtuple
-from contextlib import contextmanager
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
 from pathlib import Path
 from queue import Queue
-from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Set
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 
 from sema4ai.actions._action_context import ActionContext
-from termcolor import colored
 
+from sema4ai.action_server._actions_process_output import OutputPump
+from sema4ai.action_server._actions_process_pool_admission import (
+    PRIORITY_NORMAL,
+    AdmissionQueue,
+    AdmissionTicket,
+)
+from sema4ai.action_server._actions_process_pool_demand import (
+    KeyDemand,
+    PackageProcessLimits,
+    parse_package_processes,
+    plan_warm_pool,
+)
 from sema4ai.action_server._models import Action, ActionPackage, Run
 from sema4ai.action_server._protocols import JSONValue
 
 from ._settings import Settings, is_frozen
 
 if TYPE_CHECKING:
+    import asyncio
+
+    from sema4ai.action_server._actions_process_zygote import ForkedProcess, Zygote
     from sema4ai.action_server._runs_state_cache import RunRuntimeInfo
 
 log = logging.getLogger(__name__)
@@ -39,6 +66,16 @@ if sys.platform == "win32":
 
 _Key = namedtuple("_Key", "action_package_id, env, cwd")
 
+# How the action server talks to the worker processes: "tcp" uses a loopback
+# TCP connection and "unix" uses a unix socket pair (inherited by the worker).
+WORKER_TRANSPORT_TCP = "tcp"
+WORKER_TRANSPORT_UNIX = "unix"
+WORKER_TRANSPORTS = (WORKER_TRANSPORT_TCP, WORKER_TRANSPORT_UNIX)
+
+
+def is_unix_transport_supported() -> bool:
+    return sys.platform != "win32" and hasattr(socket_module, "AF_UNIX")
+
 
 def _create_server_socket(host: str, port: int):
     try:
@@ -90,25 +127,132 @@ def _connect_to_socket(host, port):
     return s
 
 
+def _build_process_launch_info(
+    settings: Settings, action_package: ActionPackage
+) -> Optional[Tuple[str, str, Dict[str, str]]]:
+    """
+    Returns:
+        The python executable, cwd and environment to be used to launch a
+        process for the given action package (or None if it's not possible
+        to launch it).
+    """
+    from ._actions_run_helpers import (
+        _add_preload_actions_dir_to_env_pythonpath,
+        get_action_package_cwd,
+    )
+    from ._robo_utils.process import build_python_launch_env
+
+    env = json.loads(action_package.env_json)
+    _add_preload_actions_dir_to_env_pythonpath(env)
+    env = build_python_launch_env(env)
+    # Shouldn't be there, but just making sure... if it is it can
+    # affect how the logs are generated and if wrong the logs would
+    # also be wrong.
+    env.pop("ROBOT_ROOT", None)
+
+    if settings.reuse_processes:
+        # When reusing processes we don't want to dump threads if
+        # the process doesn't exit!
+        env["RC_DUMP_THREADS_AFTER_RUN"] = "0"
+
+    if "PYTHON_EXE" in env:
+        python_exe = env["PYTHON_EXE"]
+    else:
+        if is_frozen():
+            log.critical(
+                f"Unable to create process for action package: {action_package} "
+                "(environment does not contain PYTHON_EXE)."
+            )
+            return None
+
+        python_exe = sys.executable
+
+    cwd = get_action_package_cwd(settings, action_package)
+    return python_exe, str(cwd), env
+
+
+class _RepliesQueue(Queue):
+    """
+    Queue with the messages received from the process (besides `get`, the
+    next message may also be awaited in an asyncio loop with `get_async`).
+    """
+
+    def __init__(self, on_abandoned: Callable[[], None]):
+        """
+        Args:
+            on_abandoned: Called when a task awaiting a message is cancelled
+                (the reply for the related request will still arrive later
+                on, so, the process must not be reused for another run as it
+                could receive that reply).
+        """
+        super().__init__()
+        self._on_abandoned = on_abandoned
+        # Set while a task in an asyncio loop is waiting for the next message.
+        self._waiter_loop: "Optional[asyncio.AbstractEventLoop]" = None
+        self._waiter_future: "Optional[asyncio.Future]" = None
+
+    def _put(self, item) -> None:
+        # Note: called with `self.mutex` held.
+        loop, future = self._waiter_loop, self._waiter_future
+        if loop is not None and future is not None:
+            self._waiter_loop = self._waiter_future = None
+            loop.call_soon_threadsafe(self._set_future_result, future, item)
+            return
+        super()._put(item)
+
+    def _set_future_result(self, future: "asyncio.Future", item) -> None:
+        if future.done():
+            # The waiter was cancelled: the reply is dropped (it must not be
+            # received by a `get` related to another request).
+            self._on_abandoned()
+        else:
+            future.set_result(item)
+
+    async def get_async(self):
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        with self.mutex:
+            if self._qsize():
+                return self._get()
+            future = loop.create_future()
+            self._waiter_loop, self._waiter_future = loop, future
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._on_abandoned()
+            raise
+        finally:
+            with self.mutex:
+                if self._waiter_future is future:
+                    self._waiter_loop = self._waiter_future = None
+
+
 class ProcessHandle:
     def __init__(
         self,
         settings: Settings,
         action_package: ActionPackage,
         post_run_args: Optional[tuple[str, ...]],
+        output_pump: "OutputPump",
+        zygote: Optional["Zygote"] = None,
+        transport: str = WORKER_TRANSPORT_TCP,
     ):
+        """
+        Args:
+            output_pump: Used to read the stdout/stderr of the process.
+            zygote: If given, the process is forked from the zygote instead of
+                being launched from scratch.
+            transport: The transport used to talk to the process (see:
+                `WORKER_TRANSPORTS`).
+        """
         from sema4ai.action_server._preload_actions.preload_actions_streams import (
             JsonRpcStreamWriter,
         )
         from sema4ai.action_server._robo_utils.callback import Callback
         from sema4ai.action_server._robo_utils.run_in_thread import run_in_thread
 
-        from ._actions_run_helpers import (
-            _add_preload_actions_dir_to_env_pythonpath,
-            get_action_package_cwd,
-        )
         from ._preload_actions.preload_actions_streams import JsonRpcStreamReaderThread
-        from ._robo_utils.process import build_python_launch_env
 
         self._post_run_args = post_run_args
 
@@ -122,30 +266,21 @@ class ProcessHandle:
         # (upon reloading all running processes are marked as non-reusable).
         self.can_reuse = True
 
-        env = json.loads(action_package.env_json)
-        _add_preload_actions_dir_to_env_pythonpath(env)
-        env = build_python_launch_env(env)
-        # Shouldn't be there, but just making sure... if it is it can
-        # affect how the logs are generated and if wrong the logs would
-        # also be wrong.
-        env.pop("ROBOT_ROOT", None)
-
-        if settings.reuse_processes:
-            # When reusing processes we don't want to dump threads if
-            # the process doesn't exit!
-            env["RC_DUMP_THREADS_AFTER_RUN"] = "0"
-
-        if "PYTHON_EXE" in env:
-            python_exe = env["PYTHON_EXE"]
-        else:
-            if is_frozen():
-                log.critical(
-                    f"Unable to create process for action package: {action_package} "
-                    "(environment does not contain PYTHON_EXE)."
-                )
-                return
+        # Information used by the recycling policies.
+        self.created_at = time.monotonic()
+        self.runs_count = 0
 
-            python_exe = sys.executable
+        # Set when the process should be recycled (but it's still kept in
+        # the pool until its replacement is ready).
+        self.retiring = False
+
+        # The result of the last run (json contents) if it was sent inline.
+        self.inline_result: Optional[str] = None
+
+        launch_info = _build_process_launch_info(settings, action_package)
+        if launch_info is None:
+            return
+        python_exe, cwd, env = launch_info
 
         # stdin/stdout is no longer an option because numpy gets halted
         # if stdin is being read while importing numpy.
@@ -153,7 +288,6 @@ class ProcessHandle:
         # https://github.com/robocorp/robocorp/issues/271
         use_tcp = True
 
-        cwd = get_action_package_cwd(settings, action_package)
         from ._robo_utils.process import build_subprocess_kwargs
 
         subprocess_kwargs = build_subprocess_kwargs(cwd=cwd, env=env)
@@ -161,73 +295,86 @@ class ProcessHandle:
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
         )
-        self._cwd: str = str(cwd)
-
-        def _process_stream_reader(stderr_or_stdout):
-            while True:
-                line_bytes = stderr_or_stdout.readline()
-                if not line_bytes:
-                    break
-                line_as_str = line_bytes.decode("utf-8", "replace")
-                print(
-                    colored(f"output (pid: {pid}): ", attrs=["dark"])
-                    + f"{line_as_str.strip()}\n",
-                    end="",
-                )
-                self._on_output(line_bytes)
+        self._cwd: str = cwd
 
-        self._read_queue: "Queue[dict]" = Queue()
+        self._read_queue = _RepliesQueue(self._on_replies_abandoned)
 
         if use_tcp:
-            server_socket = _create_server_socket("127.0.0.1", 0)
-            host, port = server_socket.getsockname()
-            cmdline = [
-                python_exe,
-                "-m",
-                "preload_actions_server_main",
-                "--tcp",
-                f"--host={host}",
-                f"--port={port}",
-            ]
-
-            def accept_connection():
-                server_socket.listen(1)
-                sock, _addr = server_socket.accept()
-                return sock
-
-            connection_future = run_in_thread(accept_connection)
-
-            self._process = subprocess.Popen(cmdline, **subprocess_kwargs)
+            self._process: "subprocess.Popen | ForkedProcess"
+            connection_future: "Optional[Future[socket_module.socket]]" = None
+            s: Optional[socket_module.socket] = None
+
+            if transport == WORKER_TRANSPORT_UNIX:
+                # The worker inherits one end of a socket pair (so, there's
+                # no need to allocate a port nor to wait for a connection).
+                s, child_socket = socket_module.socketpair(
+                    socket_module.AF_UNIX, SOCK_STREAM
+                )
+                try:
+                    if zygote is not None:
+                        self._process = zygote.fork_worker(sock=child_socket)
+                    else:
+                        cmdline = [
+                            python_exe,
+                            "-m",
+                            "preload_actions_server_main",
+                            f"--socket-fd={child_socket.fileno()}",
+                        ]
+                        subprocess_kwargs["pass_fds"] = (child_socket.fileno(),)
+                        self._process = subprocess.Popen(cmdline, **subprocess_kwargs)
+                except BaseException:
+                    s.close()
+                    raise
+                finally:
+                    child_socket.close()
+            else:
+                server_socket = _create_server_socket("127.0.0.1", 0)
+                host, port = server_socket.getsockname()
+                cmdline = [
+                    python_exe,
+                    "-m",
+                    "preload_actions_server_main",
+                    "--tcp",
+                    f"--host={host}",
+                    f"--port={port}",
+                ]
+
+                def accept_connection():
+                    server_socket.listen(1)
+                    sock, _addr = server_socket.accept()
+                    return sock
+
+                connection_future = run_in_thread(accept_connection)
+
+                if zygote is not None:
+                    try:
+                        self._process = zygote.fork_worker(host, port)
+                    except BaseException:
+                        # Unblock the thread waiting for the connection.
+                        server_socket.close()
+                        raise
+                else:
+                    self._process = subprocess.Popen(cmdline, **subprocess_kwargs)
             self._on_output = Callback()
 
             pid = self._process.pid
 
-            stderr = self._process.stderr
-            stdout = self._process.stdout
-
-            t = threading.Thread(
-                target=_process_stream_reader, args=(stderr,), daemon=True
-            )
-            t.name = f"Stderr reader (pid: {pid})"
-            t.start()
-
-            t = threading.Thread(
-                target=_process_stream_reader, args=(stdout,), daemon=True
-            )
-            t.name = f"Stdout reader (pid: {pid})"
-            t.start()
+            output_pump.register(self._process.stderr, pid, self._on_output)
+            output_pump.register(self._process.stdout, pid, self._on_output)
 
-            try:
-                s = connection_future.result(10)
-            except Exception:
-                log.exception(
-                    "Process that runs action did not connect back in the available timeout."
-                )
-                raise
+            if connection_future is not None:
+                try:
+                    s = connection_future.result(10)
+                except Exception:
+                    log.exception(
+                        "Process that runs action did not connect back in the available timeout."
+                    )
+                    raise
+            assert s is not None
             read_from = s.makefile("rb")
             write_to = s.makefile("wb")
 
-            self._writer = JsonRpcStreamWriter(write_to, sort_keys=True)
+            self._writer = JsonRpcStreamWriter(write_to)
             self._reader = JsonRpcStreamReaderThread(
                 read_from, self._read_queue, lambda *args, **kwargs: None
             )
@@ -245,27 +392,86 @@ class ProcessHandle:
 
             pid = self._process.pid
 
-            stderr = self._process.stderr
-            t = threading.Thread(target=_process_stream_reader, args=(stderr,))
-            t.name = f"Stderr reader (pid: {pid})"
-            t.start()
+            output_pump.register(self._process.stderr, pid, self._on_output)
 
             write_to = self._process.stdin
             read_from = self._process.stdout
-            self._writer = JsonRpcStreamWriter(write_to, sort_keys=True)
+            self._writer = JsonRpcStreamWriter(write_to)
             self._reader = JsonRpcStreamReaderThread(
                 read_from, self._read_queue, lambda *args, **kwargs: None
             )
         self._reader.start()
+        self._negotiate_framing(settings.worker_framing)
+
+    def _negotiate_framing(self, worker_framing: str) -> None:
+        """
+        Negotiates with the process the framing used for the messages
+        exchanged afterwards (by default messages are sent with http-style
+        headers, which is the slowest option).
+        """
+        from queue import Empty
+
+        from ._preload_actions.preload_actions_streams import (
+            FRAMING_HEADERS,
+            SWITCH_FRAMING_KEY,
+            get_available_framings,
+        )
+
+        if worker_framing == FRAMING_HEADERS:
+            return
+
+        if worker_framing == "auto":
+            framings = get_available_framings()
+        else:
+            framings = [worker_framing]
+
+        self._writer.write({"command": "handshake", "framings": framings})
+        try:
+            reply = self._read_queue.get(timeout=10)
+        except Empty:
+            reply = None
+        if reply is None:
+            self.kill()
+            raise RuntimeError(
+                f"Process (pid: {self.pid}) did not reply to the handshake."
+            )
+
+        framing = reply.get("framing", FRAMING_HEADERS)
+        log.debug(f"Process Pool: Using {framing} framing (pid: {self.pid}).")
+        if framing != FRAMING_HEADERS:
+            # The process already switched its writer and now we switch ours
+            # (and the process switches its reader after this message).
+            self._writer.write({"command": "framing", SWITCH_FRAMING_KEY: framing})
 
     @property
     def pid(self):
         return self._process.pid
 
+    def get_rss(self) -> Optional[int]:
+        """
+        Returns:
+            The resident set size (in bytes) of the process (or None if it's
+            not possible to get it).
+        """
+        import psutil
+
+        try:
+            return psutil.Process(self._process.pid).memory_info().rss
+        except Exception:
+            return None
+
     @property
     def cwd(self) -> str:
         return self._cwd
 
+    def _on_replies_abandoned(self) -> None:
+        if self.can_reuse:
+            log.debug(
+                f"Process Pool: Reply from process ({self.pid}) abandoned "
+                "-- process marked as non-reusable."
+            )
+        self.can_reuse = False
+
     def is_alive(self) -> bool:
         if self._kill_called:
             return False
@@ -302,7 +508,93 @@ class ProcessHandle:
         headers: dict,
         cookies: dict,
         reuse_process: bool,
+        inline_inputs: Optional[str],
+        inline_threshold: int,
+        on_chunk: Optional[Callable[[JSONValue], None]],
+    ) -> int:
+        msg, initial_action_context_value = self._send_run_action(
+            run,
+            action_package,
+            action,
+            input_json,
+            run_artifacts_dir,
+            result_json,
+            headers,
+            cookies,
+            reuse_process,
+            inline_inputs,
+            inline_threshold,
+            on_chunk is not None,
+        )
+        result_msg = self._read_queue.get(block=True)
+        while self._on_chunk_message(result_msg, on_chunk):
+            result_msg = self._read_queue.get(block=True)
+        return self._on_run_action_reply(
+            result_msg, msg, initial_action_context_value, run
+        )
+
+    async def _do_run_action_async(
+        self,
+        run: Run,
+        action_package: ActionPackage,
+        action: Action,
+        input_json: Path,
+        run_artifacts_dir: Path,
+        result_json: Path,
+        headers: dict,
+        cookies: dict,
+        reuse_process: bool,
+        inline_inputs: Optional[str],
+        inline_threshold: int,
+        on_chunk: Optional[Callable[[JSONValue], None]],
     ) -> int:
+        from starlette.concurrency import run_in_threadpool
+
+        # Sending may need to access the database (and refresh OAuth2 tokens),
+        # so, it's done in a thread, but the reply is awaited in the loop.
+        msg, initial_action_context_value = await run_in_threadpool(
+            self._send_run_action,
+            run,
+            action_package,
+            action,
+            input_json,
+            run_artifacts_dir,
+            result_json,
+            headers,
+            cookies,
+            reuse_process,
+            inline_inputs,
+            inline_threshold,
+            on_chunk is not None,
+        )
+        result_msg = await self._read_queue.get_async()
+        while self._on_chunk_message(result_msg, on_chunk):
+            result_msg = await self._read_queue.get_async()
+        return self._on_run_action_reply(
+            result_msg, msg, initial_action_context_value, run
+        )
+
+    def _send_run_action(
+        self,
+        run: Run,
+        action_package: ActionPackage,
+        action: Action,
+        input_json: Path,
+        run_artifacts_dir: Path,
+        result_json: Path,
+        headers: dict,
+        cookies: dict,
+        reuse_process: bool,
+        inline_inputs: Optional[str],
+        inline_threshold: int,
+        stream_chunks: bool,
+    ) -> Tuple[dict, Optional[JSONValue]]:
+        """
+        Sends the message to run the action to the process.
+
+        Returns:
+            The message sent and the initial value of the action context.
+        """
         from sema4ai.action_server._api_oauth2 import (
             get_resolved_provider_settings,
             refresh_tokens,
@@ -439,14 +731,45 @@ class ProcessHandle:
             "reuse_process": reuse_process,
             "cwd": self._cwd,
         }
+        if inline_inputs is not None:
+            msg["inline_inputs"] = inline_inputs
+        if inline_threshold > 0:
+            msg["inline_threshold"] = inline_threshold
+        if stream_chunks:
+            msg["stream_chunks"] = True
         self._writer.write(msg)
+        return msg, initial_action_context_value
 
-        queue = self._read_queue
+    def _on_chunk_message(
+        self,
+        result_msg: Optional[dict],
+        on_chunk: Optional[Callable[[JSONValue], None]],
+    ) -> bool:
+        """
+        Returns:
+            True if the message is a value yielded by the action (in which
+            case the reply with the `returncode` is still pending).
+        """
+        if result_msg is None or "chunk" not in result_msg:
+            return False
+        if on_chunk is not None:
+            try:
+                on_chunk(result_msg["chunk"])
+            except Exception:
+                log.exception("Error handling value yielded by the action.")
+        return True
 
-        result_msg = queue.get(block=True)
+    def _on_run_action_reply(
+        self,
+        result_msg: Optional[dict],
+        msg: dict,
+        initial_action_context_value: Optional[JSONValue],
+        run: Run,
+    ) -> int:
         if result_msg is None:
             # This means that the process was actually killed (or crashed).
             result_msg = {"returncode": 77}
+        self.inline_result = result_msg.get("inline_result")
 
         if self._post_run_args:
             log.debug("Calling post run command.")
@@ -550,16 +873,33 @@ class ProcessHandle:
         headers: dict,
         cookies: dict,
         reuse_process: bool,
+        inline_inputs: Optional[str] = None,
+        inline_threshold: int = 0,
+        on_chunk: Optional[Callable[[JSONValue], None]] = None,
     ) -> int:
         """
         Runs the action and returns the returncode from running the action.
 
         (returncode=0 means everything is Ok).
+
+        Args:
+            inline_inputs: If given, the inputs (json contents) are sent
+                directly to the process (and `input_json` is not read).
+            inline_threshold: If > 0, the result is sent back directly
+                (available in `inline_result` after the run) if its size
+                is up to this threshold (otherwise it's written to
+                `result_json`).
+            on_chunk: If given, called with each value yielded by the action
+                (if it's a generator) as soon as it's available (note: called
+                in the thread reading the replies or in the asyncio loop when
+                using `run_action_async`).
         """
+        self.runs_count += 1
+        self.inline_result = None
         with output_file.open("wb") as stream:
 
-            def on_output(line_bytes: bytes):
-                stream.write(line_bytes)
+            def on_output(data: bytes):
+                stream.write(data)
 
             with self._on_output.register(on_output):
                 # stdout is now used for communicating, so, don't hear on it.
@@ -573,9 +913,62 @@ class ProcessHandle:
                     headers,
                     cookies,
                     reuse_process,
+                    inline_inputs,
+                    inline_threshold,
+                    on_chunk,
                 )
                 return returncode
 
+    async def run_action_async(
+        self,
+        run: Run,
+        action_package: ActionPackage,
+        action: Action,
+        input_json: Path,
+        run_artifacts_dir: Path,
+        output_file: Path,
+        result_json: Path,
+        headers: dict,
+        cookies: dict,
+        reuse_process: bool,
+        inline_inputs: Optional[str] = None,
+        inline_threshold: int = 0,
+        on_chunk: Optional[Callable[[JSONValue], None]] = None,
+    ) -> int:
+        """
+        Same as `run_action` but the reply from the process is awaited in the
+        asyncio loop (without blocking a thread while the action runs).
+        """
+        from starlette.concurrency import run_in_threadpool
+
+        self.runs_count += 1
+        self.inline_result = None
+        # Note: the output file is opened/closed in a thread (the contents are
+        # written by the output pump thread).
+        stream = await run_in_threadpool(output_file.open, "wb")
+        try:
+
+            def on_output(data: bytes):
+                stream.write(data)
+
+            with self._on_output.register(on_output):
+                return await self._do_run_action_async(
+                    run,
+                    action_package,
+                    action,
+                    input_json,
+                    run_artifacts_dir,
+                    result_json,
+                    headers,
+                    cookies,
+                    reuse_process,
+                    inline_inputs,
+                    inline_threshold,
+                    on_chunk,
+                )
+        finally:
+            await run_in_threadpool(stream.close)
+
 
 def _get_process_handle_key(settings: Settings, action_package: ActionPackage) -> _Key:
     """
@@ -619,20 +1012,55 @@ class ActionsProcessPool:
 
             self._post_run_cmd_args = tuple(post_run_cmd_args)
 
-        # We just want the actions which are enabled.
-        self.actions = [action for action in actions if action.enabled]
+        # Per action package (name) overrides for the warm processes.
+        self._package_limits: Dict[str, PackageProcessLimits] = parse_package_processes(
+            settings.package_processes
+        )
 
-        # An iterator which keeps cycling over the actions.
-        self._cycle_actions_iterator = itertools.cycle(self.actions)
+        # Demand (arrival rate/spawn latency) tracked per process key.
+        self._key_to_demand: Dict[_Key, KeyDemand] = {}
+
+        self.actions: List[Action] = []
+        self._key_to_action_package: Dict[_Key, ActionPackage] = {}
+        self._update_actions(actions)
 
         self._lock = threading.Lock()
         self._running_processes: Dict[_Key, Set[ProcessHandle]] = {}
         self._idle_processes: Dict[_Key, Set[ProcessHandle]] = {}
 
-        # Semaphore used to track running processes.
-        self._processes_running_semaphore = threading.Semaphore(self.max_processes)
+        # Processes which were reserved (while holding the lock) but which are
+        # still being spawned (outside of the lock). The future is resolved
+        # with the process handle (or None if it was not possible to create it).
+        self._pending_processes: Dict[_Key, Set["Future[Optional[ProcessHandle]]"]] = {}
+
+        # Incremented whenever the pool is reloaded or disposed (processes
+        # spawned for a previous generation are not added to the pool).
+        self._generation = 0
+
+        # Admission queue used to limit the number of running processes
+        # (runs which can't be started right away wait in it).
+        self._admission_queue = AdmissionQueue(
+            self.max_processes,
+            max_queue_depth=settings.max_queue_depth,
+            max_queue_wait=settings.max_queue_wait,
+        )
 
-        self._warmup_processes()
+        # Number of processes recycled due to the recycling policies.
+        self._recycled_count = 0
+
+        # Zygotes (used to fork new processes) per process key (only used
+        # when the worker start mode is `zygote`).
+        self._use_zygote = self._check_use_zygote()
+        self._worker_transport = self._check_worker_transport()
+        self._zygotes_lock = threading.Lock()
+        self._zygotes: Dict[_Key, "Zygote"] = {}
+
+        # A single thread reads the stdout/stderr of all the processes.
+        self._output_pump = OutputPump(echo=settings.worker_output_echo)
+
+        # When starting up, wait for the initial processes to be available.
+        for future in self._warmup_processes():
+            future.result()
 
     def on_reload(
         self,
@@ -644,10 +1072,8 @@ class ActionsProcessPool:
         any running process as non-reusable.
         """
         with self._lock:
-            for key, idle_processes in tuple(self._idle_processes.items()):
-                for process in idle_processes:
-                    process.kill()
-                self._idle_processes.pop(key)
+            self._generation += 1
+            idle_processes_to_kill = self._pop_all_idle_processes_unlocked()
 
             for key, running_processes in tuple(self._running_processes.items()):
                 for process in running_processes:
@@ -656,15 +1082,95 @@ class ActionsProcessPool:
             self.action_package_id_to_action_package = (
                 action_package_id_to_action_package
             )
+            self._update_actions(actions)
 
-            # We just want the actions which are enabled.
-            self.actions = [action for action in actions if action.enabled]
+        for process in idle_processes_to_kill:
+            process.kill()
 
-            # An iterator which keeps cycling over the actions.
-            self._cycle_actions_iterator = itertools.cycle(self.actions)
+        # Zygotes may have preloaded modules which changed.
+        self._dispose_zygotes()
 
         self._warmup_processes()
 
+    def _update_actions(self, actions: List[Action]) -> None:
+        # We just want the actions which are enabled.
+        self.actions = [action for action in actions if action.enabled]
+
+        # The warm processes are planned per process key (i.e.: per action
+        # package environment), not per action.
+        key_to_action_package: Dict[_Key, ActionPackage] = {}
+        for action in self.actions:
+            action_package = self.action_package_id_to_action_package[
+                action.action_package_id
+            ]
+            key = _get_process_handle_key(self._settings, action_package)
+            key_to_action_package[key] = action_package
+        self._key_to_action_package = key_to_action_package
+
+    def _get_demand_unlocked(self, key: _Key) -> KeyDemand:
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        demand = self._key_to_demand.get(key)
+        if demand is None:
+            demand = self._key_to_demand[key] = KeyDemand()
+        return demand
+
+    def _get_package_limits(self, key: _Key) -> Tuple[int, Optional[int]]:
+        action_package = self._key_to_action_package.get(key)
+        if action_package is not None:
+            limits = self._package_limits.get(action_package.name)
+            if limits is not None:
+                return limits.min_processes, limits.max_processes
+        return 0, None
+
+    def _plan_warm_pool_unlocked(self) -> Dict[_Key, int]:
+        """
+        Returns:
+            The number of idle processes that each process key should have
+            (the `min_processes` budget is split based on the observed demand).
+        """
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        import time
+
+        now = time.monotonic()
+        return plan_warm_pool(
+            self._key_to_action_package.keys(),
+            self.min_processes,
+            lambda key: self._get_demand_unlocked(key).weight(now),
+            self._get_package_limits,
+        )
+
+    def _next_key_to_warmup_unlocked(self, plan: Dict[_Key, int]) -> Optional[_Key]:
+        """
+        Returns:
+            The key for which a new idle process should be created (or None if
+            no new process should be created).
+        """
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        total = self._count_total_processes()
+        if total >= self.max_processes:
+            return None
+
+        best_key: Optional[_Key] = None
+        best_deficit = 0
+        for key, target in plan.items():
+            warm = len(self._idle_processes.get(key, ())) + len(
+                self._pending_processes.get(key, ())
+            )
+            deficit = target - warm
+            if deficit <= 0:
+                continue
+
+            if total >= self.min_processes:
+                # Global minimum already satisfied: only create if the
+                # package explicitly requests more warm processes.
+                if warm >= self._get_package_limits(key)[0]:
+                    continue
+
+            if deficit > best_deficit:
+                best_key = key
+                best_deficit = deficit
+        return best_key
+
     @property
     def _reuse_processes(self) -> bool:
         """
@@ -686,27 +1192,219 @@ class ActionsProcessPool:
     def min_processes(self) -> int:
         return self._settings.min_processes
 
-    def _create_process(self, action: Action):
-        action_package: ActionPackage = self.action_package_id_to_action_package[
-            action.action_package_id
-        ]
+    def _check_use_zygote(self) -> bool:
+        from sema4ai.action_server._actions_process_zygote import (
+            WORKER_START_MODE_ZYGOTE,
+            is_zygote_supported,
+        )
 
-        process_handle = ProcessHandle(
-            self._settings, action_package, self._post_run_cmd_args
+        if self._settings.worker_start_mode != WORKER_START_MODE_ZYGOTE:
+            return False
+
+        if not is_zygote_supported():
+            log.warning(
+                "The `zygote` worker start mode is only supported on Linux "
+                "(processes will be spawned instead)."
+            )
+            return False
+        return True
+
+    def _check_worker_transport(self) -> str:
+        transport = self._settings.worker_transport
+        if transport == WORKER_TRANSPORT_UNIX and not is_unix_transport_supported():
+            log.warning(
+                "The `unix` worker transport is not supported on this platform "
+                "(`tcp` will be used instead)."
+            )
+            return WORKER_TRANSPORT_TCP
+        return transport
+
+    def _get_zygote(self, action_package: ActionPackage) -> Optional["Zygote"]:
+        """
+        Provides the zygote to be used to create processes for the given
+        action package (creating it if needed).
+        """
+        from sema4ai.action_server._actions_process_zygote import Zygote
+
+        key = _get_process_handle_key(self._settings, action_package)
+        with self._zygotes_lock:
+            zygote = self._zygotes.get(key)
+            if zygote is not None:
+                if zygote.is_alive():
+                    return zygote
+                log.info(f"Process Pool: Zygote ({zygote.pid}) exited (recreating).")
+                zygote.dispose()
+                del self._zygotes[key]
+
+            launch_info = _build_process_launch_info(self._settings, action_package)
+            if launch_info is None:
+                return None
+            python_exe, cwd, env = launch_info
+            zygote = self._zygotes[key] = Zygote(
+                python_exe, cwd, env, self._output_pump
+            )
+            return zygote
+
+    def _discard_zygote(self, action_package: ActionPackage, zygote: "Zygote") -> None:
+        key = _get_process_handle_key(self._settings, action_package)
+        with self._zygotes_lock:
+            if self._zygotes.get(key) is zygote:
+                del self._zygotes[key]
+        zygote.dispose()
+
+    def _dispose_zygotes(self) -> None:
+        with self._zygotes_lock:
+            zygotes = tuple(self._zygotes.values())
+            self._zygotes.clear()
+
+        for zygote in zygotes:
+            zygote.dispose()
+
+    def _create_process_handle(self, action_package: ActionPackage) -> ProcessHandle:
+        """
+        Creates a new process (this is slow as it launches a new python
+        interpreter and waits for it to connect back, so, it must be
+        called without holding `self._lock`).
+        """
+        if self._use_zygote:
+            zygote = None
+            try:
+                zygote = self._get_zygote(action_package)
+                if zygote is not None:
+                    return ProcessHandle(
+                        self._settings,
+                        action_package,
+                        self._post_run_cmd_args,
+                        self._output_pump,
+                        zygote=zygote,
+                        transport=self._worker_transport,
+                    )
+            except Exception:
+                log.exception(
+                    "Process Pool: Unable to fork process from zygote "
+                    "(process will be spawned instead)."
+                )
+                if zygote is not None and not zygote.is_alive():
+                    # i.e.: the fork request timed out (a late reply would be
+                    # read by the next fork request).
+                    log.info(f"Process Pool: Disposing broken zygote ({zygote.pid}).")
+                    self._discard_zygote(action_package, zygote)
+
+        return ProcessHandle(
+            self._settings,
+            action_package,
+            self._post_run_cmd_args,
+            self._output_pump,
+            transport=self._worker_transport,
         )
+
+    def _reserve_process_unlocked(self, key: _Key) -> "Future[Optional[ProcessHandle]]":
+        """
+        Reserves a slot for a process which will be created later on (outside
+        of the lock).
+        """
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        reservation: "Future[Optional[ProcessHandle]]" = Future()
+        pending = self._pending_processes.get(key)
+        if pending is None:
+            pending = self._pending_processes[key] = set()
+        pending.add(reservation)
+        return reservation
+
+    def _discard_reservation_unlocked(
+        self, key: _Key, reservation: "Future[Optional[ProcessHandle]]"
+    ) -> None:
         assert self._lock.locked(), "Lock must be acquired at this point."
-        self._add_to_idle_processes(process_handle)
+        pending = self._pending_processes.get(key)
+        if pending is None:
+            return
+        pending.discard(reservation)
+        if not pending:
+            del self._pending_processes[key]
+
+    def _spawn_reserved_process(
+        self,
+        action_package: ActionPackage,
+        key: _Key,
+        reservation: "Future[Optional[ProcessHandle]]",
+    ) -> ProcessHandle:
+        """
+        Creates the process related to a reservation. Must be called without
+        holding `self._lock`. The reservation is kept until the caller
+        decides where the process goes (idle/running).
+        """
+        import time
+
+        initial_time = time.monotonic()
+        try:
+            process_handle = self._create_process_handle(action_package)
+        except BaseException as e:
+            with self._lock:
+                self._discard_reservation_unlocked(key, reservation)
+            reservation.set_exception(e)
+            raise
+
+        elapsed = time.monotonic() - initial_time
+        with self._lock:
+            self._get_demand_unlocked(key).on_spawn(elapsed)
+        return process_handle
+
+    def _spawn_idle_process(
+        self,
+        action_package: ActionPackage,
+        key: _Key,
+        reservation: "Future[Optional[ProcessHandle]]",
+        generation: int,
+    ) -> Optional[ProcessHandle]:
+        try:
+            process_handle = self._spawn_reserved_process(
+                action_package, key, reservation
+            )
+        except Exception:
+            log.exception("Process Pool: Error creating idle process.")
+            return None
+
+        with self._lock:
+            self._discard_reservation_unlocked(key, reservation)
+            keep = generation == self._generation
+            if keep:
+                self._add_to_idle_processes(process_handle)
+
+        if not keep:
+            log.debug(
+                "Process Pool: Discarding process created before reload/dispose "
+                f"({process_handle.pid})."
+            )
+            process_handle.kill()
+            reservation.set_result(None)
+            return None
+
+        log.debug(f"Process Pool: Created idle process ({process_handle.pid}).")
+        reservation.set_result(process_handle)
+        return process_handle
+
+    def _pop_all_idle_processes_unlocked(self) -> List[ProcessHandle]:
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        ret: List[ProcessHandle] = []
+        for processes in self._idle_processes.values():
+            ret.extend(processes)
+        self._idle_processes.clear()
+        return ret
 
     def dispose(self):
         with self._lock:
-            for processes in itertools.chain(
-                self._idle_processes.values(), self._running_processes.values()
-            ):
-                for process_handle in processes:
-                    process_handle.kill()
-            self._idle_processes.clear()
+            self._generation += 1
+            to_kill = self._pop_all_idle_processes_unlocked()
+            for processes in self._running_processes.values():
+                to_kill.extend(processes)
             self._running_processes.clear()
 
+        for process_handle in to_kill:
+            process_handle.kill()
+
+        self._dispose_zygotes()
+        self._output_pump.dispose()
+
     def get_idle_processes_count(self) -> int:
         with self._lock:
             return self._get_idle_processes_count_unlocked()
@@ -729,11 +1427,28 @@ class ActionsProcessPool:
             count += len(v)
         return count
 
+    def get_pending_processes_count(self) -> int:
+        """
+        Returns:
+            The number of processes which are still being spawned.
+        """
+        with self._lock:
+            return self._get_pending_processes_count_unlocked()
+
+    def _get_pending_processes_count_unlocked(self) -> int:
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        count = 0
+        for v in self._pending_processes.values():
+            count += len(v)
+        return count
+
     def _count_total_processes(self) -> int:
         assert self._lock.locked(), "Lock must be acquired at this point."
         count = 0
         for v in itertools.chain(
-            self._running_processes.values(), self._idle_processes.values()
+            self._running_processes.values(),
+            self._idle_processes.values(),
+            self._pending_processes.values(),
         ):
             count += len(v)
         return count
@@ -759,109 +1474,366 @@ class ActionsProcessPool:
             return
         processes.discard(process_handle)
 
-    def _warmup_processes(self):
+    def _remove_from_idle_processes(self, process_handle: ProcessHandle) -> bool:
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        processes = self._idle_processes.get(process_handle.key)
+        if not processes or process_handle not in processes:
+            return False
+        processes.discard(process_handle)
+        return True
+
+    def _pop_idle_process_unlocked(
+        self, processes: Set[ProcessHandle]
+    ) -> ProcessHandle:
+        """
+        Pops an idle process (processes which are not being recycled are
+        preferred).
+        """
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        for process_handle in processes:
+            if not process_handle.retiring:
+                processes.discard(process_handle)
+                return process_handle
+        return processes.pop()
+
+    def _get_recycle_reason(self, process_handle: ProcessHandle) -> Optional[str]:
+        """
+        Checks the recycling policies (max runs, max RSS, max age).
+
+        Returns:
+            The reason why the process should be recycled or None if it
+            shouldn't be recycled.
+        """
+        settings = self._settings
+        if settings.max_process_runs > 0:
+            if process_handle.runs_count >= settings.max_process_runs:
+                return f"ran {process_handle.runs_count} actions"
+
+        if settings.max_process_age > 0:
+            age = time.monotonic() - process_handle.created_at
+            if age >= settings.max_process_age:
+                return f"alive for {age:.1f} seconds"
+
+        if settings.max_process_rss > 0:
+            rss = process_handle.get_rss()
+            if rss is not None and rss >= settings.max_process_rss * 1024 * 1024:
+                return f"using {rss / (1024 * 1024):.1f} MB of memory"
+        return None
+
+    def _retire_process_unlocked(
+        self, process_handle: ProcessHandle, reason: str
+    ) -> Optional[Tuple[ActionPackage, _Key, "Future[Optional[ProcessHandle]]", int]]:
+        """
+        Marks an idle process as retiring and reserves its replacement (the
+        retiring process is kept in the idle processes until the replacement
+        is ready, so that the pool capacity doesn't dip).
+
+        Returns:
+            The info to spawn the replacement or None if the process was
+            removed from the idle processes and must be killed right away (if
+            there's no room to spawn the replacement).
+        """
+        assert self._lock.locked(), "Lock must be acquired at this point."
+        key = process_handle.key
+        process_handle.retiring = True
+        self._recycled_count += 1
+
+        action_package = self._key_to_action_package.get(key)
+        if action_package is None or (
+            self._count_total_processes() >= self.max_processes
+        ):
+            log.info(
+                f"Process Pool: Recycling process ({process_handle.pid}): {reason}."
+            )
+            self._remove_from_idle_processes(process_handle)
+            return None
+
+        log.info(
+            f"Process Pool: Recycling process ({process_handle.pid}): {reason} "
+            "(will be stopped when its replacement is ready)."
+        )
+        reservation = self._reserve_process_unlocked(key)
+        return action_package, key, reservation, self._generation
+
+    def _spawn_replacement_process(
+        self,
+        action_package: ActionPackage,
+        key: _Key,
+        reservation: "Future[Optional[ProcessHandle]]",
+        generation: int,
+        retiring: ProcessHandle,
+    ) -> None:
+        self._spawn_idle_process(action_package, key, reservation, generation)
+
+        # Even if the replacement couldn't be created, the retiring process
+        # is stopped (if it was taken to run some action in the meanwhile it's
+        # stopped when it's released).
+        with self._lock:
+            kill = self._remove_from_idle_processes(retiring)
+        if kill:
+            retiring.kill()
+
+    def _warmup_processes(self) -> List["Future[Optional[ProcessHandle]]"]:
+        """
+        Reserves (under the lock) the processes needed to satisfy the
+        `min_processes` and spawns them asynchronously (outside of the lock).
+
+        Returns:
+            Futures which are resolved when the processes are spawned.
+        """
+        from sema4ai.action_server._robo_utils.run_in_thread import run_in_thread
+
         if not self.actions:
-            return
+            return []
 
+        to_spawn = []
         with self._lock:
-            while self._count_total_processes() < self._settings.min_processes:
-                one_action = next(self._cycle_actions_iterator)
-                self._create_process(one_action)
+            generation = self._generation
+            plan = self._plan_warm_pool_unlocked()
+            while True:
+                key = self._next_key_to_warmup_unlocked(plan)
+                if key is None:
+                    break
+                action_package = self._key_to_action_package[key]
+                reservation = self._reserve_process_unlocked(key)
+                to_spawn.append((action_package, key, reservation))
+
+        futures = []
+        for action_package, key, reservation in to_spawn:
+            futures.append(
+                run_in_thread(
+                    partial(
+                        self._spawn_idle_process,
+                        action_package,
+                        key,
+                        reservation,
+                        generation,
+                    ),
+                    name="Process Pool: spawn idle process",
+                )
+            )
+        return futures
+
+    @property
+    def admission_queue(self) -> AdmissionQueue:
+        return self._admission_queue
+
+    def get_stats(self) -> dict:
+        """
+        Returns:
+            Information on the processes in the pool and on the admission
+            queue (i.e.: runs waiting for a process).
+        """
+        with self._lock:
+            stats = {
+                "idle_processes": self._get_idle_processes_count_unlocked(),
+                "running_processes": self._get_running_processes_count_unlocked(),
+                "pending_processes": self._get_pending_processes_count_unlocked(),
+                "min_processes": self.min_processes,
+                "max_processes": self.max_processes,
+                "recycled_processes": self._recycled_count,
+            }
+        stats["admission"] = self._admission_queue.get_stats()
+        return stats
+
+    def _wait_admission(
+        self,
+        action: Action,
+        runtime_info: Optional["RunRuntimeInfo"],
+        priority: str,
+    ) -> AdmissionTicket:
+        """
+        Waits until the given action can be run (i.e.: until less than
+        `max_processes` actions are running).
+
+        Raises:
+            AdmissionRejectedError: if the queue is full or the action waited
+                for more than the allowed time.
+            CancelledError: if the run was cancelled while waiting.
+        """
+        ticket = self._enqueue_admission(action, runtime_info, priority)
+        if not ticket.granted:
+            with self._admission_wait_scope(action, runtime_info, ticket) as on_delayed:
+                self._admission_queue.wait(ticket, on_delayed)
+        return ticket
+
+    async def _wait_admission_async(
+        self,
+        action: Action,
+        runtime_info: Optional["RunRuntimeInfo"],
+        priority: str,
+    ) -> AdmissionTicket:
+        """
+        Same as `_wait_admission` but waits in the asyncio loop.
+        """
+        ticket = self._enqueue_admission(action, runtime_info, priority)
+        if not ticket.granted:
+            with self._admission_wait_scope(action, runtime_info, ticket) as on_delayed:
+                await self._admission_queue.wait_async(ticket, on_delayed)
+        return ticket
+
+    def _enqueue_admission(
+        self,
+        action: Action,
+        runtime_info: Optional["RunRuntimeInfo"],
+        priority: str,
+    ) -> AdmissionTicket:
+        from concurrent.futures import CancelledError
+
+        if runtime_info is not None and runtime_info.is_canceled():
+            raise CancelledError(
+                f"Action: {action.name} cancelled while waiting for process."
+            )
+
+        return self._admission_queue.enqueue(priority)
 
     @contextmanager
-    def obtain_process_for_action(
-        self, action: Action, runtime_info: Optional["RunRuntimeInfo"] = None
-    ) -> Iterator[ProcessHandle]:
-        import time
+    def _admission_wait_scope(
+        self,
+        action: Action,
+        runtime_info: Optional["RunRuntimeInfo"],
+        ticket: AdmissionTicket,
+    ) -> Iterator[Callable[[float], None]]:
+        """
+        Cancels the ticket if the run is cancelled while waiting for it to be
+        granted.
+
+        Yields:
+            The callback to be called periodically while waiting.
+        """
         from concurrent.futures import CancelledError
+        from contextlib import nullcontext
 
-        action_package: ActionPackage = self.action_package_id_to_action_package[
-            action.action_package_id
-        ]
+        admission_queue = self._admission_queue
 
-        key = _get_process_handle_key(self._settings, action_package)
-        process_handle: Optional[ProcessHandle] = None
-        acquired_process_semaphore = False
+        def on_cancel(*args, **kwargs):
+            admission_queue.cancel(ticket)
 
-        # Only print more info regarding delaying after 10 seconds elapse.
-        print_delayed_at = time.monotonic() + 10
+        def on_delayed(waited: float):
+            log.info(
+                f"Delayed running action: {action.name} because "
+                f"{self.max_processes} actions are already running (waiting for "
+                f"another action to finish running for {waited:.1f} seconds)."
+            )
 
-        try:
+        with (
+            runtime_info.on_cancel.register(on_cancel)
+            if runtime_info is not None
+            else nullcontext()
+        ):
+            if runtime_info is not None and runtime_info.is_canceled():
+                on_cancel()
+
+            try:
+                yield on_delayed
+            except CancelledError:
+                raise CancelledError(
+                    f"Action: {action.name} cancelled while waiting for process."
+                )
+
+    def _pop_idle_process_for_key(self, key: _Key) -> Optional[ProcessHandle]:
+        """
+        Provides an idle process (which is moved to the running processes)
+        or None if there's no compatible idle process.
+        """
+        with self._lock:
             while True:
-                if acquired_process_semaphore:
-                    # If we had previously acquired, release it now (for some reason we haven't
-                    # been able to create a process after acquiring the semaphore).
-                    self._processes_running_semaphore.release()
-                    acquired_process_semaphore = False
+                processes = self._idle_processes.get(key)
+                if not processes:
+                    return None
+
+                # Get any process from the (compatible) idle processes.
+                process_handle = self._pop_idle_process_unlocked(processes)
+                log.debug(f"Process Pool: Using idle process ({process_handle.pid}).")
+                if not process_handle.is_alive():
+                    # Process died while trying to get it.
+                    log.critical(
+                        f"Process Pool: Unexpected: Idle process exited "
+                        f"({process_handle.pid})."
+                    )
+                    continue
+
+                self._add_to_running_processes(process_handle)
+                return process_handle
+
+    def _acquire_process(
+        self,
+        action: Action,
+        action_package: ActionPackage,
+        key: _Key,
+        ticket: AdmissionTicket,
+        runtime_info: Optional["RunRuntimeInfo"],
+    ) -> ProcessHandle:
+        """
+        Provides a process to run the given action after it was admitted
+        (which may need to create a new process).
 
+        Note: the ticket is released if it's not possible to get a process.
+        """
+        import time
+        from concurrent.futures import CancelledError
+
+        process_handle: Optional[ProcessHandle] = None
+        try:
+            while True:
                 if runtime_info is not None and runtime_info.is_canceled():
                     raise CancelledError(
                         f"Action: {action.name} cancelled while waiting for process."
                     )
 
-                # Each 2 seconds check again if we can acquire a process.
-                # Important: do it without acquiring `self._lock` (as it could lead
-                # to a deadlock if one depends on the other)
-                if not self._processes_running_semaphore.acquire(timeout=2):
-                    if time.monotonic() > print_delayed_at:
-                        log.info(
-                            f"Delayed running action: {action.name} because "
-                            f"{self.max_processes} actions are already running ("
-                            f"waiting for another action to finish running)."
-                        )
-                        print_delayed_at = time.monotonic() + 10
-                    continue
-                acquired_process_semaphore = True
+                process_handle = self._pop_idle_process_for_key(key)
+                if process_handle is not None:
+                    break
 
+                reservation: Optional["Future[Optional[ProcessHandle]]"] = None
                 with self._lock:
-                    processes = self._idle_processes.get(key)
-                    if processes:
-                        # Get any process from the (compatible) idle processes.
-                        process_handle = processes.pop()
-                        log.debug(
-                            f"Process Pool: Using idle process ({process_handle.pid})."
+                    # No compatible process: we need to create one now.
+                    n_running = self._get_running_processes_count_unlocked()
+                    if n_running < self.max_processes:
+                        # Just reserve it here, the actual process creation
+                        # is done outside of the lock.
+                        reservation = self._reserve_process_unlocked(key)
+                        generation = self._generation
+                    else:
+                        log.critical(
+                            f"Unable to run: {action.name} because "
+                            f"{self.max_processes} actions are already running "
+                            "(waiting for another action to finish running). "
+                            "THIS IS UNEXPECTED AT THIS POINT "
+                            "(the admission queue with the max number of "
+                            "processes is not working as expected)."
                         )
-                        if not process_handle.is_alive():
-                            # Process died while trying to get it.
-                            log.critical(
-                                f"Process Pool: Unexpected: Idle process exited "
-                                f"({process_handle.pid})."
-                            )
-                            continue
 
-                        self._add_to_running_processes(process_handle)
-                    else:
-                        # No compatible process: we need to create one now.
-                        n_running = self._get_running_processes_count_unlocked()
-                        if n_running < self.max_processes:
-                            self._create_process(action)
-                            processes = self._idle_processes.get(key)
-                            assert processes, f"Expected idle processes bound to key: {key} at this point!"
-                            process_handle = processes.pop()
-                            log.debug(
-                                f"Process Pool: Created process ({process_handle.pid})."
-                            )
-                            if not process_handle.is_alive():
-                                # Process died while trying to get it.
-                                log.critical(
-                                    f"Process Pool: Unexpected: Idle process exited right "
-                                    f"after creation ({process_handle.pid})."
-                                )
-                                continue
-                            self._add_to_running_processes(process_handle)
-                        else:
-                            log.critical(
-                                f"Unable to run: {action.name} because "
-                                f"{self.max_processes} actions are already running "
-                                "(waiting for another action to finish running). "
-                                "THIS IS UNEXPECTED AT THIS POINT "
-                                "(the semaphore with the max number of processes is "
-                                "not working as expected)."
-                            )
+                if reservation is not None:
+                    created = self._spawn_reserved_process(
+                        action_package, key, reservation
+                    )
+                    log.debug(f"Process Pool: Created process ({created.pid}).")
+                    with self._lock:
+                        self._discard_reservation_unlocked(key, reservation)
+                        if generation != self._generation:
+                            # A reload happened while the process was being
+                            # created: it can be used for this run but not
+                            # reused afterwards.
+                            created.can_reuse = False
+                        self._add_to_running_processes(created)
+                    reservation.set_result(created)
+
+                    if not created.is_alive():
+                        # Process died while trying to get it.
+                        log.critical(
+                            f"Process Pool: Unexpected: Idle process exited right "
+                            f"after creation ({created.pid})."
+                        )
+                        with self._lock:
+                            self._remove_from_running_processes(created)
+                        continue
+                    process_handle = created
 
                 if process_handle is not None:
                     break
                 else:
+                    time.sleep(0.5)
                     continue
         except BaseException as e:
             if not isinstance(e, CancelledError):
@@ -869,59 +1841,178 @@ class ActionsProcessPool:
                     "CRITICAL ERROR IN Action Server Process Pool! This may make the Action Server unresponsive. Please report error!"
                 )
 
-            if acquired_process_semaphore:
-                self._processes_running_semaphore.release()
-
+            self._admission_queue.release(ticket)
             raise
 
         if process_handle is None:
             raise AssertionError(
                 "Expected process_handle to be not None at this point!"
             )
+        return process_handle
 
-        if not acquired_process_semaphore:
-            raise AssertionError(
-                "Expected 'acquired_process_semaphore' to be True at this point!"
+    def _release_process(
+        self, key: _Key, process_handle: ProcessHandle, ticket: AdmissionTicket
+    ) -> None:
+        """
+        Called after the action finished running in the given process (which
+        is added back to the idle processes or killed).
+        """
+        kill_process = False
+        replacement = None
+
+        # Note: checked without the lock (getting the RSS may be slow).
+        recycle_reason = None
+        if (
+            self._reuse_processes
+            and process_handle.can_reuse
+            and not process_handle.retiring
+            and process_handle.is_alive()
+        ):
+            recycle_reason = self._get_recycle_reason(process_handle)
+
+        with self._lock:
+            self._remove_from_running_processes(process_handle)
+            if process_handle.is_alive():
+                if self._reuse_processes:
+                    curr_idle = len(self._idle_processes.get(key, ()))
+                    target_idle = self._plan_warm_pool_unlocked().get(key, 0)
+                    if not process_handle.can_reuse:
+                        log.debug(
+                            f"Process Pool: Exited process ({process_handle.pid}) -- process marked as non-reusable."
+                        )
+                        # We cannot reuse it!
+                        kill_process = True
+
+                    elif process_handle.retiring:
+                        log.debug(
+                            f"Process Pool: Exited process ({process_handle.pid}) -- process is being recycled."
+                        )
+                        kill_process = True
+
+                    elif target_idle <= curr_idle:
+                        log.debug(
+                            f"Process Pool: Exited process ({process_handle.pid}) -- min processes already satisfied."
+                        )
+                        # We cannot reuse it!
+                        kill_process = True
+                    else:
+                        log.debug(
+                            f"Process Pool: Adding back to pool ({process_handle.pid})."
+                        )
+                        self._add_to_idle_processes(process_handle)
+                        if recycle_reason is not None:
+                            replacement = self._retire_process_unlocked(
+                                process_handle, recycle_reason
+                            )
+                            if replacement is None:
+                                kill_process = True
+                else:
+                    log.debug(
+                        f"Process Pool: Exited process ({process_handle.pid}) -- not reusing processes."
+                    )
+                    # We cannot reuse it!
+                    kill_process = True
+
+        # Only release after the process is back in the idle processes
+        # (so that the run which gets the slot may reuse it).
+        self._admission_queue.release(ticket)
+
+        if kill_process:
+            process_handle.kill()
+
+        if replacement is not None:
+            from sema4ai.action_server._robo_utils.run_in_thread import (
+                run_in_thread,
+            )
+
+            run_in_thread(
+                partial(self._spawn_replacement_process, *replacement, process_handle),
+                name="Process Pool: spawn replacement process",
             )
 
+        # If needed recreate idle processes which were removed (needed
+        # especially when not reusing processes, but if some process
+        # crashes it's also needed).
+        self._warmup_processes()
+
+    def _on_obtain_process_request(self, action: Action) -> Tuple[ActionPackage, _Key]:
+        action_package: ActionPackage = self.action_package_id_to_action_package[
+            action.action_package_id
+        ]
+
+        key = _get_process_handle_key(self._settings, action_package)
+
+        with self._lock:
+            self._get_demand_unlocked(key).on_request()
+        return action_package, key
+
+    @contextmanager
+    def obtain_process_for_action(
+        self,
+        action: Action,
+        runtime_info: Optional["RunRuntimeInfo"] = None,
+        priority: str = PRIORITY_NORMAL,
+    ) -> Iterator[ProcessHandle]:
+        """
+        Provides a process to run the given action (waiting in the admission
+        queue if `max_processes` actions are already running).
+
+        Args:
+            action: The action to be run.
+            runtime_info: Used to check whether the run was cancelled.
+            priority: The priority class (see: `PRIORITY_CLASSES`) to be used
+                if the run needs to wait in the admission queue.
+
+        Raises:
+            AdmissionRejectedError: if the admission queue is full or the
+                action waited for more than the allowed time in the queue.
+        """
+        action_package, key = self._on_obtain_process_request(action)
+
+        # The ticket is kept (so, the position in the queue isn't lost) even
+        # if it's not possible to get a process at the first try.
+        ticket = self._wait_admission(action, runtime_info, priority)
+        process_handle = self._acquire_process(
+            action, action_package, key, ticket, runtime_info
+        )
         try:
             yield process_handle
         finally:
-            self._processes_running_semaphore.release()
-            with self._lock:
-                self._remove_from_running_processes(process_handle)
-                if process_handle.is_alive():
-                    if self._reuse_processes:
-                        curr_idle = self._get_idle_processes_count_unlocked()
-                        if not process_handle.can_reuse:
-                            log.debug(
-                                f"Process Pool: Exited process ({process_handle.pid}) -- process marked as non-reusable."
-                            )
-                            # We cannot reuse it!
-                            process_handle.kill()
+            self._release_process(key, process_handle, ticket)
 
-                        elif self.min_processes <= curr_idle:
-                            log.debug(
-                                f"Process Pool: Exited process ({process_handle.pid}) -- min processes already satisfied."
-                            )
-                            # We cannot reuse it!
-                            process_handle.kill()
-                        else:
-                            log.debug(
-                                f"Process Pool: Adding back to pool ({process_handle.pid})."
-                            )
-                            self._add_to_idle_processes(process_handle)
-                    else:
-                        log.debug(
-                            f"Process Pool: Exited process ({process_handle.pid}) -- not reusing processes."
-                        )
-                        # We cannot reuse it!
-                        process_handle.kill()
+    @asynccontextmanager
+    async def obtain_process_for_action_async(
+        self,
+        action: Action,
+        runtime_info: Optional["RunRuntimeInfo"] = None,
+        priority: str = PRIORITY_NORMAL,
+    ) -> AsyncIterator[ProcessHandle]:
+        """
+        Same as `obtain_process_for_action` but waits in the admission queue
+        in the asyncio loop (threads are used to get the process -- which
+        needs the pool lock and may need to create a new process -- and to
+        release it afterwards).
+        """
+        from starlette.concurrency import run_in_threadpool
 
-            # If needed recreate idle processes which were removed (needed
-            # especially when not reusing processes, but if some process
-            # crashes it's also needed).
-            self._warmup_processes()
+        action_package, key = await run_in_threadpool(
+            self._on_obtain_process_request, action
+        )
+
+        ticket = await self._wait_admission_async(action, runtime_info, priority)
+
+        process_handle = await run_in_threadpool(
+            self._acquire_process,
+            action,
+            action_package,
+            key,
+            ticket,
+            runtime_info,
+        )
+        try:
+            yield process_handle
+        finally:
+            await run_in_threadpool(self._release_process, key, process_handle, ticket)
 
 
 _actions_process_pool: Optional[ActionsProcessPool] = None
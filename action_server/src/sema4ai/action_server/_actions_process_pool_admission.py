@@ -0,0 +1,439 @@
+"""
+Admission control for the process pool.
+
+Runs which can't be started right away (because `max_processes` actions are
+already running) wait in a FIFO queue (with optional priority classes: a
+waiter in a higher priority class is always served before one in a lower
+priority class and waiters in the same class are served in arrival order).
+
+When a running action finishes, its slot is handed off directly to the waiter
+at the head of the queue (so, a new request arriving at that moment can't
+take the slot from a request which was already waiting).
+
+The queue may be bounded (`max_queue_depth`), in which case new requests are
+rejected (the HTTP layer maps that to a `429` with a `Retry-After` header)
+and the time a request may wait in the queue may also be bounded
+(`max_queue_wait`), in which case it's rejected with a `503`.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+
+# Note: the order is important (first is the one with the highest priority).
+PRIORITY_CLASSES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+
+# Weight for the EWMA of wait/service times (higher means newer samples count more).
+_EWMA_ALPHA = 0.2
+
+# Used to compute the `Retry-After` when no run was completed yet.
+_DEFAULT_SERVICE_TIME = 1.0
+
+# Bounds for the `Retry-After` (in seconds).
+_MIN_RETRY_AFTER = 1
+_MAX_RETRY_AFTER = 600
+
+# Waiters log that they're still waiting in this interval (in seconds).
+_LOG_DELAYED_INTERVAL = 10
+
+
+class AdmissionRejectedError(Exception):
+    """
+    Raised when a run can't be admitted (the queue is full or the run waited
+    in the queue for more than the allowed time).
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def parse_priority(value: Optional[str]) -> str:
+    """
+    Args:
+        value: The priority class (as received in the request header). If
+            empty the normal priority is used.
+
+    Raises:
+        ValueError: if the priority is not valid.
+    """
+    if not value:
+        return PRIORITY_NORMAL
+    value = value.strip().lower()
+    if value not in PRIORITY_CLASSES:
+        raise ValueError(
+            f"Invalid priority: {value!r} "
+            f"(expected one of: {', '.join(PRIORITY_CLASSES)})."
+        )
+    return value
+
+
+class AdmissionTicket:
+    """
+    Represents a request for a slot to run an action.
+    """
+
+    __slots__ = [
+        "priority",
+        "enqueued_at",
+        "granted_at",
+        "_event",
+        "_granted",
+        "_cancelled",
+        "_on_signaled",
+    ]
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self._event = threading.Event()
+        self._granted = False
+        self._cancelled = False
+
+        # Called (with the lock held) when the ticket is granted/cancelled
+        # (used to wake up an asyncio waiter).
+        self._on_signaled: Optional[Callable[[], None]] = None
+
+    def _signal(self) -> None:
+        self._event.set()
+        if self._on_signaled is not None:
+            self._on_signaled()
+
+    @property
+    def granted(self) -> bool:
+        return self._granted
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+
+class AdmissionQueue:
+    def __init__(
+        self,
+        max_running: int,
+        max_queue_depth: int = 0,
+        max_queue_wait: float = 0,
+    ):
+        """
+        Args:
+            max_running: The number of slots (runs which may be running at
+                the same time).
+            max_queue_depth: The maximum number of runs which may be waiting
+                for a slot (0 means no limit).
+            max_queue_wait: The maximum time (in seconds) that a run may wait
+                for a slot (0 means no limit).
+        """
+        self._lock = threading.Lock()
+        self._max_running = max_running
+        self._available = max_running
+        self._max_queue_depth = max_queue_depth
+        self._max_queue_wait = max_queue_wait
+        self._waiters: Dict[str, Deque[AdmissionTicket]] = dict(
+            (priority, deque()) for priority in PRIORITY_CLASSES
+        )
+
+        # Stats
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._cancelled = 0
+        self._wait_time_avg = 0.0
+        self._wait_time_max = 0.0
+        self._service_time_avg: Optional[float] = None
+
+    @property
+    def max_running(self) -> int:
+        return self._max_running
+
+    def _get_queue_depth_unlocked(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def get_queue_depth(self) -> int:
+        with self._lock:
+            return self._get_queue_depth_unlocked()
+
+    def _compute_retry_after_unlocked(self) -> int:
+        service_time = self._service_time_avg
+        if service_time is None:
+            service_time = _DEFAULT_SERVICE_TIME
+        depth = self._get_queue_depth_unlocked()
+        # Expected time for the queue ahead of a new request to be drained.
+        estimate = service_time * (depth + 1) / max(1, self._max_running)
+        return max(_MIN_RETRY_AFTER, min(_MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def _is_full_unlocked(self) -> bool:
+        if self._available > 0 or self._max_queue_depth <= 0:
+            return False
+        return self._get_queue_depth_unlocked() >= self._max_queue_depth
+
+    def check_can_enqueue(self) -> None:
+        """
+        Checks whether a new request could be enqueued right now (used to
+        reject requests early on, before a run is created).
+
+        Raises:
+            AdmissionRejectedError: if the queue is full.
+        """
+        with self._lock:
+            if self._is_full_unlocked():
+                self._rejected += 1
+                raise self._create_queue_full_error_unlocked()
+
+    def _create_queue_full_error_unlocked(self) -> AdmissionRejectedError:
+        return AdmissionRejectedError(
+            f"Unable to run action: {self._max_running} actions are already "
+            f"running and {self._max_queue_depth} are waiting to run "
+            "(the queue is full).",
+            status_code=429,
+            retry_after=self._compute_retry_after_unlocked(),
+        )
+
+    def _grant_unlocked(self, ticket: AdmissionTicket) -> None:
+        ticket.granted_at = time.monotonic()
+        ticket._granted = True
+        ticket._signal()
+
+        wait_time = ticket.granted_at - ticket.enqueued_at
+        self._admitted += 1
+        self._wait_time_avg = (
+            _EWMA_ALPHA * wait_time + (1 - _EWMA_ALPHA) * self._wait_time_avg
+        )
+        self._wait_time_max = max(self._wait_time_max, wait_time)
+
+    def enqueue(self, priority: str = PRIORITY_NORMAL) -> AdmissionTicket:
+        """
+        Requests a slot. If a slot is available it's granted right away,
+        otherwise the ticket is put in the queue (use `wait` to wait for it).
+
+        Raises:
+            AdmissionRejectedError: if the queue is full.
+        """
+        ticket = AdmissionTicket(priority)
+        with self._lock:
+            if self._available > 0 and self._get_queue_depth_unlocked() == 0:
+                self._available -= 1
+                self._grant_unlocked(ticket)
+                return ticket
+
+            if self._is_full_unlocked():
+                self._rejected += 1
+                raise self._create_queue_full_error_unlocked()
+
+            self._waiters[priority].append(ticket)
+        return ticket
+
+    def wait(
+        self,
+        ticket: AdmissionTicket,
+        on_delayed: Optional[Callable[[float], None]] = None,
+    ) -> None:
+        """
+        Waits until the ticket is granted a slot.
+
+        Args:
+            on_delayed: Called (with the time waited so far) periodically
+                while waiting.
+
+        Raises:
+            AdmissionRejectedError: if the max queue wait time elapsed.
+            concurrent.futures.CancelledError: if the ticket was cancelled.
+        """
+        deadline = self._get_deadline(ticket)
+        while True:
+            timeout = self._get_wait_timeout(deadline)
+            if timeout > 0 and ticket._event.wait(timeout):
+                break
+
+            if self._check_wait_finished(ticket, deadline):
+                break
+
+            if on_delayed is not None:
+                on_delayed(time.monotonic() - ticket.enqueued_at)
+
+        self._check_not_cancelled(ticket)
+
+    async def wait_async(
+        self,
+        ticket: AdmissionTicket,
+        on_delayed: Optional[Callable[[float], None]] = None,
+    ) -> None:
+        """
+        Same as `wait` but waits in the asyncio loop (without blocking a thread).
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        signaled: "asyncio.Future[None]" = loop.create_future()
+
+        def on_signaled_in_loop():
+            if not signaled.done():
+                signaled.set_result(None)
+
+        def on_signaled():
+            loop.call_soon_threadsafe(on_signaled_in_loop)
+
+        with self._lock:
+            if ticket._event.is_set():
+                signaled.set_result(None)
+            else:
+                ticket._on_signaled = on_signaled
+
+        try:
+            deadline = self._get_deadline(ticket)
+            while True:
+                timeout = self._get_wait_timeout(deadline)
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(asyncio.shield(signaled), timeout)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+
+                if self._check_wait_finished(ticket, deadline):
+                    break
+
+                if on_delayed is not None:
+                    on_delayed(time.monotonic() - ticket.enqueued_at)
+        finally:
+            with self._lock:
+                ticket._on_signaled = None
+
+        self._check_not_cancelled(ticket)
+
+    def _get_deadline(self, ticket: AdmissionTicket) -> Optional[float]:
+        if self._max_queue_wait > 0:
+            return ticket.enqueued_at + self._max_queue_wait
+        return None
+
+    def _get_wait_timeout(self, deadline: Optional[float]) -> float:
+        timeout: float = _LOG_DELAYED_INTERVAL
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        return timeout
+
+    def _check_wait_finished(
+        self, ticket: AdmissionTicket, deadline: Optional[float]
+    ) -> bool:
+        """
+        Returns:
+            True if the ticket was already granted/cancelled.
+
+        Raises:
+            AdmissionRejectedError: if the max queue wait time elapsed.
+        """
+        with self._lock:
+            if ticket._event.is_set():
+                return True
+
+            if deadline is not None and time.monotonic() >= deadline:
+                self._remove_unlocked(ticket)
+                self._timed_out += 1
+                raise AdmissionRejectedError(
+                    f"Unable to run action: waited for {self._max_queue_wait:.1f} "
+                    "seconds without a process being available.",
+                    status_code=503,
+                    retry_after=self._compute_retry_after_unlocked(),
+                )
+        return False
+
+    def _check_not_cancelled(self, ticket: AdmissionTicket) -> None:
+        from concurrent.futures import CancelledError
+
+        if ticket.cancelled:
+            raise CancelledError("Cancelled while waiting for a process.")
+
+    def _remove_unlocked(self, ticket: AdmissionTicket) -> bool:
+        try:
+            self._waiters[ticket.priority].remove(ticket)
+        except ValueError:
+            return False
+        return True
+
+    def cancel(self, ticket: AdmissionTicket) -> bool:
+        """
+        Cancels a ticket which is still waiting in the queue.
+
+        Returns:
+            True if it was cancelled and False otherwise (it was already
+            granted or cancelled).
+        """
+        with self._lock:
+            if ticket._granted or ticket._cancelled:
+                return False
+            self._remove_unlocked(ticket)
+            ticket._cancelled = True
+            self._cancelled += 1
+            ticket._signal()
+            return True
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        """
+        Releases the slot of a granted ticket (which is handed off to the
+        waiter at the head of the queue if there's one).
+        """
+        with self._lock:
+            if not ticket._granted:
+                raise AssertionError("Only granted tickets may be released.")
+            ticket._granted = False
+
+            if ticket.granted_at is not None:
+                service_time = time.monotonic() - ticket.granted_at
+                if self._service_time_avg is None:
+                    self._service_time_avg = service_time
+                else:
+                    self._service_time_avg = (
+                        _EWMA_ALPHA * service_time
+                        + (1 - _EWMA_ALPHA) * self._service_time_avg
+                    )
+
+            for priority in PRIORITY_CLASSES:
+                waiters = self._waiters[priority]
+                if waiters:
+                    self._grant_unlocked(waiters.popleft())
+                    return
+
+            self._available += 1
+
+    def get_stats(self) -> dict:
+        """
+        Returns:
+            Information on the queue (may be used for autoscaling).
+        """
+        with self._lock:
+            now = time.monotonic()
+            oldest_wait = 0.0
+            for waiters in self._waiters.values():
+                if waiters:
+                    oldest_wait = max(oldest_wait, now - waiters[0].enqueued_at)
+
+            return {
+                "max_running": self._max_running,
+                "running": self._max_running - self._available,
+                "queue_depth": self._get_queue_depth_unlocked(),
+                "queue_depth_by_priority": dict(
+                    (priority, len(waiters))
+                    for priority, waiters in self._waiters.items()
+                ),
+                "max_queue_depth": self._max_queue_depth,
+                "max_queue_wait": self._max_queue_wait,
+                "oldest_wait_time": oldest_wait,
+                "wait_time_avg": self._wait_time_avg,
+                "wait_time_max": self._wait_time_max,
+                "service_time_avg": self._service_time_avg,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "cancelled": self._cancelled,
+            }
@@ -0,0 +1,240 @@
+"""
+Helpers to decide how the warm (idle) processes of the process pool should be
+split among the different action packages.
+
+The idea is that each process key (which maps to an action package environment)
+keeps track of the rate at which requests arrive and of how long it takes to
+spawn a new process for it. The warm pool planner then splits the idle budget
+(`min_processes`) based on the observed demand (so, warm capacity goes where
+the traffic actually lands).
+"""
+
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple, TypeVar
+
+log = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+
+# Time constant (in seconds) used for the exponentially-weighted arrival rate
+# (i.e.: requests which arrived more than a few minutes ago barely count).
+DEFAULT_RATE_TAU = 60.0
+
+# Weight for the spawn latency EWMA (higher means newer samples count more).
+DEFAULT_LATENCY_ALPHA = 0.3
+
+# Used when no process was spawned for a key yet.
+DEFAULT_SPAWN_LATENCY = 1.0
+
+# Baseline weight which every key gets (so that keys without any observed
+# demand still get a share of the budget when there's no traffic at all).
+_BASELINE_WEIGHT = 0.001
+
+
+@dataclass(slots=True)
+class PackageProcessLimits:
+    """
+    Per action package overrides for the number of warm processes.
+    """
+
+    min_processes: int = 0
+    max_processes: Optional[int] = None
+
+
+def parse_package_processes(value: str) -> Dict[str, PackageProcessLimits]:
+    """
+    Parses the per action package limits.
+
+    Args:
+        value: A string in the format: `<package_name>=<min>:<max>` with
+            multiple entries separated by `,` (either `min` or `max` may be
+            empty, i.e.: `my-package=2:` or `my-package=:4`).
+
+    Returns:
+        A dict mapping the action package name to the limits.
+    """
+    ret: Dict[str, PackageProcessLimits] = {}
+    if not value:
+        return ret
+
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            name, limits = entry.rsplit("=", 1)
+            min_str, max_str = limits.split(":", 1)
+            min_processes = int(min_str) if min_str.strip() else 0
+            max_processes = int(max_str) if max_str.strip() else None
+        except ValueError:
+            raise ValueError(
+                f"Invalid package processes entry: {entry!r} "
+                "(expected: <package_name>=<min>:<max>)."
+            )
+        if min_processes < 0 or (max_processes is not None and max_processes < 0):
+            raise ValueError(
+                f"Invalid package processes entry: {entry!r} (values must be >= 0)."
+            )
+        if max_processes is not None and min_processes > max_processes:
+            raise ValueError(f"Invalid package processes entry: {entry!r} (min > max).")
+        ret[name.strip()] = PackageProcessLimits(min_processes, max_processes)
+    return ret
+
+
+class KeyDemand:
+    """
+    Keeps the demand related information for a given process key.
+
+    Note: not thread-safe (the process pool must hold its lock when using it).
+    """
+
+    __slots__ = ["_rate", "_last_arrival", "_spawn_latency", "_tau"]
+
+    def __init__(self, tau: float = DEFAULT_RATE_TAU):
+        self._rate = 0.0
+        self._last_arrival: Optional[float] = None
+        self._spawn_latency: Optional[float] = None
+        self._tau = tau
+
+    def on_request(self, now: Optional[float] = None) -> None:
+        """
+        Should be called whenever a request arrives for the key.
+        """
+        if now is None:
+            now = time.monotonic()
+        self._rate = self.rate(now) + 1.0 / self._tau
+        self._last_arrival = now
+
+    def on_spawn(self, elapsed: float) -> None:
+        """
+        Should be called with the time it took to spawn a process for the key.
+        """
+        if self._spawn_latency is None:
+            self._spawn_latency = elapsed
+        else:
+            self._spawn_latency = (
+                DEFAULT_LATENCY_ALPHA * elapsed
+                + (1 - DEFAULT_LATENCY_ALPHA) * self._spawn_latency
+            )
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """
+        Returns:
+            The (exponentially decayed) arrival rate in requests per second.
+        """
+        if self._last_arrival is None:
+            return 0.0
+        if now is None:
+            now = time.monotonic()
+        elapsed = max(0.0, now - self._last_arrival)
+        return self._rate * math.exp(-elapsed / self._tau)
+
+    @property
+    def spawn_latency(self) -> float:
+        if self._spawn_latency is None:
+            return DEFAULT_SPAWN_LATENCY
+        return self._spawn_latency
+
+    def weight(self, now: Optional[float] = None) -> float:
+        """
+        The weight is the expected number of requests arriving while a new
+        process is spawned (so, keys which are slower to spawn or which have
+        more traffic get more warm processes).
+        """
+        return self.rate(now) * self.spawn_latency + _BASELINE_WEIGHT
+
+
+def plan_warm_pool(
+    keys: Iterable[K],
+    budget: int,
+    get_weight: Callable[[K], float],
+    get_limits: Callable[[K], Tuple[int, Optional[int]]],
+) -> Dict[K, int]:
+    """
+    Splits the budget of warm processes among the given keys.
+
+    Args:
+        keys: The keys which should be considered.
+        budget: The number of warm processes to split.
+        get_weight: Provides the weight (demand) of a key.
+        get_limits: Provides the (min, max) warm processes for a key (max may
+            be None to mean no limit).
+
+    Returns:
+        A dict with the number of warm processes each key should have. Note
+        that the sum may be higher than the budget if the per-key minimums
+        require it.
+    """
+    keys = list(keys)
+    plan: Dict[K, int] = {}
+    if not keys:
+        return plan
+
+    limits = dict((key, get_limits(key)) for key in keys)
+
+    # First, satisfy the minimums.
+    for key in keys:
+        plan[key] = limits[key][0]
+
+    remaining = budget - sum(plan.values())
+
+    # Then split what's left by weight (largest remainder method), respecting
+    # the maximums (whatever is left from a capped key is redistributed).
+    candidates = [
+        key for key in keys if limits[key][1] is None or plan[key] < limits[key][1]
+    ]
+    while remaining > 0 and candidates:
+        weights = dict((key, max(0.0, get_weight(key))) for key in candidates)
+        total_weight = sum(weights.values())
+        if total_weight <= 0:
+            weights = dict((key, 1.0) for key in candidates)
+            total_weight = float(len(candidates))
+
+        shares = dict(
+            (key, remaining * weights[key] / total_weight) for key in candidates
+        )
+        assigned = 0
+        floor_total = 0
+        for key in candidates:
+            add = int(shares[key])
+            floor_total += add
+            max_processes = limits[key][1]
+            if max_processes is not None:
+                add = min(add, max_processes - plan[key])
+            plan[key] += add
+            assigned += add
+
+        # Distribute what was lost due to rounding by the largest fractional
+        # part (what was lost due to a cap is redistributed in the next
+        # iteration).
+        rounding_left = remaining - floor_total
+        by_remainder = sorted(
+            candidates,
+            key=lambda key: (shares[key] - int(shares[key]), weights[key]),
+            reverse=True,
+        )
+        for key in by_remainder:
+            if rounding_left <= 0:
+                break
+            max_processes = limits[key][1]
+            if max_processes is not None and plan[key] >= max_processes:
+                continue
+            plan[key] += 1
+            assigned += 1
+            rounding_left -= 1
+
+        left = remaining - assigned
+        if left == remaining:
+            # Nothing could be assigned (everything is capped).
+            break
+        remaining = left
+        candidates = [
+            key
+            for key in candidates
+            if limits[key][1] is None or plan[key] < limits[key][1]
+        ]
+
+    return plan
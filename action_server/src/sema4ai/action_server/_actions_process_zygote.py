@@ -0,0 +1,222 @@
+"""
+Support for the "zygote" worker start mode (Linux only).
+
+In this mode, instead of launching a new python interpreter for each worker,
+one template process (the zygote) is launched per action package environment.
+The zygote preloads the modules needed to run actions and new workers are
+forked from it (which then connect back to the action server using the same
+channel used by regular workers).
+
+See: `_preload_actions/preload_actions_zygote.py` for the zygote side.
+"""
+
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import typing
+from typing import IO, Optional
+
+if typing.TYPE_CHECKING:
+    from ._actions_process_output import OutputPump
+
+log = logging.getLogger(__name__)
+
+WORKER_START_MODE_SPAWN = "spawn"
+WORKER_START_MODE_ZYGOTE = "zygote"
+WORKER_START_MODES = (WORKER_START_MODE_SPAWN, WORKER_START_MODE_ZYGOTE)
+
+# Timeout (in seconds) to wait for the zygote to reply to a fork request.
+_FORK_TIMEOUT = 20
+
+
+def is_zygote_supported() -> bool:
+    return sys.platform == "linux" and hasattr(socket, "send_fds")
+
+
+class ForkedProcess:
+    """
+    Provides the subset of the `subprocess.Popen` API used by the
+    `ProcessHandle` for a worker forked from a zygote (which is not a child
+    of the action server, so, it can't be waited for).
+    """
+
+    def __init__(self, pid: int, stdout: IO[bytes], stderr: IO[bytes]):
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+
+    def poll(self) -> Optional[int]:
+        from ._robo_utils.process import is_process_alive
+
+        if self.returncode is None and not is_process_alive(self.pid):
+            # The actual returncode is not available (the process is
+            # reaped by the zygote).
+            self.returncode = -1
+        return self.returncode
+
+
+class _OutputLogger:
+    """
+    Logs (in debug) the output of the zygote line by line (the contents are
+    received in chunks from the output pump).
+    """
+
+    def __init__(self, pid: int):
+        self._pid = pid
+        self._partial = b""
+
+    def __call__(self, data: bytes) -> None:
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._log_line(line)
+
+    def _log_line(self, line_bytes: bytes) -> None:
+        log.debug(
+            "zygote (pid: %s): %s",
+            self._pid,
+            line_bytes.decode("utf-8", "replace").rstrip(),
+        )
+
+
+class Zygote:
+    def __init__(
+        self,
+        python_exe: str,
+        cwd: str,
+        env: dict[str, str],
+        output_pump: "OutputPump",
+    ):
+        """
+        Args:
+            output_pump: Used to read the stdout/stderr of the zygote (which
+                is logged and not echoed to the console).
+        """
+        from ._robo_utils.process import build_subprocess_kwargs
+
+        parent_sock, child_sock = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET
+        )
+        try:
+            cmdline = [
+                python_exe,
+                "-m",
+                "preload_actions_server_main",
+                f"--zygote-fd={child_sock.fileno()}",
+            ]
+            subprocess_kwargs = build_subprocess_kwargs(cwd=cwd, env=env)
+            subprocess_kwargs.update(
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=(child_sock.fileno(),),
+            )
+            self._process = subprocess.Popen(cmdline, **subprocess_kwargs)
+        except BaseException:
+            parent_sock.close()
+            raise
+        finally:
+            child_sock.close()
+
+        self._sock = parent_sock
+        self._sock.settimeout(_FORK_TIMEOUT)
+        self._lock = threading.Lock()
+
+        # Set when a fork request fails (i.e.: timed out): the zygote must not
+        # be used anymore as a late reply would be read by the next request.
+        self._broken = False
+
+        pid = self._process.pid
+        for stream in (self._process.stdout, self._process.stderr):
+            output_pump.register(stream, pid, _OutputLogger(pid), echo=False)
+
+        log.debug(f"Process Pool: Created zygote ({pid}).")
+
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
+    def is_alive(self) -> bool:
+        return not self._broken and self._process.poll() is None
+
+    def fork_worker(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        sock: Optional[socket.socket] = None,
+    ) -> ForkedProcess:
+        """
+        Requests the zygote to fork a new worker which should either connect
+        back to the given host/port or use the given socket (which is passed
+        to the zygote and inherited by the forked worker).
+
+        Note: if it fails the zygote is marked as broken (`is_alive()` returns
+        False afterwards) and it should be disposed.
+        """
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        try:
+            try:
+                fds = [stdout_write, stderr_write]
+                if sock is not None:
+                    request: dict = {"socket": True}
+                    fds.append(sock.fileno())
+                else:
+                    request = {"host": host, "port": port}
+                msg = json.dumps(request).encode("utf-8")
+                with self._lock:
+                    if self._broken:
+                        raise RuntimeError(
+                            f"Zygote ({self._process.pid}) is broken (a previous "
+                            "fork request failed)."
+                        )
+                    try:
+                        socket.send_fds(self._sock, [msg], fds)
+                        reply = self._sock.recv(4096)
+                        pid = self._get_pid_from_reply(reply)
+                    except BaseException:
+                        self._broken = True
+                        raise
+            finally:
+                os.close(stdout_write)
+                os.close(stderr_write)
+        except BaseException:
+            os.close(stdout_read)
+            os.close(stderr_read)
+            raise
+
+        return ForkedProcess(
+            pid, os.fdopen(stdout_read, "rb"), os.fdopen(stderr_read, "rb")
+        )
+
+    def _get_pid_from_reply(self, reply: bytes) -> int:
+        if not reply:
+            raise RuntimeError(
+                f"Zygote ({self._process.pid}) exited while forking worker."
+            )
+        reply_as_dict = json.loads(reply)
+        pid = reply_as_dict.get("pid")
+        if not pid:
+            raise RuntimeError(
+                f"Zygote ({self._process.pid}) was unable to fork worker: "
+                f"{reply_as_dict}."
+            )
+        return pid
+
+    def dispose(self) -> None:
+        """
+        Stops the zygote (workers which were already forked are not affected).
+        """
+        log.debug(f"Process Pool: Disposing zygote ({self._process.pid}).")
+        try:
+            self._sock.close()
+        except Exception:
+            pass
+        try:
+            self._process.kill()
+        except Exception:
+            pass
@@ -0,0 +1,250 @@
+"""
+Cache for the results of actions which are explicitly marked as not
+consequential (i.e.: `@action(is_consequential=False)`).
+
+The cache is opt-in: it's only enabled when `--result-cache-size` is given
+and only actions which are explicitly not consequential and which have a
+time to live (configured in the action options, in the `package.yaml` or
+with `--result-cache-ttl` as a default for all such actions) are cached.
+
+Entries are keyed by the action id, the hash of the action package
+environment, the inputs (as canonical json) and the values of selected
+headers (the headers which provide the action context are always used,
+others may be added with `vary-headers`). The cache is bounded by the
+number of entries (the least recently used entries are evicted first) and
+it's cleared whenever the actions are reloaded.
+
+Configuration in the `package.yaml`:
+
+    result-cache:
+      my_action:
+        ttl: 60  # in seconds (0 disables the cache for the action)
+        vary-headers:
+          - x-user-id
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+if typing.TYPE_CHECKING:
+    from ._models import Action, ActionPackage
+    from ._settings import Settings
+
+log = logging.getLogger(__name__)
+
+# Headers whose values are always part of the key (the action may use
+# secrets or information on the request provided in those).
+_CONTEXT_HEADERS = ("x-action-context", "x-action-invocation-context")
+
+
+@dataclass
+class ResultCacheConfig:
+    ttl: float  # in seconds
+    vary_headers: Tuple[str, ...] = ()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int):
+        """
+        Args:
+            max_entries: The maximum number of results kept in the cache
+                (when full, the least recently used entry is evicted).
+        """
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # key -> (expires_at, result as json)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns:
+            The result (as json) cached for the given key or None if it's not
+            in the cache (or if it already expired).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return result
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: str, result: str, ttl: float) -> None:
+        if ttl <= 0 or self._max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self._max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+def is_result_shareable(action: "Action") -> bool:
+    """
+    Returns:
+        True if the result of a run of the given action may be used for other
+        requests with the same inputs/headers (i.e.: the action is explicitly
+        not consequential and it doesn't depend on the user session).
+    """
+    if action.is_consequential is not False:
+        return False
+
+    if action.managed_params_schema:
+        for param_info in json.loads(action.managed_params_schema).values():
+            if param_info.get("type") == "OAuth2Secret":
+                return False
+    return True
+
+
+def make_result_cache_key(
+    action: "Action",
+    action_package: "ActionPackage",
+    inputs: Any,
+    headers: Dict[str, str],
+    vary_headers: Tuple[str, ...] = (),
+) -> str:
+    """
+    Provides the key for the result of running the given action with the
+    given inputs/headers.
+
+    Args:
+        vary_headers: Headers (lowercase) whose values are also used in the
+            key (besides the headers which provide the action context).
+    """
+    lower_headers = dict((k.lower(), v) for k, v in headers.items())
+    header_values = [
+        [name, lower_headers.get(name)] for name in _CONTEXT_HEADERS + vary_headers
+    ]
+    contents = json.dumps(
+        [action.id, action_package.conda_hash, inputs, header_values],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+
+def _parse_config(
+    action: "Action", value: Any, default_ttl: float, vary_headers_key: str
+) -> Optional[ResultCacheConfig]:
+    if value is False:
+        return None
+
+    if not isinstance(value, dict):
+        log.critical(
+            f"Expected the result cache configuration of action {action.name} to "
+            f"be a dict or `false`. Found: {value!r} (ignoring it)."
+        )
+        return None
+
+    ttl = value.get("ttl", default_ttl)
+    vary_headers = value.get(vary_headers_key, [])
+    if not isinstance(ttl, (int, float)) or not isinstance(vary_headers, list):
+        log.critical(
+            f"Invalid result cache configuration for action {action.name}: "
+            f"{value!r} (ignoring it)."
+        )
+        return None
+
+    if ttl <= 0:
+        return None
+    return ResultCacheConfig(
+        ttl=float(ttl), vary_headers=tuple(str(h).lower() for h in vary_headers)
+    )
+
+
+def get_result_cache_config(
+    settings: "Settings", action_package: "ActionPackage", action: "Action"
+) -> Optional[ResultCacheConfig]:
+    """
+    Provides the result cache configuration for the given action.
+
+    Returns:
+        The configuration or None if the results of the action must not be
+        cached.
+    """
+    from ._actions_run_helpers import load_package_yaml_section
+
+    if settings.result_cache_size <= 0:
+        return None
+
+    if not is_result_shareable(action):
+        return None
+
+    options: dict = {}
+    if action.options:
+        try:
+            options = json.loads(action.options)
+        except Exception:
+            log.exception(f"Error loading options of action {action.name}.")
+
+    default_ttl = settings.result_cache_ttl
+    package_yaml_config = load_package_yaml_section(
+        settings, action_package, "result-cache"
+    )
+    if action.name in package_yaml_config:
+        return _parse_config(
+            action, package_yaml_config[action.name], default_ttl, "vary-headers"
+        )
+
+    if "result_cache" in options:
+        return _parse_config(
+            action, options["result_cache"], default_ttl, "vary_headers"
+        )
+
+    if default_ttl > 0:
+        return ResultCacheConfig(ttl=default_ttl)
+    return None
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    global _result_cache
+
+    if _result_cache is None:
+        from ._settings import get_settings
+
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache(get_settings().result_cache_size)
+    return _result_cache
+
+
+def clear_result_cache() -> None:
+    """
+    Clears the results cached (called when the actions are reloaded).
+    """
+    if _result_cache is not None:
+        _result_cache.clear()
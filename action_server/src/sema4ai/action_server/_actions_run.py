@@ -3,15 +3,30 @@ import json
 import logging
 import time
 import typing
-from typing import Any, Callable, Dict, Protocol, Tuple
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 from fastapi import HTTPException, Request, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.concurrency import run_in_threadpool
 
 from ._settings import (
+    HEADER_ACTION_ARTIFACTS,
     HEADER_ACTION_ASYNC_COMPLETION,
     HEADER_ACTION_INVOCATION_CONTEXT,
+    HEADER_ACTION_PRIORITY,
     HEADER_ACTION_SERVER_RUN_ID,
     HEADER_ACTIONS_ASYNC_CALLBACK,
     HEADER_ACTIONS_ASYNC_TIMEOUT,
@@ -19,10 +34,18 @@ from ._settings import (
 )
 
 if typing.TYPE_CHECKING:
+    import asyncio
+
+    from ._actions_process_pool import ProcessHandle
+    from ._actions_result_cache import ResultCacheConfig
+    from ._actions_single_flight import Flight
     from ._models import Action, ActionPackage, Run
+    from ._runs_state_cache import RunRuntimeInfo
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 # Note: for pydantic models, the following APIs are used:
 # cls.model_validate(dict)
@@ -44,11 +67,17 @@ def _create_run_artifacts_dir(action: "Action", run_id: str) -> str:
         The path, relative to the settings.artifacts_dir which should be used
         to store the output of the given run.
     """
+    from ._artifacts_staging import get_artifacts_staging
     from ._settings import get_settings
 
+    path = run_id
+    if get_artifacts_staging() is not None:
+        # Lightweight artifacts mode: the directory is only created in the
+        # `artifacts_dir` if the files of the run are persisted.
+        return path
+
     settings = get_settings()
     artifacts_dir = settings.artifacts_dir
-    path = run_id
     target_dir = artifacts_dir / path
     target_dir.mkdir(parents=True, exist_ok=False)
     return path
@@ -61,57 +90,86 @@ def _create_run(
     relative_artifacts_dir: str,
     request_id: str,
 ) -> "Run":
-    from sema4ai.action_server._models import RUN_ID_COUNTER, Counter
+    runs = _create_runs(action, [(run_id, inputs, relative_artifacts_dir, request_id)])
+    return runs[0]
 
+
+def _create_runs(
+    action: "Action", runs_info: Sequence[Tuple[str, Any, str, str]]
+) -> List["Run"]:
+    """
+    Creates the runs for the given action (in a single transaction).
+
+    Args:
+        runs_info: The (run_id, inputs, relative_artifacts_dir, request_id)
+            of each run to be created.
+    """
     from ._database import datetime_to_str
+    from ._db_group_commit import submit_write
     from ._models import Run, RunStatus, get_db
+    from ._run_numbers import get_run_number_allocator
     from ._runs_state_cache import get_global_runs_state
 
     db = get_db()
-    run_kwargs: Dict[str, Any] = dict(
-        id=run_id,
-        status=RunStatus.NOT_RUN,
-        action_id=action.id,
-        start_time=datetime_to_str(datetime.datetime.now(datetime.timezone.utc)),
-        run_time=None,
-        inputs=json.dumps(inputs),
-        result=None,
-        error_message=None,
-        relative_artifacts_dir=relative_artifacts_dir,
-        request_id=request_id,
-    )
-    with db.transaction():
-        with db.cursor() as cursor:
-            db.execute_update_returning(
-                cursor,
-                "UPDATE counter SET value=value+1 WHERE id=? RETURNING value",
-                [RUN_ID_COUNTER],
+    start_time = datetime_to_str(datetime.datetime.now(datetime.timezone.utc))
+    runs: List[Run] = []
+
+    def write():
+        first_numbered_id = get_run_number_allocator().allocate(len(runs_info))
+
+        for i, (run_id, inputs, relative_artifacts_dir, request_id) in enumerate(
+            runs_info
+        ):
+            run = Run(
+                id=run_id,
+                status=RunStatus.NOT_RUN,
+                action_id=action.id,
+                start_time=start_time,
+                run_time=None,
+                inputs=json.dumps(inputs),
+                result=None,
+                error_message=None,
+                relative_artifacts_dir=relative_artifacts_dir,
+                numbered_id=first_numbered_id + i,
+                request_id=request_id,
             )
-            counter_record = cursor.fetchall()
-            if not counter_record:
-                raise RuntimeError(
-                    f"Error. No counter found for run_id. Counters in db: {db.all(Counter)}"
-                )
-            run_kwargs["numbered_id"] = counter_record[0][0]
-
-        run = Run(**run_kwargs)
-        db.insert(run)
+            runs.append(run)
+        db.insert_many(runs)
 
-    # Ok, transaction finished properly. Let's add it to our in-memory cache.
-    global_runs_state = get_global_runs_state()
-    global_runs_state.on_run_inserted(run)
+    def on_committed():
+        # Ok, transaction finished properly. Let's add them to our in-memory cache.
+        global_runs_state = get_global_runs_state()
+        for run in runs:
+            global_runs_state.on_run_inserted(run)
 
-    return run
+    # Durable: the run must be found by new queries when this returns.
+    submit_write(write, on_committed)
+    return runs
 
 
-def _update_run(run: "Run", initial_time: float, run_finished: bool, **changes):
+def _update_run(
+    run: "Run",
+    initial_time: float,
+    run_finished: bool,
+    durable: bool = True,
+    **changes,
+):
+    """
+    Args:
+        durable: If False the update is just queued to be written (see:
+            `_db_group_commit`).
+    """
     from sema4ai.action_server._settings import get_settings
 
-    from ._models import get_db
+    from ._db_group_commit import submit_write
+    from ._models import Run, get_db
+    from ._runs_analytics import record_finished_run
     from ._runs_state_cache import get_global_runs_state
 
+    finished_at: Optional[datetime.datetime] = None
     if run_finished:
         changes["run_time"] = time.monotonic() - initial_time
+        finished_at = datetime.datetime.now(datetime.timezone.utc)
 
     db = get_db()
     changes_repr = []
@@ -127,12 +185,25 @@ def _update_run(run: "Run", initial_time: float, run_finished: bool, **changes):
     url = f"{get_settings().base_url}/runs/{run.id}"
 
     log.info(f"Updating run {run.id} with changes: {changes_str} (see: {url})")
-    with db.transaction():
-        db.update(run, *fields_changed)
 
-    # Ok, transaction finished properly. Let's update our in-memory cache.
-    global_runs_state = get_global_runs_state()
-    global_runs_state.on_run_changed(run, changes)
+    # The run may be changed again before the write is applied, so, the
+    # current values are used.
+    run_copy = Run(**asdict(run))
+    fields = {field: getattr(run_copy, field) for field in fields_changed}
+
+    def write():
+        if finished_at is not None:
+            # Note: done before the update as the run is only added to the
+            # rollups if it's not already finished in the database.
+            record_finished_run(db, run_copy, finished_at)
+        db.update_by_id(Run, run_copy.id, fields)
+
+    def on_committed():
+        # Ok, transaction finished properly. Let's update our in-memory cache.
+        global_runs_state = get_global_runs_state()
+        global_runs_state.on_run_changed(run_copy, changes)
+
+    submit_write(write, on_committed, durable)
 
 
 def _set_run_as_finished_ok(run: "Run", result: str, initial_time: float) -> int:
@@ -142,6 +213,17 @@ def _set_run_as_finished_ok(run: "Run", result: str, initial_time: float) -> int
     return RunStatus.PASSED
 
 
+def _set_run_as_finished_from_cache(
+    run: "Run", result: str, initial_time: float
+) -> int:
+    from ._models import RunStatus
+
+    _update_run(
+        run, initial_time, True, result=result, status=RunStatus.PASSED, cache_hit=True
+    )
+    return RunStatus.PASSED
+
+
 def _set_run_as_finished_failed_with_response(
     run: "Run", result: str, initial_time: float
 ) -> int:
@@ -176,7 +258,8 @@ def _set_run_as_finished_failed(
 def _set_run_as_running(run: "Run", initial_time: float) -> int:
     from ._models import RunStatus
 
-    _update_run(run, initial_time, False, status=RunStatus.RUNNING)
+    # Not durable: the run finishing is written after it anyways.
+    _update_run(run, initial_time, False, durable=False, status=RunStatus.RUNNING)
     return RunStatus.RUNNING
 
 
@@ -232,9 +315,20 @@ class _ActionsRunner:
         response_handler: IResponseHandler,
         headers: dict,
         cookies: dict,
+        result_cache_config: Optional["ResultCacheConfig"] = None,
+        coalesce: bool = False,
+        run: Optional["Run"] = None,
+        on_chunk: Optional[Callable[[Any], None]] = None,
     ) -> None:
         """
-        Constructor. Still running in the main thread.
+        Constructor. Must not be called in the asyncio loop if the `run` is
+        not given (as the run is created in the database).
+
+        Args:
+            run: The run to be used (if it was already created, i.e.: when
+                running a batch). If not given a new run is created.
+            on_chunk: If given, called with each value yielded by the action
+                (when it's a generator) as soon as it's available.
         """
         from concurrent.futures import Future
         from typing import Optional
@@ -252,29 +346,55 @@ class _ActionsRunner:
         self.response_handler = response_handler
         self.headers = headers
         self.cookies = cookies
+        self.result_cache_config = result_cache_config
+        self.coalesce = coalesce
+        self.on_chunk = on_chunk
+
+        # Key used to share the result of the run (with the result cache and
+        # with identical runs started while this one is in flight).
+        self._result_key: Optional[str] = None
+        if result_cache_config is not None or coalesce:
+            from ._actions_result_cache import make_result_cache_key
+
+            vary_headers: Tuple[str, ...] = ()
+            if result_cache_config is not None:
+                vary_headers = result_cache_config.vary_headers
+            self._result_key = make_result_cache_key(
+                action, action_package, inputs, headers, vary_headers
+            )
 
         timeout = headers.get(HEADER_ACTIONS_ASYNC_TIMEOUT, None)
         if timeout is not None:
             timeout = float(timeout)
 
         self.request_id: str = headers.get(HEADER_ACTIONS_REQUEST_ID, "")
+        self.priority: str = _get_priority(headers)
         self.timeout: Optional[float] = timeout
         self.callback_url: Optional[str] = headers.get(
             HEADER_ACTIONS_ASYNC_CALLBACK, None
         )
         self._future: Optional[Future] = None
-        self._run_id = gen_uuid("run")
+        self._task: "Optional[asyncio.Task]" = None
+        self._runtime_info: "Optional[RunRuntimeInfo]" = None
         self._returning_async_result = False
         self._run_status: Optional[int] = None
+        self._run_files: "Optional[_RunFiles]" = None
+        # The error which made the run fail (if any).
+        self._run_error: Optional[BaseException] = None
 
-        self._relative_artifacts_path: str = _create_run_artifacts_dir(
-            action, self._run_id
-        )
+        if run is not None:
+            self._run_id = run.id
+            self._relative_artifacts_path: str = run.relative_artifacts_dir
+            self._run: Run = run
+            return
+
+        self._run_id = gen_uuid("run")
+        self._relative_artifacts_path = _create_run_artifacts_dir(action, self._run_id)
 
         # The run is created right away so that new queries related to
         # this run will be able to find it (for instance, to cancel it
         # or get the run id from the request id).
-        self._run: Run = _create_run(
+        self._run = _create_run(
             action,
             self._run_id,
             inputs,
@@ -321,6 +441,37 @@ class _ActionsRunner:
         except TimeoutError:
             return self._async_result()
 
+    async def run_async(self) -> Any:
+        """
+        Same as `run_in_thread`, but the run is orchestrated in the asyncio
+        loop (no thread is held while waiting for a process or for the action
+        to finish: threads are only used for the blocking calls, such as
+        writing to the database).
+        """
+        import asyncio
+
+        assert self._task is None, "Task already set"
+
+        self.response_handler.set_run_id(self._run_id)
+
+        # The run is done in a separate task so that it's not cancelled if
+        # the request is (it must run to completion as it would in a thread).
+        task = asyncio.ensure_future(self._run_action_async())
+        _running_tasks.add(task)
+        task.add_done_callback(_on_run_task_done)
+        self._task = task
+
+        if self.timeout is None:
+            return await asyncio.shield(task)
+
+        if self.timeout == 0:
+            return self._async_result()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            return self._async_result()
+
     def _async_result(self) -> Any:
         self._returning_async_result = True
         self.response_handler.set_async_completion()
@@ -336,6 +487,46 @@ class _ActionsRunner:
         Returns:
             The result of the action.
         """
+        self._validate_inputs()
+
+        flight = self._join_flight()
+        if flight is not None and not flight.is_leader:
+            result = self._follow_flight(flight)
+        else:
+            try:
+                result = self._run_action_impl()
+            finally:
+                if flight is not None:
+                    self._land_flight(flight)
+
+        if self._returning_async_result:
+            # We're returning an async result, so, we need to call the callback.
+            if self.callback_url:
+                _call_with_db(self._enqueue_callback, result)
+        return result
+
+    async def _run_action_async(self) -> Any:
+        from starlette.concurrency import run_in_threadpool
+
+        self._validate_inputs()
+
+        flight = self._join_flight()
+        if flight is not None and not flight.is_leader:
+            result = await self._follow_flight_async(flight)
+        else:
+            try:
+                result = await self._run_action_impl_async()
+            finally:
+                if flight is not None:
+                    self._land_flight(flight)
+
+        if self._returning_async_result:
+            # We're returning an async result, so, we need to call the callback.
+            if self.callback_url:
+                await run_in_threadpool(_call_with_db, self._enqueue_callback, result)
+        return result
+
+    def _validate_inputs(self) -> None:
         # Before even running the action, validate the inputs.
         inputs: dict = self.inputs
         input_validator: Callable[[dict], None] = self.input_validator
@@ -348,57 +539,38 @@ class _ActionsRunner:
                 ]
             )
 
-        result = self._run_action_impl()
-        if self._returning_async_result:
-            # We're returning an async result, so, we need to call the callback.
-            if self.callback_url:
-                post_result = None
-                try:
-                    import sema4ai_http
+    def _enqueue_callback(self, result: Any) -> None:
+        """
+        Adds the result to the outbox of callbacks to be delivered (must be
+        called with a database connection).
+        """
+        from ._callback_dispatcher import get_callback_dispatcher
 
-                    headers: dict[str, str] = {
-                        HEADER_ACTION_SERVER_RUN_ID: self._run_id,
-                    }
+        assert self.callback_url
+        headers: dict[str, str] = {
+            HEADER_ACTION_SERVER_RUN_ID: self._run_id,
+        }
 
-                    if self.request_id:
-                        headers[HEADER_ACTIONS_REQUEST_ID] = self.request_id
+        if self.request_id:
+            headers[HEADER_ACTIONS_REQUEST_ID] = self.request_id
 
-                    for _i in range(3):  # Try up to 3 times before giving up.
-                        post_result = sema4ai_http.post(
-                            self.callback_url,
-                            json=result,
-                            headers=headers,
-                        )
-                        if post_result.status == 200:
-                            break
-                        time.sleep(0.5)
-                    else:
-                        log.critical(
-                            f"Error posting callback to: {self.callback_url} for run id {self._run_id}.\nRequest id: {self.request_id}.\nResult: {post_result}"
-                        )
-                except Exception:
-                    log.exception(
-                        f"Error posting callback to: {self.callback_url} for run id {self._run_id}.\nRequest id: {self.request_id}.\nResult: {post_result}"
-                    )
-        return result
+        try:
+            get_callback_dispatcher().enqueue(
+                self._run_id, self.callback_url, result, headers
+            )
+        except Exception:
+            log.exception(
+                f"Error scheduling callback to: {self.callback_url} for run id "
+                f"{self._run_id}.\nRequest id: {self.request_id}."
+            )
 
     def _run_action_impl(self) -> Any:
         from concurrent.futures import CancelledError
-        from typing import Literal
 
         from sema4ai.action_server._actions_process_pool import (
             ActionsProcessPool,
             ProcessHandle,
         )
-        from sema4ai.action_server._runs_state_cache import get_global_runs_state
-
-        action_package: "ActionPackage" = self.action_package
-        action: "Action" = self.action
-        output_validator: Callable[[dict], None] = self.output_validator
-        inputs: dict = self.inputs
-        headers: dict = self.headers
-        cookies: dict = self.cookies
-
         from sema4ai.action_server._settings import get_settings
 
         from ._actions_process_pool import get_actions_process_pool
@@ -406,155 +578,670 @@ class _ActionsRunner:
 
         settings = get_settings()
 
-        global_runs_state = get_global_runs_state()
-        runtime_info = global_runs_state.create_run_runtime_info(self._run_id)
+        runtime_info = self._get_runtime_info()
 
         db = get_db()
         with db.connect():  # Connection is per-thread, so, we need to create a new one.
             actions_process_pool: ActionsProcessPool = get_actions_process_pool()
             process_handle: ProcessHandle
-            relative_artifacts_path = self._relative_artifacts_path
-            run = self._run
 
             try:
                 # This can take some time to complete if multiple actions are
                 # running in parallel (i.e.: the process pool may be full).
                 initial_time = time.monotonic()  # Initial time
+                cached_result = self._get_cached_result()
+                if cached_result is not None:
+                    return self._on_cached_result(cached_result, initial_time)
+
                 process_handle_ctx = actions_process_pool.obtain_process_for_action(
-                    action, runtime_info
+                    self.action, runtime_info, self.priority
                 )
                 with process_handle_ctx as process_handle:
                     initial_time = time.monotonic()
-                    input_json = (
-                        settings.artifacts_dir
-                        / relative_artifacts_path
-                        / "__action_server_inputs.json"
+                    run_files = self._start_run(initial_time)
+
+                    with runtime_info.on_cancel.register(
+                        partial(self._on_cancel, process_handle)
+                    ):
+                        if runtime_info.is_canceled():
+                            # Cancelled before the run was actually started.
+                            raise CancelledError("Run canceled")
+
+                        returncode = process_handle.run_action(
+                            self._run,
+                            self.action_package,
+                            self.action,
+                            run_files.input_json,
+                            run_files.run_artifacts_dir,
+                            run_files.output_file,
+                            run_files.result_json,
+                            self.headers,
+                            self.cookies,
+                            settings.reuse_processes,
+                            run_files.inline_inputs,
+                            run_files.inline_threshold,
+                            self.on_chunk,
+                        )
+
+                    return self._collect_result(
+                        process_handle,
+                        returncode,
+                        run_files,
+                        runtime_info,
+                        initial_time,
                     )
-                    input_json.write_bytes(json.dumps(inputs).encode("utf-8"))
 
-                    run_artifacts_dir = settings.artifacts_dir / relative_artifacts_path
+            except BaseException as e:
+                raise self._on_run_error(e, runtime_info, initial_time)
+
+    async def _run_action_impl_async(self) -> Any:
+        from concurrent.futures import CancelledError
+
+        from starlette.concurrency import run_in_threadpool
+
+        from sema4ai.action_server._actions_process_pool import (
+            ActionsProcessPool,
+            ProcessHandle,
+        )
+        from sema4ai.action_server._settings import get_settings
+
+        from ._actions_process_pool import get_actions_process_pool
+
+        settings = get_settings()
+
+        runtime_info = self._get_runtime_info()
+
+        actions_process_pool: ActionsProcessPool = get_actions_process_pool()
+        process_handle: ProcessHandle
+
+        try:
+            initial_time = time.monotonic()  # Initial time
+            cached_result = self._get_cached_result()
+            if cached_result is not None:
+                return await run_in_threadpool(
+                    _call_with_db, self._on_cached_result, cached_result, initial_time
+                )
+
+            process_handle_ctx = actions_process_pool.obtain_process_for_action_async(
+                self.action, runtime_info, self.priority
+            )
+            async with process_handle_ctx as process_handle:
+                initial_time = time.monotonic()
+                run_files = await run_in_threadpool(
+                    _call_with_db, self._start_run, initial_time
+                )
 
-                    result_json = (
-                        settings.artifacts_dir
-                        / relative_artifacts_path
-                        / "__action_server_result.json"
+                with runtime_info.on_cancel.register(
+                    partial(self._on_cancel, process_handle)
+                ):
+                    if runtime_info.is_canceled():
+                        # Cancelled before the run was actually started.
+                        raise CancelledError("Run canceled")
+
+                    returncode = await process_handle.run_action_async(
+                        self._run,
+                        self.action_package,
+                        self.action,
+                        run_files.input_json,
+                        run_files.run_artifacts_dir,
+                        run_files.output_file,
+                        run_files.result_json,
+                        self.headers,
+                        self.cookies,
+                        settings.reuse_processes,
+                        run_files.inline_inputs,
+                        run_files.inline_threshold,
+                        self.on_chunk,
                     )
 
-                    output_file = (
-                        settings.artifacts_dir
-                        / relative_artifacts_path
-                        / "__action_server_output.txt"
+                return await run_in_threadpool(
+                    _call_with_db,
+                    self._collect_result,
+                    process_handle,
+                    returncode,
+                    run_files,
+                    runtime_info,
+                    initial_time,
+                )
+
+        except BaseException as e:
+            raise await run_in_threadpool(
+                _call_with_db, self._on_run_error, e, runtime_info, initial_time
+            )
+
+    def _get_runtime_info(self) -> "RunRuntimeInfo":
+        from sema4ai.action_server._runs_state_cache import get_global_runs_state
+
+        if self._runtime_info is None:
+            global_runs_state = get_global_runs_state()
+            self._runtime_info = global_runs_state.create_run_runtime_info(self._run_id)
+        return self._runtime_info
+
+    def _join_flight(self) -> Optional["Flight"]:
+        """
+        Returns:
+            The flight joined (if identical runs are coalesced) or None.
+        """
+        from ._actions_single_flight import get_single_flight
+
+        if not self.coalesce or self._result_key is None:
+            return None
+
+        flight = get_single_flight().join(self._result_key, self._run_id)
+        if not flight.is_leader:
+            log.info(
+                f"Run {self._run_id} of action {self.action.name} will use the "
+                f"result of the identical run in flight: {flight.leader_run_id}."
+            )
+        return flight
+
+    def _land_flight(self, flight: "Flight") -> None:
+        from ._actions_single_flight import get_single_flight
+
+        get_single_flight().land(flight, self._run, self._run_error)
+
+    def _follow_flight(self, flight: "Flight") -> Any:
+        """
+        Waits for the leader run to finish and reuses its outcome (if the
+        leader run is cancelled, the action is run again for this run).
+        """
+        from concurrent.futures import FIRST_COMPLETED, CancelledError, Future, wait
+
+        from ._models import get_db
+
+        runtime_info = self._get_runtime_info()
+        cancelled: "Future[None]" = Future()
+
+        with get_db().connect():  # Connection is per-thread.
+            initial_time = time.monotonic()
+            try:
+                self._on_follow_flight(flight, initial_time)
+                with runtime_info.on_cancel.register(
+                    partial(_set_future_done, cancelled)
+                ):
+                    if not runtime_info.is_canceled():
+                        wait([flight.future, cancelled], return_when=FIRST_COMPLETED)
+
+                if runtime_info.is_canceled():
+                    raise CancelledError("Run canceled")
+
+                leader_run, leader_error = flight.future.result()
+                if not self._on_leader_cancelled(leader_run, initial_time):
+                    return self._on_leader_finished(
+                        leader_run, leader_error, initial_time
                     )
+            except BaseException as e:
+                raise self._on_run_error(e, runtime_info, initial_time)
 
-                    returncode: int | Literal["<unset>"] = "<unset>"
-                    _set_run_as_running(run, initial_time)
+        return self._run_action_impl()
 
-                    def on_cancel(*args, **kwargs):
-                        log.info(
-                            f"Killing process related to run {run.id} due to cancel request (pid: {process_handle.pid})."
-                        )
-                        process_handle.kill()
+    async def _follow_flight_async(self, flight: "Flight") -> Any:
+        """
+        Same as `_follow_flight` but waits in the asyncio loop.
+        """
+        import asyncio
+        from concurrent.futures import CancelledError
 
-                    with runtime_info.on_cancel.register(on_cancel):
-                        if runtime_info.is_canceled():
-                            # Cancelled before the run was actually started.
-                            raise CancelledError("Run canceled")
+        from starlette.concurrency import run_in_threadpool
 
-                        reuse_process = settings.reuse_processes
-                        returncode = process_handle.run_action(
-                            run,
-                            action_package,
-                            action,
-                            input_json,
-                            run_artifacts_dir,
-                            output_file,
-                            result_json,
-                            headers,
-                            cookies,
-                            reuse_process,
-                        )
+        runtime_info = self._get_runtime_info()
+        loop = asyncio.get_running_loop()
+        cancelled: "asyncio.Future[None]" = loop.create_future()
 
-                    error_msg = None
-                    try:
-                        run_result_str: str = result_json.read_text("utf-8", "replace")
-                    except Exception:
-                        error_msg = (
-                            "It was not possible to collect the contents of the "
-                            "result (json not created)."
-                        )
-                    else:
-                        try:
-                            result_contents = json.loads(run_result_str)
-                        except Exception:
-                            error_msg = f"Error loading the contents of {run_result_str} as json."
+        def on_cancel(*args, **kwargs):
+            loop.call_soon_threadsafe(_set_future_done, cancelled)
 
-                    if error_msg is not None:
-                        if runtime_info.is_canceled():
-                            # When cancelled, these errors are expected (so, throw error that it's cancelled
-                            # instead of the error message).
-                            raise CancelledError(
-                                f"Run cancelled, action: {action.name}"
-                            )
-
-                        raise RuntimeError(error_msg)
-
-                    ret = result_contents.get("result")
-                    result_str: str = json.dumps(ret, indent=4)
-                    if ret is not None or returncode == 0:
-                        try:
-                            output_validator(ret)
-                        except Exception as e:
-                            show_str = result_str
-                            if ret is None:
-                                show_str = "None"
-                            raise RuntimeError(
-                                f"Inconsistent value returned from action.\ni.e.: the returned value: {show_str}\ndoes not match the expected output schema.\n"
-                                f"Original error: {e}"
-                            )
-
-                    if returncode == 0:
-                        _set_run_as_finished_ok(run, result_str, initial_time)
-                        return ret
-
-                    else:
-                        if runtime_info.is_canceled():
-                            raise CancelledError(
-                                f"Run cancelled, action: {action.name}"
-                            )
-
-                        if ret:
-                            # We have a return even with a failure. This means it's
-                            # something as a Response(error=error_msg)
-                            (
-                                _set_run_as_finished_failed_with_response(
-                                    run, result_str, initial_time
-                                )
-                            )
-                            return ret
-
-                    raise RuntimeError(  # Error in action itself.
-                        result_contents.get(
-                            "message",
-                            f"Action {action.name} failed with returncode={returncode}",
-                        )
+        initial_time = time.monotonic()
+        try:
+            await run_in_threadpool(
+                _call_with_db, self._on_follow_flight, flight, initial_time
+            )
+            with runtime_info.on_cancel.register(on_cancel):
+                if not runtime_info.is_canceled():
+                    await asyncio.wait(
+                        [asyncio.wrap_future(flight.future), cancelled],
+                        return_when=asyncio.FIRST_COMPLETED,
                     )
 
-            except BaseException as e:
-                try:
-                    if runtime_info.is_canceled() or isinstance(e, CancelledError):
-                        log.exception(
-                            f"Action {action.name} cancelled (run_id={run.id})"
-                        )
-                        _set_run_as_finished_cancelled(run, str(e), initial_time)
-                    else:
-                        log.exception(f"Action {action.name} failed (run_id={run.id})")
-                        _set_run_as_finished_failed(run, str(e), initial_time)
-                except Exception:
-                    log.exception(
-                        f"INTERNAL ERROR (unexpected) IN ACTION SERVER! Error setting run {run.id} as finished."
+            if runtime_info.is_canceled():
+                raise CancelledError("Run canceled")
+
+            leader_run, leader_error = flight.future.result()
+            if not await run_in_threadpool(
+                _call_with_db, self._on_leader_cancelled, leader_run, initial_time
+            ):
+                return await run_in_threadpool(
+                    _call_with_db,
+                    self._on_leader_finished,
+                    leader_run,
+                    leader_error,
+                    initial_time,
+                )
+        except BaseException as e:
+            raise await run_in_threadpool(
+                _call_with_db, self._on_run_error, e, runtime_info, initial_time
+            )
+        finally:
+            cancelled.cancel()
+
+        return await self._run_action_impl_async()
+
+    def _on_follow_flight(self, flight: "Flight", initial_time: float) -> None:
+        """
+        Marks the run as running (following the leader run). Must be called
+        with a database connection.
+        """
+        from ._models import RunStatus
+
+        _update_run(
+            self._run,
+            initial_time,
+            False,
+            status=RunStatus.RUNNING,
+            leader_run_id=flight.leader_run_id,
+        )
+
+    def _on_leader_cancelled(self, leader_run: "Run", initial_time: float) -> bool:
+        """
+        Returns:
+            True if the leader run was cancelled (in which case the run no
+            longer follows it). Must be called with a database connection.
+        """
+        from ._models import RunStatus
+
+        if leader_run.status != RunStatus.CANCELLED:
+            return False
+
+        log.info(
+            f"Run {leader_run.id} (followed by run {self._run_id}) was cancelled "
+            "(the action will be run again)."
+        )
+        _update_run(self._run, initial_time, False, leader_run_id="")
+        return True
+
+    def _on_leader_finished(
+        self,
+        leader_run: "Run",
+        leader_error: Optional[BaseException],
+        initial_time: float,
+    ) -> Any:
+        """
+        Finishes the run with the outcome of the leader run (must be called
+        with a database connection).
+
+        Args:
+            leader_error: The error which made the leader run fail (if any).
+        """
+        from ._actions_process_pool_admission import AdmissionRejectedError
+        from ._models import RunStatus
+
+        if isinstance(leader_error, AdmissionRejectedError):
+            # The leader wasn't even admitted: the followers are rejected
+            # the same way (a new instance as it may be raised concurrently
+            # in multiple threads).
+            raise AdmissionRejectedError(
+                str(leader_error), leader_error.status_code, leader_error.retry_after
+            )
+
+        if leader_run.result is not None:
+            if leader_run.status == RunStatus.PASSED:
+                _set_run_as_finished_ok(self._run, leader_run.result, initial_time)
+                return json.loads(leader_run.result)
+
+            if leader_run.status == RunStatus.FAILED:
+                _set_run_as_finished_failed_with_response(
+                    self._run, leader_run.result, initial_time
+                )
+                return json.loads(leader_run.result)
+
+        raise RuntimeError(
+            leader_run.error_message
+            or f"Action {self.action.name} failed (run_id={leader_run.id})."
+        )
+
+    def _get_cached_result(self) -> Optional[str]:
+        """
+        Returns:
+            The result (as json) of a previous run with the same inputs or
+            None if it's not available in the result cache.
+        """
+        from ._actions_result_cache import get_result_cache
+
+        if self.result_cache_config is None or self._result_key is None:
+            return None
+        return get_result_cache().get(self._result_key)
+
+    def _on_cached_result(self, result_str: str, initial_time: float) -> Any:
+        """
+        Marks the run as finished with the cached result (must be called with
+        a database connection).
+        """
+        log.info(f"Action {self.action.name} result provided by the result cache.")
+        _set_run_as_finished_from_cache(self._run, result_str, initial_time)
+        return json.loads(result_str)
+
+    def _on_cancel(self, process_handle: "ProcessHandle", *args, **kwargs) -> None:
+        log.info(
+            f"Killing process related to run {self._run.id} due to cancel request (pid: {process_handle.pid})."
+        )
+        process_handle.kill()
+
+    def _start_run(self, initial_time: float) -> "_RunFiles":
+        """
+        Prepares the files for the run and marks it as running (must be
+        called with a database connection).
+        """
+        from sema4ai.action_server._settings import get_settings
+
+        from ._artifacts_staging import get_artifacts_staging
+
+        settings = get_settings()
+        artifacts_requested = _is_artifacts_requested(self.headers)
+
+        staged = False
+        artifacts_staging = get_artifacts_staging()
+        if artifacts_staging is None:
+            run_artifacts_dir = settings.artifacts_dir / self._relative_artifacts_path
+        elif artifacts_staging.should_stage(artifacts_requested):
+            run_artifacts_dir = artifacts_staging.create_staged_dir(
+                self._relative_artifacts_path
+            )
+            staged = True
+        else:
+            run_artifacts_dir = settings.artifacts_dir / self._relative_artifacts_path
+            run_artifacts_dir.mkdir(parents=True, exist_ok=True)
+
+        input_json = run_artifacts_dir / "__action_server_inputs.json"
+
+        # Small inputs/results are passed inline (unless the
+        # files were explicitly requested).
+        inline_threshold = settings.inline_payload_threshold
+        if artifacts_requested:
+            inline_threshold = 0
+
+        # Note: the run already has the inputs as json.
+        inputs_json_str: str = self._run.inputs
+        inline_inputs: Optional[str] = None
+        if 0 < len(inputs_json_str) <= inline_threshold:
+            inline_inputs = inputs_json_str
+        else:
+            input_json.write_bytes(inputs_json_str.encode("utf-8"))
+
+        run_files = _RunFiles(
+            input_json=input_json,
+            run_artifacts_dir=run_artifacts_dir,
+            result_json=run_artifacts_dir / "__action_server_result.json",
+            output_file=run_artifacts_dir / "__action_server_output.txt",
+            inline_inputs=inline_inputs,
+            inline_threshold=inline_threshold,
+            staged=staged,
+        )
+        self._run_files = run_files
+        _set_run_as_running(self._run, initial_time)
+        return run_files
+
+    def _release_run_files(self, persist: bool) -> None:
+        """
+        Persists (moves to the `artifacts_dir`) or removes the files of the
+        run if they were staged (lightweight artifacts mode).
+        """
+        from sema4ai.action_server._settings import get_settings
+
+        from ._artifacts_staging import get_artifacts_staging
+
+        run_files = self._run_files
+        if run_files is None or not run_files.staged:
+            return
+        self._run_files = None
+
+        artifacts_staging = get_artifacts_staging()
+        if artifacts_staging is None:
+            return  # The action server is exiting.
+
+        target_dir = get_settings().artifacts_dir / self._relative_artifacts_path
+        artifacts_staging.release(run_files.run_artifacts_dir, target_dir, persist)
+
+    def _collect_result(
+        self,
+        process_handle: "ProcessHandle",
+        returncode: int,
+        run_files: "_RunFiles",
+        runtime_info: "RunRuntimeInfo",
+        initial_time: float,
+    ) -> Any:
+        """
+        Collects the result of the run (and updates the run in the database
+        accordingly, so, it must be called with a database connection).
+        """
+        from concurrent.futures import CancelledError
+
+        action: "Action" = self.action
+        output_validator: Callable[[dict], None] = self.output_validator
+        run = self._run
+
+        error_msg = None
+        try:
+            run_result_str: str
+            if process_handle.inline_result is not None:
+                run_result_str = process_handle.inline_result
+            else:
+                run_result_str = run_files.result_json.read_text("utf-8", "replace")
+        except Exception:
+            error_msg = (
+                "It was not possible to collect the contents of the "
+                "result (json not created)."
+            )
+        else:
+            try:
+                result_contents = json.loads(run_result_str)
+            except Exception:
+                error_msg = f"Error loading the contents of {run_result_str} as json."
+
+        if error_msg is not None:
+            if runtime_info.is_canceled():
+                # When cancelled, these errors are expected (so, throw error that it's cancelled
+                # instead of the error message).
+                raise CancelledError(f"Run cancelled, action: {action.name}")
+
+            raise RuntimeError(error_msg)
+
+        ret = result_contents.get("result")
+        result_str: str = json.dumps(ret, indent=4)
+        if ret is not None or returncode == 0:
+            try:
+                output_validator(ret)
+            except Exception as e:
+                show_str = result_str
+                if ret is None:
+                    show_str = "None"
+                raise RuntimeError(
+                    f"Inconsistent value returned from action.\ni.e.: the returned value: {show_str}\ndoes not match the expected output schema.\n"
+                    f"Original error: {e}"
+                )
+
+        if returncode == 0:
+            self._release_run_files(persist=False)
+            _set_run_as_finished_ok(run, result_str, initial_time)
+            if self.result_cache_config is not None and self._result_key is not None:
+                from ._actions_result_cache import get_result_cache
+
+                get_result_cache().put(
+                    self._result_key, result_str, self.result_cache_config.ttl
+                )
+            return ret
+
+        else:
+            if runtime_info.is_canceled():
+                raise CancelledError(f"Run cancelled, action: {action.name}")
+
+            if ret:
+                # We have a return even with a failure. This means it's
+                # something as a Response(error=error_msg)
+                self._release_run_files(persist=True)
+                (
+                    _set_run_as_finished_failed_with_response(
+                        run, result_str, initial_time
                     )
+                )
+                return ret
+
+        raise RuntimeError(  # Error in action itself.
+            result_contents.get(
+                "message",
+                f"Action {action.name} failed with returncode={returncode}",
+            )
+        )
+
+    def _on_run_error(
+        self, e: BaseException, runtime_info: "RunRuntimeInfo", initial_time: float
+    ) -> HTTPException:
+        """
+        Marks the run as failed/cancelled (must be called with a database
+        connection).
+
+        Returns:
+            The exception to be raised.
+        """
+        from concurrent.futures import CancelledError
+
+        from ._actions_process_pool_admission import AdmissionRejectedError
+
+        run = self._run
+        action = self.action
+        self._run_error = e
+
+        # Files of failed runs are always persisted.
+        self._release_run_files(persist=True)
+
+        try:
+            if runtime_info.is_canceled() or isinstance(e, CancelledError):
+                log.error(
+                    f"Action {action.name} cancelled (run_id={run.id})", exc_info=e
+                )
+                _set_run_as_finished_cancelled(run, str(e), initial_time)
+            else:
+                log.error(f"Action {action.name} failed (run_id={run.id})", exc_info=e)
+                _set_run_as_finished_failed(run, str(e), initial_time)
+        except Exception:
+            log.exception(
+                f"INTERNAL ERROR (unexpected) IN ACTION SERVER! Error setting run {run.id} as finished."
+            )
+
+        if isinstance(e, AdmissionRejectedError):
+            return _admission_rejected_to_http_exception(e)
+
+        return HTTPException(status_code=500, detail=str(e))
 
-                raise HTTPException(status_code=500, detail=str(e))
+
+@dataclass
+class _RunFiles:
+    input_json: Path
+    run_artifacts_dir: Path
+    result_json: Path
+    output_file: Path
+    inline_inputs: Optional[str]
+    inline_threshold: int
+    # Whether the files are staged (lightweight artifacts mode).
+    staged: bool = False
+
+
+# Keeps a reference to the tasks running actions in the asyncio loop (which
+# may still be running after an async return).
+_running_tasks: "Set[asyncio.Task]" = set()
+
+
+def _on_run_task_done(task: "asyncio.Task") -> None:
+    _running_tasks.discard(task)
+    if not task.cancelled():
+        # Errors are already handled, but the exception must still be
+        # retrieved (the task may've been left running after an async return).
+        task.exception()
+
+
+def _set_future_done(future, *args, **kwargs) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _call_with_db(func: Callable[..., T], *args) -> T:
+    from ._models import get_db
+
+    with get_db().connect():  # Connection is per-thread.
+        return func(*args)
+
+
+def _is_artifacts_requested(headers: dict) -> bool:
+    value = headers.get(HEADER_ACTION_ARTIFACTS)
+    if not value:
+        return False
+    return value.strip().lower() in ("1", "true")
+
+
+def _get_priority(headers: dict) -> str:
+    from ._actions_process_pool_admission import parse_priority
+
+    try:
+        return parse_priority(headers.get(HEADER_ACTION_PRIORITY))
+    except ValueError as e:
+        raise RequestValidationError([f"Invalid {HEADER_ACTION_PRIORITY} header: {e}"])
+
+
+def _admission_rejected_to_http_exception(e) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _check_admission() -> None:
+    """
+    Rejects the request early on (before a run is created) if the admission
+    queue of the process pool is full.
+    """
+    from ._actions_process_pool import get_actions_process_pool
+    from ._actions_process_pool_admission import AdmissionRejectedError
+
+    try:
+        get_actions_process_pool().admission_queue.check_can_enqueue()
+    except AdmissionRejectedError as e:
+        log.info(f"Request rejected: {e}")
+        raise _admission_rejected_to_http_exception(e)
+
+
+def _unwrap_invocation_context(inputs: Any, headers: dict) -> Any:
+    """
+    Returns:
+        The actual inputs for the action (the headers are updated with the
+        contexts passed in the body when the invocation context is used).
+    """
+    # i.e.: if the `x-action-invocation-context` header is present, we
+    # expect it to contain a data envelope (`base64(encrypted_data(JSON.stringify(content)))` or
+    # `base64(JSON.stringify(content))`) with the invocation context.
+    #
+    # This also changes how the body is processed (in this case, each new entry
+    # in the body will internally map to a header, whereas the `body` in it will
+    # become the actual input).
+    #
+    # This is done because headers have a size restriction and we don't want to
+    # hit it (so, we enable passing things that are conceptually headers, such as
+    # `x-action-context` and `x-data-context`, in the body of the request)
+    invocation_context = headers.get(HEADER_ACTION_INVOCATION_CONTEXT)
+    # Anything there means we expect the body to contain the additional contexts.
+    if invocation_context:
+        if isinstance(inputs, dict):
+            if "body" not in inputs:
+                raise RequestValidationError(
+                    [
+                        "The received input arguments (sent in the body) do not "
+                        "contain the `body` key (which is expected when the "
+                        "`x-action-invocation-context` header is present)."
+                    ]
+                )
+            use_inputs = inputs.pop("body")
+            headers.update(inputs)
+            inputs = use_inputs
+    return inputs
 
 
 def _name_as_class_name(name):
@@ -567,6 +1254,7 @@ def generate_func_from_action(
     Callable[[Response, Request], Any],
     IInternalFuncAPI,
     dict[str, object],
+    Callable[[Request, Optional[int]], Any],
 ]:
     """
     This method generates the function which should be called from FastAPI.
@@ -579,7 +1267,8 @@ def generate_func_from_action(
     will do the validation.
 
     Returns:
-        Function/Open API spec for the function
+        Function/Open API spec for the function (and the function to run a
+        batch of inputs).
     """
     input_schema_dict = json.loads(action.input_schema)
     output_schema_dict = json.loads(action.output_schema)
@@ -616,14 +1305,24 @@ def generate_func_from_action(
         },
     }
 
+    from ._actions_result_cache import get_result_cache_config, is_result_shareable
+    from ._actions_validators import get_json_validator
+    from ._settings import get_settings
+
+    result_cache_config = get_result_cache_config(
+        get_settings(), action_package, action
+    )
+    coalesce = get_settings().coalesce_runs and is_result_shareable(action)
+
+    schema_validator = get_settings().schema_validator
     try:
-        input_validator = _get_json_validator(input_schema_dict)
+        input_validator = get_json_validator(input_schema_dict, schema_validator)
     except Exception:
         raise RuntimeError(
             f"Error making validator for input schema: {input_schema_dict}"
         )
     try:
-        output_validator = _get_json_validator(output_schema_dict)
+        output_validator = get_json_validator(output_schema_dict, schema_validator)
     except Exception:
         raise RuntimeError(
             f"Error making validator for output schema: {output_schema_dict}"
@@ -643,39 +1342,79 @@ def generate_func_from_action(
             )
         headers = dict((x[0].lower(), x[1]) for x in request.headers.items())
         cookies = dict(request.cookies)
-        response_handler = ResponseHandler(response)
 
-        # i.e.: if the `x-action-invocation-context` header is present, we
-        # expect it to contain a data envelope (`base64(encrypted_data(JSON.stringify(content)))` or
-        # `base64(JSON.stringify(content))`) with the invocation context.
-        #
-        # This also changes how the body is processed (in this case, each new entry
-        # in the body will internally map to a header, whereas the `body` in it will
-        # become the actual input).
-        #
-        # This is done because headers have a size restriction and we don't want to
-        # hit it (so, we enable passing things that are conceptually headers, such as
-        # `x-action-context` and `x-data-context`, in the body of the request)
-        invocation_context = headers.get(HEADER_ACTION_INVOCATION_CONTEXT)
-        if invocation_context:  # Anything there means we expect the body to contain the additional contexts.
-            if isinstance(inputs, dict):
-                if "body" not in inputs:
-                    raise RequestValidationError(
-                        [
-                            "The received input arguments (sent in the body) do not contain the `body` key (which is expected when the `x-action-invocation-context` header is present)."
-                        ]
-                    )
-                use_inputs = inputs.pop("body")
-                headers.update(inputs)
-                inputs = use_inputs
+        inputs = _unwrap_invocation_context(inputs, headers)
+
+        from ._actions_run_stream import get_stream_format
 
+        stream_format = get_stream_format(headers)
+        if stream_format is not None:
+            return await _stream_run(inputs, headers, cookies, stream_format)
+
+        response_handler = ResponseHandler(response)
         return await func_internal(response_handler, inputs, headers, cookies)
 
+    async def _stream_run(
+        inputs: Any, headers: dict, cookies: dict, stream_format: str
+    ):
+        """
+        Runs the action streaming the values yielded by it (see:
+        `_actions_run_stream`).
+        """
+        import asyncio
+
+        from starlette.responses import StreamingResponse
+
+        from ._actions_run_stream import (
+            ChunksQueue,
+            StreamResponseHandler,
+            iter_run_stream,
+        )
+
+        # The run is always streamed to completion.
+        headers.pop(HEADER_ACTIONS_ASYNC_TIMEOUT, None)
+        headers.pop(HEADER_ACTIONS_ASYNC_CALLBACK, None)
+        _check_admission()
+
+        chunks_queue = ChunksQueue(asyncio.get_running_loop())
+        runner = await run_in_threadpool(
+            _call_with_db,
+            _ActionsRunner,
+            action_package,
+            action,
+            input_schema_dict,
+            output_schema_dict,
+            input_validator,
+            output_validator,
+            inputs,
+            StreamResponseHandler(),
+            headers,
+            cookies,
+            result_cache_config,
+            coalesce,
+            None,
+            chunks_queue.put_threadsafe,
+        )
+        # Invalid inputs are reported before the response is started.
+        runner._validate_inputs()
+        return StreamingResponse(
+            iter_run_stream(
+                runner, chunks_queue, stream_format, get_settings().run_orchestration
+            ),
+            media_type=stream_format,
+            headers={
+                HEADER_ACTION_SERVER_RUN_ID: runner._run_id,
+                "Cache-Control": "no-cache",
+            },
+        )
+
     async def func_internal(
         response_handler: IResponseHandler, inputs: Any, headers: dict, cookies: dict
     ) -> Any:
         """
-        This is an internal function that actually runs an action (in the threadpool) based on the user's inputs.
+        This is an internal function that actually runs an action (in the
+        threadpool or in the asyncio loop, see: `--run-orchestration`) based on
+        the user's inputs.
 
         Args:
             response_handler: The response handler to use (where we can set the run id and whether an async completion was done).
@@ -686,7 +1425,13 @@ def generate_func_from_action(
         Returns:
             The result of the action.
         """
-        runner = _ActionsRunner(
+        _check_admission()
+
+        # The run is created in a thread (the asyncio loop must not wait for
+        # the database).
+        runner = await run_in_threadpool(
+            _call_with_db,
+            _ActionsRunner,
             action_package,
             action,
             input_schema_dict,
@@ -697,48 +1442,90 @@ def generate_func_from_action(
             response_handler,
             headers,
             cookies,
+            result_cache_config,
+            coalesce,
         )
+        if get_settings().run_orchestration == "asyncio":
+            return await runner.run_async()
         return await run_in_threadpool(runner.run_in_thread)
 
-    return func_fast_api, func_internal, openapi_extra
-
-
-def _iter_jsonschema_specifications():
-    from pathlib import Path
-
-    import jsonschema_specifications  # type: ignore
-    from referencing import Resource
-
-    parent = Path(jsonschema_specifications._core.__file__).absolute().parent
-
-    for version in (parent / "schemas").iterdir():
-        if version.name.startswith("."):
-            continue
-        for child in version.iterdir():
-            children = [child] if child.is_file() else child.iterdir()
-            for path in children:
-                if path.name.startswith("."):
-                    continue
-                contents = json.loads(path.read_text(encoding="utf-8"))
-                yield Resource.from_contents(contents)
-
-
-def _fix_jsonschema_specifications():
-    import jsonschema_specifications  # type: ignore
-    from referencing.jsonschema import EMPTY_REGISTRY as _EMPTY_REGISTRY
+    async def func_batch_fast_api(request: Request, parallelism: Optional[int] = None):
+        """
+        Runs the action for each of the inputs in the body (a json array),
+        streaming the outcome of each run as NDJSON.
+        """
+        from starlette.responses import StreamingResponse
 
-    REGISTRY = (_iter_jsonschema_specifications() @ _EMPTY_REGISTRY).crawl()
-    jsonschema_specifications.REGISTRY = REGISTRY
+        from sema4ai.action_server._gen_ids import gen_uuid
 
+        from ._actions_run_batch import (
+            BatchItemResponseHandler,
+            get_batch_parallelism,
+            iter_batch_results,
+            prepare_batch_items,
+        )
 
-def _get_json_validator(schema: dict):
-    # Dirty hack to make jsonschema_specifications work with pyoxidizer.
-    # see: https://github.com/python-jsonschema/jsonschema-specifications/issues/61
-    _fix_jsonschema_specifications()
+        body = await request.body()
+        try:
+            inputs_list = json.loads(body)
+        except Exception as e:
+            raise RequestValidationError(
+                [
+                    "The received input arguments (sent in the body) cannot be "
+                    f"interpreted as json. Details: {e}"
+                ]
+            )
+        headers = dict((x[0].lower(), x[1]) for x in request.headers.items())
+        cookies = dict(request.cookies)
 
-    from jsonschema.validators import validator_for
+        # Everything is validated before any run is created.
+        items = prepare_batch_items(
+            inputs_list, headers, input_validator, _unwrap_invocation_context
+        )
+        _get_priority(headers)
+        settings = get_settings()
+        parallelism = get_batch_parallelism(settings, parallelism)
+        _check_admission()
+
+        def create_runs() -> List["Run"]:
+            runs_info = []
+            for inputs, item_headers in items:
+                run_id = gen_uuid("run")
+                runs_info.append(
+                    (
+                        run_id,
+                        inputs,
+                        _create_run_artifacts_dir(action, run_id),
+                        item_headers.get(HEADER_ACTIONS_REQUEST_ID, ""),
+                    )
+                )
+            return _create_runs(action, runs_info)
+
+        # The runs are created in a thread (the asyncio loop must not wait
+        # for the database).
+        runs = await run_in_threadpool(_call_with_db, create_runs)
+
+        runners = [
+            _ActionsRunner(
+                action_package,
+                action,
+                input_schema_dict,
+                output_schema_dict,
+                input_validator,
+                output_validator,
+                inputs,
+                BatchItemResponseHandler(),
+                item_headers,
+                cookies,
+                result_cache_config,
+                coalesce,
+                run=run,
+            )
+            for (inputs, item_headers), run in zip(items, runs)
+        ]
+        return StreamingResponse(
+            iter_batch_results(runners, parallelism, settings.run_orchestration),
+            media_type="application/x-ndjson",
+        )
 
-    cls = validator_for(schema)
-    cls.check_schema(schema)
-    instance = cls(schema)
-    return instance.validate
+    return func_fast_api, func_internal, openapi_extra, func_batch_fast_api
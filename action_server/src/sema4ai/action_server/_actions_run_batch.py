@@ -0,0 +1,182 @@
+"""
+Running an action for a batch of inputs in a single request
+(`POST /api/actions/{package}/{action}/run-batch`).
+
+All the inputs are validated before any run is created, then the runs are
+created (in a single transaction) and scheduled in the process pool (at most
+`parallelism` items run at the same time). The outcome of each item is
+streamed back as a line of json (NDJSON) as soon as it's available, so, the
+lines are not necessarily in the same order as the inputs (`index` identifies
+the related item).
+"""
+
+import json
+import logging
+import typing
+from typing import Any, AsyncIterator, Callable, List, Optional, Tuple
+
+from ._settings import (
+    HEADER_ACTIONS_ASYNC_CALLBACK,
+    HEADER_ACTIONS_ASYNC_TIMEOUT,
+    HEADER_ACTIONS_REQUEST_ID,
+)
+
+if typing.TYPE_CHECKING:
+    from ._actions_run import _ActionsRunner
+    from ._settings import Settings
+
+log = logging.getLogger(__name__)
+
+
+class BatchItemResponseHandler:
+    """
+    Response handler for an item of a batch (the run id is provided in the
+    line with the outcome of the item and async completions are not
+    available).
+    """
+
+    def __init__(self):
+        self.run_id: Optional[str] = None
+
+    def set_run_id(self, run_id: str):
+        self.run_id = run_id
+
+    def set_async_completion(self):
+        pass
+
+
+def get_batch_parallelism(settings: "Settings", requested: Optional[int]) -> int:
+    """
+    Returns:
+        The number of items of a batch which may run at the same time (the
+        requested value is capped by `--batch-parallelism`).
+    """
+    parallelism = max(1, settings.batch_parallelism)
+    if requested is not None:
+        parallelism = max(1, min(requested, parallelism))
+    return parallelism
+
+
+def prepare_batch_items(
+    inputs_list: Any,
+    headers: dict,
+    input_validator: Callable[[dict], None],
+    unwrap_invocation_context: Callable[[Any, dict], Any],
+) -> List[Tuple[Any, dict]]:
+    """
+    Validates all the inputs of the batch (before anything is run).
+
+    Returns:
+        The (inputs, headers) for each item of the batch.
+
+    Raises:
+        RequestValidationError: if some item is not valid.
+    """
+    from fastapi.exceptions import RequestValidationError
+
+    if not isinstance(inputs_list, list) or not inputs_list:
+        raise RequestValidationError(
+            [
+                "The received input arguments (sent in the body) must be a "
+                "non-empty array with the inputs for each run."
+            ]
+        )
+
+    request_id = headers.get(HEADER_ACTIONS_REQUEST_ID, "")
+    errors = []
+    items = []
+    for index, inputs in enumerate(inputs_list):
+        item_headers = dict(headers)
+        # Items are always run to completion (the result is streamed).
+        item_headers.pop(HEADER_ACTIONS_ASYNC_TIMEOUT, None)
+        item_headers.pop(HEADER_ACTIONS_ASYNC_CALLBACK, None)
+        if request_id:
+            item_headers[HEADER_ACTIONS_REQUEST_ID] = f"{request_id}/{index}"
+
+        try:
+            inputs = unwrap_invocation_context(inputs, item_headers)
+            input_validator(inputs)
+        except RequestValidationError as e:
+            errors.append(f"Item {index}: {e.errors()[0]}")
+            continue
+        except Exception as e:
+            errors.append(
+                f"Item {index}: the received input arguments do not conform "
+                f"to the expected API. Details: {e}"
+            )
+            continue
+        items.append((inputs, item_headers))
+
+    if errors:
+        raise RequestValidationError(errors)
+    return items
+
+
+async def _run_item(
+    index: int, runner: "_ActionsRunner", orchestration: str
+) -> Tuple[int, Any, Optional[str]]:
+    """
+    Returns:
+        The index of the item, the result and the error message (if the run
+        failed).
+    """
+    from fastapi import HTTPException
+    from fastapi.exceptions import RequestValidationError
+    from starlette.concurrency import run_in_threadpool
+
+    try:
+        if orchestration == "asyncio":
+            result = await runner.run_async()
+        else:
+            result = await run_in_threadpool(runner.run_in_thread)
+        return index, result, None
+    except HTTPException as e:
+        return index, None, str(e.detail)
+    except RequestValidationError as e:
+        return index, None, str(e.errors())
+    except Exception as e:
+        log.exception(f"Error running item {index} of batch.")
+        return index, None, str(e)
+
+
+async def iter_batch_results(
+    runners: List["_ActionsRunner"], parallelism: int, orchestration: str
+) -> AsyncIterator[str]:
+    """
+    Runs the items of the batch (at most `parallelism` at the same time) and
+    provides a line of json with the outcome of each item as it finishes.
+
+    Note: the runs are always done to completion (even if the client
+    disconnects before all the results are streamed).
+    """
+    import asyncio
+
+    from ._actions_run import _on_run_task_done, _running_tasks
+    from ._models import run_status_to_str
+
+    semaphore = asyncio.Semaphore(parallelism)
+
+    async def run_with_semaphore(index: int, runner: "_ActionsRunner"):
+        async with semaphore:
+            return await _run_item(index, runner, orchestration)
+
+    tasks = []
+    for index, runner in enumerate(runners):
+        task = asyncio.ensure_future(run_with_semaphore(index, runner))
+        _running_tasks.add(task)
+        task.add_done_callback(_on_run_task_done)
+        tasks.append(task)
+
+    for next_done in asyncio.as_completed(tasks):
+        index, result, error = await next_done
+        run = runners[index]._run
+        line = {
+            "index": index,
+            "run_id": run.id,
+            "status": run_status_to_str(run.status),
+        }
+        if error is None:
+            line["result"] = result
+        else:
+            line["error"] = error
+        yield json.dumps(line) + "\n"
@@ -1,3 +1,4 @@
+import logging
 import os
 import typing
 from pathlib import Path
@@ -7,6 +8,8 @@ if typing.TYPE_CHECKING:
     from sema4ai.action_server._models import ActionPackage
     from sema4ai.action_server._settings import Settings
 
+log = logging.getLogger(__name__)
+
 
 def _add_preload_actions_dir_to_env_pythonpath(env: Dict[str, str]) -> None:
     from sema4ai.action_server import _preload_actions
@@ -41,3 +44,39 @@ import it again from the new location.
 """
         )
     return directory
+
+
+def load_package_yaml_section(
+    settings: "Settings", action_package: "ActionPackage", section: str
+) -> dict:
+    """
+    Loads a (dict) section from the `package.yaml` of the given action package.
+
+    Returns:
+        The contents of the section (an empty dict if not available).
+    """
+    import yaml
+
+    try:
+        package_yaml = get_action_package_cwd(settings, action_package) / "package.yaml"
+        if not package_yaml.exists():
+            return {}
+        with open(package_yaml, "r", encoding="utf-8") as stream:
+            contents = yaml.safe_load(stream)
+    except Exception:
+        log.exception(
+            f"Error loading the package.yaml of {action_package.name} "
+            f"(`{section}` configuration not loaded)."
+        )
+        return {}
+
+    if not isinstance(contents, dict):
+        return {}
+    value = contents.get(section) or {}
+    if not isinstance(value, dict):
+        log.critical(
+            f"Expected `{section}` in the package.yaml of {action_package.name} "
+            "to be a dict (ignoring it)."
+        )
+        return {}
+    return value
@@ -0,0 +1,160 @@
+"""
+Streaming of the values yielded by actions which are generators (or async
+generators) while the action is still running.
+
+When the request to run an action accepts `text/event-stream` (SSE) or
+`application/x-ndjson` (before `application/json`), each value yielded by the
+action is sent to the client as soon as it's received from the worker
+process and the outcome of the run is sent at the end.
+
+The result stored in the `Run` is still the full result (the list with all
+the values yielded).
+
+SSE events:
+
+    event: chunk
+    data: <json value yielded>
+
+    event: result
+    data: <json result>
+
+    event: error
+    data: {"status_code": <int>, "detail": <str>}
+
+NDJSON lines:
+
+    {"event": "chunk", "data": <json value yielded>}
+    {"event": "result", "data": <json result>}
+    {"event": "error", "data": {"status_code": <int>, "detail": <str>}}
+"""
+
+import json
+import logging
+import typing
+from typing import Any, AsyncIterator, Optional
+
+if typing.TYPE_CHECKING:
+    import asyncio
+
+    from ._actions_run import _ActionsRunner
+
+log = logging.getLogger(__name__)
+
+STREAM_FORMAT_SSE = "text/event-stream"
+STREAM_FORMAT_NDJSON = "application/x-ndjson"
+
+_STREAM_FORMATS = (STREAM_FORMAT_SSE, STREAM_FORMAT_NDJSON)
+
+# Put in the queue after the run finishes.
+_DONE = object()
+
+
+class StreamResponseHandler:
+    """
+    Response handler for a streamed run (the run id is set in the headers of
+    the streaming response when it's created and async completions are not
+    available).
+    """
+
+    def set_run_id(self, run_id: str):
+        pass
+
+    def set_async_completion(self):
+        pass
+
+
+def get_stream_format(headers: dict) -> Optional[str]:
+    """
+    Returns:
+        The format in which the run should be streamed (based on the `accept`
+        header) or None if it should not be streamed.
+    """
+    accept = headers.get("accept", "")
+    for media_type in accept.split(","):
+        media_type = media_type.split(";", 1)[0].strip().lower()
+        if media_type in _STREAM_FORMATS:
+            return media_type
+        if media_type == "application/json":
+            return None
+    return None
+
+
+def format_event(stream_format: str, event: str, data: Any) -> str:
+    if stream_format == STREAM_FORMAT_SSE:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+class ChunksQueue:
+    """
+    Queue with the values yielded by the action (values may be put from any
+    thread and are consumed in the asyncio loop).
+    """
+
+    def __init__(self, loop: "asyncio.AbstractEventLoop"):
+        import asyncio
+
+        self._loop = loop
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue()
+
+    def put_threadsafe(self, chunk: Any) -> None:
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, chunk)
+
+    def put_done(self, *args, **kwargs) -> None:
+        self.put_threadsafe(_DONE)
+
+    async def get(self) -> Any:
+        return await self._queue.get()
+
+
+async def iter_run_stream(
+    runner: "_ActionsRunner",
+    chunks_queue: ChunksQueue,
+    stream_format: str,
+    orchestration: str,
+) -> AsyncIterator[str]:
+    """
+    Runs the action and provides the values yielded by it (and its outcome)
+    in the given stream format.
+
+    Note: the run is always done to completion (even if the client disconnects
+    before all the values are streamed).
+    """
+    import asyncio
+
+    from fastapi import HTTPException
+    from fastapi.exceptions import RequestValidationError
+    from starlette.concurrency import run_in_threadpool
+
+    from ._actions_run import _on_run_task_done, _running_tasks
+
+    if orchestration == "asyncio":
+        task = asyncio.ensure_future(runner.run_async())
+    else:
+        task = asyncio.ensure_future(run_in_threadpool(runner.run_in_thread))
+    _running_tasks.add(task)
+    task.add_done_callback(_on_run_task_done)
+    # Note: the values yielded are always put in the queue before the run
+    # finishes, so, this is the last entry in the queue.
+    task.add_done_callback(chunks_queue.put_done)
+
+    while True:
+        chunk = await chunks_queue.get()
+        if chunk is _DONE:
+            break
+        yield format_event(stream_format, "chunk", chunk)
+
+    try:
+        result = task.result()
+    except HTTPException as e:
+        error = {"status_code": e.status_code, "detail": str(e.detail)}
+    except RequestValidationError as e:
+        error = {"status_code": 422, "detail": str(e.errors())}
+    except Exception as e:
+        log.exception("Error running streamed action.")
+        error = {"status_code": 500, "detail": str(e)}
+    else:
+        yield format_event(stream_format, "result", result)
+        return
+
+    yield format_event(stream_format, "error", error)
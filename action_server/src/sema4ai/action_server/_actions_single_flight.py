@@ -0,0 +1,109 @@
+"""
+Coalescing of identical concurrent runs (single-flight).
+
+When enabled (`--coalesce-runs`), while a run of an action which is
+explicitly not consequential is in flight, other requests for the same action
+with the same inputs/headers (see: `make_result_cache_key`) don't start a new
+run: they wait for the run in flight (the leader) to finish and reuse its
+outcome.
+
+Each request still has its own `Run` (with `leader_run_id` set to the id of
+the leader run).
+"""
+
+import threading
+import typing
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+
+if typing.TYPE_CHECKING:
+    from ._models import Run
+
+
+class Flight:
+    """
+    A run in flight which may be followed by other runs.
+    """
+
+    __slots__ = ["key", "leader_run_id", "is_leader", "future"]
+
+    def __init__(
+        self,
+        key: str,
+        leader_run_id: str,
+        is_leader: bool,
+        future: "Future[Tuple[Run, Optional[BaseException]]]",
+    ):
+        self.key = key
+        self.leader_run_id = leader_run_id
+        self.is_leader = is_leader
+
+        # Resolved with the leader run (and the error which made it fail,
+        # if any) after it finishes.
+        self.future = future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_to_flight: Dict[str, Flight] = {}
+        self._coalesced = 0
+
+    def join(self, key: str, run_id: str) -> Flight:
+        """
+        Joins the flight for the given key (the given run becomes the leader
+        if there's no run in flight for the key).
+
+        Note: if the returned flight has `is_leader == True`, `land` must be
+        called when the run finishes.
+        """
+        with self._lock:
+            flight = self._key_to_flight.get(key)
+            if flight is not None:
+                self._coalesced += 1
+                return Flight(key, flight.leader_run_id, False, flight.future)
+
+            flight = Flight(key, run_id, True, Future())
+            self._key_to_flight[key] = flight
+            return flight
+
+    def land(
+        self,
+        flight: Flight,
+        leader_run: "Run",
+        leader_error: Optional[BaseException] = None,
+    ) -> None:
+        """
+        Called when the leader run finishes (its outcome is provided to the
+        runs which followed it).
+
+        Args:
+            leader_error: The error which made the leader run fail (if any).
+        """
+        assert flight.is_leader
+        with self._lock:
+            if self._key_to_flight.get(flight.key) is flight:
+                del self._key_to_flight[flight.key]
+        flight.future.set_result((leader_run, leader_error))
+
+    def get_in_flight_count(self) -> int:
+        with self._lock:
+            return len(self._key_to_flight)
+
+    def get_coalesced_count(self) -> int:
+        with self._lock:
+            return self._coalesced
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
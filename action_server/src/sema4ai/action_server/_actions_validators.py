@@ -0,0 +1,310 @@
+"""
+Validators for the json schemas of the inputs/outputs of actions.
+
+Creating a `jsonschema` validator is relatively slow, so, validators are
+cached by the hash of the schema (the cache is kept across reloads, so, an
+action whose schema didn't change reuses the validator it already had).
+
+Besides the `jsonschema` backend, a `fast` backend may be used (see:
+`--schema-validator`): in this case, for schemas which only use the subset
+commonly used in the signature of actions (objects, primitives, arrays and
+string enums), python code is generated to check whether a value is valid
+(and `jsonschema` is only used to report the error when the value is not
+valid, so, the error messages are the same in both backends). Schemas
+using anything else just use `jsonschema`.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+SCHEMA_VALIDATOR_JSONSCHEMA = "jsonschema"
+SCHEMA_VALIDATOR_FAST = "fast"
+SCHEMA_VALIDATORS = (SCHEMA_VALIDATOR_JSONSCHEMA, SCHEMA_VALIDATOR_FAST)
+
+_MAX_CACHED_VALIDATORS = 1024
+
+# Keywords which don't affect validation (so, they're ignored when
+# generating code).
+_ANNOTATION_KEYWORDS = frozenset(
+    (
+        "$schema",
+        "$comment",
+        "title",
+        "description",
+        "default",
+        "examples",
+        "format",
+        "deprecated",
+        "readOnly",
+        "writeOnly",
+        "contentMediaType",
+        "contentEncoding",
+    )
+)
+
+# Keywords handled by the generated code.
+_SUPPORTED_KEYWORDS = frozenset(
+    ("type", "properties", "required", "additionalProperties", "items", "enum")
+)
+
+_TYPE_CHECKS = {
+    "object": "type(v) is dict",
+    "array": "type(v) is list",
+    "string": "type(v) is str",
+    "boolean": "type(v) is bool",
+    "null": "v is None",
+    "integer": "(type(v) is int or (type(v) is float and v.is_integer()))",
+    "number": "type(v) in (int, float)",
+}
+
+_cache_lock = threading.Lock()
+_cache: "OrderedDict[Tuple[str, str], Callable[[Any], None]]" = OrderedDict()
+
+_fixed_jsonschema_specifications = False
+
+
+def _iter_jsonschema_specifications():
+    from pathlib import Path
+
+    import jsonschema_specifications  # type: ignore
+    from referencing import Resource
+
+    parent = Path(jsonschema_specifications._core.__file__).absolute().parent
+
+    for version in (parent / "schemas").iterdir():
+        if version.name.startswith("."):
+            continue
+        for child in version.iterdir():
+            children = [child] if child.is_file() else child.iterdir()
+            for path in children:
+                if path.name.startswith("."):
+                    continue
+                contents = json.loads(path.read_text(encoding="utf-8"))
+                yield Resource.from_contents(contents)
+
+
+def _fix_jsonschema_specifications():
+    # Dirty hack to make jsonschema_specifications work with pyoxidizer.
+    # see: https://github.com/python-jsonschema/jsonschema-specifications/issues/61
+    # (this is only needed once per process).
+    global _fixed_jsonschema_specifications
+    if _fixed_jsonschema_specifications:
+        return
+
+    import jsonschema_specifications  # type: ignore
+    from referencing.jsonschema import EMPTY_REGISTRY as _EMPTY_REGISTRY
+
+    REGISTRY = (_iter_jsonschema_specifications() @ _EMPTY_REGISTRY).crawl()
+    jsonschema_specifications.REGISTRY = REGISTRY
+    _fixed_jsonschema_specifications = True
+
+
+def _create_jsonschema_validator(schema: dict) -> Callable[[Any], None]:
+    _fix_jsonschema_specifications()
+
+    from jsonschema.validators import validator_for
+
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    instance = cls(schema)
+    return instance.validate
+
+
+class _UnsupportedSchema(Exception):
+    pass
+
+
+class _CodeGenerator:
+    def __init__(self):
+        self._lines: List[str] = []
+        self._namespace: Dict[str, Any] = {}
+        self._next_id = 0
+
+    def _new_name(self, prefix: str) -> str:
+        self._next_id += 1
+        return f"{prefix}{self._next_id}"
+
+    def _add_const(self, value) -> str:
+        name = self._new_name("_c")
+        self._namespace[name] = value
+        return name
+
+    def generate(self, schema) -> str:
+        """
+        Generates the code for a function which returns whether a value is
+        valid for the given schema.
+
+        Returns:
+            The name of the generated function.
+
+        Raises:
+            _UnsupportedSchema: if the schema uses something not supported.
+        """
+        if schema is True or schema == {}:
+            return self._add_const(lambda v: True)
+
+        if not isinstance(schema, dict):
+            raise _UnsupportedSchema()
+
+        for key in schema:
+            if key in _SUPPORTED_KEYWORDS or key in _ANNOTATION_KEYWORDS:
+                continue
+            if key.startswith("x-"):
+                continue
+            raise _UnsupportedSchema()
+
+        checks: List[str] = []
+
+        schema_type = schema.get("type")
+        if schema_type is not None:
+            types = [schema_type] if isinstance(schema_type, str) else schema_type
+            try:
+                type_checks = [_TYPE_CHECKS[t] for t in types]
+            except (KeyError, TypeError):
+                raise _UnsupportedSchema()
+            checks.append(f"if not ({' or '.join(type_checks)}): return False")
+
+        if "enum" in schema:
+            enum = schema["enum"]
+            if not isinstance(enum, list) or not all(isinstance(x, str) for x in enum):
+                raise _UnsupportedSchema()
+            values = self._add_const(frozenset(enum))
+            checks.append(f"if not (type(v) is str and v in {values}): return False")
+
+        object_checks = self._generate_object_checks(schema)
+        if object_checks:
+            checks.append("if type(v) is dict:")
+            checks.extend(f"    {check}" for check in object_checks)
+
+        if "items" in schema:
+            items = self.generate(schema["items"])
+            checks.append("if type(v) is list:")
+            checks.append("    for item in v:")
+            checks.append(f"        if not {items}(item): return False")
+
+        name = self._new_name("_validate")
+        self._lines.append(f"def {name}(v):")
+        self._lines.extend(f"    {check}" for check in checks)
+        self._lines.append("    return True")
+        self._lines.append("")
+        return name
+
+    def _generate_object_checks(self, schema: dict) -> List[str]:
+        checks: List[str] = []
+
+        required = schema.get("required")
+        if required:
+            if not isinstance(required, list):
+                raise _UnsupportedSchema()
+            for key in required:
+                checks.append(f"if {key!r} not in v: return False")
+
+        properties = schema.get("properties", {})
+        if not isinstance(properties, dict):
+            raise _UnsupportedSchema()
+        for key, property_schema in properties.items():
+            validate = self.generate(property_schema)
+            checks.append(
+                f"if {key!r} in v and not {validate}(v[{key!r}]): return False"
+            )
+
+        additional = schema.get("additionalProperties", True)
+        if additional is not True:
+            known = self._add_const(frozenset(properties))
+            checks.append("for key, value in v.items():")
+            checks.append(f"    if key in {known}: continue")
+            if additional is False:
+                checks.append("    return False")
+            else:
+                validate = self.generate(additional)
+                checks.append(f"    if not {validate}(value): return False")
+
+        return checks
+
+    def compile(self, name: str) -> Callable[[Any], bool]:
+        code = "\n".join(self._lines)
+        exec(compile(code, "<generated schema validator>", "exec"), self._namespace)
+        return self._namespace[name]
+
+
+def compile_fast_validator(schema) -> Optional[Callable[[Any], bool]]:
+    """
+    Generates a function which checks whether a value is valid for the given
+    schema.
+
+    Returns:
+        The function which returns whether the value is valid or None if
+        the schema uses something not supported by the generated code.
+    """
+    generator = _CodeGenerator()
+    try:
+        name = generator.generate(schema)
+    except _UnsupportedSchema:
+        return None
+    except RecursionError:
+        return None
+    return generator.compile(name)
+
+
+def _create_fast_validator(schema: dict) -> Callable[[Any], None]:
+    jsonschema_validate = _create_jsonschema_validator(schema)
+    is_valid = compile_fast_validator(schema)
+    if is_valid is None:
+        log.debug("Schema not supported by the fast validator: %s", schema)
+        return jsonschema_validate
+
+    def validate(value) -> None:
+        if not is_valid(value):
+            # Let jsonschema provide the error.
+            jsonschema_validate(value)
+
+    return validate
+
+
+def get_json_validator(
+    schema: dict, backend: str = SCHEMA_VALIDATOR_JSONSCHEMA
+) -> Callable[[Any], None]:
+    """
+    Provides a function which validates a value against the given schema
+    (validators are cached by the hash of the schema).
+
+    Args:
+        backend: The validator backend (see: `SCHEMA_VALIDATORS`).
+
+    Raises:
+        jsonschema.SchemaError: if the schema is not valid.
+    """
+    contents = json.dumps(schema, sort_keys=True)
+    key = (backend, hashlib.sha256(contents.encode("utf-8")).hexdigest())
+    with _cache_lock:
+        validator = _cache.get(key)
+        if validator is not None:
+            _cache.move_to_end(key)
+            return validator
+
+    # The validator keeps its own copy (so, changes to the given schema
+    # don't affect the cached validator).
+    schema = json.loads(contents)
+    if backend == SCHEMA_VALIDATOR_FAST:
+        validator = _create_fast_validator(schema)
+    elif backend == SCHEMA_VALIDATOR_JSONSCHEMA:
+        validator = _create_jsonschema_validator(schema)
+    else:
+        raise ValueError(f"Invalid schema validator: {backend!r}")
+
+    with _cache_lock:
+        _cache[key] = validator
+        while len(_cache) > _MAX_CACHED_VALIDATORS:
+            _cache.popitem(last=False)
+    return validator
+
+
+def clear_json_validators_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
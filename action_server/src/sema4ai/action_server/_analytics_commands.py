@@ -0,0 +1,146 @@
+import json
+import logging
+import typing
+from dataclasses import asdict
+from typing import List, Optional
+
+from sema4ai.action_server._protocols import ArgumentsNamespaceAnalytics
+
+if typing.TYPE_CHECKING:
+    from sema4ai.action_server._database import Database
+    from sema4ai.action_server._runs_analytics import ActionRunsAnalytics
+
+log = logging.getLogger(__name__)
+
+
+def handle_analytics_command(args: ArgumentsNamespaceAnalytics) -> int:
+    """
+    Prints the analytics of the runs (note: the database is just read, so,
+    this may be used while the action server is running).
+    """
+    from sema4ai.action_server._models import load_db
+    from sema4ai.action_server._protocols import ArgumentsNamespaceRequiringDatadir
+    from sema4ai.action_server._runs_analytics import (
+        compute_runs_analytics,
+        parse_duration,
+    )
+    from sema4ai.action_server._settings import setup_settings
+    from sema4ai.action_server.migrations import MigrationStatus, db_migration_status
+
+    try:
+        window = parse_duration(args.window)
+        step = parse_duration(args.step) if args.step else None
+    except ValueError as e:
+        log.critical(str(e))
+        return 1
+
+    with setup_settings(
+        typing.cast(ArgumentsNamespaceRequiringDatadir, args)
+    ) as settings:
+        db_path = settings.datadir / settings.db_file
+        if not db_path.exists():
+            log.critical(f"Database not found at: {db_path}")
+            return 1
+
+        if db_migration_status(db_path) != MigrationStatus.UP_TO_DATE:
+            log.critical(
+                "The database is not up to date with this version of the "
+                "action server (please run `action-server migrate` or start "
+                "the action server to migrate it)."
+            )
+            return 1
+
+        with load_db(db_path) as db:
+            action_id = None
+            if args.action:
+                action_id = _find_action_id(db, args.action)
+                if action_id is None:
+                    return 1
+
+            analytics = compute_runs_analytics(db, window, step, action_id)
+
+    if args.json:
+        print(json.dumps([asdict(a) for a in analytics], indent=2))
+    else:
+        print(_format_analytics(analytics, show_window=step is not None))
+    return 0
+
+
+def _find_action_id(db: "Database", action: str) -> Optional[str]:
+    from sema4ai.action_server._models import Action, ActionPackage
+
+    action_package_name = None
+    action_name = action
+    if "/" in action:
+        action_package_name, action_name = action.split("/", 1)
+
+    actions = db.all(Action, where="name = ?", values=[action_name])
+    if action_package_name is not None:
+        action_packages = db.all(
+            ActionPackage, where="name = ?", values=[action_package_name]
+        )
+        action_package_ids = {ap.id for ap in action_packages}
+        actions = [a for a in actions if a.action_package_id in action_package_ids]
+
+    if not actions:
+        log.critical(f"Action not found: {action}")
+        return None
+    if len(actions) > 1:
+        log.critical(
+            f"Multiple actions named: {action} "
+            "(please use: <action package name>/<action name>)."
+        )
+        return None
+    return actions[0].id
+
+
+def _format_seconds(value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if value < 1:
+        return f"{value * 1000:.0f}ms"
+    return f"{value:.2f}s"
+
+
+def _format_analytics(analytics: List["ActionRunsAnalytics"], show_window: bool) -> str:
+    if not analytics:
+        return "No runs finished in the given window."
+
+    header = [
+        "Action",
+        "Runs",
+        "Errors",
+        "Runs/min",
+        "Run p50",
+        "Run p90",
+        "Run p99",
+        "Queue p50",
+        "Queue p90",
+        "Queue p99",
+    ]
+    if show_window:
+        header.insert(0, "Window start")
+
+    rows = [header]
+    for a in analytics:
+        row = [
+            f"{a.action_package_name}/{a.action_name}",
+            str(a.runs),
+            f"{a.error_rate:.1%}",
+            f"{a.throughput:.2f}",
+            _format_seconds(a.run_time.p50),
+            _format_seconds(a.run_time.p90),
+            _format_seconds(a.run_time.p99),
+            _format_seconds(a.queue_wait.p50),
+            _format_seconds(a.queue_wait.p90),
+            _format_seconds(a.queue_wait.p99),
+        ]
+        if show_window:
+            row.insert(0, a.window_start)
+        rows.append(row)
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in rows
+    )
@@ -25,6 +25,10 @@ def build_url_api_run(action_package_name: str, action_name: str) -> str:
     return f"/api/actions/{_name_to_url(action_package_name)}/{_name_to_url(action_name)}/run"
 
 
+def build_url_api_run_batch(action_package_name: str, action_name: str) -> str:
+    return f"{build_url_api_run(action_package_name, action_name)}-batch"
+
+
 def get_action_description_from_docs(docs: str) -> str:
     import docstring_parser
 
@@ -299,6 +303,7 @@ class _ActionRoutes:
                 func_fast_api,
                 func_internal,
                 openapi_extra,
+                func_batch_fast_api,
             ) = _actions_run.generate_func_from_action(
                 action_package, action, display_name
             )
@@ -324,6 +329,19 @@ class _ActionRoutes:
             )
             registered_route_names.add(route_name)
 
+            # The batch route is not in the OpenAPI spec (it's not meant
+            # to be used as a tool).
+            batch_route_name = build_url_api_run_batch(action_package.name, action.name)
+            app.add_api_route(
+                batch_route_name,
+                func_batch_fast_api,
+                name=f"{action.name}_batch",
+                methods=["POST"],
+                dependencies=self.endpoint_dependencies,
+                include_in_schema=False,
+            )
+            registered_route_names.add(batch_route_name)
+
             self.mcp_server_setup_helper.register_action(
                 func_internal, action_package, action, display_name, doc_desc
             )
@@ -0,0 +1,48 @@
+import logging
+from typing import Annotated, List, Optional
+
+import fastapi
+from fastapi.routing import APIRouter
+
+from sema4ai.action_server._runs_analytics import ActionRunsAnalytics
+
+analytics_api_router = APIRouter(prefix="/api/analytics")
+log = logging.getLogger(__name__)
+
+
+@analytics_api_router.get("/runs", response_model=List[ActionRunsAnalytics])
+def get_runs_analytics(
+    window: Annotated[
+        str,
+        fastapi.Query(description="The time window to consider (i.e.: 30m, 24h, 7d)."),
+    ] = "24h",
+    step: Annotated[
+        Optional[str],
+        fastapi.Query(
+            description="If given, the window is split in intervals of this size."
+        ),
+    ] = None,
+    action_id: Optional[str] = None,
+):
+    """
+    Provides the analytics of the runs of each action which finished in the
+    given window: run time and queue wait percentiles (p50/p90/p99, in
+    seconds), error rate and throughput (runs per minute).
+    """
+    from fastapi.exceptions import HTTPException
+    from starlette import status as http_status
+
+    from ._models import get_db
+    from ._runs_analytics import compute_runs_analytics, parse_duration
+
+    try:
+        window_seconds = parse_duration(window)
+        step_seconds = parse_duration(step) if step else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+
+    db = get_db()
+    with db.connect():
+        return compute_runs_analytics(db, window_seconds, step_seconds, action_id)
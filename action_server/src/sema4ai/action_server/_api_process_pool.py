@@ -0,0 +1,18 @@
+import logging
+
+from fastapi.routing import APIRouter
+
+process_pool_api_router = APIRouter(prefix="/api/processPool")
+log = logging.getLogger(__name__)
+
+
+@process_pool_api_router.get("/stats", response_model=dict)
+def get_process_pool_stats():
+    """
+    Provides information on the process pool (idle/running processes) and
+    on its admission queue (runs waiting for a process, wait times, rejected
+    runs), which may be used for autoscaling.
+    """
+    from ._actions_process_pool import get_actions_process_pool
+
+    return get_actions_process_pool().get_stats()
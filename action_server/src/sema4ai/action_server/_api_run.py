@@ -16,12 +16,68 @@ run_api_router = APIRouter(prefix="/api/runs")
 
 
 @run_api_router.get("", response_model=list[Run])
-def list_runs():
+def list_runs(
+    response: fastapi.Response,
+    before: Annotated[
+        Optional[int],
+        fastapi.Query(
+            description="Cursor: only runs older than the run with this "
+            "`numbered_id` are listed (use the `x-next-cursor` header of the "
+            "previous page)."
+        ),
+    ] = None,
+    limit: Annotated[int, fastapi.Query(ge=1, le=1000)] = 200,
+    action_id: Optional[str] = None,
+    action_package_id: Optional[str] = None,
+    status: Annotated[
+        Optional[List[str]],
+        fastapi.Query(
+            description="Run status (not_run, running, passed, failed or cancelled)."
+        ),
+    ] = None,
+    started_after: Annotated[
+        Optional[str], fastapi.Query(description="Time in isoformat.")
+    ] = None,
+    started_before: Annotated[
+        Optional[str], fastapi.Query(description="Time in isoformat.")
+    ] = None,
+    request_id: Optional[str] = None,
+):
+    """
+    Lists the runs (most recent first) matching the given filters.
+
+    When there are more runs, the `x-next-cursor` header has the value to be
+    used in `before` to get the next page.
+    """
+    from fastapi.exceptions import HTTPException
+    from starlette import status as http_status
+
+    from ._runs_query import create_runs_query
     from ._runs_state_cache import get_global_runs_state
 
+    try:
+        query = create_runs_query(
+            before=before,
+            limit=limit,
+            action_id=action_id,
+            action_package_id=action_package_id,
+            status=status,
+            started_after=started_after,
+            started_before=started_before,
+            request_id=request_id,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST, detail=str(e)
+        ) from e
+
     global_runs_state = get_global_runs_state()
     with global_runs_state.semaphore:
-        return global_runs_state.get_current_run_state()
+        page = global_runs_state.query_runs(query)
+
+    if page.next_cursor is not None:
+        response.headers["x-next-cursor"] = str(page.next_cursor)
+    return page.runs
 
 
 def get_run_by_id(run_id: str) -> Run:
@@ -201,10 +257,7 @@ for a given run (i.e.: [{'name': '__action_server_output.txt', 'size_in_bytes':
 
     artifacts_in = artifacts_dir / run.relative_artifacts_dir
     if not artifacts_in.exists():
-        log.critical(
-            f"Unable to get artifacts because the artifacts_dir ({artifacts_in}) "
-            "does not exist."
-        )
+        _log_artifacts_dir_missing(artifacts_in)
         return []
 
     return _get_file_info_in_path(artifacts_in)
@@ -350,6 +403,21 @@ return new TextDecoder().decode(mergedArray);
     stream.write(contents[end_index:].encode("utf-8"))
 
 
+def _log_artifacts_dir_missing(artifacts_in: Path) -> None:
+    from ._artifacts_staging import get_artifacts_staging
+
+    msg = (
+        f"Unable to get artifacts because the artifacts_dir ({artifacts_in}) "
+        "does not exist."
+    )
+    if get_artifacts_staging() is not None:
+        # Expected in the lightweight artifacts mode (only the files of some
+        # runs are persisted).
+        log.debug(msg)
+    else:
+        log.critical(msg)
+
+
 def _get_artifacts_dir_for_run_id(run_id: str) -> Optional[Path]:
     from sema4ai.action_server._settings import get_settings
 
@@ -365,10 +433,7 @@ def _get_artifacts_dir_for_run_id(run_id: str) -> Optional[Path]:
 
     artifacts_in = (artifacts_dir / run.relative_artifacts_dir).absolute()
     if not artifacts_in.exists():
-        log.critical(
-            f"Unable to get artifacts because the artifacts_dir ({artifacts_in}) "
-            "does not exist."
-        )
+        _log_artifacts_dir_missing(artifacts_in)
         return None
 
     return artifacts_in
@@ -457,10 +522,7 @@ def get_run_artifact_binary(
 
     artifacts_in = artifacts_dir / run.relative_artifacts_dir
     if not artifacts_in.exists():
-        log.critical(
-            f"Unable to get artifacts because the artifacts_dir ({artifacts_in}) "
-            "does not exist."
-        )
+        _log_artifacts_dir_missing(artifacts_in)
         return None
 
     f = (artifacts_in / artifact_name).absolute()
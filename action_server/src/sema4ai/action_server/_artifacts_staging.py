@@ -0,0 +1,145 @@
+"""
+Lightweight artifacts mode (`--artifacts-mode=lightweight`).
+
+In this mode the directory of a run isn't created in the `artifacts_dir` when
+the run is created: the files of the run (inputs, result, output and the
+robolog files) are staged in a directory in a tmpfs (`/dev/shm` by default,
+see: `--artifacts-staging-dir`) and after the run finishes they're:
+
+- moved to the `artifacts_dir` if the run failed (or was cancelled)
+- removed otherwise
+
+Runs which requested the artifacts (`x-action-artifacts: 1`) or which are
+sampled (`--artifacts-sample-rate`) write their files directly in the
+`artifacts_dir`.
+"""
+
+import logging
+import os
+import random
+import shutil
+import tempfile
+import typing
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+if typing.TYPE_CHECKING:
+    from ._settings import Settings
+
+log = logging.getLogger(__name__)
+
+ARTIFACTS_MODE_PERSISTENT = "persistent"
+ARTIFACTS_MODE_LIGHTWEIGHT = "lightweight"
+
+ARTIFACTS_MODES = (ARTIFACTS_MODE_PERSISTENT, ARTIFACTS_MODE_LIGHTWEIGHT)
+
+
+def get_default_staging_base_dir() -> Path:
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return Path(tempfile.gettempdir())
+
+
+class ArtifactsStaging:
+    def __init__(
+        self,
+        staging_dir: Path,
+        sample_rate: float,
+        rand: Optional[random.Random] = None,
+    ):
+        """
+        Args:
+            staging_dir: The directory where the files of the runs are staged
+                (it's removed when the staging is closed).
+            sample_rate: The fraction of runs (0 to 1) whose files are always
+                persisted.
+        """
+        self.staging_dir = staging_dir
+        self._sample_rate = sample_rate
+        self._random = rand or random.Random()
+
+    def should_stage(self, artifacts_requested: bool) -> bool:
+        """
+        Returns:
+            Whether the files of a run should be staged (otherwise they're
+            written directly in the `artifacts_dir`).
+        """
+        if artifacts_requested:
+            return False
+        if self._sample_rate > 0 and self._random.random() < self._sample_rate:
+            return False
+        return True
+
+    def create_staged_dir(self, relative_artifacts_dir: str) -> Path:
+        staged_dir = self.staging_dir / relative_artifacts_dir
+        staged_dir.mkdir(parents=True, exist_ok=False)
+        return staged_dir
+
+    def release(self, staged_dir: Path, target_dir: Path, persist: bool) -> None:
+        """
+        Moves the staged files to the target dir (if `persist` is True) or
+        removes them.
+        """
+        try:
+            if persist:
+                target_dir.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(staged_dir), str(target_dir))
+            else:
+                shutil.rmtree(staged_dir)
+        except Exception:
+            log.exception(
+                f"Error releasing staged artifacts: {staged_dir} (persist: {persist})."
+            )
+
+    def close(self) -> None:
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+_artifacts_staging: Optional[ArtifactsStaging] = None
+
+
+@contextmanager
+def setup_artifacts_staging(settings: "Settings") -> Iterator[None]:
+    global _artifacts_staging
+
+    if settings.artifacts_mode != ARTIFACTS_MODE_LIGHTWEIGHT:
+        yield
+        return
+
+    if os.environ.get("SEMA4AI_ACTION_SERVER_POST_RUN_CMD"):
+        # The post run command may access the files after the run finishes.
+        log.warning(
+            "The lightweight artifacts mode is not used because "
+            "SEMA4AI_ACTION_SERVER_POST_RUN_CMD is set."
+        )
+        yield
+        return
+
+    base_dir = (
+        Path(settings.artifacts_staging_dir)
+        if settings.artifacts_staging_dir
+        else get_default_staging_base_dir()
+    )
+    # A directory per process (it's removed when the action server exits).
+    staging_dir = base_dir / f"sema4ai-action-server-{os.getpid()}"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    log.info(f"Staging the artifacts of runs in: {staging_dir}")
+
+    staging = ArtifactsStaging(staging_dir, settings.artifacts_sample_rate)
+    _artifacts_staging = staging
+    try:
+        yield
+    finally:
+        _artifacts_staging = None
+        staging.close()
+
+
+def get_artifacts_staging() -> Optional[ArtifactsStaging]:
+    """
+    Returns:
+        The artifacts staging or None if the lightweight artifacts mode is
+        not being used.
+    """
+    return _artifacts_staging
@@ -0,0 +1,282 @@
+"""
+Delivery of the results of async runs to the callback url
+(`x-actions-async-callback`).
+
+Callbacks are not posted from the thread running the action: the run just
+adds an entry to the `callback_outbox` table and the dispatcher (which has its
+own thread/event loop and a pooled http client) delivers it.
+
+- Failed deliveries are retried with exponential backoff (with jitter) up to
+  `--callback-max-attempts`.
+- At most `--callback-max-per-host` callbacks are posted at the same time to
+  the same host.
+- Entries are only removed from the outbox after being delivered (or after
+  all the attempts failed), so, pending callbacks are delivered again when
+  the server is restarted.
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+import random
+import threading
+import typing
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set
+from urllib.parse import urlparse
+
+if typing.TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+    from ._models import CallbackOutbox
+    from ._settings import Settings
+
+log = logging.getLogger(__name__)
+
+# Base/max delay (in seconds) between delivery attempts.
+_BACKOFF_BASE = 0.5
+_BACKOFF_MAX = 300.0
+
+# Timeout (in seconds) for each post.
+_POST_TIMEOUT = 30.0
+
+
+def compute_backoff(attempts: int, rand: Optional[random.Random] = None) -> float:
+    """
+    Args:
+        attempts: The number of attempts already done.
+
+    Returns:
+        The time (in seconds) to wait before the next attempt (exponential
+        backoff with full jitter).
+    """
+    delay = min(_BACKOFF_MAX, _BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return (rand or random).uniform(0, delay)
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class CallbackDispatcher:
+    def __init__(self, max_attempts: int, max_per_host: int):
+        self._max_attempts = max(1, max_attempts)
+        self._max_per_host = max(1, max_per_host)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session: Optional["ClientSession"] = None
+        self._started = threading.Event()
+        self._stop_event: Optional[asyncio.Event] = None
+        self._thread: Optional[threading.Thread] = None
+
+        # Only accessed in the dispatcher thread.
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="CallbackDispatcher", daemon=True
+        )
+        self._thread.start()
+        self._started.wait()
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Stops the dispatcher (callbacks still pending remain in the outbox).
+        """
+        loop = self._loop
+        if loop is not None and self._stop_event is not None:
+            loop.call_soon_threadsafe(self._stop_event.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def enqueue(self, run_id: str, url: str, result: Any, headers: dict) -> None:
+        """
+        Adds the callback to the outbox (must be called with a database
+        connection) and schedules its delivery.
+        """
+        from sema4ai.action_server._gen_ids import gen_uuid
+
+        from ._database import datetime_to_str
+        from ._models import CallbackOutbox, get_db
+
+        now = datetime_to_str(_now())
+        entry = CallbackOutbox(
+            id=gen_uuid("callback"),
+            run_id=run_id,
+            url=url,
+            body=json.dumps(result),
+            headers=json.dumps(headers),
+            created_at=now,
+            next_attempt_at=now,
+            attempts=0,
+        )
+        db = get_db()
+        with db.transaction():
+            db.insert(entry)
+
+        self._schedule_threadsafe(entry, 0)
+
+    def _schedule_threadsafe(self, entry: "CallbackOutbox", delay: float) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            log.critical(
+                f"Callback dispatcher not running (callback for run {entry.run_id} "
+                "will be delivered when the server is restarted)."
+            )
+            return
+        loop.call_soon_threadsafe(self._schedule, entry, delay)
+
+    def _schedule(self, entry: "CallbackOutbox", delay: float) -> None:
+        if delay > 0:
+            assert self._loop is not None
+            self._loop.call_later(delay, self._schedule, entry, 0)
+            return
+
+        task = asyncio.ensure_future(self._deliver(entry))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _run(self) -> None:
+        from ._models import get_db
+
+        with get_db().connect():  # Connection is per-thread.
+            try:
+                asyncio.run(self._main())
+            except Exception:
+                log.exception("Error in callback dispatcher.")
+            finally:
+                self._started.set()
+
+    async def _main(self) -> None:
+        import aiohttp
+
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        connector = aiohttp.TCPConnector(limit_per_host=self._max_per_host)
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=_POST_TIMEOUT)
+        ) as session:
+            self._session = session
+            self._schedule_pending()
+            self._started.set()
+
+            await self._stop_event.wait()
+
+            for task in list(self._tasks):
+                task.cancel()
+            if self._tasks:
+                await asyncio.wait(list(self._tasks))
+
+    def _schedule_pending(self) -> None:
+        """
+        Schedules the callbacks which were not delivered (i.e.: when the
+        server was stopped before they were delivered).
+        """
+        from ._database import str_to_datetime
+        from ._models import CallbackOutbox, get_db
+
+        entries = get_db().all(CallbackOutbox, order_by="next_attempt_at")
+        if entries:
+            log.info(f"Scheduling delivery of {len(entries)} pending callback(s).")
+
+        now = _now()
+        for entry in entries:
+            delay = (str_to_datetime(entry.next_attempt_at) - now).total_seconds()
+            self._schedule(entry, max(0.0, delay))
+
+    def _get_host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        semaphore = self._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._host_semaphores[host] = asyncio.Semaphore(
+                self._max_per_host
+            )
+        return semaphore
+
+    async def _deliver(self, entry: "CallbackOutbox") -> None:
+        assert self._session is not None
+
+        error: Optional[str] = None
+        async with self._get_host_semaphore(entry.url):
+            try:
+                async with self._session.post(
+                    entry.url,
+                    data=entry.body,
+                    headers={
+                        "Content-Type": "application/json",
+                        **json.loads(entry.headers),
+                    },
+                ) as response:
+                    if not 200 <= response.status < 300:
+                        error = f"Status: {response.status}"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = f"{e.__class__.__name__}: {e}"
+
+        if error is None:
+            self._on_delivered(entry)
+        else:
+            self._on_failed(entry, error)
+
+    def _on_delivered(self, entry: "CallbackOutbox") -> None:
+        from ._models import get_db
+
+        log.debug(f"Callback for run {entry.run_id} delivered to: {entry.url}")
+        db = get_db()
+        with db.transaction():
+            db.delete(entry, ("id",))
+
+    def _on_failed(self, entry: "CallbackOutbox", error: str) -> None:
+        from ._database import datetime_to_str
+        from ._models import get_db
+
+        db = get_db()
+        entry.attempts += 1
+        entry.last_error = error
+        if entry.attempts >= self._max_attempts:
+            log.critical(
+                f"Error posting callback to: {entry.url} for run id {entry.run_id} "
+                f"(giving up after {entry.attempts} attempts). Last error: {error}"
+            )
+            with db.transaction():
+                db.delete(entry, ("id",))
+            return
+
+        delay = compute_backoff(entry.attempts)
+        log.info(
+            f"Error posting callback to: {entry.url} for run id {entry.run_id} "
+            f"(attempt {entry.attempts}, retrying in {delay:.1f}s). Error: {error}"
+        )
+        entry.next_attempt_at = datetime_to_str(
+            _now() + datetime.timedelta(seconds=delay)
+        )
+        with db.transaction():
+            db.update(entry, "attempts", "last_error", "next_attempt_at")
+        self._schedule(entry, delay)
+
+
+_callback_dispatcher: Optional[CallbackDispatcher] = None
+
+
+@contextmanager
+def setup_callback_dispatcher(settings: "Settings") -> Iterator[None]:
+    global _callback_dispatcher
+
+    dispatcher = CallbackDispatcher(
+        settings.callback_max_attempts, settings.callback_max_per_host
+    )
+    dispatcher.start()
+    _callback_dispatcher = dispatcher
+    try:
+        yield
+    finally:
+        _callback_dispatcher = None
+        dispatcher.stop()
+
+
+def get_callback_dispatcher() -> CallbackDispatcher:
+    assert _callback_dispatcher is not None, "Callback dispatcher not set up."
+    return _callback_dispatcher
@@ -17,10 +17,12 @@ from . import __version__
 from ._errors_action_server import ActionServerValidationError
 from ._protocols import (
     ArgumentsNamespace,
+    ArgumentsNamespaceAnalytics,
     ArgumentsNamespaceBaseImportOrStart,
     ArgumentsNamespaceDatadir,
     ArgumentsNamespaceDownloadRcc,
     ArgumentsNamespaceImport,
+    ArgumentsNamespaceMigrate,
     ArgumentsNamespaceRequiringDatadir,
     ArgumentsNamespaceStart,
 )
@@ -165,6 +167,331 @@ def _add_start_server_command(command_parser, defaults):
         ),
     )
 
+    start_parser.add_argument(
+        "--package-processes",
+        help=(
+            "By default the warm processes (--min-processes) are split among the "
+            "action packages based on the observed demand. This can be used to "
+            "override the minimum/maximum number of warm processes of an action "
+            "package. Format: `<package_name>=<min>:<max>` (multiple entries can "
+            "be separated by `,` and either `min` or `max` may be empty)."
+        ),
+        default="",
+    )
+
+    start_parser.add_argument(
+        "--worker-start-mode",
+        choices=["spawn", "zygote"],
+        help=(
+            "How new processes to run actions are started. `spawn` launches a new "
+            "python interpreter for each process. `zygote` (Linux only) launches "
+            "one template process per action package environment which preloads "
+            "the needed modules and new processes are forked from it "
+            "(default: %(default)s)."
+        ),
+        default="spawn",
+    )
+
+    start_parser.add_argument(
+        "--worker-transport",
+        choices=["tcp", "unix"],
+        help=(
+            "How the action server communicates with the processes which run "
+            "actions. `tcp` uses a loopback TCP connection. `unix` (not available "
+            "on Windows) uses a unix socket pair which is inherited by the "
+            "process (default: %(default)s)."
+        ),
+        default="tcp",
+    )
+
+    start_parser.add_argument(
+        "--worker-framing",
+        choices=["auto", "binary-msgpack", "binary-json", "headers"],
+        help=(
+            "How the messages exchanged with the processes which run actions are "
+            "framed. `auto` uses the fastest framing available in both the action "
+            "server and the action package environment (`binary-msgpack` requires "
+            "`msgspec` or `msgpack` in the environment, otherwise `binary-json` is "
+            "used). `headers` uses http-style headers (default: %(default)s)."
+        ),
+        default="auto",
+    )
+
+    start_parser.add_argument(
+        "--worker-output-echo",
+        choices=["on", "off", "limited"],
+        help=(
+            "Whether the output of the processes which run actions is also "
+            "printed to the console (it's always available in the output of "
+            "the run). `limited` prints at most 20 lines per second for each "
+            "process (default: %(default)s)."
+        ),
+        default="on",
+    )
+
+    start_parser.add_argument(
+        "--max-queue-depth",
+        type=int,
+        help=(
+            "The maximum number of runs which may wait for a process when "
+            "--max-processes actions are already running (0 means no limit). "
+            "When the queue is full new requests are rejected with a 429 status "
+            "code (with a `Retry-After` header)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--max-queue-wait",
+        type=float,
+        help=(
+            "The maximum time (in seconds) that a run may wait for a process "
+            "(0 means no limit). When elapsed the run is rejected with a 503 "
+            "status code (with a `Retry-After` header)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--max-process-runs",
+        type=int,
+        help=(
+            "When --reuse-processes is used, a process is recycled (replaced by a "
+            "new one) after running the given number of actions (0 means no limit)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--max-process-rss",
+        type=int,
+        help=(
+            "When --reuse-processes is used, a process is recycled (replaced by a "
+            "new one) when its memory usage (RSS in MB, checked after each run) "
+            "goes over the given value (0 means no limit)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--max-process-age",
+        type=float,
+        help=(
+            "When --reuse-processes is used, a process is recycled (replaced by a "
+            "new one) after it's alive for the given number of seconds (checked "
+            "after each run, 0 means no limit)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--inline-payload-threshold",
+        type=int,
+        help=(
+            "Inputs and results of runs up to this size (in characters of the "
+            "json contents) are passed directly to/from the process which runs "
+            "the action instead of being written to files in the run artifacts "
+            "(0 means that files are always used). Note: files are always used "
+            "if the `x-action-artifacts` header is set in the request "
+            "(default: %(default)s)."
+        ),
+        default=256 * 1024,
+    )
+
+    start_parser.add_argument(
+        "--schema-validator",
+        choices=["jsonschema", "fast"],
+        help=(
+            "How the inputs and outputs of actions are validated against their "
+            "schemas. `fast` generates code for schemas which only use objects, "
+            "primitives, arrays and enums (other schemas are still validated "
+            "with `jsonschema`) (default: %(default)s)."
+        ),
+        default="jsonschema",
+    )
+
+    start_parser.add_argument(
+        "--run-orchestration",
+        choices=["threads", "asyncio"],
+        help=(
+            "How runs are orchestrated. `asyncio` waits for a process and for "
+            "the action to finish in the event loop instead of using a thread "
+            "for each run in progress (default: %(default)s)."
+        ),
+        default="threads",
+    )
+
+    start_parser.add_argument(
+        "--result-cache-size",
+        type=int,
+        help=(
+            "Maximum number of results kept in the result cache for actions "
+            "which are explicitly not consequential (0 means the cache is "
+            "disabled) (default: %(default)s)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--result-cache-ttl",
+        type=float,
+        help=(
+            "Default time to live (in seconds) of cached results for actions "
+            "which are explicitly not consequential and don't have a specific "
+            "configuration (0 means only the actions configured in the "
+            "`package.yaml` or in the action options are cached) "
+            "(default: %(default)s)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--coalesce-runs",
+        action="store_true",
+        help=(
+            "When a run of an action which is explicitly not consequential is in "
+            "flight, requests for the same action with the same inputs wait for it "
+            "and reuse its outcome instead of starting a new run (each request "
+            "still has its own run, which points to the run whose outcome was "
+            "reused)."
+        ),
+    )
+
+    start_parser.add_argument(
+        "--batch-parallelism",
+        type=int,
+        help=(
+            "Maximum number of items of a batch (sent to "
+            "`/api/actions/{package}/{action}/run-batch`) which run at the same "
+            "time. A request may ask for less with the `parallelism` query "
+            "parameter (default: %(default)s)."
+        ),
+        default=4,
+    )
+
+    start_parser.add_argument(
+        "--callback-max-attempts",
+        type=int,
+        help=(
+            "Maximum number of attempts to deliver the result of an async run to "
+            "its callback url (`x-actions-async-callback`). Failed attempts are "
+            "retried with exponential backoff (default: %(default)s)."
+        ),
+        default=10,
+    )
+
+    start_parser.add_argument(
+        "--callback-max-per-host",
+        type=int,
+        help=(
+            "Maximum number of callbacks (`x-actions-async-callback`) posted at "
+            "the same time to the same host (default: %(default)s)."
+        ),
+        default=4,
+    )
+
+    start_parser.add_argument(
+        "--artifacts-mode",
+        choices=["persistent", "lightweight"],
+        help=(
+            "How the files of runs (inputs, result, output and logs) are stored. "
+            "`lightweight` stages them in `--artifacts-staging-dir` and only "
+            "persists them in the artifacts directory when the run fails, when "
+            "the run is sampled (`--artifacts-sample-rate`) or when requested "
+            "with the `x-action-artifacts` header (default: %(default)s)."
+        ),
+        default="persistent",
+    )
+
+    start_parser.add_argument(
+        "--artifacts-staging-dir",
+        help=(
+            "Directory where the files of runs are staged in the lightweight "
+            "artifacts mode (default: `/dev/shm` if available, otherwise the "
+            "temporary directory)."
+        ),
+        default="",
+    )
+
+    start_parser.add_argument(
+        "--artifacts-sample-rate",
+        type=float,
+        help=(
+            "Fraction (0 to 1) of the runs whose files are always persisted in "
+            "the lightweight artifacts mode (default: %(default)s)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--db-group-commit-delay",
+        type=float,
+        help=(
+            "Time (in milliseconds) to wait for more writes of runs to be "
+            "batched in the same database transaction (0 means that only the "
+            "writes queued while the previous transaction is committed are "
+            "batched) (default: %(default)s)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--runs-max-age",
+        type=float,
+        help=(
+            "Finished runs which started more than the given number of days ago "
+            "are removed along with their artifacts (0 means no limit; may be "
+            "overridden with `retention.max-age` in the package.yaml) "
+            "(default: %(default)s)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--runs-max-count",
+        type=int,
+        help=(
+            "Max number of finished runs kept per action package (older runs are "
+            "removed along with their artifacts; 0 means no limit; may be "
+            "overridden with `retention.max-runs` in the package.yaml) "
+            "(default: %(default)s)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--runs-max-artifacts-size",
+        type=float,
+        help=(
+            "Max size (in MB) of the artifacts of the finished runs kept per action "
+            "package (older runs are removed along with their artifacts; 0 means "
+            "no limit; may be overridden with `retention.max-artifacts-size` in "
+            "the package.yaml) (default: %(default)s)."
+        ),
+        default=0,
+    )
+
+    start_parser.add_argument(
+        "--retention-interval",
+        type=float,
+        help=(
+            "Time (in seconds) between the checks for runs to be removed based on "
+            "the retention policies (default: %(default)s)."
+        ),
+        default=300,
+    )
+
+    start_parser.add_argument(
+        "--runs-analytics-max-age",
+        type=float,
+        help=(
+            "The rollups of the runs used for the analytics (see: "
+            "`action-server analytics`) are kept for the given number of days "
+            "(0 means they're kept forever) (default: %(default)s)."
+        ),
+        default=30,
+    )
+
     start_parser.add_argument(
         "--full-openapi-spec",
         action="store_true",
@@ -244,6 +571,17 @@ def _add_migrate_command(command_subparser, defaults):
         "migrate",
         help="Makes a database migration (if needed) and exits",
     )
+    migration_parser.add_argument(
+        "--vacuum",
+        action="store_true",
+        help=(
+            "Also enables the incremental vacuum in the database (so that the "
+            "space freed by the retention of runs is reclaimed). Databases "
+            "created by older versions need a full VACUUM for that (one time "
+            "operation which may take a while and needs free disk space about "
+            "the size of the database)."
+        ),
+    )
     add_data_args(migration_parser, defaults)
     _add_kill_lock_holder_args(migration_parser, defaults)
     add_verbose_args(migration_parser, defaults)
@@ -414,6 +752,52 @@ def _add_datadir_command(command_subparser, defaults):
     add_verbose_args(clear_actions_parser, defaults)
 
 
+def _add_analytics_command(command_subparser, defaults):
+    from sema4ai.action_server._cli_helpers import (
+        add_data_args,
+        add_json_output_args,
+        add_verbose_args,
+    )
+
+    analytics_parser = command_subparser.add_parser(
+        "analytics",
+        help=(
+            "Shows the analytics of the runs of each action (run time and "
+            "queue wait percentiles, error rate and throughput)"
+        ),
+    )
+
+    analytics_parser.add_argument(
+        "--window",
+        default="24h",
+        help=(
+            "The time window to consider, such as 30m, 24h or 7d "
+            "(default: %(default)s)."
+        ),
+    )
+    analytics_parser.add_argument(
+        "--step",
+        default=None,
+        help=(
+            "If given, the window is split in intervals of this size, such as "
+            "1h (default: %(default)s)."
+        ),
+    )
+    analytics_parser.add_argument(
+        "--action",
+        default=None,
+        help=(
+            "Only show the analytics of the given action "
+            "(its name or `<action package name>/<action name>`) "
+            "(default: %(default)s)."
+        ),
+    )
+
+    add_data_args(analytics_parser, defaults)
+    add_json_output_args(analytics_parser)
+    add_verbose_args(analytics_parser, defaults)
+
+
 def _create_parser():
     from sema4ai.action_server.package._package_build_cli import add_package_command
 
@@ -495,6 +879,7 @@ def _create_parser():
     _add_oauth2_command(command_subparser, defaults)
     _add_devenv_command(command_subparser, defaults)
     _add_datadir_command(command_subparser, defaults)
+    _add_analytics_command(command_subparser, defaults)
 
     return base_parser
 
@@ -689,6 +1074,13 @@ def _main_retcode(
             log.debug(f"Arguments: {subprocess.list2cmdline(sys.argv)}")
             log.debug(f"CWD: {os.path.abspath(os.getcwd())}")
 
+    if command == "analytics":
+        from ._analytics_commands import handle_analytics_command
+
+        return handle_analytics_command(
+            typing.cast(ArgumentsNamespaceAnalytics, base_args)
+        )
+
     from ._download_rcc import download_rcc
 
     if command == "download-rcc":
@@ -860,6 +1252,11 @@ def _command_requiring_datadir(
                 return 1
             if not migrate_db(db_path):
                 return 1
+            if typing.cast(ArgumentsNamespaceMigrate, base_args).vacuum:
+                from ._runs_retention import enable_incremental_vacuum
+
+                with use_db_ctx(db_path) as db:
+                    enable_incremental_vacuum(db)
             return 0
         else:
             if not is_new:
@@ -949,7 +1346,7 @@ information from this datadir.
                                     f"Run {run.id} marked as cancelled in Action Server Start (when the Action Server was last shutdown its state was: '{current_status_str}')"
                                 )
                             run.status = RunStatus.CANCELLED
-                            db.update(run, "status", "error_message")
+                        db.update_many(runs_to_cancel, "status", "error_message")
 
                 with use_runs_state_ctx(db):
                     from ._server import start_server
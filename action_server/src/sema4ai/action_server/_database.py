@@ -1,16 +1,20 @@
 import datetime
 import itertools
 import logging
+import operator
 import re
 import sqlite3
 import sys
 import threading
+import time
 from contextlib import closing, contextmanager
 from pathlib import Path
 from types import NoneType
 from typing import (
     Any,
+    Callable,
     Dict,
+    Iterable,
     Iterator,
     List,
     Optional,
@@ -56,6 +60,117 @@ class DBError(Exception):
     pass
 
 
+# Pragmas applied to each new connection (the WAL journal mode enables readers
+# to proceed while a write is in progress).
+_CONNECTION_PRAGMAS = (
+    # Only has effect for new databases (must be set before the journal mode
+    # is changed or tables are created), so that the space freed by the
+    # retention of runs may be reclaimed incrementally.
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    # In WAL mode `NORMAL` is still safe against corruption (a commit may
+    # only be rolled back on a power loss).
+    "PRAGMA synchronous = NORMAL",
+    # Negative means KiB (so, 8 MiB of page cache per connection).
+    "PRAGMA cache_size = -8000",
+    "PRAGMA mmap_size = 268435456",
+)
+
+# Number of prepared statements cached by each connection (the sql of the
+# statements to insert/update/select is always the same for a given class,
+# so, those are prepared only once per connection).
+_CACHED_STATEMENTS = 256
+
+# Max number of idle connections kept in the pool.
+DEFAULT_POOL_MAX_IDLE = 8
+
+# Idle connections are closed after this time (in seconds).
+DEFAULT_POOL_IDLE_TIMEOUT = 60.0
+
+
+class _ConnectionPool:
+    """
+    Keeps the connections which are not in use so that they can be reused
+    by later calls to `Database.connect()`.
+
+    A thread gets back the connection it last released when it's still idle
+    (otherwise the connection most recently released by some other thread
+    is used). Connections idle for more than `idle_timeout` seconds are
+    closed and at most `max_idle` connections are kept.
+    """
+
+    def __init__(
+        self,
+        create_connection,
+        max_idle: int = DEFAULT_POOL_MAX_IDLE,
+        idle_timeout: float = DEFAULT_POOL_IDLE_TIMEOUT,
+    ):
+        self._create_connection = create_connection
+        self._max_idle = max_idle
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # thread ident -> (connection, time released). Dicts keep the insertion
+        # order, so, the last entry is the most recently released one.
+        self._idle: Dict[int, Tuple[sqlite3.Connection, float]] = {}
+
+    def acquire(self) -> sqlite3.Connection:
+        thread_ident = threading.get_ident()
+        with self._lock:
+            to_close = self._pop_expired()
+            entry = self._idle.pop(thread_ident, None)
+            if entry is None and self._idle:
+                entry = self._idle.pop(next(reversed(self._idle)))
+        self._close_all(to_close)
+
+        if entry is not None:
+            return entry[0]
+        return self._create_connection()
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            # Should not really happen (transactions are always finished
+            # in `Database.transaction()`), but don't reuse it if it does.
+            self._close_all([conn])
+            return
+
+        thread_ident = threading.get_ident()
+        with self._lock:
+            to_close = self._pop_expired()
+            previous = self._idle.pop(thread_ident, None)
+            if previous is not None:
+                to_close.append(previous[0])
+            self._idle[thread_ident] = (conn, time.monotonic())
+            while len(self._idle) > self._max_idle:
+                to_close.append(self._idle.pop(next(iter(self._idle)))[0])
+        self._close_all(to_close)
+
+    def close(self) -> None:
+        with self._lock:
+            to_close = [conn for conn, _released in self._idle.values()]
+            self._idle.clear()
+        self._close_all(to_close)
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+    def _pop_expired(self) -> List[sqlite3.Connection]:
+        # Note: must be called with the lock held.
+        expire_before = time.monotonic() - self._idle_timeout
+        expired = [
+            thread_ident
+            for thread_ident, (_conn, released) in self._idle.items()
+            if released < expire_before
+        ]
+        return [self._idle.pop(thread_ident)[0] for thread_ident in expired]
+
+    def _close_all(self, connections: List[sqlite3.Connection]) -> None:
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                log.exception("Error closing database connection.")
+
+
 class DBRules:
     def __init__(self) -> None:
         # Fields which should have unique indexes in the format:
@@ -70,6 +185,139 @@ class DBRules:
         # "Class.field_name"
         self.foreign_keys: Set[str] = set()
 
+        # Indexes on multiple fields in the format:
+        # ("Class.field_name1", "Class.field_name2", ...)
+        self.composite_indexes: Set[Tuple[str, ...]] = set()
+
+
+def _is_bool_type(field_cls: Any) -> bool:
+    if field_cls is bool:
+        return True
+    # i.e.: Optional[bool]
+    args = getattr(field_cls, "__args__", ())
+    return bool in args and all(arg in (bool, NoneType) for arg in args)
+
+
+def _to_bool(value: Any) -> Optional[bool]:
+    # Booleans are stored as integers (0/1).
+    if value is None:
+        return None
+    return bool(value)
+
+
+def _make_values_getter(names: Sequence[str]) -> Callable[[Any], tuple]:
+    """
+    Provides a function which gets the values of the given attributes of an
+    instance (always as a tuple).
+    """
+    if len(names) == 1:
+        name = names[0]
+        return lambda instance: (getattr(instance, name),)
+    return operator.attrgetter(*names)
+
+
+class _TableInfo:
+    """
+    Information on a class stored in the database which is computed only once
+    (the sql of the statements and how to get the values from instances or to
+    create instances from rows).
+    """
+
+    def __init__(self, cls: type, type_hints: dict) -> None:
+        self.cls = cls
+        self.table_name = _make_table_name(cls)
+        self.field_names: Tuple[str, ...] = tuple(type_hints.keys())
+
+        self.select_sql = f"SELECT * FROM {self.table_name}"
+        self.insert_sql = f"""
+INSERT INTO {self.table_name}
+    ({", ".join(self.field_names)})
+VALUES
+    ({", ".join("?" for _ in self.field_names)})
+"""
+        self.get_values = _make_values_getter(self.field_names)
+
+        # (set fields, where fields) -> (sql, values getter)
+        self._update_statements: Dict[
+            Tuple[Tuple[str, ...], Tuple[str, ...]],
+            Tuple[str, Callable[[Any], tuple]],
+        ] = {}
+
+        self._from_row = self._make_from_row(type_hints)
+
+    def update_statement(
+        self, set_fields: Sequence[str], where_fields: Sequence[str]
+    ) -> Tuple[str, Callable[[Any], tuple]]:
+        """
+        Returns:
+            The sql to update the `set_fields` of a row matching the
+            `where_fields` and a function to get the values for it from an
+            instance.
+        """
+        key = (tuple(set_fields), tuple(where_fields))
+        try:
+            return self._update_statements[key]
+        except KeyError:
+            pass
+
+        for name in itertools.chain(*key):
+            if name not in self.field_names:
+                raise DBError(f"{self.cls.__name__} has no field named: {name}")
+
+        set_sql = ", ".join(f"{name}=?" for name in key[0])
+        where_sql = " AND ".join(f"{name}=?" for name in key[1])
+        statement = (
+            f"UPDATE {self.table_name} SET {set_sql} WHERE {where_sql}",
+            _make_values_getter(key[0] + key[1]),
+        )
+        self._update_statements[key] = statement
+        return statement
+
+    def _make_from_row(self, type_hints: dict) -> Callable[[Sequence[Any]], Any]:
+        """
+        Creates the function which creates an instance from a row (converting
+        the values which aren't stored with the same type -- i.e.: booleans
+        are stored as integers).
+        """
+        cls = self.cls
+        converters: Tuple[Tuple[int, Callable[[Any], Any]], ...] = ()
+        if not hasattr(cls, "__pydantic_validator__"):
+            # Note: pydantic dataclasses already convert the values when
+            # validating them in the constructor.
+            converters = tuple(
+                (i, _to_bool)
+                for i, field_cls in enumerate(type_hints.values())
+                if _is_bool_type(field_cls)
+            )
+        if not converters:
+            return lambda row: cls(*row)
+
+        def from_row(row: Sequence[Any]) -> Any:
+            values = list(row)
+            for i, convert in converters:
+                values[i] = convert(values[i])
+            return cls(*values)
+
+        return from_row
+
+    def _check_row(self, row: Sequence[Any]) -> None:
+        if len(row) != len(self.field_names):
+            raise DBError(
+                f"The {self.table_name} table has {len(row)} columns "
+                f"(expected {len(self.field_names)}: {', '.join(self.field_names)})."
+            )
+
+    def from_row(self, row: Sequence[Any]) -> Any:
+        self._check_row(row)
+        return self._from_row(row)
+
+    def from_rows(self, rows: List[Sequence[Any]]) -> List[Any]:
+        if not rows:
+            return []
+        self._check_row(rows[0])
+        from_row = self._from_row
+        return [from_row(row) for row in rows]
+
 
 class Database:
     """
@@ -81,12 +329,23 @@ class Database:
         single thread for writing).
 
         This class makes it so that there's only one connection per thread.
+
+        Connections are kept in a pool (while some `connect()` is active)
+        so that they're reused instead of being created for each
+        `connect()`. The database is used in WAL mode, so, reads (which
+        don't hold the write-lock) may happen while a write is in progress.
     """
 
     verbose = 0
 
-    def __init__(self, db_path: Optional[Union[Path, str]] = None):
+    def __init__(
+        self,
+        db_path: Optional[Union[Path, str]] = None,
+        pool_max_idle: int = DEFAULT_POOL_MAX_IDLE,
+        pool_idle_timeout: float = DEFAULT_POOL_IDLE_TIMEOUT,
+    ):
         self._cls_to_type_hint: Dict[type, dict] = {}
+        self._cls_to_table_info: Dict[type, _TableInfo] = {}
         if not db_path:
             from ._settings import get_settings
 
@@ -100,6 +359,20 @@ class Database:
         self._write_lock = threading.RLock()
         self._classes: List[type] = []
 
+        # Each connection to an in-memory database is a different database,
+        # so, those aren't pooled.
+        self._in_memory = str(self._db_path) == ":memory:"
+        self._pool = _ConnectionPool(
+            self._create_connection,
+            max_idle=0 if self._in_memory else pool_max_idle,
+            idle_timeout=pool_idle_timeout,
+        )
+        # The number of `connect()` calls active (when it reaches 0 all the
+        # connections in the pool are closed so that the database file isn't
+        # kept open after it's no longer used).
+        self._active_connections = 0
+        self._active_connections_lock = threading.Lock()
+
     @property
     def db_path(self) -> Path:
         return self._db_path
@@ -117,6 +390,14 @@ class Database:
             self._cls_to_type_hint[cls] = ret
             return ret
 
+    def _get_table_info(self, cls) -> _TableInfo:
+        try:
+            return self._cls_to_table_info[cls]
+        except KeyError:
+            ret = _TableInfo(cls, self._get_type_hints(cls))
+            self._cls_to_table_info[cls] = ret
+            return ret
+
     def _iter_name_and_name_cls_fields(self, cls) -> Iterator[Tuple[str, type]]:
         yield from self._get_type_hints(cls).items()
 
@@ -134,13 +415,40 @@ class Database:
             yield
             return
 
-        with closing(sqlite3.connect(self._db_path, isolation_level=None)) as conn:
-            conn.execute("PRAGMA foreign_keys = ON")
+        with self._active_connections_lock:
+            self._active_connections += 1
+        try:
+            conn = self._pool.acquire()
             self._tlocal.conn = conn
             try:
                 yield
             finally:
                 self._tlocal.conn = None
+                self._pool.release(conn)
+        finally:
+            with self._active_connections_lock:
+                self._active_connections -= 1
+                if self._active_connections == 0:
+                    self._pool.close()
+
+    def _create_connection(self) -> sqlite3.Connection:
+        # The connection may be reused by a different thread later on (but
+        # it's only used by one thread at a time).
+        conn = sqlite3.connect(
+            self._db_path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=_CACHED_STATEMENTS,
+        )
+        try:
+            if not self._in_memory:
+                for pragma in _CONNECTION_PRAGMAS:
+                    conn.execute(pragma)
+            conn.execute("PRAGMA foreign_keys = ON")
+        except BaseException:
+            conn.close()
+            raise
+        return conn
 
     def _next_savepoint_name(self):
         return f"savepoint_{next(self._counter)}"
@@ -221,13 +529,21 @@ class Database:
                 # Nested transactions are not supported, so, don't start a new one
                 # here, but we can still use savepoints.
                 self._tlocal.in_transaction += 1
+                rollback_callbacks = self._tlocal.rollback_callbacks
+                rollback_callbacks.append([])
                 savepoint_name = self._next_savepoint_name()
                 self.execute(f"savepoint {savepoint_name};")
                 try:
                     yield
                 except BaseException:
                     self.execute(f"rollback to savepoint {savepoint_name};")
+                    self._call_rollback_callbacks(rollback_callbacks.pop())
                     raise
+                else:
+                    # If the savepoint is released, a rollback of the outer
+                    # transaction also rolls back what was done here.
+                    callbacks = rollback_callbacks.pop()
+                    rollback_callbacks[-1].extend(callbacks)
                 finally:
                     self._tlocal.in_transaction -= 1
                 return
@@ -237,21 +553,44 @@ class Database:
             ), "Error transaction nesting logic not correct!"
 
             self._tlocal.in_transaction += 1
+            self._tlocal.rollback_callbacks = [[]]
             try:
                 self.execute("BEGIN")
                 yield
             except BaseException:
                 log.exception("Error. Rolling back database")
                 conn.rollback()
+                self._call_rollback_callbacks(self._tlocal.rollback_callbacks[0])
                 raise
             else:
                 conn.commit()
             finally:
+                self._tlocal.rollback_callbacks = None
                 self._tlocal.in_transaction -= 1
                 assert (
                     self._tlocal.in_transaction == 0
                 ), "Error transaction nesting logic not correct!"
 
+    def on_rollback(self, callback: Callable[[], None]) -> None:
+        """
+        Registers a callback to be called if the current transaction (or
+        savepoint) is rolled back (i.e.: to restore some state kept in memory
+        which was changed along with the database).
+
+        Note: must be called in a transaction.
+        """
+        rollback_callbacks = getattr(self._tlocal, "rollback_callbacks", None)
+        if not rollback_callbacks:
+            raise DBError("on_rollback must be called in a transaction.")
+        rollback_callbacks[-1].append(callback)
+
+    def _call_rollback_callbacks(self, callbacks: List[Callable[[], None]]) -> None:
+        for callback in reversed(callbacks):
+            try:
+                callback()
+            except Exception:
+                log.exception("Error calling rollback callback.")
+
     def where(self, instance, keys: Sequence[str]) -> tuple[str, list[Any]]:
         """
         Makes an sql which can be used in a where clause.
@@ -297,14 +636,14 @@ class Database:
         return (sql, values)
 
     def delete_where(self, cls: Type, where: str, values: list[Any]):
-        table_name = _make_table_name(cls)
+        table_name = self._get_table_info(cls).table_name
         self.execute(f"DELETE FROM {table_name} WHERE {where}", values)
 
     def delete(self, instance, keys: Sequence[str]):
         """
         Deletes the given instance from the db given the keys given.
         """
-        table_name = _make_table_name(instance.__class__)
+        table_name = self._get_table_info(instance.__class__).table_name
         sql, values = self.where(instance, keys)
 
         self.execute(f"DELETE FROM {table_name} WHERE {sql}", values)
@@ -313,7 +652,7 @@ class Database:
         """
         Updates database values from some instance given its id.
         """
-        table_name = _make_table_name(instance.__class__)
+        table_name = self._get_table_info(instance.__class__).table_name
 
         where, values = self.where(instance, keys)
         sql = f"SELECT * FROM {table_name} WHERE {where}"
@@ -334,24 +673,39 @@ class Database:
             fields: The name of the fields that should be updated
                     (only the selected fields will be updated).
         """
-        fields_dict: dict[str, Any] = {}
-        for field in fields:
-            fields_dict[field] = getattr(instance, field)
-        self.update_by_id(instance.__class__, instance.id, fields_dict)
+        sql, get_values = self._get_table_info(instance.__class__).update_statement(
+            fields, ("id",)
+        )
+        self.execute(sql, list(get_values(instance)))
+
+    def update_many(self, instances: Iterable[Any], *fields: str):
+        """
+        Updates database values from the given instances given their ids
+        (with a single statement executed for all the instances of a class).
+
+        Args:
+            fields: The name of the fields that should be updated
+                    (only the selected fields will be updated).
+        """
+        for cls, instances_of_cls in itertools.groupby(
+            instances, key=lambda instance: instance.__class__
+        ):
+            sql, get_values = self._get_table_info(cls).update_statement(
+                fields, ("id",)
+            )
+            self.executemany(
+                sql, [get_values(instance) for instance in instances_of_cls]
+            )
 
     def update_by_id(self, cls: Type, id: Any, fields: dict[str, Any]):
         """
         Updates database values from some instance given its id.
         """
-        table_name = _make_table_name(cls)
-        set_fields = []
-        values = []
-        for name, value in fields.items():
-            set_fields.append(f"{name}=?")
-            values.append(value)
-
+        sql, _get_values = self._get_table_info(cls).update_statement(
+            tuple(fields.keys()), ("id",)
+        )
+        values = list(fields.values())
         values.append(id)
-        sql = f"UPDATE {table_name} SET {', '.join(set_fields)} WHERE id=?"
         self.execute(sql, values)
 
     def update_by_fields(self, instance, keys: Sequence[str]):
@@ -362,52 +716,35 @@ class Database:
             instance: The instance with the values to be update.
             keys: The keys for which the values should be updated.
         """
-
-        set_placeholders: list[str] = []
-        set_values = []
-
-        where_placeholders: list[str] = []
-        where_values = []
-
-        for name, _field_cls in self._iter_name_and_name_cls_fields(instance.__class__):
-            if name in keys:
-                where_placeholders.append(f"{name}=?")
-                where_values.append(getattr(instance, name))
-            else:
-                set_placeholders.append(f"{name}=?")
-                set_values.append(getattr(instance, name))
-
-        table_name = _make_table_name(instance.__class__)
-
-        sql = f"UPDATE {table_name} SET {', '.join(set_placeholders)} WHERE {' AND '.join(where_placeholders)}"
-        self.execute(sql, set_values + where_values)
+        table_info = self._get_table_info(instance.__class__)
+        sql, get_values = table_info.update_statement(
+            [name for name in table_info.field_names if name not in keys],
+            [name for name in table_info.field_names if name in keys],
+        )
+        self.execute(sql, list(get_values(instance)))
 
     def insert(
         self,
         instance,
     ) -> None:
-        table_name = _make_table_name(instance.__class__)
+        table_info = self._get_table_info(instance.__class__)
+        self.execute(table_info.insert_sql, list(table_info.get_values(instance)))
 
-        field_names = []
-        values = []
-        placeholders = []
-        for name in self._iter_name_fields(instance.__class__):
-            field_names.append(name)
-            values.append(getattr(instance, name))
-            placeholders.append("?")
-
-        fields_str = ", ".join(field_names)
-        placeholders_str = ", ".join(placeholders)
-
-        self.execute(
-            f"""
-INSERT INTO {table_name}
-    ({fields_str})
-VALUES
-    ({placeholders_str})
-""",
-            values,
-        )
+    def insert_many(self, instances: Iterable[Any]) -> None:
+        """
+        Inserts the given instances (with a single statement executed for the
+        consecutive instances of the same class, so, the insertion order is
+        kept).
+        """
+        for cls, instances_of_cls in itertools.groupby(
+            instances, key=lambda instance: instance.__class__
+        ):
+            table_info = self._get_table_info(cls)
+            get_values = table_info.get_values
+            self.executemany(
+                table_info.insert_sql,
+                [get_values(instance) for instance in instances_of_cls],
+            )
 
     def all(
         self,
@@ -419,13 +756,16 @@ VALUES
         where: Optional[str] = None,
         values: Optional[list] = None,
     ) -> List[T]:
-        table_name = _make_table_name(cls)
+        table_info = self._get_table_info(cls)
         if limit is not None:
             assert isinstance(limit, int)
         if offset is not None:
             assert isinstance(offset, int)
 
-        sql = f"SELECT * FROM {table_name}"
+        sql = table_info.select_sql
+
+        if where:
+            sql += f" WHERE {where}"
 
         if order_by:
             # Careful: users cannot provide this as it's susceptible to
@@ -436,17 +776,17 @@ VALUES
             sql += f" LIMIT {limit}"
 
         if offset:
+            if not limit:
+                # OFFSET is only valid after a LIMIT (-1 means no limit).
+                sql += " LIMIT -1"
             sql += f" OFFSET {offset}"
 
-        if where:
-            sql += f" WHERE {where}"
-
         return self.select(cls, sql, values)
 
     def select(self, cls: Type[T], sql: str, values: Optional[list] = None):
         with self.cursor() as cursor:
             self.execute_query(cursor, sql, values)
-            return [cls(*x) for x in cursor.fetchall()]
+            return self._get_table_info(cls).from_rows(cursor.fetchall())
 
     def first(
         self,
@@ -475,16 +815,16 @@ VALUES
         Raises:
             KeyError if no entries were returned in the query.
         """
+        table_info = self._get_table_info(cls)
         if not query:
-            table_name = _make_table_name(cls)
-            query = f"SELECT * FROM {table_name}"
+            query = table_info.select_sql
 
         with self.cursor() as cursor:
             self.execute_query(cursor, query, values=values)
             one = cursor.fetchone()
             if one is None:
                 raise KeyError("Query returned no entries.")
-            return cls(*one)
+            return table_info.from_row(one)
 
     def list_table_names(self) -> List[str]:
         with self.cursor() as cursor:
@@ -662,6 +1002,31 @@ ORDER BY index_name,il.seq,ii.seqno""",
                 f"Error running sql: {sql!r} with values: {values!r}"
             )
 
+    def executemany(self, sql: str, values: Sequence[Sequence[Any]]) -> None:
+        """
+        Executes a statement which will change the database for each of the
+        given values.
+
+        Requires the write-lock to be acquired since SQLite can't deal with
+        writes in multiple threads concurrently.
+        """
+        if self.verbose:
+            self._print_sql(sql, list(values))
+        try:
+            if not self.in_transaction():
+                raise DBError(
+                    "When running an sql that changes the DB, it's expected that "
+                    "a transaction is in place."
+                )
+            conn = self._tlocal.conn
+            assert conn is not None
+            with self._write_lock:
+                conn.executemany(sql, values)
+        except Exception:
+            self._raise_execute_error(
+                f"Error running sql: {sql!r} with values: {values!r}"
+            )
+
     def register_classes(self, classes: List[Type]) -> None:
         if self._table_name_to_cls:
             values = set(self._table_name_to_cls.values())
@@ -696,6 +1061,7 @@ ORDER BY index_name,il.seq,ii.seqno""",
 
             sqls.extend(self.create_unique_indexes_sql(cls, db_rules))
             sqls.extend(self.create_non_unique_indexes_sql(cls, db_rules))
+            sqls.extend(self.create_composite_indexes_sql(cls, db_rules))
 
         with self.connect():
             with self.transaction():
@@ -736,6 +1102,24 @@ CREATE INDEX {table_name}_{column}_non_unique_index ON {table_name}({column});
             ret.append(sql)
         return ret
 
+    def create_composite_indexes_sql(self, cls: Type, db_rules: DBRules) -> List[str]:
+        table_name = _make_table_name(cls)
+
+        ret: List[str] = []
+        for fields in sorted(db_rules.composite_indexes):
+            columns: List[str] = []
+            for field_full_name in fields:
+                cls_name, name = field_full_name.split(".", 1)
+                if cls_name != cls.__name__:
+                    break
+                columns.append(name)
+            else:
+                sql = f"""
+CREATE INDEX {table_name}_{'_'.join(columns)}_composite_index ON {table_name}({', '.join(columns)});
+"""
+                ret.append(sql)
+        return ret
+
     def create_table_sql(self, cls: Type, db_rules: DBRules) -> str:
         table_name = _make_table_name(cls)
 
@@ -0,0 +1,205 @@
+"""
+Group commit of the writes done for runs (creation and status updates).
+
+Instead of each run thread starting its own transaction (and waiting for the
+write-lock and for the commit) the writes are queued and a single writer
+thread applies all the writes queued at the time in one transaction (each
+write in its own savepoint, so, a failing write doesn't affect the others).
+
+- Writes may be durable (the caller waits until the transaction with the
+  write is committed and gets any error raised by it) or not (the caller
+  just queues it).
+- The `on_committed` callback of a write (i.e.: notifying the `RunsState`) is
+  called in the writer thread after the transaction is committed (and before
+  durable callers are released).
+- Writes are applied in the order in which they're queued.
+- `--db-group-commit-delay` (in milliseconds) makes the writer wait before
+  committing so that more writes are batched (by default only the writes
+  queued while the previous transaction was being committed are batched).
+"""
+
+import logging
+import queue
+import threading
+import time
+import typing
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+if typing.TYPE_CHECKING:
+    from ._database import Database
+    from ._settings import Settings
+
+log = logging.getLogger(__name__)
+
+# Max number of writes applied in a single transaction.
+_MAX_BATCH_SIZE = 256
+
+# Put in the queue to stop the writer.
+_STOP = object()
+
+_Write = Tuple[Callable[[], None], Optional[Callable[[], None]], Optional[Future]]
+
+
+class GroupCommitWriter:
+    def __init__(self, db: "Database", delay: float = 0):
+        """
+        Args:
+            delay: The time (in seconds) to wait for more writes after the
+                first write of a batch is received.
+        """
+        self._db = db
+        self._delay = delay
+        self._queue: "queue.Queue[object]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="GroupCommitWriter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Stops the writer (writes already queued are still applied).
+        """
+        self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+        # Writes queued after the writer stopped are applied here.
+        batch: List[_Write] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(typing.cast(_Write, item))
+        if batch:
+            self._apply_batch(batch)
+
+    def submit(
+        self,
+        write: Callable[[], None],
+        on_committed: Optional[Callable[[], None]] = None,
+        durable: bool = True,
+    ) -> None:
+        """
+        Queues a write to be applied in the writer thread.
+
+        Args:
+            write: Called (in a transaction) to do the write (with the
+                database connection of the writer thread).
+            on_committed: Called after the write is committed.
+            durable: If True this call only returns after the write is
+                committed (and raises the error if the write failed).
+        """
+        future: Optional[Future] = Future() if durable else None
+        self._queue.put((write, on_committed, future))
+        if future is not None:
+            future.result()
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch: List[_Write] = [typing.cast(_Write, item)]
+            if self._delay > 0:
+                time.sleep(self._delay)
+
+            while len(batch) < _MAX_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    # Apply what was already queued and exit.
+                    stop = True
+                    break
+                batch.append(typing.cast(_Write, item))
+
+            self._apply_batch(batch)
+
+    def _apply_batch(self, batch: List[_Write]) -> None:
+        db = self._db
+        errors: List[Optional[BaseException]] = []
+        try:
+            with db.connect(), db.transaction():
+                for write, _on_committed, _future in batch:
+                    try:
+                        # Nested transaction: a savepoint is used for each write.
+                        with db.transaction():
+                            write()
+                    except Exception as e:
+                        errors.append(e)
+                    else:
+                        errors.append(None)
+        except Exception as e:
+            log.exception("Error committing batch of writes.")
+            errors = [e] * len(batch)
+
+        for (_write, on_committed, future), error in zip(batch, errors):
+            if error is None and on_committed is not None:
+                try:
+                    on_committed()
+                except Exception:
+                    log.exception("Error notifying write committed.")
+
+            if future is not None:
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+            elif error is not None:
+                log.error(f"Error applying write: {error}", exc_info=error)
+
+
+_group_commit_writer: Optional[GroupCommitWriter] = None
+
+
+@contextmanager
+def setup_group_commit_writer(settings: "Settings") -> Iterator[None]:
+    global _group_commit_writer
+
+    from ._models import get_db
+
+    writer = GroupCommitWriter(get_db(), settings.db_group_commit_delay / 1000.0)
+    writer.start()
+    _group_commit_writer = writer
+    try:
+        yield
+    finally:
+        _group_commit_writer = None
+        writer.stop()
+
+
+def submit_write(
+    write: Callable[[], None],
+    on_committed: Optional[Callable[[], None]] = None,
+    durable: bool = True,
+) -> None:
+    """
+    Applies the given write in the group commit writer (if available and not
+    already in a transaction) or directly in the current thread (in which case
+    it's always durable).
+
+    Note: when applied directly, it must be called with a database connection.
+    """
+    from ._models import get_db
+
+    writer = _group_commit_writer
+    if writer is None or get_db().in_transaction():
+        # If a transaction is in place the write must be a part of it (and
+        # the write-lock is held, so, waiting for the writer would deadlock).
+        with get_db().transaction():
+            write()
+        if on_committed is not None:
+            on_committed()
+        return
+
+    writer.submit(write, on_committed, durable)
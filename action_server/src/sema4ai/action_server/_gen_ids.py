@@ -13,7 +13,11 @@ def get_counter(counter_name: Optional[str] = None):
         return _counters[counter_name]
 
 
-def gen_uuid(counter_name: Optional[Literal["action_package", "action", "run"]] = None):
+def gen_uuid(
+    counter_name: Optional[
+        Literal["action_package", "action", "run", "callback"]
+    ] = None,
+):
     if not counter_name:
         prefix = ""
     elif counter_name == "action_package":
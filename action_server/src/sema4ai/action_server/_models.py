@@ -89,6 +89,7 @@ class Run:
     _db_rules.indexes.add("Run.action_id")
 
     start_time: str  # The time that the action started running (empty means it hasn't started yet).
+    _db_rules.indexes.add("Run.start_time")
     # The time to run the action (in seconds).
     # Does not include the time the run spent queued waiting for the
     # process to be available.
@@ -105,11 +106,22 @@ class Run:
     # workspace while the other one would be global.
     numbered_id: int
     _db_rules.unique_indexes.add("Run.numbered_id")
+    # Used by the runs queries (filtered and paginated by the numbered_id).
+    _db_rules.composite_indexes.add(("Run.action_id", "Run.numbered_id"))
+    _db_rules.composite_indexes.add(("Run.status", "Run.numbered_id"))
 
     # The request id that this run is associated with (if any).
     request_id: str = ""
     _db_rules.indexes.add("Run.request_id")
 
+    # Whether the result was provided by the result cache (i.e.: the action
+    # wasn't actually run).
+    cache_hit: bool = False
+
+    # The id of the run whose outcome was reused (when identical runs in
+    # flight are coalesced).
+    leader_run_id: str = ""
+
 
 @dataclass
 class UserSession:
@@ -166,6 +178,55 @@ class OAuth2UserData:
     code_verifier: str = ""  # Data encrypted with storage key
 
 
+@dataclass
+class CallbackOutbox:  # Table name: callback_outbox
+    id: str  # primary key (uuid)
+    _db_rules.unique_indexes.add("CallbackOutbox.id")
+
+    run_id: str  # The run whose result is posted
+    url: str  # The callback url
+    body: str  # The json to be posted
+    headers: str  # The headers to be sent (as json)
+    created_at: str  # date in isoformat
+    next_attempt_at: str  # date in isoformat
+    attempts: int  # Number of delivery attempts already done
+    last_error: str = ""
+
+
+@dataclass
+class RunStats:  # Table name: run_stats
+    # Rollup of the runs of an action which finished in a time bucket
+    # (updated as runs finish, see: `_runs_analytics`).
+    id: str  # primary key ("{action_id}:{bucket_start}")
+    _db_rules.unique_indexes.add("RunStats.id")
+
+    action_id: str
+    bucket_start: str  # date in isoformat (UTC) of the start of the bucket
+    _db_rules.composite_indexes.add(("RunStats.bucket_start", "RunStats.action_id"))
+
+    runs: int
+    passed: int
+    failed: int
+    cancelled: int
+    run_time_total: float  # in seconds
+    queue_wait_total: float  # in seconds
+
+
+@dataclass
+class RunStatsBin:  # Table name: run_stats_bin
+    # Number of runs in a bin of the histogram of the run time (or of the
+    # queue wait) of the runs of a `RunStats` bucket.
+    id: str  # primary key ("{run_stats_id}:{metric}:{bin_index}")
+    _db_rules.unique_indexes.add("RunStatsBin.id")
+
+    run_stats_id: str
+    _db_rules.indexes.add("RunStatsBin.run_stats_id")
+
+    metric: int  # 0=run time, 1=queue wait
+    bin_index: int
+    count: int
+
+
 class RunStatus:
     NOT_RUN = 0
     RUNNING = 1
@@ -208,6 +269,9 @@ def get_all_model_classes():
         UserSession,
         TempUserSessionData,
         OAuth2UserData,
+        CallbackOutbox,
+        RunStats,
+        RunStatsBin,
     ]
 
 
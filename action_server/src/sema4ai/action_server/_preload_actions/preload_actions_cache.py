@@ -0,0 +1,330 @@
+"""
+Caches which are used when a worker process is reused to run multiple actions.
+
+When a process is reused, each `run_action` request would (by default) walk
+the whole action package searching for files with actions (reading the
+contents of each file to check whether it has actions), re-read the
+`pyproject.toml` and re-introspect the signature / type hints of the
+action being run.
+
+The helpers in this module keep that information cached per path (the cache
+for a path is invalidated when the mtime of any of the related files or
+directories changes).
+
+Important: this will run in the target environment and can't really import anything
+from the action server.
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Environment variable which may be used to disable the caching (i.e.: set to "0").
+ENV_WORKER_CACHE = "SEMA4AI_ACTION_SERVER_WORKER_CACHE"
+
+# Directories which are never considered when checking whether the actions
+# found in a directory changed.
+_SKIP_DIRS = frozenset(
+    (
+        ".git",
+        ".hg",
+        ".svn",
+        ".venv",
+        "venv",
+        "node_modules",
+        "__pycache__",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+    )
+)
+
+# The files which (besides `.py` files) may change which actions are collected.
+_TRACKED_FILENAMES = frozenset(("package.yaml", "pyproject.toml"))
+
+# Maximum depth when walking directories (similar to what's used when
+# collecting actions).
+_MAX_DEPTH = 10
+
+
+def is_cache_enabled() -> bool:
+    return os.environ.get(ENV_WORKER_CACHE, "1").lower() not in (
+        "0",
+        "false",
+        "f",
+        "no",
+    )
+
+
+def _stat_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def compute_mtimes_snapshot(
+    path: str, skip_dirs: Sequence[str] = ()
+) -> Dict[str, Optional[int]]:
+    """
+    Provides the mtimes of the directories and files which may affect which
+    actions are collected in the given path (a file or a directory).
+
+    Note: the mtime of a directory changes when a file is added/removed/renamed
+    in it, so, on a check it's enough to stat the paths in the snapshot
+    (there's no need to list directories again).
+    """
+    snapshot: Dict[str, Optional[int]] = {}
+    if not os.path.isdir(path):
+        snapshot[path] = _stat_mtime(path)
+        return snapshot
+
+    skip = set(os.path.normcase(os.path.normpath(p)) for p in skip_dirs)
+    base_depth = path.rstrip(os.sep).count(os.sep)
+
+    for dirpath, dirnames, filenames in os.walk(path):
+        snapshot[dirpath] = _stat_mtime(dirpath)
+
+        if dirpath.count(os.sep) - base_depth >= _MAX_DEPTH:
+            dirnames[:] = []
+        else:
+            dirnames[:] = [
+                d
+                for d in dirnames
+                if d not in _SKIP_DIRS
+                and os.path.normcase(os.path.join(dirpath, d)) not in skip
+            ]
+
+        for filename in filenames:
+            if filename.endswith(".py") or filename in _TRACKED_FILENAMES:
+                filepath = os.path.join(dirpath, filename)
+                snapshot[filepath] = _stat_mtime(filepath)
+    return snapshot
+
+
+def is_snapshot_up_to_date(snapshot: Dict[str, Optional[int]]) -> bool:
+    for path, mtime in snapshot.items():
+        if _stat_mtime(path) != mtime:
+            return False
+    return True
+
+
+def cache_introspection_info(method: Callable) -> None:
+    """
+    Caches the signature and the resolved type hints of the given function.
+
+    `inspect.signature` uses the `__signature__` attribute when available and
+    `typing.get_type_hints` doesn't need to evaluate the annotations again
+    once those are resolved (which is relevant when annotations are strings,
+    i.e.: when `from __future__ import annotations` is used).
+    """
+    import inspect
+    import typing
+
+    try:
+        if getattr(method, "__signature__", None) is None:
+            method.__signature__ = inspect.signature(method)  # type: ignore
+    except Exception:
+        pass  # Unable to get the signature (it'll be computed on each call).
+
+    try:
+        annotations = getattr(method, "__annotations__", None)
+        if annotations and any(isinstance(v, str) for v in annotations.values()):
+            method.__annotations__ = typing.get_type_hints(method, include_extras=True)
+    except Exception:
+        pass  # Unable to resolve (it'll be resolved on each call).
+
+
+class _CollectedEntry:
+    __slots__ = ["snapshot", "collected"]
+
+    def __init__(
+        self,
+        snapshot: Dict[str, Optional[int]],
+        collected: List[Tuple[type, str, str, Callable, Optional[dict]]],
+    ):
+        self.snapshot = snapshot
+        self.collected = collected
+
+
+class CollectedActionsCache:
+    """
+    Wraps a `collect_actions` function so that the actions collected for a
+    given path are cached (the `Action` objects returned are always new
+    instances, as those keep the state of a run, but the collection itself
+    is done only once while the related files are unchanged).
+    """
+
+    def __init__(
+        self,
+        collect_actions: Callable[..., Iterator[Any]],
+        get_skip_dirs: Callable[[], Sequence[str]] = lambda: (),
+        before_collect: Optional[Callable[[Any, set], None]] = None,
+        after_collect: Optional[Callable[[list], None]] = None,
+    ):
+        """
+        Args:
+            collect_actions: The function which actually collects actions
+                (called as `collect_actions(pm, path, action_names, glob)`).
+            get_skip_dirs: Provides directories which should not be walked when
+                checking for changes (i.e.: library roots).
+            before_collect: Called as `before_collect(path, action_names)` when
+                the collection is served from the cache.
+            after_collect: Called as `after_collect(actions)` when the
+                collection is served from the cache.
+        """
+        self._collect_actions = collect_actions
+        self._get_skip_dirs = get_skip_dirs
+        self._before_collect = before_collect
+        self._after_collect = after_collect
+        self._lock = threading.Lock()
+        self._cache: Dict[
+            Tuple[str, Tuple[str, ...], Optional[str]], _CollectedEntry
+        ] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    def __call__(
+        self,
+        pm,
+        path,
+        action_names: Sequence[str] = (),
+        glob: Optional[str] = None,
+    ) -> Iterator[Any]:
+        from pathlib import Path
+
+        path = Path(path).absolute()
+        key = (str(path), tuple(sorted(action_names)), glob)
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and not is_snapshot_up_to_date(entry.snapshot):
+                del self._cache[key]
+                entry = None
+
+        if entry is None:
+            self.misses += 1
+            yield from self._collect_and_cache(key, pm, path, action_names, glob)
+            return
+
+        self.hits += 1
+        if self._before_collect is not None:
+            self._before_collect(path, set(action_names))
+
+        actions = []
+        for action_class, module_name, module_file, method, options in entry.collected:
+            action = action_class(pm, module_name, module_file, method, options=options)
+            actions.append(action)
+            yield action
+
+        if self._after_collect is not None:
+            self._after_collect(actions)
+
+    def _collect_and_cache(self, key, pm, path, action_names, glob) -> Iterator[Any]:
+        # The snapshot is computed before collecting so that any change done
+        # while collecting invalidates the cache.
+        snapshot = compute_mtimes_snapshot(str(path), self._get_skip_dirs())
+
+        collected = []
+        for action in self._collect_actions(pm, path, action_names, glob):
+            method = action.method
+            cache_introspection_info(method)
+            collected.append(
+                (
+                    action.__class__,
+                    action.module_name,
+                    action.filename,
+                    method,
+                    action.options,
+                )
+            )
+            yield action
+
+        with self._lock:
+            self._cache[key] = _CollectedEntry(snapshot, collected)
+
+
+class PyProjectCache:
+    """
+    Wraps the function which reads the `pyproject.toml` so that it's only
+    re-read when its mtime changes.
+    """
+
+    def __init__(self, read_pyproject_toml: Callable[[Any], Any]):
+        self._read_pyproject_toml = read_pyproject_toml
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[Dict[str, Optional[int]], Any]] = {}
+
+    def __call__(self, path):
+        import copy
+
+        key = str(path)
+        with self._lock:
+            cached = self._cache.get(key)
+
+        if cached is not None:
+            snapshot, info = cached
+            if is_snapshot_up_to_date(snapshot):
+                return copy.deepcopy(info)
+
+        info = self._read_pyproject_toml(path)
+        if info is not None:
+            pyproject_path = str(info.pyproject)
+            snapshot = {pyproject_path: _stat_mtime(pyproject_path)}
+            with self._lock:
+                self._cache[key] = (snapshot, info)
+            return copy.deepcopy(info)
+        return info
+
+
+_installed = False
+
+
+def install() -> bool:
+    """
+    Installs the caches (i.e.: replaces the functions used by `sema4ai.actions`
+    to collect actions and read the `pyproject.toml` with cached versions).
+
+    Returns:
+        True if the caches are installed and False otherwise (i.e.: the cache
+        was disabled or an older version of `sema4ai-actions` is being used).
+    """
+    global _installed
+    if _installed:
+        return True
+
+    if not is_cache_enabled():
+        return False
+
+    try:
+        from robocorp.log import pyproject_config
+        from sema4ai.actions import _collect_actions, _hooks
+    except ImportError:
+        return False
+
+    def get_skip_dirs() -> Sequence[str]:
+        get_default_library_roots = getattr(
+            _collect_actions, "_get_default_library_roots", None
+        )
+        if get_default_library_roots is None:
+            return ()
+        try:
+            return get_default_library_roots()
+        except Exception:
+            return ()
+
+    _collect_actions.collect_actions = CollectedActionsCache(  # type: ignore
+        _collect_actions.collect_actions,
+        get_skip_dirs,
+        before_collect=_hooks.before_collect_actions,
+        after_collect=_hooks.after_collect_actions,
+    )
+    pyproject_config.read_pyproject_toml = PyProjectCache(  # type: ignore
+        pyproject_config.read_pyproject_toml
+    )
+    _installed = True
+    return True
@@ -6,10 +6,12 @@ Important: this will run in the target environment and can't really import anyth
 from the action server.
 """
 import argparse
+import json
 import os
 import sys
 import traceback
-from typing import Any, Dict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
 
 DEFAULT_TIMEOUT = 10
 NO_TIMEOUT = None
@@ -106,20 +108,32 @@ def add_arguments(parser):
     )
     parser.add_argument("--host", default="127.0.0.1", help="Bind to this address")
     parser.add_argument("--port", default=-1, type=int, help="Bind to this port")
+    parser.add_argument(
+        "--socket-fd",
+        default=-1,
+        type=int,
+        help="Communicate with the action server through the given (inherited) "
+        "socket fd instead of connecting to it",
+    )
+    parser.add_argument(
+        "--zygote-fd",
+        default=-1,
+        type=int,
+        help="Run as a zygote (template process which forks new workers) "
+        "communicating with the action server through the given unix socket fd",
+    )
 
 
 class MessagesHandler:
     def __init__(self, read_stream, write_stream):
         try:
-            from preload_actions_streams import (  # type: ignore
-                JsonRpcStreamReaderThread,
-                JsonRpcStreamWriter,
-            )
+            import preload_actions_streams  # type: ignore
         except ImportError:
-            from .preload_actions_streams import (
-                JsonRpcStreamReaderThread,
-                JsonRpcStreamWriter,
-            )
+            from . import preload_actions_streams  # noqa
+
+        JsonRpcStreamReaderThread = preload_actions_streams.JsonRpcStreamReaderThread
+        JsonRpcStreamWriter = preload_actions_streams.JsonRpcStreamWriter
+        self._streams_module = preload_actions_streams
 
         from queue import Queue
 
@@ -175,7 +189,10 @@ class MessagesHandler:
         # env["ROBOT_ARTIFACTS"] = robot_artifacts
         # env["S4_ACTION_RESULT_LOCATION"] = result_json
         command = message.get("command")
-        if command == "run_action":
+        if command == "handshake":
+            self._on_handshake(message)
+
+        elif command == "run_action":
             try:
                 # new
                 from sema4ai.actions import cli
@@ -184,6 +201,8 @@ class MessagesHandler:
                 from robocorp.actions import cli  # type: ignore
 
             returncode = 1
+            reply: Dict[str, Any] = {}
+            inputs_fd = None
             try:
                 action_name = message["action_name"]
                 action_file = message["action_file"]
@@ -195,10 +214,32 @@ class MessagesHandler:
                 reuse_process = message["reuse_process"]
                 cwd = message["cwd"]
 
+                # When given, the inputs are passed inline (instead of in the
+                # `input_json` file) and the result may also be sent back inline
+                # (if its size is up to the threshold).
+                inline_inputs = message.get("inline_inputs")
+                inline_threshold = message.get("inline_threshold", 0)
+
+                # When set, the values yielded by actions which are generators
+                # are sent as they're available.
+                stream_chunks = message.get("stream_chunks", False)
+                if inline_inputs is not None:
+                    input_json, inputs_fd = _materialize_inputs(
+                        inline_inputs, input_json
+                    )
+
+                teardown_module = _import_teardown_module()
+                teardown_module.capture_result = inline_threshold > 0
+                teardown_module.pop_captured_result()
+
                 os.environ["ROBOT_ARTIFACTS"] = robot_artifacts
                 os.environ["S4_ACTION_RESULT_LOCATION"] = result_json
 
                 if reuse_process:
+                    # As the process will be reused, keep the collected
+                    # actions cached for the next runs.
+                    self._install_worker_cache()
+
                     # Setup is skipped (for callbacks which still haven't been
                     # executed)
                     os.environ["RC_TASKS_SKIP_SESSION_SETUP"] = "1"
@@ -233,18 +274,85 @@ class MessagesHandler:
                 ]
                 os.chdir(cwd)
 
-                returncode = cli.main(
-                    args,
-                    exit=False,
-                    **self._plugin_manager_kwargs(
-                        {"request": {"headers": headers, "cookies": cookies}}
-                    ),
-                )
+                with self._send_result_chunks(stream_chunks):
+                    returncode = cli.main(
+                        args,
+                        exit=False,
+                        **self._plugin_manager_kwargs(
+                            {"request": {"headers": headers, "cookies": cookies}}
+                        ),
+                    )
+
+                captured_result = teardown_module.pop_captured_result()
+                if captured_result is not None:
+                    result_contents = json.dumps(captured_result)
+                    if len(result_contents) <= inline_threshold:
+                        reply["inline_result"] = result_contents
+                    else:
+                        # Too big: spill to the file.
+                        os.makedirs(os.path.dirname(result_json), exist_ok=True)
+                        with open(result_json, "w", encoding="utf-8") as stream:
+                            stream.write(result_contents)
             except BaseException:
                 traceback.print_exc()
 
             finally:
-                self._jsonrpc_stream_writer.write({"returncode": returncode})
+                if inputs_fd is not None:
+                    os.close(inputs_fd)
+                reply["returncode"] = returncode
+                self._jsonrpc_stream_writer.write(reply)
+
+    def _on_handshake(self, message) -> None:
+        # The action server offers the framings it supports (ordered by
+        # preference) and we reply with the one which should be used
+        # (switching our writer right after the reply -- the action server
+        # then sends a message to switch our reader).
+        streams = self._streams_module
+        framing = streams.choose_framing(message.get("framings", ()))
+        reply = {"framing": framing}
+        if framing != streams.FRAMING_HEADERS:
+            reply[streams.SWITCH_FRAMING_KEY] = framing
+        self._jsonrpc_stream_writer.write(reply)
+
+    @contextmanager
+    def _send_result_chunks(self, stream_chunks: bool) -> Iterator[None]:
+        """
+        While in this context, each value yielded by an action which is a
+        generator is sent as a `{"chunk": value}` message (before the reply
+        with the `returncode`).
+        """
+        if not stream_chunks:
+            yield
+            return
+
+        try:
+            from sema4ai.actions._hooks import on_action_result_chunk
+        except ImportError:
+            # Not available in this version of sema4ai-actions (the full
+            # result is still available at the end of the run).
+            yield
+            return
+
+        writer = self._jsonrpc_stream_writer
+
+        def on_chunk(action, chunk) -> None:
+            writer.write({"chunk": chunk})
+
+        with on_action_result_chunk.register(on_chunk):
+            yield
+
+    def _install_worker_cache(self) -> None:
+        try:
+            import preload_actions_cache  # type: ignore
+        except ImportError:
+            from . import preload_actions_cache  # noqa
+
+        try:
+            preload_actions_cache.install()
+        except Exception:
+            # If the cache can't be installed just go through the regular
+            # (slower) code path.
+            traceback.print_exc()
 
     def _plugin_manager_kwargs(self, managed_parameters) -> Dict[str, Any]:
         try:
@@ -293,19 +401,50 @@ class MessagesHandler:
         return {"plugin_manager": pm}
 
 
-def main(args=None):
-    original_args = args if args is not None else sys.argv[1:]
+def _import_teardown_module():
+    try:
+        import preload_actions_teardown  # type: ignore
+    except ImportError:
+        from . import preload_actions_teardown  # noqa
 
-    parser = argparse.ArgumentParser()
-    add_arguments(parser)
+    return preload_actions_teardown
 
-    args = parser.parse_args(args=original_args)
 
-    if args.tcp:
-        rfile, wfile = socket_connect(args.host, args.port)
-    else:
-        rfile, wfile = binary_stdio()
+def _materialize_inputs(inline_inputs: str, input_json: str) -> Tuple[str, Any]:
+    """
+    Provides a path from where the inputs (received inline) can be loaded by
+    `sema4ai.actions` (which only accepts a path in `--json-input`).
+
+    On Linux an in-memory file is used (so, nothing is written to the disk),
+    otherwise the contents are written to the given `input_json`.
+
+    Returns:
+        The path to be used and the fd to be closed after the run (if any).
+    """
+    contents = inline_inputs.encode("utf-8")
+    memfd_create = getattr(os, "memfd_create", None)
+    if memfd_create is not None and os.path.isdir("/proc/self/fd"):
+        try:
+            fd = memfd_create("action_server_inputs", getattr(os, "MFD_CLOEXEC", 0))
+        except OSError:
+            pass
+        else:
+            try:
+                written = 0
+                view = memoryview(contents)
+                while written < len(contents):
+                    written += os.write(fd, view[written:])
+            except BaseException:
+                os.close(fd)
+                raise
+            return f"/proc/self/fd/{fd}", fd
+
+    with open(input_json, "wb") as stream:
+        stream.write(contents)
+    return input_json, None
+
 
+def _start_autoexit() -> None:
     try:
         import preload_actions_autoexit  # type: ignore
     except ImportError:
@@ -314,6 +453,63 @@ def main(args=None):
     pid = os.environ.get("SEMA4AI_ACTION_SERVER_PARENT_PID", 0)
     if pid:
         preload_actions_autoexit.exit_when_pid_exists(pid)
+
+
+def run_tcp_worker(host, port):
+    rfile, wfile = socket_connect(host, port)
+    _start_autoexit()
+    server = MessagesHandler(rfile, wfile)
+    server.start()
+
+
+def run_socket_worker(fd):
+    import socket as socket_module
+
+    s = socket_module.socket(fileno=fd)
+    rfile = s.makefile("rb")
+    wfile = s.makefile("wb")
+    _start_autoexit()
+    server = MessagesHandler(rfile, wfile)
+    server.start()
+
+
+def _run_zygote_worker(request, socket_fd):
+    if socket_fd is not None:
+        run_socket_worker(socket_fd)
+    else:
+        run_tcp_worker(request["host"], request["port"])
+
+
+def main(args=None):
+    original_args = args if args is not None else sys.argv[1:]
+
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+
+    args = parser.parse_args(args=original_args)
+
+    if args.zygote_fd >= 0:
+        try:
+            import preload_actions_zygote  # type: ignore
+        except ImportError:
+            from . import preload_actions_zygote  # noqa
+
+        # Note: the autoexit is not started in the zygote (it must not have
+        # threads when forking). It'll exit when the action server closes
+        # the connection and each forked worker starts its own autoexit.
+        preload_actions_zygote.zygote_main(args.zygote_fd, _run_zygote_worker)
+        return
+
+    if args.socket_fd >= 0:
+        run_socket_worker(args.socket_fd)
+        return
+
+    if args.tcp:
+        run_tcp_worker(args.host, args.port)
+        return
+
+    rfile, wfile = binary_stdio()
+    _start_autoexit()
     server = MessagesHandler(rfile, wfile)
     server.start()
 
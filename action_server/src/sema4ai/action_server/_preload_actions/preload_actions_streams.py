@@ -17,11 +17,31 @@
 import json
 import logging
 import queue
+import struct
 import threading
-from typing import Optional
+from typing import Any, Callable, List, Optional, Sequence, Tuple
 
 log = logging.getLogger(__name__)
 
+# The framing used by default: each message is sent as json preceded by
+# http-style headers (`Content-Length: <len>\r\n\r\n`).
+FRAMING_HEADERS = "headers"
+
+# Length-prefixed binary framing (each message is preceded by its length as a
+# 4-byte big-endian unsigned int) where the contents are json.
+FRAMING_BINARY_JSON = "binary-json"
+
+# Length-prefixed binary framing where the contents are msgpack (only
+# available if `msgspec` or `msgpack` is installed).
+FRAMING_BINARY_MSGPACK = "binary-msgpack"
+
+# If a message has this key, the framing of the messages sent afterwards (from
+# the same sender) is changed to the given framing (used when negotiating the
+# framing: both the writer and the reader switch right after that message).
+SWITCH_FRAMING_KEY = "switch_framing"
+
+_LEN_PREFIX = struct.Struct(">I")
+
 
 def read(stream) -> Optional[str]:
     """
@@ -33,6 +53,13 @@ def read(stream) -> Optional[str]:
     :return str|NoneType:
         The message or None if the stream was closed.
     """
+    body = _read_headers_message(stream)
+    if body is None:
+        return None
+    return body.decode("utf-8")
+
+
+def _read_headers_message(stream) -> Optional[bytes]:
     headers = {}
     while True:
         # Interpret the http protocol headers
@@ -40,45 +67,211 @@ def read(stream) -> Optional[str]:
 
         if not line:  # EOF
             return None
-        line = line.strip().decode("ascii")
+        line = line.strip()
         if not line:  # Read just a new line without any contents
             break
         try:
-            name, value = line.split(": ", 1)
+            name, value = line.split(b": ", 1)
         except ValueError:
-            raise RuntimeError("Invalid header line: {}.".format(line))
+            raise RuntimeError(
+                "Invalid header line: {}.".format(line.decode("ascii", "replace"))
+            )
         headers[name.strip()] = value.strip()
 
     if not headers:
         raise RuntimeError("Got message without headers.")
 
-    content_length = int(headers["Content-Length"])
+    content_length = int(headers[b"Content-Length"])
 
     # Get the actual json
-    body = _read_len(stream, content_length)
-    return body.decode("utf-8")
+    return _read_len(stream, content_length)
 
 
 def _read_len(stream, content_length) -> bytes:
-    buf = b""
     if not content_length:
-        return buf
+        return b""
 
-    # Grab the body
-    while True:
-        data = stream.read(content_length - len(buf))
-        if not buf and len(data) == content_length:
-            # Common case
-            return data
-        buf += data
-        if len(buf) == content_length:
-            return buf
-        if len(buf) > content_length:
-            raise AssertionError(
-                "Expected to read message up to len == %s (already read: %s). Found:\n%s"
-                % (content_length, len(buf), buf.decode("utf-8", "replace"))
+    data = stream.read(content_length)
+    if len(data) == content_length:
+        # Common case
+        return data
+
+    if not data:
+        raise EOFError(
+            "Expected to read message with len == %s (EOF reached)." % (content_length,)
+        )
+
+    # Partial read: read the remainder in a preallocated buffer.
+    buf = bytearray(content_length)
+    buf[: len(data)] = data
+    _read_into(stream, memoryview(buf), len(data))
+    return bytes(buf)
+
+
+def _read_into(stream, view: memoryview, pos: int = 0) -> None:
+    """
+    Fills the given buffer (starting at `pos`) with the contents of the stream.
+
+    Raises:
+        EOFError: if the stream is closed before the buffer is filled.
+    """
+    total = len(view)
+    readinto = getattr(stream, "readinto", None)
+    while pos < total:
+        if readinto is not None:
+            n = readinto(view[pos:])
+        else:
+            data = stream.read(total - pos)
+            n = len(data)
+            view[pos : pos + n] = data
+        if not n:
+            raise EOFError(
+                "Expected to read message with len == %s (already read: %s)."
+                % (total, pos)
             )
-        # len(buf) < content_length (just keep on going).
+        pos += n
+
+
+def read_binary(stream) -> Optional[bytearray]:
+    """
+    Reads one message sent with the binary framing (the message contents are
+    read into a preallocated buffer).
+
+    :return bytearray|NoneType:
+        The message contents or None if the stream was closed.
+    """
+    prefix = stream.read(_LEN_PREFIX.size)
+    if not prefix:  # EOF
+        return None
+    if len(prefix) < _LEN_PREFIX.size:
+        buf = bytearray(_LEN_PREFIX.size)
+        buf[: len(prefix)] = prefix
+        _read_into(stream, memoryview(buf), len(prefix))
+        prefix = bytes(buf)
+
+    (content_length,) = _LEN_PREFIX.unpack(prefix)
+    body = bytearray(content_length)
+    _read_into(stream, memoryview(body))
+    return body
+
+
+class _Framing(object):
+    name = FRAMING_HEADERS
+
+    def read(self, stream) -> Any:
+        """
+        :return:
+            The contents of the message (or None if EOF was reached).
+        """
+        return _read_headers_message(stream)
+
+    def decode(self, data) -> Any:
+        return json.loads(data)
+
+    def encode(self, message) -> bytes:
+        return json.dumps(message).encode("utf-8")
+
+    def write(self, stream, message) -> None:
+        as_bytes = self.encode(message)
+        content_len_as_str = "Content-Length: %s\r\n\r\n" % len(as_bytes)
+        stream.write(content_len_as_str.encode("ascii"))
+        stream.write(as_bytes)
+
+
+class _BinaryFraming(_Framing):
+    def __init__(self, name: str, encode: Callable, decode: Callable):
+        self.name = name
+        self.encode = encode  # type: ignore
+        self.decode = decode  # type: ignore
+
+    def read(self, stream) -> Any:
+        return read_binary(stream)
+
+    def write(self, stream, message) -> None:
+        as_bytes = self.encode(message)
+        stream.write(_LEN_PREFIX.pack(len(as_bytes)))
+        stream.write(as_bytes)
+
+
+def _json_codec() -> Tuple[Callable, Callable]:
+    try:
+        import msgspec
+
+        return msgspec.json.encode, msgspec.json.decode
+    except ImportError:
+        pass
+
+    def encode(message) -> bytes:
+        return json.dumps(message).encode("utf-8")
+
+    return encode, json.loads
+
+
+def _msgpack_codec() -> Optional[Tuple[Callable, Callable]]:
+    try:
+        import msgspec
+
+        return msgspec.msgpack.encode, msgspec.msgpack.decode
+    except ImportError:
+        pass
+
+    try:
+        import msgpack  # type: ignore
+    except ImportError:
+        return None
+
+    def encode(message) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+
+    def decode(data) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+    return encode, decode
+
+
+def create_framing(name: str) -> _Framing:
+    """
+    Raises:
+        ValueError: if the given framing is not available.
+    """
+    if name == FRAMING_HEADERS:
+        return _Framing()
+
+    if name == FRAMING_BINARY_JSON:
+        return _BinaryFraming(name, *_json_codec())
+
+    if name == FRAMING_BINARY_MSGPACK:
+        codec = _msgpack_codec()
+        if codec is not None:
+            return _BinaryFraming(name, *codec)
+
+    raise ValueError(f"Framing not available: {name}")
+
+
+def get_available_framings() -> List[str]:
+    """
+    :return:
+        The framings available in this environment (ordered by preference).
+    """
+    ret = []
+    if _msgpack_codec() is not None:
+        ret.append(FRAMING_BINARY_MSGPACK)
+    ret.append(FRAMING_BINARY_JSON)
+    ret.append(FRAMING_HEADERS)
+    return ret
+
+
+def choose_framing(offered: Sequence[str]) -> str:
+    """
+    :return:
+        The first framing from the given ones (ordered by preference) which is
+        available in this environment.
+    """
+    available = set(get_available_framings())
+    for name in offered:
+        if name in available:
+            return name
+    return FRAMING_HEADERS
 
 
 class JsonRpcStreamReaderThread(threading.Thread):
@@ -87,23 +280,34 @@ class JsonRpcStreamReaderThread(threading.Thread):
         self._rfile = rfile
         self._queue = queue
         self._message_consumer = message_consumer
+        self._framing: _Framing = _Framing()
         self.name = "JsonRpcStreamReaderThread"
         self.daemon = True
 
     def run(self):
         try:
             while not self._rfile.closed:
-                data = read(self._rfile)
+                framing = self._framing
+                try:
+                    data = framing.read(self._rfile)
+                except EOFError:
+                    data = None
                 if data is None:
                     log.debug("Read: %s", data)
                     return
 
                 try:
-                    msg = json.loads(data)
+                    msg = framing.decode(data)
                 except Exception:
-                    log.exception("Failed to parse JSON message %s", data)
+                    log.exception("Failed to parse message %s", data)
                     continue
 
+                if isinstance(msg, dict):
+                    switch_framing = msg.get(SWITCH_FRAMING_KEY)
+                    if switch_framing:
+                        # The next messages use the new framing.
+                        self._framing = create_framing(switch_framing)
+
                 if isinstance(msg, dict):
                     # Note: parsing is done on a thread so that we can read
                     # while processing so that we can give priority to `cancelProgress`.
@@ -197,6 +401,13 @@ class JsonRpcStreamWriter(object):
         self._wfile = wfile
         self._wfile_lock = threading.Lock()
         self._json_dumps_args = json_dumps_args
+        self._framing: Optional[_Framing] = None
+
+    @property
+    def framing(self) -> str:
+        if self._framing is None:
+            return FRAMING_HEADERS
+        return self._framing.name
 
     def close(self):
         log.debug("Will close writer")
@@ -232,16 +443,25 @@ class JsonRpcStreamWriter(object):
                 else:
                     log.debug("Writing (non dict message): %s", message)
 
-                body = json.dumps(message, **self._json_dumps_args)
-
-                as_bytes = body.encode("utf-8")
                 stream = self._wfile
-                content_len_as_str = "Content-Length: %s\r\n\r\n" % len(as_bytes)
-                content_len_bytes = content_len_as_str.encode("ascii")
+                if self._framing is None:
+                    body = json.dumps(message, **self._json_dumps_args)
 
-                stream.write(content_len_bytes)
-                stream.write(as_bytes)
+                    as_bytes = body.encode("utf-8")
+                    content_len_as_str = "Content-Length: %s\r\n\r\n" % len(as_bytes)
+                    content_len_bytes = content_len_as_str.encode("ascii")
+
+                    stream.write(content_len_bytes)
+                    stream.write(as_bytes)
+                else:
+                    self._framing.write(stream, message)
                 stream.flush()
+
+                if isinstance(message, dict):
+                    switch_framing = message.get(SWITCH_FRAMING_KEY)
+                    if switch_framing:
+                        # The next messages use the new framing.
+                        self._framing = create_framing(switch_framing)
                 return True
             except Exception:  # pylint: disable=broad-except
                 log.exception(
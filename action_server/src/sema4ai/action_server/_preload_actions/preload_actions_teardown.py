@@ -1,6 +1,7 @@
 import json
 import os
 from pathlib import Path
+from typing import Optional
 
 try:
     from sema4ai.actions import IAction, teardown
@@ -9,14 +10,28 @@ except ImportError:
     from robocorp.actions import IAction, teardown  # type:ignore
 
 
+# When set (by the worker), the result is kept in memory (to be sent back to
+# the action server through the worker channel) instead of being written to
+# `S4_ACTION_RESULT_LOCATION`.
+capture_result = False
+_captured_result: Optional[dict] = None
+
+
+def pop_captured_result() -> Optional[dict]:
+    global _captured_result
+    ret = _captured_result
+    _captured_result = None
+    return ret
+
+
 @teardown
 def on_teardown_save_result(action: IAction):
+    global _captured_result
+
     S4_ACTION_RESULT_LOCATION = os.environ.get("S4_ACTION_RESULT_LOCATION", "")
 
-    if S4_ACTION_RESULT_LOCATION:
+    if capture_result or S4_ACTION_RESULT_LOCATION:
         result = action.result
-        p = Path(S4_ACTION_RESULT_LOCATION)
-        p.parent.mkdir(parents=True, exist_ok=True)
         dump = result
         if hasattr(result, "model_dump"):
             # Support for pydantic
@@ -28,4 +43,10 @@ def on_teardown_save_result(action: IAction):
             "status": action.status.value,
         }
 
+        if capture_result:
+            _captured_result = contents_to_write
+            return
+
+        p = Path(S4_ACTION_RESULT_LOCATION)
+        p.parent.mkdir(parents=True, exist_ok=True)
         p.write_text(json.dumps(contents_to_write))
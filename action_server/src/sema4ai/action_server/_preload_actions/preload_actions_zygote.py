@@ -0,0 +1,137 @@
+"""
+A "zygote" is a template process which preloads the modules needed to run
+actions and then forks new workers on request (which is much faster than
+launching a new python interpreter and importing everything again).
+
+This is only available on Linux (where `os.fork` and file descriptor passing
+over unix sockets are available).
+
+Important: this will run in the target environment and can't really import anything
+from the action server.
+
+Protocol (over a `SOCK_SEQPACKET` unix socket inherited from the action server):
+
+- The action server sends a json message: `{"host": <host>, "port": <port>}`
+  along with 2 file descriptors (which should be used as the stdout/stderr of
+  the new worker).
+- The zygote forks, the forked process connects back to the action server at
+  `host:port` (just like a regular worker) and the zygote replies with
+  `{"pid": <pid of the forked worker>}`.
+
+Alternatively, the message may be `{"socket": true}`, in which case a third
+file descriptor (a connected socket which the forked worker should use to talk
+to the action server) is also sent.
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+
+# The modules which are preloaded by default.
+DEFAULT_PRELOAD_MODULES = (
+    "pydantic",
+    "robocorp.log",
+    "sema4ai.actions",
+    "sema4ai.actions.cli",
+)
+
+# Environment variable which may be used to preload additional modules
+# (comma-separated).
+ENV_ZYGOTE_PRELOAD = "SEMA4AI_ACTION_SERVER_ZYGOTE_PRELOAD"
+
+MAX_MESSAGE_SIZE = 4096
+
+
+def preload_modules() -> None:
+    import importlib
+
+    modules = list(DEFAULT_PRELOAD_MODULES)
+    extra = os.environ.get(ENV_ZYGOTE_PRELOAD, "")
+    modules.extend(x.strip() for x in extra.split(",") if x.strip())
+
+    for module_name in modules:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            # i.e.: some module may not be available in the target environment
+            # (it'll be imported later in the worker if needed).
+            sys.stderr.write(f"Zygote: unable to preload: {module_name}\n")
+
+
+def _run_forked_worker(sock, fds, request, run_worker) -> None:
+    exit_code = 0
+    try:
+        sock.close()
+        # The zygote ignores SIGCHLD, but the worker needs the default handler
+        # to be able to wait for its own subprocesses.
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+
+        stdout_fd, stderr_fd = fds[:2]
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.close(stdout_fd)
+        os.close(stderr_fd)
+
+        socket_fd = fds[2] if len(fds) > 2 else None
+        run_worker(request, socket_fd)
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(exit_code)
+
+
+def zygote_main(fd: int, run_worker) -> None:
+    """
+    Args:
+        fd: The file descriptor of the unix socket used to talk to the action server.
+        run_worker: A callable receiving `(request, socket_fd)` which runs a
+            worker (called in the forked process). `socket_fd` is None if the
+            worker should connect to the `host`/`port` in the request.
+    """
+    sock = socket.socket(fileno=fd)
+    preload_modules()
+
+    # Forked workers are tracked by the action server by their pid, so, the
+    # zygote never waits for them (and they must not become zombies).
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+
+    while True:
+        try:
+            msg, fds, _flags, _addr = socket.recv_fds(sock, MAX_MESSAGE_SIZE, 3)
+        except InterruptedError:
+            continue
+
+        if not msg:
+            # The action server closed the connection: exit.
+            return
+
+        request = json.loads(msg)
+        expected_fds = 3 if request.get("socket") else 2
+        if len(fds) != expected_fds:
+            for f in fds:
+                os.close(f)
+            sys.stderr.write(
+                f"Zygote: expected {expected_fds} file descriptors. Found: {fds}\n"
+            )
+            sock.sendall(
+                json.dumps({"error": f"expected {expected_fds} fds"}).encode("utf-8")
+            )
+            continue
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _run_forked_worker(sock, fds, request, run_worker)  # Never returns.
+
+        for f in fds:
+            os.close(f)
+        sock.sendall(json.dumps({"pid": pid}).encode("utf-8"))
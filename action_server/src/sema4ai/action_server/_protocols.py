@@ -201,6 +201,7 @@ class ArgumentsNamespaceRequiringDatadir(ArgumentsNamespace):
 
 class ArgumentsNamespaceMigrate(ArgumentsNamespaceRequiringDatadir):
     command: Literal["migrate"]
+    vacuum: bool
 
 
 class ArgumentsNamespaceBaseImportOrStart(ArgumentsNamespaceRequiringDatadir):
@@ -318,6 +319,16 @@ class ArgumentsNamespaceDatadir(ArgumentsNamespaceRequiringDatadir):
     datadir_command: Literal["clear-actions"]
 
 
+class ArgumentsNamespaceAnalytics(ArgumentsNamespace):
+    command: Literal["analytics"]
+    datadir: str
+    db_file: str
+    window: str
+    step: Optional[str]
+    action: Optional[str]
+    json: bool
+
+
 JSONValue = Union[
     dict[str, "JSONValue"], list["JSONValue"], str, int, float, bool, None
 ]
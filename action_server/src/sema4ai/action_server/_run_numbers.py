@@ -0,0 +1,121 @@
+"""
+Allocation of the `numbered_id` of runs.
+
+Instead of updating the `run_id` counter for each run created, numbers are
+reserved in blocks (the counter has the last number reserved) and given out
+from memory, so, creating a run usually only needs the `Run` insert.
+
+When the action server is restarted the numbering is resumed from the max
+`numbered_id` persisted (so, the numbers reserved but not used aren't
+skipped).
+
+If the transaction which reserved a block is rolled back, the block is
+reserved again in the next allocation (so, the counter is never behind the
+numbers given out).
+"""
+
+import logging
+import threading
+import typing
+from typing import Optional
+
+if typing.TYPE_CHECKING:
+    from ._database import Database
+
+log = logging.getLogger(__name__)
+
+# Number of run numbers reserved with each update of the counter.
+DEFAULT_BLOCK_SIZE = 1000
+
+
+class RunNumberAllocator:
+    def __init__(self, db: "Database", block_size: int = DEFAULT_BLOCK_SIZE):
+        self.db = db
+        self._block_size = max(1, block_size)
+        self._lock = threading.Lock()
+
+        # The next number to be given and the last number reserved (None
+        # until loaded from the database).
+        self._next: Optional[int] = None
+        self._reserved_until = 0
+
+    def allocate(self, count: int) -> int:
+        """
+        Allocates `count` consecutive numbers (must be called in a
+        transaction).
+
+        Returns:
+            The first number allocated.
+        """
+        with self._lock:
+            if self._next is None:
+                self._next = self._load_next()
+
+            first = self._next
+            last = first + count - 1
+            if last > self._reserved_until:
+                self._reserve(last + self._block_size)
+            self._next = last + 1
+            return first
+
+    def _load_next(self) -> int:
+        from ._models import RUN_ID_COUNTER
+
+        db = self.db
+        with db.cursor() as cursor:
+            db.execute_query(cursor, "SELECT MAX(numbered_id) FROM run")
+            max_numbered_id = cursor.fetchone()[0]
+            if max_numbered_id is not None:
+                return max_numbered_id + 1
+
+            # No runs (still use the counter so that numbers given to runs
+            # which were removed aren't reused).
+            db.execute_query(
+                cursor, "SELECT value FROM counter WHERE id=?", [RUN_ID_COUNTER]
+            )
+            counter_record = cursor.fetchall()
+            if not counter_record:
+                raise RuntimeError(
+                    f"Error. No counter found for: {RUN_ID_COUNTER} in the database."
+                )
+            return counter_record[0][0] + 1
+
+    def _reserve(self, reserved_until: int) -> None:
+        from ._models import RUN_ID_COUNTER
+
+        db = self.db
+        db.execute(
+            "UPDATE counter SET value=MAX(value, ?) WHERE id=?",
+            [reserved_until, RUN_ID_COUNTER],
+        )
+        log.debug(f"Reserved run numbers until: {reserved_until}")
+        previous_reserved_until = self._reserved_until
+        self._reserved_until = reserved_until
+
+        def on_rollback():
+            # Note: called in the thread which holds the write lock (no other
+            # allocation can happen until the transaction finishes).
+            log.debug(f"Reservation of run numbers until {reserved_until} undone.")
+            self._reserved_until = min(self._reserved_until, previous_reserved_until)
+
+        db.on_rollback(on_rollback)
+
+
+_run_number_allocator: Optional[RunNumberAllocator] = None
+_run_number_allocator_lock = threading.Lock()
+
+
+def get_run_number_allocator() -> RunNumberAllocator:
+    """
+    Provides the allocator for the global database.
+    """
+    global _run_number_allocator
+
+    from ._models import get_db
+
+    db = get_db()
+    with _run_number_allocator_lock:
+        allocator = _run_number_allocator
+        if allocator is None or allocator.db is not db:
+            allocator = _run_number_allocator = RunNumberAllocator(db)
+        return allocator
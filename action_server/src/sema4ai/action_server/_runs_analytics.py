@@ -0,0 +1,470 @@
+"""
+Analytics of the runs: run time/queue wait percentiles, error rate and
+throughput per action in a time window.
+
+When a run finishes, its outcome is added (in the same transaction which
+updates the run) to the rollups of its action for the time bucket
+(`BUCKET_SECONDS`) in which it finished:
+
+- `RunStats`: the number of runs (passed/failed/cancelled) and the total
+  run time/queue wait.
+- `RunStatsBin`: histograms of the run time and of the queue wait with
+  logarithmic bins (so, percentiles are approximate, with a relative error
+  under 10% -- values up to 1ms are reported as 0).
+
+A run is only added when it changes to a final status in the database (so,
+a run which is set as finished more than once is counted only once).
+
+So, the analytics only read the rollups of the buckets in the window instead
+of all the runs (note: runs which finished before the rollups were added
+aren't considered and rollups are kept when runs are removed by the
+retention). Rollups older than `--runs-analytics-max-age` days are removed
+periodically (along with the retention of runs).
+
+The queue wait is the time from the creation of the run until it finished
+minus its run time (so, it's mostly the time waiting for a process but it
+also includes the time to prepare the run and to save its result).
+"""
+
+import datetime
+import logging
+import math
+import re
+import typing
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+if typing.TYPE_CHECKING:
+    from ._database import Database
+    from ._models import Run
+
+log = logging.getLogger(__name__)
+
+# Size of the time buckets of the rollups (in seconds).
+BUCKET_SECONDS = 300
+
+METRIC_RUN_TIME = 0
+METRIC_QUEUE_WAIT = 1
+
+# Values up to this one (in seconds) are in the bin 0 and each bin is
+# `_BIN_GROWTH` times bigger than the previous one.
+_BIN_MIN_VALUE = 0.001
+_BIN_GROWTH = 2**0.25
+
+_UPSERT_RUN_STATS_SQL = """
+INSERT INTO run_stats
+    (id, action_id, bucket_start, runs, passed, failed, cancelled, run_time_total, queue_wait_total)
+VALUES
+    (?, ?, ?, 1, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    runs = runs + 1,
+    passed = passed + excluded.passed,
+    failed = failed + excluded.failed,
+    cancelled = cancelled + excluded.cancelled,
+    run_time_total = run_time_total + excluded.run_time_total,
+    queue_wait_total = queue_wait_total + excluded.queue_wait_total
+"""
+
+_UPSERT_RUN_STATS_BIN_SQL = """
+INSERT INTO run_stats_bin
+    (id, run_stats_id, metric, bin_index, count)
+VALUES
+    (?, ?, ?, ?, 1)
+ON CONFLICT(id) DO UPDATE SET
+    count = count + 1
+"""
+
+
+def value_to_bin(value: float) -> int:
+    if value <= _BIN_MIN_VALUE:
+        return 0
+    return math.ceil(math.log(value / _BIN_MIN_VALUE, _BIN_GROWTH))
+
+
+def bin_to_value(bin_index: int) -> float:
+    """
+    Returns:
+        The value which represents the values in the given bin (the geometric
+        mean of its bounds or 0 for the bin 0).
+    """
+    if bin_index <= 0:
+        return 0.0
+    return _BIN_MIN_VALUE * _BIN_GROWTH ** (bin_index - 0.5)
+
+
+def get_bucket_start(dt: datetime.datetime) -> datetime.datetime:
+    timestamp = dt.timestamp()
+    return datetime.datetime.fromtimestamp(
+        timestamp - timestamp % BUCKET_SECONDS, datetime.timezone.utc
+    )
+
+
+def record_finished_run(
+    db: "Database", run: "Run", finished_at: datetime.datetime
+) -> None:
+    """
+    Adds the given (finished) run to the rollups if it's not already finished
+    in the database (must be called in the transaction which marks the run as
+    finished, before the run is updated).
+    """
+    from ._database import datetime_to_str, str_to_datetime
+    from ._models import RunStatus
+
+    final_statuses = (RunStatus.PASSED, RunStatus.FAILED, RunStatus.CANCELLED)
+    if run.status not in final_statuses:
+        return
+
+    with db.cursor() as cursor:
+        db.execute_query(cursor, "SELECT status FROM run WHERE id = ?", [run.id])
+        stored = cursor.fetchone()
+    if stored is not None and stored[0] in final_statuses:
+        # Already counted when it was first set as finished.
+        log.debug(f"Run {run.id} was already finished (not added to the rollups).")
+        return
+
+    run_time = run.run_time or 0.0
+    queue_wait = 0.0
+    if run.start_time:
+        try:
+            created_at = str_to_datetime(run.start_time)
+        except ValueError:
+            log.debug(f"Unable to parse start time of run: {run.start_time!r}")
+        else:
+            elapsed = (finished_at - created_at).total_seconds()
+            queue_wait = max(0.0, elapsed - run_time)
+
+    bucket_start = datetime_to_str(get_bucket_start(finished_at))
+    run_stats_id = f"{run.action_id}:{bucket_start}"
+    db.execute(
+        _UPSERT_RUN_STATS_SQL,
+        [
+            run_stats_id,
+            run.action_id,
+            bucket_start,
+            int(run.status == RunStatus.PASSED),
+            int(run.status == RunStatus.FAILED),
+            int(run.status == RunStatus.CANCELLED),
+            run_time,
+            queue_wait,
+        ],
+    )
+
+    bins = []
+    for metric, value in ((METRIC_RUN_TIME, run_time), (METRIC_QUEUE_WAIT, queue_wait)):
+        bin_index = value_to_bin(value)
+        bins.append(
+            (
+                f"{run_stats_id}:{metric}:{bin_index}",
+                run_stats_id,
+                metric,
+                bin_index,
+            )
+        )
+    db.executemany(_UPSERT_RUN_STATS_BIN_SQL, bins)
+
+
+# Max number of rollups removed in each transaction.
+_PRUNE_BATCH_SIZE = 500
+
+
+def prune_run_stats(
+    db: "Database", max_age: float, now: Optional[datetime.datetime] = None
+) -> int:
+    """
+    Removes the rollups of buckets which started more than `max_age` days ago
+    (must be called with a database connection).
+
+    Returns:
+        The number of rollups (`RunStats`) removed.
+    """
+    from ._database import datetime_to_str
+
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    limit = datetime_to_str(now - datetime.timedelta(days=max_age))
+
+    removed = 0
+    while True:
+        with db.cursor() as cursor:
+            db.execute_query(
+                cursor,
+                "SELECT id FROM run_stats WHERE bucket_start < ? LIMIT ?",
+                [limit, _PRUNE_BATCH_SIZE],
+            )
+            run_stats_ids = [row[0] for row in cursor.fetchall()]
+        if not run_stats_ids:
+            break
+
+        placeholders = ", ".join("?" for _ in run_stats_ids)
+        with db.transaction():
+            db.execute(
+                f"DELETE FROM run_stats_bin WHERE run_stats_id IN ({placeholders})",
+                run_stats_ids,
+            )
+            db.execute(
+                f"DELETE FROM run_stats WHERE id IN ({placeholders})", run_stats_ids
+            )
+        removed += len(run_stats_ids)
+
+    if removed:
+        log.info(f"Removed {removed} rollups of runs older than {max_age} days.")
+    return removed
+
+
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60}
+_RE_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+
+
+def parse_duration(value: str) -> float:
+    """
+    Args:
+        value: A duration such as `30m`, `24h`, `7d` or `90` (in seconds).
+
+    Returns:
+        The duration in seconds (raises ValueError if not valid).
+    """
+    match = _RE_DURATION.match(value.lower())
+    if not match or float(match.group(1)) <= 0:
+        raise ValueError(
+            f"Invalid duration: {value!r} (expected something as: 30m, 24h or 7d)."
+        )
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2) or "s"]
+
+
+@dataclass
+class Percentiles:
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+    mean: Optional[float] = None
+
+
+@dataclass
+class ActionRunsAnalytics:
+    action_id: str
+    action_name: str
+    action_package_name: str
+    window_start: str  # date in isoformat
+    window_end: str  # date in isoformat
+
+    runs: int = 0
+    passed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    error_rate: float = 0  # failed / runs
+    throughput: float = 0  # runs per minute
+
+    run_time: Percentiles = field(default_factory=Percentiles)  # in seconds
+    queue_wait: Percentiles = field(default_factory=Percentiles)  # in seconds
+
+
+def _compute_percentiles(histogram: Dict[int, int], total: float) -> Percentiles:
+    count = sum(histogram.values())
+    if not count:
+        return Percentiles()
+
+    ret = Percentiles(mean=total / count)
+    sorted_bins = sorted(histogram.items())
+    for attr, percentile in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        rank = max(1, math.ceil(percentile * count))
+        accumulated = 0
+        for bin_index, bin_count in sorted_bins:
+            accumulated += bin_count
+            if accumulated >= rank:
+                setattr(ret, attr, bin_to_value(bin_index))
+                break
+    return ret
+
+
+def compute_runs_analytics(
+    db: "Database",
+    window: float,
+    step: Optional[float] = None,
+    action_id: Optional[str] = None,
+    now: Optional[datetime.datetime] = None,
+) -> List[ActionRunsAnalytics]:
+    """
+    Computes the analytics of the runs of each action which finished in the
+    last `window` seconds (must be called with a database connection).
+
+    Args:
+        step: If given, the window is split in intervals with this size (in
+            seconds) and the analytics are computed for each interval.
+        action_id: If given, only the runs of this action are considered.
+
+    Returns:
+        The analytics of each action (with runs) for each interval (ordered
+        by the interval and then by action package/action name).
+
+    Note: the window and step are rounded to `BUCKET_SECONDS` (at least one
+    bucket) and when a step is given the start of the window is rounded down
+    to a multiple of the step.
+    """
+    from ._database import datetime_to_str, str_to_datetime
+    from ._models import Action, ActionPackage
+
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+    buckets_in_window = max(1, round(window / BUCKET_SECONDS))
+    buckets_in_step = buckets_in_window
+    if step is not None:
+        buckets_in_step = min(buckets_in_window, max(1, round(step / BUCKET_SECONDS)))
+
+    # The window ends in the bucket of the current time.
+    end_bucket = get_bucket_start(now) + datetime.timedelta(seconds=BUCKET_SECONDS)
+    start_bucket = end_bucket - datetime.timedelta(
+        seconds=BUCKET_SECONDS * buckets_in_window
+    )
+    # Without a step everything is aggregated in the database (otherwise
+    # each bucket is aggregated in its interval afterwards).
+    per_bucket = buckets_in_step != buckets_in_window
+    if per_bucket:
+        # Intervals are aligned to multiples of the step (i.e.: an interval
+        # of 1 hour starts at the start of an hour).
+        start_timestamp = start_bucket.timestamp()
+        start_bucket = datetime.datetime.fromtimestamp(
+            start_timestamp - start_timestamp % (BUCKET_SECONDS * buckets_in_step),
+            datetime.timezone.utc,
+        )
+
+    where = "run_stats.bucket_start >= ? AND run_stats.bucket_start < ?"
+    values: list = [datetime_to_str(start_bucket), datetime_to_str(end_bucket)]
+    if action_id:
+        where += " AND run_stats.action_id = ?"
+        values.append(action_id)
+
+    group_by = "run_stats.action_id"
+    bucket_start_column = "NULL"
+    if per_bucket:
+        group_by += ", run_stats.bucket_start"
+        bucket_start_column = "run_stats.bucket_start"
+
+    def get_slot(row_bucket_start: Optional[str]) -> int:
+        if row_bucket_start is None:
+            return 0
+        elapsed = (str_to_datetime(row_bucket_start) - start_bucket).total_seconds()
+        return int(elapsed // BUCKET_SECONDS) // buckets_in_step
+
+    key_to_analytics: Dict[Tuple[int, str], ActionRunsAnalytics] = {}
+    key_to_totals: Dict[Tuple[int, str], Tuple[float, float]] = {}
+    key_to_histograms: Dict[Tuple[int, str, int], Dict[int, int]] = {}
+
+    with db.cursor() as cursor:
+        db.execute_query(
+            cursor,
+            f"""
+SELECT run_stats.action_id, {bucket_start_column}, SUM(runs), SUM(passed),
+    SUM(failed), SUM(cancelled), SUM(run_time_total), SUM(queue_wait_total)
+FROM run_stats
+WHERE {where}
+GROUP BY {group_by}
+""",
+            values,
+        )
+        for (
+            row_action_id,
+            row_bucket_start,
+            runs,
+            passed,
+            failed,
+            cancelled,
+            run_time_total,
+            queue_wait_total,
+        ) in cursor.fetchall():
+            key = (get_slot(row_bucket_start), row_action_id)
+            analytics = key_to_analytics.get(key)
+            if analytics is None:
+                analytics = key_to_analytics[key] = ActionRunsAnalytics(
+                    action_id=row_action_id,
+                    action_name="",
+                    action_package_name="",
+                    window_start="",
+                    window_end="",
+                )
+                key_to_totals[key] = (0.0, 0.0)
+            analytics.runs += runs
+            analytics.passed += passed
+            analytics.failed += failed
+            analytics.cancelled += cancelled
+            run_time_sum, queue_wait_sum = key_to_totals[key]
+            key_to_totals[key] = (
+                run_time_sum + run_time_total,
+                queue_wait_sum + queue_wait_total,
+            )
+
+        db.execute_query(
+            cursor,
+            f"""
+SELECT run_stats.action_id, {bucket_start_column}, run_stats_bin.metric,
+    run_stats_bin.bin_index, SUM(run_stats_bin.count)
+FROM run_stats_bin JOIN run_stats ON run_stats_bin.run_stats_id = run_stats.id
+WHERE {where}
+GROUP BY {group_by}, run_stats_bin.metric, run_stats_bin.bin_index
+""",
+            values,
+        )
+        for (
+            row_action_id,
+            row_bucket_start,
+            metric,
+            bin_index,
+            count,
+        ) in cursor.fetchall():
+            histogram = key_to_histograms.setdefault(
+                (get_slot(row_bucket_start), row_action_id, metric), {}
+            )
+            histogram[bin_index] = histogram.get(bin_index, 0) + count
+
+    id_to_action = {action.id: action for action in db.all(Action)}
+    id_to_action_package = {
+        action_package.id: action_package for action_package in db.all(ActionPackage)
+    }
+
+    for (slot, row_action_id), analytics in key_to_analytics.items():
+        action = id_to_action.get(row_action_id)
+        if action is not None:
+            analytics.action_name = action.name
+            action_package = id_to_action_package.get(action.action_package_id)
+            if action_package is not None:
+                analytics.action_package_name = action_package.name
+
+        slot_start = start_bucket + datetime.timedelta(
+            seconds=BUCKET_SECONDS * buckets_in_step * slot
+        )
+        slot_end = min(
+            end_bucket,
+            slot_start + datetime.timedelta(seconds=BUCKET_SECONDS * buckets_in_step),
+        )
+        analytics.window_start = datetime_to_str(slot_start)
+        analytics.window_end = datetime_to_str(slot_end)
+
+        # The current bucket is still in progress.
+        elapsed = (min(slot_end, now) - slot_start).total_seconds()
+        if elapsed > 0:
+            analytics.throughput = analytics.runs / (elapsed / 60)
+        if analytics.runs:
+            analytics.error_rate = analytics.failed / analytics.runs
+
+        run_time_total, queue_wait_total = key_to_totals[(slot, row_action_id)]
+        analytics.run_time = _compute_percentiles(
+            key_to_histograms.get((slot, row_action_id, METRIC_RUN_TIME), {}),
+            run_time_total,
+        )
+        analytics.queue_wait = _compute_percentiles(
+            key_to_histograms.get((slot, row_action_id, METRIC_QUEUE_WAIT), {}),
+            queue_wait_total,
+        )
+
+    return [
+        analytics
+        for _key, analytics in sorted(
+            key_to_analytics.items(),
+            key=lambda item: (
+                item[0][0],
+                item[1].action_package_name,
+                item[1].action_name,
+                item[1].action_id,
+            ),
+        )
+    ]
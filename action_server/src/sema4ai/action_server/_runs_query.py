@@ -0,0 +1,207 @@
+"""
+Queries on the runs (most recent first) with keyset pagination.
+
+Pages are requested with the `numbered_id` of the last run of the previous
+page as the cursor (`before`), so, getting a page doesn't need to skip over
+all the runs of the previous pages as with `LIMIT/OFFSET`.
+
+Filters may be used to get only the runs of an action or action package,
+with some status, which started in a time range or with a given request id.
+"""
+
+import typing
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+
+if typing.TYPE_CHECKING:
+    from ._database import Database
+    from ._models import Run
+
+# Default/max number of runs in a page.
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+
+
+@dataclass
+class RunsQuery:
+    # Cursor: only runs with a `numbered_id` lower than this one are provided.
+    before: Optional[int] = None
+    limit: int = DEFAULT_PAGE_SIZE
+
+    action_id: Optional[str] = None
+    action_package_id: Optional[str] = None
+    status: Sequence[int] = ()
+    # Runs which started at or after/before the given times (isoformat).
+    started_after: Optional[str] = None
+    started_before: Optional[str] = None
+    request_id: Optional[str] = None
+
+
+@dataclass
+class RunsPage:
+    runs: List["Run"]
+    # The cursor to get the next page (None if this is the last page).
+    next_cursor: Optional[int]
+
+
+def parse_run_status(value: str) -> int:
+    """
+    Args:
+        value: The run status as a string (i.e.: "passed" or "2").
+
+    Returns:
+        The run status (raises ValueError if not valid).
+    """
+    from ._models import RunStatus, run_status_to_str
+
+    value = value.strip().lower().replace("_", " ")
+    for run_status in (
+        RunStatus.NOT_RUN,
+        RunStatus.RUNNING,
+        RunStatus.PASSED,
+        RunStatus.FAILED,
+        RunStatus.CANCELLED,
+    ):
+        if value in (run_status_to_str(run_status), str(run_status)):
+            return run_status
+    raise ValueError(f"Invalid run status: {value!r}")
+
+
+def normalize_time(value: Optional[str]) -> Optional[str]:
+    """
+    Converts the given time (isoformat) to the format used in the database
+    (UTC).
+
+    Raises:
+        ValueError: if the time is not valid.
+    """
+    import datetime
+
+    from ._database import datetime_to_str
+
+    if not value:
+        return None
+    try:
+        dt = datetime.datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid time (expected isoformat): {value!r}") from None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return datetime_to_str(dt.astimezone(datetime.timezone.utc))
+
+
+def create_runs_query(
+    before: Optional[Any] = None,
+    limit: Optional[Any] = None,
+    action_id: Optional[str] = None,
+    action_package_id: Optional[str] = None,
+    status: Optional[Sequence[Any]] = None,
+    started_after: Optional[str] = None,
+    started_before: Optional[str] = None,
+    request_id: Optional[str] = None,
+) -> RunsQuery:
+    """
+    Creates a query validating the values received in a request (the REST
+    API and the websocket use the same validation).
+
+    Raises:
+        ValueError: if some value is not valid.
+    """
+    if before is not None:
+        before = _to_int("before", before)
+
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+    else:
+        limit = _to_int("limit", limit)
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(
+                f"Invalid limit: {limit} (expected a value from 1 to {MAX_PAGE_SIZE})."
+            )
+
+    if isinstance(status, str):
+        status = (status,)
+
+    return RunsQuery(
+        before=before,
+        limit=limit,
+        action_id=action_id,
+        action_package_id=action_package_id,
+        status=tuple(parse_run_status(str(s)) for s in status or ()),
+        started_after=normalize_time(started_after),
+        started_before=normalize_time(started_before),
+        request_id=request_id,
+    )
+
+
+def _to_int(name: str, value: Any) -> int:
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid {name}: {value!r} (expected an integer).")
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"Invalid {name}: {value!r} (expected an integer).") from None
+
+
+def build_runs_query_sql(query: RunsQuery) -> Tuple[str, list]:
+    """
+    Returns:
+        The sql and the values to get the runs of the given query (note: one
+        more run than the limit is requested to know whether there's a next
+        page).
+    """
+    where: List[str] = []
+    values: list = []
+
+    if query.before is not None:
+        where.append("numbered_id < ?")
+        values.append(query.before)
+
+    if query.action_id:
+        where.append("action_id = ?")
+        values.append(query.action_id)
+
+    if query.action_package_id:
+        where.append("action_id IN (SELECT id FROM action WHERE action_package_id = ?)")
+        values.append(query.action_package_id)
+
+    if query.status:
+        where.append(f"status IN ({', '.join('?' for _ in query.status)})")
+        values.extend(query.status)
+
+    if query.started_after:
+        where.append("start_time >= ?")
+        values.append(query.started_after)
+
+    if query.started_before:
+        where.append("start_time < ?")
+        values.append(query.started_before)
+
+    if query.request_id:
+        where.append("request_id = ?")
+        values.append(query.request_id)
+
+    sql = "SELECT * FROM run"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+
+    limit = max(1, min(query.limit, MAX_PAGE_SIZE))
+    sql += f" ORDER BY numbered_id DESC LIMIT {limit + 1}"
+    return sql, values
+
+
+def query_runs(db: "Database", query: RunsQuery) -> RunsPage:
+    """
+    Provides a page of the runs matching the given query (must be called with
+    a database connection).
+    """
+    from ._models import Run
+
+    sql, values = build_runs_query_sql(query)
+    runs = db.select(Run, sql, values)
+
+    limit = max(1, min(query.limit, MAX_PAGE_SIZE))
+    if len(runs) > limit:
+        runs = runs[:limit]
+        return RunsPage(runs, runs[-1].numbered_id)
+    return RunsPage(runs, None)
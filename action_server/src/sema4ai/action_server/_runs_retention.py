@@ -0,0 +1,370 @@
+"""
+Retention of runs (and of their artifacts).
+
+A background thread periodically (`--retention-interval`) removes finished
+runs based on the policies of the action package of each run:
+
+- `--runs-max-age`: runs which started more than the given number of days ago.
+- `--runs-max-count`: runs older than the given number of most recent runs.
+- `--runs-max-artifacts-size`: runs older than the most recent runs whose
+  artifacts take up to the given size (in MB).
+
+The policies may be overridden per action package in the `package.yaml`
+(0 disables a policy for the action package):
+
+    retention:
+      max-age: 7  # in days
+      max-runs: 1000
+      max-artifacts-size: 500  # in MB
+
+Runs are removed from the database in small batches (each in its own short
+transaction, so, the write-lock isn't held for long, the pending callbacks of
+the runs are removed along with them), their artifacts directories are
+removed in a separate thread and afterwards the database is compacted
+(`wal_checkpoint` and `incremental_vacuum`).
+
+The same thread also removes the rollups of runs used for the analytics which
+are older than `--runs-analytics-max-age` days (see: `_runs_analytics`).
+
+Note: the space freed is only reclaimed incrementally if the database uses
+`auto_vacuum=INCREMENTAL` (the default for new databases). Databases created
+by older versions need a full `VACUUM` to enable it, which is only done
+explicitly with `action-server migrate --vacuum` (as it may take a while and
+needs free disk space about the size of the database).
+"""
+
+import datetime
+import logging
+import os
+import shutil
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+if typing.TYPE_CHECKING:
+    from ._database import Database
+    from ._models import ActionPackage
+    from ._settings import Settings
+
+log = logging.getLogger(__name__)
+
+# Max number of runs removed in each transaction.
+_BATCH_SIZE = 100
+
+# Max number of pages freed by each `incremental_vacuum`.
+_VACUUM_PAGES = 2000
+
+
+@dataclass
+class RetentionPolicy:
+    max_age: float = 0  # in days
+    max_runs: int = 0
+    max_artifacts_size: float = 0  # in MB
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age > 0 or self.max_runs > 0 or self.max_artifacts_size > 0
+
+
+def get_retention_policy(
+    settings: "Settings", action_package: "ActionPackage"
+) -> RetentionPolicy:
+    from ._actions_run_helpers import load_package_yaml_section
+
+    policy = RetentionPolicy(
+        max_age=settings.runs_max_age,
+        max_runs=settings.runs_max_count,
+        max_artifacts_size=settings.runs_max_artifacts_size,
+    )
+    config = load_package_yaml_section(settings, action_package, "retention")
+    for key, attr, cls in (
+        ("max-age", "max_age", float),
+        ("max-runs", "max_runs", int),
+        ("max-artifacts-size", "max_artifacts_size", float),
+    ):
+        if key not in config:
+            continue
+        value = config[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            log.critical(
+                f"Invalid `retention.{key}` in the package.yaml of "
+                f"{action_package.name}: {value!r} (ignoring it)."
+            )
+            continue
+        setattr(policy, attr, cls(value))
+    return policy
+
+
+def _get_dir_size(directory: Path) -> int:
+    size = 0
+    for root, _dirs, files in os.walk(directory):
+        for f in files:
+            try:
+                size += os.stat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def _remove_dir(directory: Path) -> None:
+    try:
+        shutil.rmtree(directory, ignore_errors=False)
+    except FileNotFoundError:
+        pass
+    except Exception:
+        log.exception(f"Error removing artifacts of run: {directory}")
+
+
+class RunsRetention:
+    def __init__(self, settings: "Settings", db: "Database"):
+        self._settings = settings
+        self._db = db
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._remove_dirs_executor: Optional[ThreadPoolExecutor] = None
+
+        # Artifacts of finished runs don't change, so, their size is cached.
+        self._artifacts_sizes: Dict[str, int] = {}
+
+    def start(self) -> None:
+        self._remove_dirs_executor = ThreadPoolExecutor(
+            1, thread_name_prefix="RunsRetentionRemoveDirs"
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="RunsRetention", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._remove_dirs_executor is not None:
+            self._remove_dirs_executor.shutdown(wait=True)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                with self._db.connect():
+                    self.sweep()
+            except Exception:
+                log.exception("Error applying the retention of runs.")
+            self._stop_event.wait(self._settings.retention_interval)
+
+    def sweep(self) -> int:
+        """
+        Removes the runs which don't match the retention policies (and the
+        rollups of runs which are too old -- must be called with a database
+        connection).
+
+        Returns:
+            The number of runs removed.
+        """
+        from ._models import ActionPackage
+
+        removed = 0
+        for action_package in self._db.all(ActionPackage):
+            if self._stop_event.is_set():
+                break
+            policy = get_retention_policy(self._settings, action_package)
+            if not policy.enabled:
+                continue
+            runs = self._select_runs_to_remove(action_package, policy)
+            if runs:
+                log.info(
+                    f"Removing {len(runs)} runs of {action_package.name} "
+                    "(retention policy)."
+                )
+                removed += self._remove_runs(runs)
+
+        if self._settings.runs_analytics_max_age > 0 and not self._stop_event.is_set():
+            from ._runs_analytics import prune_run_stats
+
+            prune_run_stats(self._db, self._settings.runs_analytics_max_age)
+
+        if removed:
+            self._compact()
+        return removed
+
+    def _query(self, sql: str, values: list) -> List[Tuple[str, str]]:
+        db = self._db
+        with db.cursor() as cursor:
+            db.execute_query(cursor, sql, values)
+            return cursor.fetchall()
+
+    def _select_runs_to_remove(
+        self, action_package: "ActionPackage", policy: RetentionPolicy
+    ) -> Dict[str, str]:
+        """
+        Returns:
+            A dict with the id -> relative artifacts dir of the runs to remove.
+        """
+        from ._database import datetime_to_str
+        from ._models import RunStatus
+
+        # Only finished runs are removed.
+        base_sql = """
+SELECT run.id, run.relative_artifacts_dir
+FROM run JOIN action ON run.action_id = action.id
+WHERE action.action_package_id = ? AND run.status IN (?, ?, ?)
+"""
+        base_values = [
+            action_package.id,
+            RunStatus.PASSED,
+            RunStatus.FAILED,
+            RunStatus.CANCELLED,
+        ]
+        to_remove: Dict[str, str] = {}
+
+        if policy.max_age > 0:
+            cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+                days=policy.max_age
+            )
+            to_remove.update(
+                self._query(
+                    base_sql + "AND run.start_time < ?",
+                    base_values + [datetime_to_str(cutoff)],
+                )
+            )
+
+        if policy.max_runs > 0:
+            to_remove.update(
+                self._query(
+                    base_sql + "ORDER BY run.numbered_id DESC LIMIT -1 OFFSET ?",
+                    base_values + [policy.max_runs],
+                )
+            )
+
+        if policy.max_artifacts_size > 0:
+            max_size = policy.max_artifacts_size * 1024 * 1024
+            artifacts_dir = self._settings.artifacts_dir
+            total_size = 0
+            for run_id, relative_artifacts_dir in self._query(
+                base_sql + "ORDER BY run.numbered_id DESC", base_values
+            ):
+                if total_size > max_size:
+                    to_remove[run_id] = relative_artifacts_dir
+                    continue
+                size = self._artifacts_sizes.get(run_id)
+                if size is None:
+                    size = _get_dir_size(artifacts_dir / relative_artifacts_dir)
+                    self._artifacts_sizes[run_id] = size
+                total_size += size
+                if total_size > max_size:
+                    to_remove[run_id] = relative_artifacts_dir
+
+        return to_remove
+
+    def _remove_runs(self, runs: Dict[str, str]) -> int:
+        db = self._db
+        artifacts_dir = self._settings.artifacts_dir
+        items = list(runs.items())
+        removed = 0
+        for i in range(0, len(items), _BATCH_SIZE):
+            if self._stop_event.is_set():
+                break
+            batch = items[i : i + _BATCH_SIZE]
+            placeholders = ", ".join("?" for _ in batch)
+            run_ids = [run_id for run_id, _ in batch]
+            with db.transaction():
+                db.execute(
+                    f"DELETE FROM callback_outbox WHERE run_id IN ({placeholders})",
+                    run_ids,
+                )
+                db.execute(f"DELETE FROM run WHERE id IN ({placeholders})", run_ids)
+            removed += len(batch)
+
+            for run_id, relative_artifacts_dir in batch:
+                self._artifacts_sizes.pop(run_id, None)
+                if relative_artifacts_dir:
+                    self._remove_dir_async(artifacts_dir / relative_artifacts_dir)
+        return removed
+
+    def _remove_dir_async(self, directory: Path) -> None:
+        if self._remove_dirs_executor is None:
+            _remove_dir(directory)
+        else:
+            self._remove_dirs_executor.submit(_remove_dir, directory)
+
+    def _compact(self) -> None:
+        db = self._db
+        try:
+            with db.transaction(), db.cursor() as cursor:
+                # The pages are only freed when all the results are read.
+                db.execute_update_returning(
+                    cursor, f"PRAGMA incremental_vacuum({_VACUUM_PAGES})"
+                )
+                cursor.fetchall()
+
+            with db.cursor() as cursor:
+                db.execute_query(cursor, "PRAGMA wal_checkpoint(TRUNCATE)")
+                cursor.fetchall()
+        except Exception:
+            log.exception("Error compacting the database.")
+
+
+def is_incremental_vacuum_enabled(db: "Database") -> bool:
+    with db.cursor() as cursor:
+        db.execute_query(cursor, "PRAGMA auto_vacuum")
+        return cursor.fetchone()[0] == 2  # INCREMENTAL
+
+
+def enable_incremental_vacuum(db: "Database") -> None:
+    """
+    Makes sure that the database uses `auto_vacuum=INCREMENTAL` (must be
+    called with a database connection and when no other thread is using the
+    database as it may need a full `VACUUM`).
+    """
+    if is_incremental_vacuum_enabled(db):
+        log.info("Incremental vacuum is already enabled in the database.")
+        return
+
+    log.info(
+        "Enabling incremental vacuum in the database (one time operation, "
+        "it may take a while)."
+    )
+    with db.cursor() as cursor:
+        db.execute_query(cursor, "PRAGMA auto_vacuum = INCREMENTAL")
+        db.execute_query(cursor, "VACUUM")
+    log.info("Incremental vacuum enabled in the database.")
+
+
+def _is_retention_enabled(settings: "Settings", db: "Database") -> bool:
+    from ._models import ActionPackage
+
+    for action_package in db.all(ActionPackage):
+        if get_retention_policy(settings, action_package).enabled:
+            return True
+    return False
+
+
+@contextmanager
+def setup_runs_retention(settings: "Settings") -> Iterator[None]:
+    from ._models import get_db
+
+    db = get_db()
+    with db.connect():
+        enabled = _is_retention_enabled(settings, db)
+        if enabled and not is_incremental_vacuum_enabled(db):
+            log.info(
+                "The database does not use incremental vacuum, so, the space "
+                "freed by the retention of runs is not reclaimed (to enable it, "
+                "run `action-server migrate --vacuum` with the action server "
+                "stopped -- note: it does a full VACUUM, which may take a while "
+                "and needs free disk space about the size of the database)."
+            )
+
+    if not enabled and settings.runs_analytics_max_age <= 0:
+        yield
+        return
+
+    retention = RunsRetention(settings, db)
+    retention.start()
+    try:
+        yield
+    finally:
+        retention.stop()
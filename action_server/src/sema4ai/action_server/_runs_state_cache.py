@@ -14,6 +14,7 @@ from typing import Any, Dict, Literal, Optional
 if typing.TYPE_CHECKING:
     from ._database import Database
     from ._models import Run
+    from ._runs_query import RunsPage, RunsQuery
 
 
 log = logging.getLogger(__name__)
@@ -72,9 +73,20 @@ class RunsState:
         self._db = db
         self._run_id_to_runtime_info: dict[str, RunRuntimeInfo] = {}
 
-    def get_current_run_state(self, offset: int = 0, limit: int = 200) -> list["Run"]:
+    def get_current_run_state(self, limit: int = 200) -> list["Run"]:
+        """
+        Provides the most recent runs.
+        """
+        from ._runs_query import RunsQuery
+
+        return self.query_runs(RunsQuery(limit=limit)).runs
+
+    def query_runs(self, query: "RunsQuery") -> "RunsPage":
+        """
+        Provides a page of the runs matching the given query.
+        """
         from ._database import Database
-        from ._models import Run
+        from ._runs_query import query_runs
 
         assert (
             self.semaphore._value == 0
@@ -82,9 +94,7 @@ class RunsState:
         db: Database = self._db
 
         with db.connect():
-            return self._db.all(
-                Run, offset=offset, limit=limit, order_by="numbered_id DESC"
-            )
+            return query_runs(db, query)
 
     def get_run_from_id(self, run_id: str) -> "Run":
         """
@@ -111,10 +111,16 @@ def start_server(
     from . import _actions_process_pool
     from ._api_action_package import action_package_api_router
     from ._api_action_routes import _ActionRoutes
+    from ._api_analytics import analytics_api_router
     from ._api_oauth2 import oauth2_api_router
+    from ._api_process_pool import process_pool_api_router
     from ._api_run import run_api_router
     from ._api_secrets import secrets_api_router
     from ._app import get_app
+    from ._artifacts_staging import setup_artifacts_staging
+    from ._callback_dispatcher import setup_callback_dispatcher
+    from ._db_group_commit import setup_group_commit_writer
+    from ._runs_retention import setup_runs_retention
     from ._server_websockets import websocket_api_router
     from ._settings import get_settings
 
@@ -180,6 +186,12 @@ def start_server(
     app.include_router(websocket_api_router)
     app.include_router(secrets_api_router, include_in_schema=settings.full_openapi_spec)
     app.include_router(oauth2_api_router, include_in_schema=settings.full_openapi_spec)
+    app.include_router(
+        process_pool_api_router, include_in_schema=settings.full_openapi_spec
+    )
+    app.include_router(
+        analytics_api_router, include_in_schema=settings.full_openapi_spec
+    )
 
     @lru_cache
     def get_static_config_data() -> dict[str, Any]:
@@ -229,6 +241,9 @@ def start_server(
             Returns:
                 True if the reload was successful and False otherwise.
             """
+            from sema4ai.action_server._actions_result_cache import (
+                clear_result_cache,
+            )
             from sema4ai.action_server._cli_impl import _import_actions
             from sema4ai.action_server._models import get_db
             from sema4ai.action_server._server_websockets import report_mtime_changed
@@ -256,6 +271,9 @@ def start_server(
                 action_routes.unregister_actions()
                 action_routes.register_actions()
 
+                # Results of the previous code must not be reused.
+                clear_result_cache()
+
                 actions_process_pool = _actions_process_pool.get_actions_process_pool()
                 actions_process_pool.on_reload(
                     action_routes.action_package_id_to_action_package,
@@ -494,10 +512,16 @@ def start_server(
 
     app.custom_lifespan.register(_expose_and_shutdown)
 
-    with _actions_process_pool.setup_actions_process_pool(
-        settings,
-        action_routes.action_package_id_to_action_package,
-        action_routes.actions,
+    with (
+        _actions_process_pool.setup_actions_process_pool(
+            settings,
+            action_routes.action_package_id_to_action_package,
+            action_routes.actions,
+        ),
+        setup_group_commit_writer(settings),
+        setup_callback_dispatcher(settings),
+        setup_artifacts_staging(settings),
+        setup_runs_retention(settings),
     ):
         kwargs = settings.to_uvicorn()
         config = uvicorn.Config(app=app, **kwargs, timeout_graceful_shutdown=5)
@@ -259,6 +259,56 @@ async def handle_start_listen_run_events(sid: str):
         _socket_server.enter_room(sid, "clients_listening_runs")
 
 
+@_socket_server.on("list_runs")
+async def handle_list_runs(sid: str, data: dict):
+    """
+    Lists a page of the runs (for paging through older runs or filtering).
+
+    The `data` may have the `message_id` (sent back in the reply) and the
+    fields of `RunsQuery` (`before` is the cursor with the `next_cursor` of
+    the previous page). The reply is a `runs_listed` message with the
+    `message_id`, `runs` and `next_cursor`.
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    from sema4ai.action_server._runs_query import create_runs_query
+    from sema4ai.action_server._runs_state_cache import get_global_runs_state
+
+    message_id = data.get("message_id")
+    try:
+        query = create_runs_query(
+            before=data.get("before"),
+            limit=data.get("limit"),
+            action_id=data.get("action_id"),
+            action_package_id=data.get("action_package_id"),
+            status=data.get("status"),
+            started_after=data.get("started_after"),
+            started_before=data.get("started_before"),
+            request_id=data.get("request_id"),
+        )
+    except ValueError as e:
+        await _socket_server.emit(
+            "runs_listed", {"message_id": message_id, "error": str(e)}, to=sid
+        )
+        return
+
+    def _query_runs():
+        global_runs_state = get_global_runs_state()
+        with global_runs_state.semaphore:
+            return global_runs_state.query_runs(query)
+
+    page = await run_in_threadpool(_query_runs)
+    await _socket_server.emit(
+        "runs_listed",
+        {
+            "message_id": message_id,
+            "runs": [asdict(run) for run in page.runs],
+            "next_cursor": page.next_cursor,
+        },
+        to=sid,
+    )
+
+
 async def _report_runs(sid: str, runs: list["Run"]):
     await _socket_server.emit("runs_collected", [asdict(run) for run in runs], to=sid)
 
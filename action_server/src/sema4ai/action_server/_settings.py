@@ -34,6 +34,12 @@ HEADER_ACTION_ASYNC_COMPLETION = "x-action-async-completion"
 # A context that will be passed to the action with information on the request (agent id, thread id, etc).
 HEADER_ACTION_INVOCATION_CONTEXT = "x-action-invocation-context"
 
+# The priority class ("high", "normal" or "low") used if the run needs to wait for a process to be available.
+HEADER_ACTION_PRIORITY = "x-action-priority"
+
+# Set to "1" or "true" to keep the inputs/result of the run as files in the run artifacts (by default those are sent inline to the process running the action).
+HEADER_ACTION_ARTIFACTS = "x-action-artifacts"
+
 # boolean (true if the action is consequential -- i.e.: it'll change the state of the world, false means it's an action that shouldn't change anything).
 # Set in the openapi spec.
 OPENAPI_SPEC_IS_CONSEQUENTIAL = "x-openai-isConsequential"
@@ -160,6 +166,107 @@ class Settings:
     max_processes: int = 20
     reuse_processes: bool = False
 
+    # Per action package overrides for the number of warm processes in the
+    # format: `<package_name>=<min>:<max>,<other_package_name>=<min>:<max>`.
+    package_processes: str = ""
+
+    # How new worker processes are started: "spawn" launches a new python
+    # interpreter for each process and "zygote" (Linux only) forks new
+    # processes from a template process which has the modules preloaded.
+    worker_start_mode: str = "spawn"
+
+    # How the action server talks to worker processes: "tcp" uses a loopback
+    # TCP connection and "unix" (not available on Windows) uses a unix socket
+    # pair inherited by the worker.
+    worker_transport: str = "tcp"
+
+    # How messages exchanged with worker processes are framed: "auto" uses the
+    # fastest framing available in both the action server and the worker
+    # environment ("binary-msgpack" if `msgspec` or `msgpack` is available,
+    # otherwise "binary-json") and "headers" uses http-style headers.
+    worker_framing: str = "auto"
+
+    # Whether the output of worker processes is echoed to the console: "on",
+    # "off" or "limited" (a limited number of lines per second per process).
+    worker_output_echo: str = "on"
+
+    # Maximum number of runs which may wait for a process to be available
+    # (0 means no limit). When full, new requests are rejected with a 429.
+    max_queue_depth: int = 0
+
+    # Maximum time (in seconds) that a run may wait for a process to be
+    # available (0 means no limit). When elapsed, the run is rejected with a 503.
+    max_queue_wait: float = 0
+
+    # Recycling policies for reused processes (0 means no limit): a process
+    # is recycled after running the given number of actions, when its RSS
+    # (in MB) goes over the given threshold or when it's older than the given
+    # number of seconds.
+    max_process_runs: int = 0
+    max_process_rss: int = 0
+    max_process_age: float = 0
+
+    # Inputs/results of runs which are up to this size (in characters of the
+    # json contents) are sent inline to/from the process running the action
+    # (bigger ones are written to files). 0 means always use files.
+    inline_payload_threshold: int = 256 * 1024
+
+    # How the inputs/outputs of actions are validated against their schemas:
+    # "jsonschema" or "fast" (which generates code for the subset of json
+    # schema commonly used in actions and uses "jsonschema" for the rest).
+    schema_validator: str = "jsonschema"
+
+    # How runs are orchestrated: "threads" (a thread is used for each run
+    # while it waits for a process and for the action to finish) or "asyncio"
+    # (the run is awaited in the event loop, so, threads are only used for
+    # blocking calls such as writing to the database or creating processes).
+    run_orchestration: str = "threads"
+
+    # Maximum number of results kept in the result cache for actions which
+    # are explicitly not consequential (0 means the cache is disabled).
+    result_cache_size: int = 0
+
+    # Default time to live (in seconds) of cached results for actions without
+    # a specific configuration (0 means only configured actions are cached).
+    result_cache_ttl: float = 0
+
+    # Whether identical runs (of actions which are explicitly not
+    # consequential) started while one is in flight reuse its outcome.
+    coalesce_runs: bool = False
+
+    # Maximum number of items of a batch (`/run-batch`) which run at the same
+    # time (per request).
+    batch_parallelism: int = 4
+
+    # Delivery of the results of async runs to the callback url.
+    callback_max_attempts: int = 10
+    callback_max_per_host: int = 4
+
+    # How the files of runs are stored: "persistent" (always written to the
+    # `artifacts_dir`) or "lightweight" (staged in `artifacts_staging_dir`, a
+    # tmpfs by default, and only persisted when the run fails, when sampled
+    # -- see: `artifacts_sample_rate` -- or when requested with the
+    # `x-action-artifacts` header).
+    artifacts_mode: str = "persistent"
+    artifacts_staging_dir: str = ""
+    artifacts_sample_rate: float = 0
+
+    # Time (in milliseconds) the writer of runs waits for more writes to be
+    # batched in the same transaction (0 means that only the writes queued
+    # while the previous transaction is committed are batched).
+    db_group_commit_delay: float = 0
+
+    # Retention of runs (0 means no limit). May be overridden per action
+    # package in `retention` in the `package.yaml`.
+    runs_max_age: float = 0  # in days
+    runs_max_count: int = 0
+    runs_max_artifacts_size: float = 0  # in MB
+    # Time (in seconds) between the checks of the retention of runs.
+    retention_interval: float = 300
+    # Rollups of runs used for the analytics older than this are removed
+    # (0 means they're kept forever).
+    runs_analytics_max_age: float = 30  # in days
+
     full_openapi_spec: bool = False
 
     use_https: bool = False
@@ -228,6 +335,34 @@ class Settings:
             "min_processes",
             "max_processes",
             "reuse_processes",
+            "package_processes",
+            "worker_start_mode",
+            "worker_transport",
+            "worker_framing",
+            "worker_output_echo",
+            "max_queue_depth",
+            "max_queue_wait",
+            "max_process_runs",
+            "max_process_rss",
+            "max_process_age",
+            "inline_payload_threshold",
+            "schema_validator",
+            "run_orchestration",
+            "result_cache_size",
+            "result_cache_ttl",
+            "coalesce_runs",
+            "batch_parallelism",
+            "callback_max_attempts",
+            "callback_max_per_host",
+            "artifacts_mode",
+            "artifacts_staging_dir",
+            "artifacts_sample_rate",
+            "db_group_commit_delay",
+            "runs_max_age",
+            "runs_max_count",
+            "runs_max_artifacts_size",
+            "retention_interval",
+            "runs_analytics_max_age",
             "full_openapi_spec",
             "ssl_self_signed",
             "ssl_keyfile",
@@ -238,6 +373,32 @@ class Settings:
             if hasattr(args, attr):
                 setattr(settings, attr, getattr(args, attr))
 
+        if settings.package_processes:
+            from sema4ai.action_server._actions_process_pool_demand import (
+                parse_package_processes,
+            )
+
+            try:
+                parse_package_processes(settings.package_processes)
+            except ValueError as e:
+                raise ActionServerValidationError(str(e))
+
+        if settings.max_queue_depth < 0:
+            raise ActionServerValidationError("--max-queue-depth must be >= 0.")
+
+        if settings.max_queue_wait < 0:
+            raise ActionServerValidationError("--max-queue-wait must be >= 0.")
+
+        for attr in (
+            "max_process_runs",
+            "max_process_rss",
+            "max_process_age",
+            "inline_payload_threshold",
+        ):
+            if getattr(settings, attr) < 0:
+                arg_name = attr.replace("_", "-")
+                raise ActionServerValidationError(f"--{arg_name} must be >= 0.")
+
         if hasattr(args, "https"):
             settings.use_https = args.https
 
@@ -37,6 +37,16 @@ MIGRATION_ID_TO_NAME: Dict[int, str] = {
     7: "add_code_verifier",
     # we'll look for a 'migration_add_request_id_to_run' module based on this.
     8: "add_request_id_to_run",
+    # we'll look for a 'migration_add_cache_hit_to_run' module based on this.
+    9: "add_cache_hit_to_run",
+    # we'll look for a 'migration_add_leader_run_id_to_run' module based on this.
+    10: "add_leader_run_id_to_run",
+    # we'll look for a 'migration_add_callback_outbox' module based on this.
+    11: "add_callback_outbox",
+    # we'll look for a 'migration_add_runs_query_indexes' module based on this.
+    12: "add_runs_query_indexes",
+    # we'll look for a 'migration_add_run_stats' module based on this.
+    13: "add_run_stats",
 }
 
 CURRENT_VERSION: int = max(MIGRATION_ID_TO_NAME.keys())
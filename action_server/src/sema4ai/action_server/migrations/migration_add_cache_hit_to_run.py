@@ -0,0 +1,15 @@
+from sema4ai.action_server._database import Database
+from sema4ai.action_server.migrations import Migration
+
+
+def migrate(db: Database) -> None:
+    from sema4ai.action_server.migrations import MIGRATION_ID_TO_NAME
+
+    db.execute(
+        """
+ALTER TABLE run 
+ADD COLUMN cache_hit INTEGER CHECK(cache_hit IN (0, 1)) NOT NULL DEFAULT 0;
+"""
+    )
+
+    db.insert(Migration(id=9, name=MIGRATION_ID_TO_NAME[9]))
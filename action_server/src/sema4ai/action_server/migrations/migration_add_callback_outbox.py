@@ -0,0 +1,29 @@
+from sema4ai.action_server._database import Database
+from sema4ai.action_server.migrations import Migration
+
+
+def migrate(db: Database) -> None:
+    from sema4ai.action_server.migrations import MIGRATION_ID_TO_NAME
+
+    sqls = [
+        """
+CREATE TABLE IF NOT EXISTS callback_outbox(
+    id TEXT NOT NULL PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    body TEXT NOT NULL,
+    headers TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    next_attempt_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT NOT NULL DEFAULT ''  
+)
+""",
+        """
+CREATE UNIQUE INDEX callback_outbox_id_index ON callback_outbox(id);
+""",
+    ]
+    for sql in sqls:
+        db.execute(sql)
+
+    db.insert(Migration(id=11, name=MIGRATION_ID_TO_NAME[11]))
@@ -0,0 +1,15 @@
+from sema4ai.action_server._database import Database
+from sema4ai.action_server.migrations import Migration
+
+
+def migrate(db: Database) -> None:
+    from sema4ai.action_server.migrations import MIGRATION_ID_TO_NAME
+
+    db.execute(
+        """
+ALTER TABLE run 
+ADD COLUMN leader_run_id TEXT NOT NULL DEFAULT '';
+"""
+    )
+
+    db.insert(Migration(id=10, name=MIGRATION_ID_TO_NAME[10]))
@@ -0,0 +1,47 @@
+from sema4ai.action_server._database import Database
+from sema4ai.action_server.migrations import Migration
+
+
+def migrate(db: Database) -> None:
+    from sema4ai.action_server.migrations import MIGRATION_ID_TO_NAME
+
+    sqls = [
+        """
+CREATE TABLE IF NOT EXISTS run_stats(
+    id TEXT NOT NULL PRIMARY KEY,
+    action_id TEXT NOT NULL,
+    bucket_start TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    cancelled INTEGER NOT NULL,
+    run_time_total REAL NOT NULL,
+    queue_wait_total REAL NOT NULL
+)
+""",
+        """
+CREATE UNIQUE INDEX run_stats_id_index ON run_stats(id);
+""",
+        """
+CREATE INDEX run_stats_bucket_start_action_id_composite_index ON run_stats(bucket_start, action_id);
+""",
+        """
+CREATE TABLE IF NOT EXISTS run_stats_bin(
+    id TEXT NOT NULL PRIMARY KEY,
+    run_stats_id TEXT NOT NULL,
+    metric INTEGER NOT NULL,
+    bin_index INTEGER NOT NULL,
+    count INTEGER NOT NULL
+)
+""",
+        """
+CREATE UNIQUE INDEX run_stats_bin_id_index ON run_stats_bin(id);
+""",
+        """
+CREATE INDEX run_stats_bin_run_stats_id_non_unique_index ON run_stats_bin(run_stats_id);
+""",
+    ]
+    for sql in sqls:
+        db.execute(sql)
+
+    db.insert(Migration(id=13, name=MIGRATION_ID_TO_NAME[13]))
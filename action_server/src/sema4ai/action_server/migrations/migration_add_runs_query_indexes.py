@@ -0,0 +1,22 @@
+from sema4ai.action_server._database import Database
+from sema4ai.action_server.migrations import Migration
+
+
+def migrate(db: Database) -> None:
+    from sema4ai.action_server.migrations import MIGRATION_ID_TO_NAME
+
+    sqls = [
+        """
+CREATE INDEX run_start_time_non_unique_index ON run(start_time);
+""",
+        """
+CREATE INDEX run_action_id_numbered_id_composite_index ON run(action_id, numbered_id);
+""",
+        """
+CREATE INDEX run_status_numbered_id_composite_index ON run(status, numbered_id);
+""",
+    ]
+    for sql in sqls:
+        db.execute(sql)
+
+    db.insert(Migration(id=12, name=MIGRATION_ID_TO_NAME[12]))
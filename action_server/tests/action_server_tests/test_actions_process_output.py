@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+
+import pytest
+
+
+def _create_pipe():
+    r, w = os.pipe()
+    return os.fdopen(r, "rb"), w
+
+
+def test_output_pump_multiplexes_streams(capsys) -> None:
+    from sema4ai.action_server._actions_process_output import OutputPump
+
+    pump = OutputPump(echo="on")
+    try:
+        found = {1: bytearray(), 2: bytearray()}
+        finished = {1: threading.Event(), 2: threading.Event()}
+
+        def on_output(i, data):
+            found[i].extend(data)
+            if found[i].endswith(b"end\n"):
+                finished[i].set()
+
+        writers = {}
+        for i in (1, 2):
+            stream, writers[i] = _create_pipe()
+            pump.register(stream, 100 + i, lambda data, i=i: on_output(i, data))
+
+        os.write(writers[1], b"line 1 from 1\nline 2 ")
+        os.write(writers[2], b"line 1 from 2\n")
+        os.write(writers[1], b"from 1\nend\n")
+        os.write(writers[2], b"end\n")
+
+        for i in (1, 2):
+            assert finished[i].wait(5)
+            os.close(writers[i])
+
+        assert found[1] == b"line 1 from 1\nline 2 from 1\nend\n"
+        assert found[2] == b"line 1 from 2\nend\n"
+    finally:
+        pump.dispose()
+
+    out = capsys.readouterr().out
+    assert "output (pid: 101): " in out
+    assert "line 2 from 1" in out
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Selector not used on Windows")
+def test_output_pump_eof_and_dispose(capsys) -> None:
+    from sema4ai.action_server._actions_process_output import OutputPump
+
+    pump = OutputPump(echo="off")
+    stream, w = _create_pipe()
+    received = threading.Event()
+    pump.register(stream, 10, lambda data: received.set())
+    os.write(w, b"some output\n")
+    assert received.wait(5)
+    assert pump.get_registered_count() == 1
+
+    os.close(w)
+    for _i in range(50):
+        if pump.get_registered_count() == 0:
+            break
+        threading.Event().wait(0.1)
+    assert pump.get_registered_count() == 0
+    assert stream.closed
+
+    # Nothing is printed with echo == "off".
+    assert "some output" not in capsys.readouterr().out
+
+    pump.dispose()
+    assert not pump._thread.is_alive()
+
+    # Registering after disposed just closes it.
+    stream, w = _create_pipe()
+    pump.register(stream, 11, lambda data: None)
+    assert stream.closed
+    os.close(w)
+
+
+def test_output_echo_limited(capsys, monkeypatch) -> None:
+    from sema4ai.action_server import _actions_process_output
+
+    monkeypatch.setattr(_actions_process_output, "_ECHO_MAX_LINES_PER_SECOND", 2)
+    echo = _actions_process_output._Echo(1, "limited")
+    echo.on_data(b"a\nb\nc\nd\npartial")
+    echo.flush()
+
+    out = capsys.readouterr().out
+    assert "a\n" in out
+    assert "b\n" in out
+    assert "c\n" not in out
+    assert "(3 lines not shown)" in out
+
+
+def test_output_pump_no_echo_zygote_logger(capsys, caplog) -> None:
+    import logging
+
+    from sema4ai.action_server._actions_process_output import OutputPump
+    from sema4ai.action_server._actions_process_zygote import _OutputLogger
+
+    caplog.set_level(logging.DEBUG)
+    pump = OutputPump(echo="on")
+    try:
+        logger = _OutputLogger(20)
+        finished = threading.Event()
+
+        def on_output(data):
+            logger(data)
+            if data.endswith(b"end\n"):
+                finished.set()
+
+        stream, w = _create_pipe()
+        pump.register(stream, 20, on_output, echo=False)
+        os.write(w, b"zygote line 1\nzygote ")
+        os.write(w, b"line 2\nend\n")
+        assert finished.wait(5)
+        os.close(w)
+    finally:
+        pump.dispose()
+
+    # The output is just logged (and not echoed to the console).
+    assert "zygote line" not in capsys.readouterr().out
+    assert "zygote (pid: 20): zygote line 1" in caplog.text
+    assert "zygote (pid: 20): zygote line 2" in caplog.text
@@ -1,11 +1,12 @@
 import json
 import logging
 import sys
+import threading
 from concurrent.futures import Future, TimeoutError
 from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterator
+from typing import Iterator, Optional
 
 import pytest
 
@@ -16,8 +17,10 @@ from sema4ai.action_server._actions_process_pool import (
 from sema4ai.action_server._robo_utils.run_in_thread import run_in_thread
 
 
-@pytest.fixture
-def actions_process_pool(tmpdir):
+@contextmanager
+def _create_actions_process_pool(
+    tmpdir, **settings_kwargs
+) -> Iterator[ActionsProcessPool]:
     from sema4ai.action_server._models import Action, ActionPackage
     from sema4ai.action_server._settings import Settings
 
@@ -27,6 +30,8 @@ def actions_process_pool(tmpdir):
     settings.reuse_processes = True
     settings.min_processes = 2
     settings.max_processes = 3
+    for key, value in settings_kwargs.items():
+        setattr(settings, key, value)
 
     action_package_id_to_action_package = {}
     actions = []
@@ -90,6 +95,12 @@ def greet(name: str, title="Mr.") -> str:
         logger.removeHandler(stream_handler)
 
 
+@pytest.fixture
+def actions_process_pool(tmpdir):
+    with _create_actions_process_pool(tmpdir) as ret:
+        yield ret
+
+
 @dataclass
 class _RunInfo:
     future: Future[int]
@@ -107,7 +118,12 @@ class _DummyRequest:
 
 @contextmanager
 def _create_run(
-    tmpdir, actions_process_pool: ActionsProcessPool, action, i
+    tmpdir,
+    actions_process_pool: ActionsProcessPool,
+    action,
+    i,
+    inline_inputs: Optional[str] = None,
+    inline_threshold: int = 0,
 ) -> Iterator[_RunInfo]:
     """
     Returns a future which provides the returncode. Note: the `with` statement
@@ -129,7 +145,8 @@ def _create_run(
     result_json = robot_artifacts / "result.json"
 
     request: Request = typing.cast(Request, _DummyRequest())
-    input_json.write_text(json.dumps({"name": "John"}))
+    if inline_inputs is None:
+        input_json.write_text(json.dumps({"name": "John"}))
     action_package = actions_process_pool.action_package_id_to_action_package[
         action.action_package_id
     ]
@@ -159,6 +176,8 @@ def _create_run(
                 dict(request.headers),
                 dict(request.cookies),
                 actions_process_pool._reuse_processes,
+                inline_inputs,
+                inline_threshold,
             )
 
         fut: Future[int] = run_in_thread(_run_action)
@@ -298,3 +317,355 @@ def test_actions_process_pool_basic(actions_process_pool: ActionsProcessPool):
 
                 assert actions_process_pool.get_idle_processes_count() == 0
                 assert actions_process_pool.get_running_processes_count() == 3
+
+
+def test_actions_process_pool_idle_not_blocked_by_spawn(
+    actions_process_pool: ActionsProcessPool,
+) -> None:
+    import threading
+
+    actions = actions_process_pool.actions
+    assert len(actions) == 1
+    action = next(iter(actions))
+
+    original_create_process_handle = actions_process_pool._create_process_handle
+    spawn_started = threading.Event()
+    release_spawn = threading.Event()
+
+    def slow_create_process_handle(action_package):
+        spawn_started.set()
+        assert release_spawn.wait(20)
+        return original_create_process_handle(action_package)
+
+    with actions_process_pool.obtain_process_for_action(action) as p1:
+        with actions_process_pool.obtain_process_for_action(action) as p2:
+            assert p1 is not None
+            assert p2 is not None
+            assert actions_process_pool.get_idle_processes_count() == 0
+
+            actions_process_pool._create_process_handle = slow_create_process_handle  # type: ignore
+
+            def _obtain_new_process():
+                with actions_process_pool.obtain_process_for_action(action) as p3:
+                    return p3.pid
+
+            fut = run_in_thread(_obtain_new_process)
+            assert spawn_started.wait(10)
+            assert actions_process_pool.get_pending_processes_count() == 1
+
+        # Releasing p2 must not be blocked by the process being spawned.
+        assert actions_process_pool.get_idle_processes_count() == 1
+
+        # And an idle process can be obtained while the spawn is pending.
+        with actions_process_pool.obtain_process_for_action(action) as p4:
+            assert p4 is p2
+            assert actions_process_pool.get_pending_processes_count() == 1
+
+        release_spawn.set()
+        assert fut.result(20) not in (p1.pid, p2.pid)
+        actions_process_pool._create_process_handle = original_create_process_handle  # type: ignore
+
+    assert actions_process_pool.get_pending_processes_count() == 0
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Zygote only available on Linux")
+def test_actions_process_pool_zygote(tmpdir) -> None:
+    with _create_actions_process_pool(
+        tmpdir, worker_start_mode="zygote"
+    ) as actions_process_pool:
+        assert actions_process_pool._use_zygote
+        assert len(actions_process_pool._zygotes) == 1
+        zygote = next(iter(actions_process_pool._zygotes.values()))
+        action = next(iter(actions_process_pool.actions))
+
+        with _create_run(tmpdir, actions_process_pool, action, 1) as run_info:
+            assert run_info.future.result() == 0
+            assert run_info.result_json.exists()
+            assert b"Hello Mr. John" in run_info.result_json.read_bytes()
+
+            # The process was forked from the zygote.
+            import psutil
+
+            assert psutil.Process(run_info.process_handle.pid).ppid() == zygote.pid
+            assert run_info.process_handle.is_alive()
+
+        run_info.process_handle.kill()
+        assert not run_info.process_handle.is_alive()
+
+    assert not actions_process_pool._zygotes
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Zygote only available on Linux")
+def test_zygote_fork_timeout_marks_broken() -> None:
+    import socket
+
+    from sema4ai.action_server._actions_process_zygote import Zygote
+
+    class _FakeProcess:
+        pid = 1
+
+        def poll(self):
+            return None
+
+        def kill(self):
+            pass
+
+    # A zygote which never replies to the fork request.
+    zygote = Zygote.__new__(Zygote)
+    zygote._process = _FakeProcess()
+    zygote._sock, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    zygote._sock.settimeout(0.1)
+    zygote._lock = threading.Lock()
+    zygote._broken = False
+    try:
+        assert zygote.is_alive()
+        with pytest.raises(socket.timeout):
+            zygote.fork_worker("127.0.0.1", 1)
+        assert not zygote.is_alive()
+
+        # A late reply must not be read by the next fork request.
+        peer.send(json.dumps({"pid": 1234}).encode("utf-8"))
+        with pytest.raises(RuntimeError, match="broken"):
+            zygote.fork_worker("127.0.0.1", 1)
+    finally:
+        zygote.dispose()
+        peer.close()
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="Zygote only available on Linux")
+def test_actions_process_pool_zygote_fork_timeout(tmpdir) -> None:
+    import socket
+
+    with _create_actions_process_pool(
+        tmpdir, worker_start_mode="zygote"
+    ) as actions_process_pool:
+        zygote = next(iter(actions_process_pool._zygotes.values()))
+        action = next(iter(actions_process_pool.actions))
+        action_package = actions_process_pool.action_package_id_to_action_package[
+            action.action_package_id
+        ]
+
+        # Simulate a zygote which doesn't reply in time.
+        zygote._sock.close()
+        zygote._sock, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        zygote._sock.settimeout(0.1)
+        try:
+            # The process is spawned instead and the zygote is discarded.
+            process_handle = actions_process_pool._create_process_handle(action_package)
+            try:
+                assert process_handle.is_alive()
+            finally:
+                process_handle.kill()
+            assert zygote not in actions_process_pool._zygotes.values()
+        finally:
+            peer.close()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Unix sockets not used on Windows")
+@pytest.mark.parametrize("worker_start_mode", ["spawn", "zygote"])
+def test_actions_process_pool_unix_transport(tmpdir, worker_start_mode) -> None:
+    if worker_start_mode == "zygote" and sys.platform != "linux":
+        pytest.skip("Zygote only available on Linux")
+
+    with _create_actions_process_pool(
+        tmpdir, worker_transport="unix", worker_start_mode=worker_start_mode
+    ) as actions_process_pool:
+        assert actions_process_pool._worker_transport == "unix"
+        action = next(iter(actions_process_pool.actions))
+
+        for i in range(2):
+            with _create_run(tmpdir, actions_process_pool, action, i) as run_info:
+                assert run_info.future.result() == 0
+                assert b"Hello Mr. John" in run_info.result_json.read_bytes()
+
+
+@pytest.mark.parametrize("worker_framing", ["auto", "binary-json", "headers"])
+def test_actions_process_pool_framing(tmpdir, worker_framing) -> None:
+    with _create_actions_process_pool(
+        tmpdir, worker_framing=worker_framing
+    ) as actions_process_pool:
+        action = next(iter(actions_process_pool.actions))
+
+        for i in range(2):
+            with _create_run(tmpdir, actions_process_pool, action, i) as run_info:
+                assert run_info.future.result() == 0
+                assert b"Hello Mr. John" in run_info.result_json.read_bytes()
+
+                framing = run_info.process_handle._writer.framing
+                if worker_framing == "auto":
+                    # msgspec is available in the test environment.
+                    assert framing == "binary-msgpack"
+                else:
+                    assert framing == worker_framing
+
+
+def test_actions_process_pool_output_echo_off(tmpdir, capsys) -> None:
+    with _create_actions_process_pool(
+        tmpdir, worker_output_echo="off"
+    ) as actions_process_pool:
+        action = next(iter(actions_process_pool.actions))
+
+        with _create_run(tmpdir, actions_process_pool, action, 0) as run_info:
+            assert run_info.future.result() == 0
+            pid = run_info.process_handle.pid
+
+        # The output is still written to the run output but not to the console.
+        assert run_info.output_file.exists()
+        assert f"output (pid: {pid})" not in capsys.readouterr().out
+
+
+def test_actions_process_pool_inline_payloads(
+    actions_process_pool: ActionsProcessPool, tmpdir
+) -> None:
+    action = next(iter(actions_process_pool.actions))
+    inline_inputs = json.dumps({"name": "Jane"})
+
+    with _create_run(
+        tmpdir, actions_process_pool, action, 0, inline_inputs, 1024
+    ) as run_info:
+        assert run_info.future.result() == 0
+        inline_result = run_info.process_handle.inline_result
+        assert inline_result is not None
+        assert json.loads(inline_result)["result"] == "Hello Mr. Jane."
+        assert not run_info.input_json.exists()
+        assert not run_info.result_json.exists()
+
+    # The result is bigger than the threshold: spilled to the file.
+    with _create_run(
+        tmpdir, actions_process_pool, action, 1, inline_inputs, 10
+    ) as run_info:
+        assert run_info.future.result() == 0
+        assert run_info.process_handle.inline_result is None
+        assert b"Hello Mr. Jane." in run_info.result_json.read_bytes()
+
+
+def test_actions_process_pool_run_async(
+    actions_process_pool: ActionsProcessPool, tmpdir
+) -> None:
+    import asyncio
+    import datetime
+
+    from sema4ai.action_server._database import datetime_to_str
+    from sema4ai.action_server._models import Run, RunStatus
+
+    action = next(iter(actions_process_pool.actions))
+    action_package = actions_process_pool.action_package_id_to_action_package[
+        action.action_package_id
+    ]
+    robot_artifacts = Path(tmpdir) / "artifacts_async"
+    robot_artifacts.mkdir(parents=True, exist_ok=True)
+    output_file = robot_artifacts / "output.txt"
+    run: Run = Run(
+        id="run-id",
+        numbered_id=1,
+        status=RunStatus.NOT_RUN,
+        action_id=action.id,
+        start_time=datetime_to_str(datetime.datetime.now(datetime.timezone.utc)),
+        run_time=None,
+        inputs=json.dumps({}),
+        result=None,
+        error_message=None,
+        relative_artifacts_dir="rel-artifacts-dir",
+    )
+
+    async def run_action(i: int) -> str:
+        ctx = actions_process_pool.obtain_process_for_action_async(action)
+        async with ctx as process_handle:
+            returncode = await process_handle.run_action_async(
+                run,
+                action_package,
+                action,
+                robot_artifacts / "input.json",
+                robot_artifacts,
+                output_file,
+                robot_artifacts / "result.json",
+                {},
+                {},
+                actions_process_pool._reuse_processes,
+                json.dumps({"name": f"John {i}"}),
+                1024,
+            )
+            assert returncode == 0
+            inline_result = process_handle.inline_result
+            assert inline_result is not None
+            return json.loads(inline_result)["result"]
+
+    async def run_actions():
+        return await asyncio.gather(*(run_action(i) for i in range(4)))
+
+    # More runs than processes: the remaining ones wait in the admission queue.
+    results = asyncio.run(run_actions())
+    assert results == [f"Hello Mr. John {i}." for i in range(4)]
+    assert actions_process_pool.get_stats()["admission"]["running"] == 0
+
+
+def test_replies_queue_get_async() -> None:
+    import asyncio
+    import threading
+
+    from sema4ai.action_server._actions_process_pool import _RepliesQueue
+
+    abandoned = []
+    queue = _RepliesQueue(lambda: abandoned.append(True))
+    queue.put({"msg": 1})
+
+    async def check():
+        # Already available.
+        assert await queue.get_async() == {"msg": 1}
+
+        # Put from another thread while awaited.
+        timer = threading.Timer(0.1, queue.put, args=({"msg": 2},))
+        timer.start()
+        assert await queue.get_async() == {"msg": 2}
+        timer.join()
+
+        assert not abandoned
+
+        # A cancelled waiter is reported (the process must not be reused).
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.get_async(), 0.05)
+        assert abandoned
+
+        # A reply received for a waiter which was cancelled afterwards is
+        # dropped (it's not kept for the next `get`).
+        del abandoned[:]
+        task = asyncio.ensure_future(queue.get_async())
+        await asyncio.sleep(0)
+        queue.put({"msg": 3})
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.05)
+        assert abandoned
+        assert queue.qsize() == 0
+
+    asyncio.run(check())
+
+
+def test_actions_process_pool_recycle_max_runs(tmpdir) -> None:
+    from devutils.fixtures import wait_for_condition
+
+    from sema4ai.action_server._robo_utils.process import is_process_alive
+
+    with _create_actions_process_pool(
+        tmpdir, min_processes=1, max_process_runs=2
+    ) as actions_process_pool:
+        action = next(iter(actions_process_pool.actions))
+
+        pids = []
+        for i in range(2):
+            with _create_run(tmpdir, actions_process_pool, action, i) as run_info:
+                assert run_info.future.result() == 0
+                pids.append(run_info.process_handle.pid)
+        assert pids[0] == pids[1]
+        retired = run_info.process_handle
+
+        # The replacement is spawned before the old process is stopped.
+        wait_for_condition(lambda: not is_process_alive(retired.pid), timeout=30)
+        assert actions_process_pool.get_idle_processes_count() == 1
+        assert actions_process_pool.get_stats()["recycled_processes"] == 1
+
+        with _create_run(tmpdir, actions_process_pool, action, 2) as run_info:
+            assert run_info.future.result() == 0
+            assert run_info.process_handle.pid != retired.pid
+            assert run_info.process_handle.runs_count == 1
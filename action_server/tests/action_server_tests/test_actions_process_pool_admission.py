@@ -0,0 +1,143 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+
+def _wait_in_thread(admission_queue, ticket, granted_order: list):
+    def wait():
+        try:
+            admission_queue.wait(ticket)
+        except BaseException as e:
+            granted_order.append(e)
+        else:
+            granted_order.append(ticket)
+
+    t = threading.Thread(target=wait, daemon=True)
+    t.start()
+    return t
+
+
+def test_admission_queue_fifo_and_priority() -> None:
+    from sema4ai.action_server._actions_process_pool_admission import (
+        PRIORITY_HIGH,
+        PRIORITY_LOW,
+        AdmissionQueue,
+    )
+
+    admission_queue = AdmissionQueue(max_running=1)
+    running = admission_queue.enqueue()
+    assert running.granted
+
+    low = admission_queue.enqueue(PRIORITY_LOW)
+    normal1 = admission_queue.enqueue()
+    normal2 = admission_queue.enqueue()
+    high = admission_queue.enqueue(PRIORITY_HIGH)
+    assert not any(t.granted for t in (low, normal1, normal2, high))
+    assert admission_queue.get_queue_depth() == 4
+
+    granted_order: list = []
+    threads = [
+        _wait_in_thread(admission_queue, t, granted_order)
+        for t in (low, normal1, normal2, high)
+    ]
+
+    # Each release hands off the slot to the head of the queue.
+    expected = [high, normal1, normal2, low]
+    current = running
+    for i, ticket in enumerate(expected):
+        admission_queue.release(current)
+        assert ticket.granted
+        threads[(low, normal1, normal2, high).index(ticket)].join(5)
+        assert granted_order[i] is ticket
+        current = ticket
+
+    admission_queue.release(current)
+    stats = admission_queue.get_stats()
+    assert stats["running"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["admitted"] == 5
+
+
+def test_admission_queue_full_timeout_and_cancel() -> None:
+    from sema4ai.action_server._actions_process_pool_admission import (
+        AdmissionQueue,
+        AdmissionRejectedError,
+    )
+
+    admission_queue = AdmissionQueue(
+        max_running=1, max_queue_depth=1, max_queue_wait=0.2
+    )
+    running = admission_queue.enqueue()
+    admission_queue.check_can_enqueue()
+
+    waiting = admission_queue.enqueue()
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        admission_queue.check_can_enqueue()
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.retry_after >= 1
+
+    with pytest.raises(AdmissionRejectedError):
+        admission_queue.enqueue()
+
+    # Waited for too long.
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        admission_queue.wait(waiting)
+    assert exc_info.value.status_code == 503
+    assert admission_queue.get_queue_depth() == 0
+
+    # Cancelled while waiting.
+    waiting = admission_queue.enqueue()
+    assert admission_queue.cancel(waiting)
+    with pytest.raises(CancelledError):
+        admission_queue.wait(waiting)
+
+    admission_queue.release(running)
+    stats = admission_queue.get_stats()
+    assert stats["rejected"] == 2
+    assert stats["timed_out"] == 1
+    assert stats["cancelled"] == 1
+    assert stats["running"] == 0
+
+
+def test_admission_queue_wait_async() -> None:
+    import asyncio
+
+    from sema4ai.action_server._actions_process_pool_admission import (
+        AdmissionQueue,
+        AdmissionRejectedError,
+    )
+
+    admission_queue = AdmissionQueue(max_running=1, max_queue_wait=5)
+    running = admission_queue.enqueue()
+
+    async def check():
+        waiting = admission_queue.enqueue()
+
+        # Released from another thread while awaited in the loop.
+        timer = threading.Timer(0.1, admission_queue.release, args=(running,))
+        timer.start()
+        await admission_queue.wait_async(waiting)
+        assert waiting.granted
+        timer.join()
+
+        # Cancelled while awaited.
+        cancelled = admission_queue.enqueue()
+        asyncio.get_running_loop().call_later(0.1, admission_queue.cancel, cancelled)
+        with pytest.raises(CancelledError):
+            await admission_queue.wait_async(cancelled)
+
+        # Waited for too long.
+        admission_queue._max_queue_wait = 0.2
+        timed_out = admission_queue.enqueue()
+        with pytest.raises(AdmissionRejectedError):
+            await admission_queue.wait_async(timed_out)
+
+        admission_queue.release(waiting)
+
+    asyncio.run(check())
+    stats = admission_queue.get_stats()
+    assert stats["running"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["timed_out"] == 1
+    assert stats["cancelled"] == 1
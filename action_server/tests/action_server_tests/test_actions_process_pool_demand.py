@@ -0,0 +1,79 @@
+import pytest
+
+
+def test_parse_package_processes() -> None:
+    from sema4ai.action_server._actions_process_pool_demand import (
+        PackageProcessLimits,
+        parse_package_processes,
+    )
+
+    assert parse_package_processes("") == {}
+    assert parse_package_processes("pkg-a=1:3, pkg-b=:2,pkg-c=2:") == {
+        "pkg-a": PackageProcessLimits(1, 3),
+        "pkg-b": PackageProcessLimits(0, 2),
+        "pkg-c": PackageProcessLimits(2, None),
+    }
+
+    for invalid in ("pkg-a", "pkg-a=1", "pkg-a=3:1", "pkg-a=-1:", "pkg-a=a:b"):
+        with pytest.raises(ValueError):
+            parse_package_processes(invalid)
+
+
+def test_key_demand_rate_decays() -> None:
+    from sema4ai.action_server._actions_process_pool_demand import KeyDemand
+
+    demand = KeyDemand(tau=10)
+    assert demand.rate(0) == 0
+
+    for i in range(100):
+        demand.on_request(now=i * 0.1)  # 10 requests per second
+
+    assert 5 < demand.rate(10) < 10
+    assert demand.rate(60) < demand.rate(10) / 100
+
+    demand.on_spawn(2.0)
+    assert demand.spawn_latency == 2.0
+    demand.on_spawn(1.0)
+    assert 1.0 < demand.spawn_latency < 2.0
+
+
+def test_plan_warm_pool() -> None:
+    from sema4ai.action_server._actions_process_pool_demand import plan_warm_pool
+
+    weights = {"hot": 10.0, "cold": 0.0, "warm": 2.0}
+    limits: dict = {}
+
+    def get_weight(key):
+        return weights[key]
+
+    def get_limits(key):
+        return limits.get(key, (0, None))
+
+    # No demand at all: split evenly.
+    assert plan_warm_pool(["a", "b"], 4, lambda key: 0, get_limits) == {
+        "a": 2,
+        "b": 2,
+    }
+
+    # Split by demand.
+    plan = plan_warm_pool(weights.keys(), 6, get_weight, get_limits)
+    assert plan == {"hot": 5, "cold": 0, "warm": 1}
+
+    # Per package minimum/maximum.
+    limits["cold"] = (1, None)
+    limits["hot"] = (0, 3)
+    plan = plan_warm_pool(weights.keys(), 6, get_weight, get_limits)
+    assert plan == {"hot": 3, "cold": 1, "warm": 2}
+
+    # Minimum may go over the budget.
+    limits["cold"] = (4, None)
+    plan = plan_warm_pool(weights.keys(), 2, get_weight, get_limits)
+    assert plan == {"hot": 0, "cold": 4, "warm": 0}
+
+    # Everything capped.
+    limits.clear()
+    limits["hot"] = (0, 1)
+    limits["cold"] = (0, 0)
+    limits["warm"] = (0, 1)
+    plan = plan_warm_pool(weights.keys(), 6, get_weight, get_limits)
+    assert plan == {"hot": 1, "cold": 0, "warm": 1}
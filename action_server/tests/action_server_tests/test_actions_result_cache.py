@@ -0,0 +1,157 @@
+import json
+from pathlib import Path
+
+
+def _create_action(**kwargs):
+    from sema4ai.action_server._models import Action
+
+    fields = dict(
+        id="action-id",
+        action_package_id="action-package-id",
+        name="my_action",
+        docs="",
+        file="actions.py",
+        lineno=1,
+        input_schema="{}",
+        output_schema="{}",
+        is_consequential=False,
+    )
+    fields.update(kwargs)
+    return Action(**fields)
+
+
+def _create_action_package(directory: Path):
+    from sema4ai.action_server._models import ActionPackage
+
+    return ActionPackage(
+        id="action-package-id",
+        name="my-package",
+        directory=str(directory),
+        conda_hash="conda-hash",
+        env_json="{}",
+    )
+
+
+def test_result_cache_lru_and_ttl(monkeypatch) -> None:
+    from sema4ai.action_server import _actions_result_cache
+    from sema4ai.action_server._actions_result_cache import ResultCache
+
+    now = [100.0]
+    monkeypatch.setattr(_actions_result_cache.time, "monotonic", lambda: now[0])
+
+    cache = ResultCache(max_entries=2)
+    cache.put("a", '"A"', ttl=10)
+    cache.put("b", '"B"', ttl=10)
+    assert cache.get("a") == '"A"'
+
+    # "b" is the least recently used.
+    cache.put("c", '"C"', ttl=10)
+    assert cache.get("b") is None
+    assert cache.get("c") == '"C"'
+
+    now[0] += 10
+    assert cache.get("a") is None
+
+    assert cache.get_stats() == {
+        "entries": 1,
+        "max_entries": 2,
+        "hits": 2,
+        "misses": 2,
+        "evictions": 1,
+    }
+
+
+def test_result_cache_key(tmpdir) -> None:
+    from sema4ai.action_server._actions_result_cache import make_result_cache_key
+
+    action = _create_action()
+    action_package = _create_action_package(Path(tmpdir))
+    vary_headers = ("x-user-id",)
+
+    key = make_result_cache_key(
+        action, action_package, {"a": 1, "b": 2}, {"X-User-Id": "1"}, vary_headers
+    )
+    # Order of the keys in the inputs and case of the headers don't matter.
+    assert key == make_result_cache_key(
+        action, action_package, {"b": 2, "a": 1}, {"x-user-id": "1"}, vary_headers
+    )
+    # Other headers don't matter.
+    assert key == make_result_cache_key(
+        action,
+        action_package,
+        {"a": 1, "b": 2},
+        {"x-user-id": "1", "y": "1"},
+        vary_headers,
+    )
+
+    for inputs, headers in (
+        ({"a": 1, "b": 3}, {"x-user-id": "1"}),
+        ({"a": 1, "b": 2}, {"x-user-id": "2"}),
+        ({"a": 1, "b": 2}, {"x-user-id": "1", "x-action-context": "secrets"}),
+    ):
+        assert key != make_result_cache_key(
+            action, action_package, inputs, headers, vary_headers
+        )
+
+
+def test_result_cache_config(tmpdir) -> None:
+    from sema4ai.action_server._actions_result_cache import (
+        ResultCacheConfig,
+        get_result_cache_config,
+    )
+    from sema4ai.action_server._settings import Settings
+
+    tmp = Path(tmpdir)
+    settings = Settings(datadir=tmp, artifacts_dir=tmp / "artifacts")
+    action_package = _create_action_package(tmp)
+    action = _create_action(
+        options=json.dumps({"result_cache": {"ttl": 5, "vary_headers": ["X-A"]}})
+    )
+
+    # Disabled by default.
+    assert get_result_cache_config(settings, action_package, action) is None
+
+    settings.result_cache_size = 10
+    assert get_result_cache_config(
+        settings, action_package, action
+    ) == ResultCacheConfig(ttl=5, vary_headers=("x-a",))
+
+    # Never cached if the action is not explicitly non-consequential.
+    for is_consequential in (None, True):
+        consequential = _create_action(is_consequential=is_consequential)
+        assert get_result_cache_config(settings, action_package, consequential) is None
+
+    # The package.yaml has priority over the action options.
+    (tmp / "package.yaml").write_text(
+        """
+name: my-package
+result-cache:
+  my_action:
+    ttl: 60
+    vary-headers:
+      - x-b
+  other_action: false
+"""
+    )
+    assert get_result_cache_config(
+        settings, action_package, action
+    ) == ResultCacheConfig(ttl=60, vary_headers=("x-b",))
+
+    other_action = _create_action(name="other_action")
+    settings.result_cache_ttl = 30
+    assert get_result_cache_config(settings, action_package, other_action) is None
+
+    # Uses the default ttl when not configured.
+    not_configured = _create_action(name="not_configured")
+    assert get_result_cache_config(
+        settings, action_package, not_configured
+    ) == ResultCacheConfig(ttl=30)
+
+    # Actions using OAuth2 depend on the user session.
+    oauth2_action = _create_action(
+        name="not_configured",
+        managed_params_schema=json.dumps(
+            {"token": {"type": "OAuth2Secret", "provider": "google"}}
+        ),
+    )
+    assert get_result_cache_config(settings, action_package, oauth2_action) is None
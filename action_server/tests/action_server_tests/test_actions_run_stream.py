@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+
+def test_get_stream_format() -> None:
+    from sema4ai.action_server._actions_run_stream import (
+        STREAM_FORMAT_NDJSON,
+        STREAM_FORMAT_SSE,
+        get_stream_format,
+    )
+
+    assert get_stream_format({}) is None
+    assert get_stream_format({"accept": "*/*"}) is None
+    assert get_stream_format({"accept": "application/json"}) is None
+    assert get_stream_format({"accept": "text/event-stream"}) == STREAM_FORMAT_SSE
+    assert (
+        get_stream_format({"accept": "application/x-ndjson; q=0.9, */*"})
+        == STREAM_FORMAT_NDJSON
+    )
+    # The first one accepted is used.
+    assert get_stream_format({"accept": "application/json, text/event-stream"}) is None
+    assert (
+        get_stream_format({"accept": "text/event-stream, application/json"})
+        == STREAM_FORMAT_SSE
+    )
+
+
+def test_format_event() -> None:
+    from sema4ai.action_server._actions_run_stream import (
+        STREAM_FORMAT_NDJSON,
+        STREAM_FORMAT_SSE,
+        format_event,
+    )
+
+    assert format_event(STREAM_FORMAT_SSE, "chunk", {"a": 1}) == (
+        'event: chunk\ndata: {"a": 1}\n\n'
+    )
+    assert json.loads(format_event(STREAM_FORMAT_NDJSON, "result", [1, 2])) == {
+        "event": "result",
+        "data": [1, 2],
+    }
+
+
+class _RunnerStub:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.on_chunk = None
+
+    async def run_async(self):
+        for chunk in self.chunks:
+            self.on_chunk(chunk)
+            await asyncio.sleep(0)
+        if self.error is not None:
+            raise self.error
+        return list(self.chunks)
+
+
+def _collect_stream(runner, stream_format):
+    from sema4ai.action_server._actions_run_stream import (
+        ChunksQueue,
+        iter_run_stream,
+    )
+
+    async def collect():
+        chunks_queue = ChunksQueue(asyncio.get_running_loop())
+        runner.on_chunk = chunks_queue.put_threadsafe
+        return [
+            line
+            async for line in iter_run_stream(
+                runner, chunks_queue, stream_format, "asyncio"
+            )
+        ]
+
+    return asyncio.run(collect())
+
+
+def test_iter_run_stream() -> None:
+    from sema4ai.action_server._actions_run_stream import STREAM_FORMAT_NDJSON
+
+    lines = _collect_stream(_RunnerStub([1, 2, 3]), STREAM_FORMAT_NDJSON)
+    assert [json.loads(line) for line in lines] == [
+        {"event": "chunk", "data": 1},
+        {"event": "chunk", "data": 2},
+        {"event": "chunk", "data": 3},
+        {"event": "result", "data": [1, 2, 3]},
+    ]
+
+
+def test_iter_run_stream_error() -> None:
+    from fastapi import HTTPException
+
+    from sema4ai.action_server._actions_run_stream import STREAM_FORMAT_SSE
+
+    runner = _RunnerStub(["a"], error=HTTPException(status_code=500, detail="Broken"))
+    lines = _collect_stream(runner, STREAM_FORMAT_SSE)
+    assert lines == [
+        'event: chunk\ndata: "a"\n\n',
+        'event: error\ndata: {"status_code": 500, "detail": "Broken"}\n\n',
+    ]
@@ -0,0 +1,61 @@
+def test_single_flight() -> None:
+    from sema4ai.action_server._actions_single_flight import SingleFlight
+
+    single_flight = SingleFlight()
+    leader = single_flight.join("key", "run-1")
+    assert leader.is_leader
+    assert leader.leader_run_id == "run-1"
+
+    follower = single_flight.join("key", "run-2")
+    assert not follower.is_leader
+    assert follower.leader_run_id == "run-1"
+    assert follower.future is leader.future
+
+    # Other keys are independent.
+    other = single_flight.join("other-key", "run-3")
+    assert other.is_leader
+    assert single_flight.get_in_flight_count() == 2
+    assert single_flight.get_coalesced_count() == 1
+
+    leader_run = object()
+    single_flight.land(leader, leader_run)  # type: ignore
+    assert follower.future.result() == (leader_run, None)
+    assert single_flight.get_in_flight_count() == 1
+
+    # After landing, a new run with the same key becomes the leader.
+    new_leader = single_flight.join("key", "run-4")
+    assert new_leader.is_leader
+    assert new_leader.future is not leader.future
+
+
+def test_single_flight_follower_admission_rejected() -> None:
+    import pytest
+
+    from sema4ai.action_server._actions_process_pool_admission import (
+        AdmissionRejectedError,
+    )
+    from sema4ai.action_server._actions_run import (
+        _ActionsRunner,
+        _admission_rejected_to_http_exception,
+    )
+    from sema4ai.action_server._actions_single_flight import SingleFlight
+
+    single_flight = SingleFlight()
+    leader = single_flight.join("key", "run-1")
+    follower = single_flight.join("key", "run-2")
+
+    # The leader wasn't admitted: followers must be rejected the same way
+    # (and not fail with an internal error).
+    leader_error = AdmissionRejectedError("Queue is full.", 503, 7)
+    single_flight.land(leader, object(), leader_error)  # type: ignore
+    leader_run, error = follower.future.result()
+    assert error is leader_error
+
+    runner = _ActionsRunner.__new__(_ActionsRunner)
+    with pytest.raises(AdmissionRejectedError) as exc_info:
+        runner._on_leader_finished(leader_run, error, 0)
+    assert exc_info.value is not leader_error
+
+    http_exception = _admission_rejected_to_http_exception(exc_info.value)
+    assert http_exception.status_code == 503
+    assert http_exception.headers == {"Retry-After": "7"}
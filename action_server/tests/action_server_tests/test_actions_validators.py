@@ -0,0 +1,91 @@
+import pytest
+
+_SCHEMA = {
+    "properties": {
+        "name": {"type": "string", "title": "Name", "description": ""},
+        "count": {"type": "integer", "default": 1},
+        "ratio": {"type": "number"},
+        "enabled": {"type": "boolean"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "kind": {"type": "string", "enum": ["a", "b"]},
+        "extra": {"type": ["string", "null"]},
+    },
+    "type": "object",
+    "required": ["name"],
+    "additionalProperties": False,
+}
+
+
+@pytest.mark.parametrize(
+    "value, valid",
+    [
+        ({"name": "x"}, True),
+        ({"name": "x", "count": 2, "ratio": 1, "enabled": False}, True),
+        ({"name": "x", "count": 2.0, "ratio": 1.5, "tags": ["a", "b"]}, True),
+        ({"name": "x", "kind": "a", "extra": None}, True),
+        ({"name": "x", "extra": "e"}, True),
+        ({}, False),
+        ({"name": 1}, False),
+        ({"name": "x", "count": True}, False),
+        ({"name": "x", "count": 1.5}, False),
+        ({"name": "x", "ratio": "1"}, False),
+        ({"name": "x", "enabled": 1}, False),
+        ({"name": "x", "tags": ["a", 1]}, False),
+        ({"name": "x", "kind": "c"}, False),
+        ({"name": "x", "extra": 1}, False),
+        ({"name": "x", "unknown": 1}, False),
+        (["name"], False),
+        (None, False),
+    ],
+)
+def test_fast_validator(value, valid) -> None:
+    from jsonschema.validators import validator_for
+
+    from sema4ai.action_server._actions_validators import compile_fast_validator
+
+    is_valid = compile_fast_validator(_SCHEMA)
+    assert is_valid is not None
+    assert is_valid(value) == valid
+
+    # Must always match jsonschema.
+    assert validator_for(_SCHEMA)(_SCHEMA).is_valid(value) == valid
+
+
+def test_fast_validator_unsupported() -> None:
+    from sema4ai.action_server._actions_validators import compile_fast_validator
+
+    assert compile_fast_validator({"type": "string", "minLength": 2}) is None
+    assert (
+        compile_fast_validator(
+            {
+                "type": "object",
+                "properties": {"data": {"$ref": "#/$defs/Data"}},
+                "$defs": {"Data": {"type": "object"}},
+            }
+        )
+        is None
+    )
+    assert compile_fast_validator({"enum": [1, "a"]}) is None
+
+
+@pytest.mark.parametrize("backend", ["jsonschema", "fast"])
+def test_get_json_validator(backend) -> None:
+    from jsonschema import ValidationError
+
+    from sema4ai.action_server._actions_validators import (
+        clear_json_validators_cache,
+        get_json_validator,
+    )
+
+    clear_json_validators_cache()
+    validate = get_json_validator(_SCHEMA, backend)
+
+    # Cached by the schema contents.
+    assert get_json_validator(dict(_SCHEMA), backend) is validate
+
+    validate({"name": "x"})
+    with pytest.raises(ValidationError) as e:
+        validate({"name": None})
+
+    # The error is the same regardless of the backend.
+    assert str(e.value).startswith("None is not of type 'string'")
@@ -0,0 +1,75 @@
+import random
+from pathlib import Path
+
+
+def test_artifacts_staging_should_stage() -> None:
+    from sema4ai.action_server._artifacts_staging import ArtifactsStaging
+
+    staging = ArtifactsStaging(Path("unused"), sample_rate=0)
+    assert staging.should_stage(artifacts_requested=False)
+    assert not staging.should_stage(artifacts_requested=True)
+
+    staging = ArtifactsStaging(Path("unused"), sample_rate=1)
+    assert not staging.should_stage(artifacts_requested=False)
+
+    staging = ArtifactsStaging(Path("unused"), sample_rate=0.25, rand=random.Random(1))
+    staged = sum(staging.should_stage(artifacts_requested=False) for _ in range(1000))
+    assert 700 < staged < 800
+
+
+def test_artifacts_staging_release(tmpdir) -> None:
+    from sema4ai.action_server._artifacts_staging import ArtifactsStaging
+
+    tmp = Path(tmpdir)
+    artifacts_dir = tmp / "artifacts"
+    staging = ArtifactsStaging(tmp / "staging", sample_rate=0)
+
+    # Removed when not persisted.
+    staged_dir = staging.create_staged_dir("run-1")
+    (staged_dir / "__action_server_output.txt").write_text("output")
+    staging.release(staged_dir, artifacts_dir / "run-1", persist=False)
+    assert not staged_dir.exists()
+    assert not (artifacts_dir / "run-1").exists()
+
+    # Moved to the artifacts dir when persisted.
+    staged_dir = staging.create_staged_dir("run-2")
+    (staged_dir / "__action_server_output.txt").write_text("output")
+    staging.release(staged_dir, artifacts_dir / "run-2", persist=True)
+    assert not staged_dir.exists()
+    assert (artifacts_dir / "run-2" / "__action_server_output.txt").read_text() == (
+        "output"
+    )
+
+    staging.close()
+    assert not (tmp / "staging").exists()
+
+
+def test_setup_artifacts_staging(tmpdir, monkeypatch) -> None:
+    from sema4ai.action_server._artifacts_staging import (
+        get_artifacts_staging,
+        setup_artifacts_staging,
+    )
+    from sema4ai.action_server._settings import Settings
+
+    monkeypatch.delenv("SEMA4AI_ACTION_SERVER_POST_RUN_CMD", raising=False)
+    tmp = Path(tmpdir)
+    settings = Settings(datadir=tmp, artifacts_dir=tmp / "artifacts")
+
+    # Not used by default.
+    with setup_artifacts_staging(settings):
+        assert get_artifacts_staging() is None
+
+    settings.artifacts_mode = "lightweight"
+    settings.artifacts_staging_dir = str(tmp / "staging")
+    with setup_artifacts_staging(settings):
+        staging = get_artifacts_staging()
+        assert staging is not None
+        assert staging.staging_dir.parent == tmp / "staging"
+        assert staging.staging_dir.is_dir()
+    assert get_artifacts_staging() is None
+    assert not staging.staging_dir.exists()
+
+    # The post run command may need the files after the run finishes.
+    monkeypatch.setenv("SEMA4AI_ACTION_SERVER_POST_RUN_CMD", "echo")
+    with setup_artifacts_staging(settings):
+        assert get_artifacts_staging() is None
@@ -0,0 +1,85 @@
+import datetime
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+
+def test_compute_backoff() -> None:
+    import random
+
+    from sema4ai.action_server._callback_dispatcher import compute_backoff
+
+    rand = random.Random(0)
+    for attempts, max_delay in ((1, 0.5), (2, 1), (3, 2), (30, 300)):
+        for _i in range(20):
+            assert 0 <= compute_backoff(attempts, rand) <= max_delay
+
+
+def test_callback_dispatcher_redelivers_pending(tmpdir) -> None:
+    from devutils.fixtures import wait_for_condition
+
+    from sema4ai.action_server._callback_dispatcher import (
+        get_callback_dispatcher,
+        setup_callback_dispatcher,
+    )
+    from sema4ai.action_server._database import datetime_to_str
+    from sema4ai.action_server._models import CallbackOutbox, create_db
+    from sema4ai.action_server._settings import Settings
+
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            received.append((self.headers["x-action-server-run-id"], json.loads(body)))
+            # The first attempt of each callback fails.
+            self.send_response(500 if len(received) % 2 else 200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/callback"
+
+    tmp = Path(tmpdir)
+    settings = Settings(datadir=tmp, artifacts_dir=tmp / "artifacts")
+    settings.callback_max_attempts = 3
+    try:
+        with create_db(tmp / "server.db") as db:
+            # Pending from a previous server run.
+            now = datetime_to_str(datetime.datetime.now(datetime.timezone.utc))
+            with db.transaction():
+                db.insert(
+                    CallbackOutbox(
+                        id="callback-1",
+                        run_id="run-1",
+                        url=url,
+                        body=json.dumps({"result": 1}),
+                        headers=json.dumps({"x-action-server-run-id": "run-1"}),
+                        created_at=now,
+                        next_attempt_at=now,
+                        attempts=0,
+                    )
+                )
+
+            with setup_callback_dispatcher(settings):
+                wait_for_condition(lambda: len(received) == 2)
+                wait_for_condition(lambda: not db.all(CallbackOutbox))
+
+                get_callback_dispatcher().enqueue(
+                    "run-2", url, "result-2", {"x-action-server-run-id": "run-2"}
+                )
+                wait_for_condition(lambda: len(received) == 4)
+                wait_for_condition(lambda: not db.all(CallbackOutbox))
+
+        assert received == [
+            ("run-1", {"result": 1}),
+            ("run-1", {"result": 1}),
+            ("run-2", "result-2"),
+            ("run-2", "result-2"),
+        ]
+    finally:
+        server.shutdown()
@@ -94,6 +94,10 @@ def test_database_schema_evolution(str_regression) -> None:
             f"'''\n{x.strip()}\n''',"
             for x in db.create_non_unique_indexes_sql(cls, model_db_rules)
         )
+        s.extend(
+            f"'''\n{x.strip()}\n''',"
+            for x in db.create_composite_indexes_sql(cls, model_db_rules)
+        )
 
     new_lines = "\n\n\n"
     str_regression.check(
@@ -208,10 +212,13 @@ def test_migrate(database_v0: Path, tmpdir) -> None:
             [
                 "action",
                 "action_package",
+                "callback_outbox",
                 "counter",
                 "migration",
                 "o_auth2_user_data",
                 "run",
+                "run_stats",
+                "run_stats_bin",
                 "temp_user_session_data",
                 "user_session",
             ]
@@ -301,6 +308,98 @@ def test_database_update():
         assert db.first(SomeActionPackage).name == "new_name"
 
 
+@dataclass
+class SomeFlag:
+    id: int
+    name: str
+    enabled: bool = True
+    checked: Optional[bool] = None
+
+
+def test_database_insert_many_update_many():
+    from sema4ai.action_server._database import DBError
+
+    db = Database(":memory:")
+    with db.connect():
+        db.initialize([SomeActionPackage, SomeAction, SomeFlag])
+        db.create_tables(_db_rules)
+
+        insert = [
+            SomeActionPackage(1, "pack1", ""),
+            SomeAction(1, 1, "action", "docs", "file", 22, "{}", "{}"),
+            SomeActionPackage(2, "pack2", ""),
+            SomeFlag(1, "flag1"),
+            SomeFlag(2, "flag2", False, True),
+        ]
+        with db.transaction():
+            # The order matters because of the foreign keys.
+            db.insert_many(insert)
+
+        assert [x.name for x in db.all(SomeActionPackage)] == ["pack1", "pack2"]
+        assert db.all(SomeAction) == [insert[1]]
+
+        # Booleans are stored as integers but loaded back as booleans.
+        flags = db.all(SomeFlag)
+        assert flags == [SomeFlag(1, "flag1"), SomeFlag(2, "flag2", False, True)]
+        assert [(type(x.enabled), type(x.checked)) for x in flags] == [
+            (bool, type(None)),
+            (bool, bool),
+        ]
+
+        for flag in flags:
+            flag.name += "-new"
+            flag.enabled = not flag.enabled
+        with db.transaction():
+            db.update_many(flags, "name", "enabled")
+        assert db.all(SomeFlag, order_by="id") == [
+            SomeFlag(1, "flag1-new", False),
+            SomeFlag(2, "flag2-new", True, True),
+        ]
+
+        with db.transaction():
+            db.update_by_id(SomeFlag, 1, {"checked": False})
+            db.update_by_fields(SomeFlag(2, "flag2-new", False, False), ["name"])
+        assert db.all(SomeFlag, order_by="id") == [
+            SomeFlag(1, "flag1-new", False, False),
+            SomeFlag(2, "flag2-new", False, False),
+        ]
+
+        with pytest.raises(DBError):
+            with db.transaction():
+                db.update_by_id(SomeFlag, 1, {"not_there": 1})
+
+        # Rows which don't match the fields of the class are reported.
+        with db.transaction():
+            db.execute("ALTER TABLE some_flag ADD COLUMN extra TEXT")
+        with pytest.raises(DBError):
+            db.all(SomeFlag)
+
+
+def test_database_plain_dataclass_booleans():
+    import dataclasses
+
+    @dataclasses.dataclass
+    class PlainFlag:
+        id: int
+        enabled: bool
+        checked: Optional[bool] = None
+
+    db = Database(":memory:")
+    with db.connect():
+        db.initialize([PlainFlag])
+        db.create_tables()
+        with db.transaction():
+            db.insert_many([PlainFlag(1, True), PlainFlag(2, False, True)])
+
+        # Without pydantic the booleans are converted when loading.
+        flags = db.all(PlainFlag, order_by="id")
+        assert flags == [PlainFlag(1, True), PlainFlag(2, False, True)]
+        assert [(type(x.enabled), type(x.checked)) for x in flags] == [
+            (bool, type(None)),
+            (bool, bool),
+        ]
+
+
 def test_database_insert_or_update():
     db = Database(":memory:")
     with db.connect():
@@ -393,6 +492,17 @@ def test_database_limit_offset():
         assert [x.id for x in db.all(SomeObject, limit=3, offset=2)] == list(
             range(2, 5)
         )
+        assert [x.id for x in db.all(SomeObject, offset=3)] == [3, 4]
+        assert [
+            x.id
+            for x in db.all(
+                SomeObject,
+                limit=2,
+                order_by="id DESC",
+                where="id < ?",
+                values=[4],
+            )
+        ] == [3, 2]
 
 
 def test_database_transactions_nested():
@@ -511,3 +621,87 @@ def test_database_temp_session_data_cleanup(tmpdir):
                 datetime_to_iso(after_time1),
                 datetime_to_iso(after_time2),
             }
+
+
+def test_database_connection_pool(tmpdir):
+    db = Database(Path(str(tmpdir)) / "test_pool.db", pool_max_idle=2)
+
+    def get_conn():
+        return db._tlocal.conn
+
+    with db.connect():
+        with db.cursor() as cursor:
+            db.execute_query(cursor, "PRAGMA journal_mode")
+            assert cursor.fetchone()[0] == "wal"
+        main_conn = get_conn()
+
+        # Reused by the same thread.
+        with db.connect():
+            assert get_conn() is main_conn
+
+        def in_thread():
+            with db.connect():
+                return get_conn()
+
+        with futures.ThreadPoolExecutor(1) as executor:
+            thread_conn = executor.submit(in_thread).result()
+            assert thread_conn is not main_conn
+            assert executor.submit(in_thread).result() is thread_conn
+        assert len(db._pool) == 1
+
+        # Connections created at the same time are bounded in the pool.
+        barrier = threading.Barrier(4)
+
+        def in_thread_with_barrier():
+            with db.connect():
+                barrier.wait()
+                return get_conn()
+
+        with futures.ThreadPoolExecutor(4) as executor:
+            conns = [executor.submit(in_thread_with_barrier) for _ in range(4)]
+            assert len({id(f.result()) for f in conns}) == 4
+        assert len(db._pool) == 2
+
+        # Idle connections are evicted.
+        db._pool._idle_timeout = -1
+        with futures.ThreadPoolExecutor(1) as executor:
+            executor.submit(in_thread).result()
+        assert len(db._pool) == 1
+
+    # All closed when no connection is active.
+    assert len(db._pool) == 0
+
+
+def test_database_read_while_writing(tmpdir):
+    db = Database(Path(str(tmpdir)) / "test_read_while_writing.db")
+    db.register_classes([SomeActionPackage])
+
+    with db.connect():
+        with db.transaction():
+            db.create_tables()
+            db.insert(SomeActionPackage(1, "package1", ""))
+
+        writing = threading.Event()
+        done_reading = threading.Event()
+
+        def in_thread():
+            with db.connect(), db.transaction():
+                db.insert(SomeActionPackage(2, "package2", ""))
+                writing.set()
+                done_reading.wait()
+
+        thread = threading.Thread(target=in_thread)
+        thread.start()
+        try:
+            assert writing.wait(5)
+            # Reads don't wait for the write to finish (the uncommitted
+            # contents are not seen).
+            assert [x.name for x in db.all(SomeActionPackage)] == ["package1"]
+        finally:
+            done_reading.set()
+            thread.join()
+
+        assert [x.name for x in db.all(SomeActionPackage)] == [
+            "package1",
+            "package2",
+        ]
@@ -0,0 +1,97 @@
+from pathlib import Path
+
+import pytest
+
+
+def test_group_commit_writer(tmpdir) -> None:
+    from sema4ai.action_server._db_group_commit import GroupCommitWriter
+    from sema4ai.action_server._models import Counter, create_db
+
+    tmp = Path(tmpdir)
+    with create_db(tmp / "server.db") as db:
+        writer = GroupCommitWriter(db)
+        batch_sizes = []
+        apply_batch = writer._apply_batch
+
+        def _apply_batch(batch):
+            batch_sizes.append(len(batch))
+            apply_batch(batch)
+
+        writer._apply_batch = _apply_batch  # type: ignore[method-assign]
+
+        committed = []
+
+        def insert(counter_id):
+            def write():
+                db.insert(Counter(counter_id, 0))
+
+            return write
+
+        def fail():
+            raise RuntimeError("Write failed")
+
+        # Queued before the writer starts: applied in the same transaction.
+        writer.submit(insert("c1"), lambda: committed.append("c1"), durable=False)
+        writer.submit(fail, lambda: committed.append("fail"), durable=False)
+        writer.submit(insert("c2"), lambda: committed.append("c2"), durable=False)
+
+        writer.start()
+        try:
+            # Durable writes wait for the commit (and get the error).
+            with pytest.raises(RuntimeError, match="Write failed"):
+                writer.submit(fail)
+            writer.submit(insert("c3"), lambda: committed.append("c3"))
+            assert committed == ["c1", "c2", "c3"]
+        finally:
+            writer.stop()
+
+        assert batch_sizes[0] == 3
+        assert sorted(c.id for c in db.all(Counter) if c.id.startswith("c")) == [
+            "c1",
+            "c2",
+            "c3",
+        ]
+
+
+def test_submit_write(tmpdir) -> None:
+    from sema4ai.action_server._db_group_commit import (
+        setup_group_commit_writer,
+        submit_write,
+    )
+    from sema4ai.action_server._models import Counter, create_db
+    from sema4ai.action_server._settings import Settings
+
+    tmp = Path(tmpdir)
+    settings = Settings(datadir=tmp, artifacts_dir=tmp / "artifacts")
+    with create_db(tmp / "server.db") as db:
+        committed = []
+
+        # Applied directly when the writer is not set up.
+        submit_write(
+            lambda: db.insert(Counter("c1", 0)), lambda: committed.append("c1")
+        )
+        assert committed == ["c1"]
+
+        with setup_group_commit_writer(settings):
+            submit_write(
+                lambda: db.insert(Counter("c2", 0)), lambda: committed.append("c2")
+            )
+            assert committed == ["c1", "c2"]
+
+            # In a transaction the write is a part of it.
+            with db.transaction():
+                submit_write(
+                    lambda: db.insert(Counter("c3", 0)),
+                    lambda: committed.append("c3"),
+                    durable=False,
+                )
+                assert committed == ["c1", "c2", "c3"]
+
+            submit_write(
+                lambda: db.insert(Counter("c4", 0)),
+                lambda: committed.append("c4"),
+                durable=False,
+            )
+        # Writes queued are applied when the writer stops.
+        assert committed == ["c1", "c2", "c3", "c4"]
+        assert db.first(Counter, "SELECT * FROM counter WHERE id = ?", ["c4"])
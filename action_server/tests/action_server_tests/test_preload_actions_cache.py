@@ -0,0 +1,91 @@
+import os
+
+
+class _FakeAction:
+    def __init__(self, pm, module_name, module_file, method, options=None):
+        self.pm = pm
+        self.module_name = module_name
+        self.filename = module_file
+        self.method = method
+        self.options = options
+
+    @property
+    def name(self):
+        return self.method.__name__
+
+
+def _bump_mtime(path) -> None:
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_collected_actions_cache(tmpdir) -> None:
+    from sema4ai.action_server._preload_actions.preload_actions_cache import (
+        CollectedActionsCache,
+    )
+
+    root = tmpdir.join("package")
+    root.mkdir()
+    action_file = root.join("actions.py")
+    action_file.write("")
+    ignored_dir = root.join(".venv")
+    ignored_dir.mkdir()
+
+    def my_action(a: "int") -> "str":
+        return str(a)
+
+    collect_calls = []
+
+    def collect_actions(pm, path, action_names, glob):
+        collect_calls.append(path)
+        yield _FakeAction(pm, "actions", str(action_file), my_action, {"a": 1})
+
+    after_collect_calls = []
+    cache = CollectedActionsCache(
+        collect_actions, after_collect=after_collect_calls.append
+    )
+
+    def collect(pm):
+        return list(cache(pm, str(root), ["my_action"], None))
+
+    actions = collect("pm1")
+    assert len(actions) == 1
+    assert (cache.misses, cache.hits) == (1, 0)
+
+    # Cached: new action instances but the collection is not redone.
+    actions2 = collect("pm2")
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert len(collect_calls) == 1
+    assert actions2[0] is not actions[0]
+    assert actions2[0].pm == "pm2"
+    assert actions2[0].method is my_action
+    assert actions2[0].options == {"a": 1}
+    assert after_collect_calls == [actions2]
+
+    # Resolved while collecting.
+    assert my_action.__annotations__ == {"a": int, "return": str}
+    assert my_action.__signature__ is not None
+
+    # Changing a file invalidates the cache.
+    _bump_mtime(str(action_file))
+    collect("pm3")
+    assert (cache.misses, cache.hits) == (2, 1)
+
+    # A new file (which changes the directory mtime) invalidates the cache.
+    root.join("new_actions.py").write("")
+    _bump_mtime(str(root))
+    collect("pm4")
+    assert (cache.misses, cache.hits) == (3, 1)
+
+    collect("pm5")
+    assert (cache.misses, cache.hits) == (3, 2)
+
+    # Changes in skipped dirs are not tracked.
+    ignored_dir.join("some_lib.py").write("")
+    _bump_mtime(str(ignored_dir))
+    collect("pm6")
+    assert (cache.misses, cache.hits) == (3, 3)
+
+    # Different action names are cached separately.
+    list(cache("pm7", str(root), ["other"], None))
+    assert (cache.misses, cache.hits) == (4, 3)
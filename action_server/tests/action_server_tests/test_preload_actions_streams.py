@@ -0,0 +1,84 @@
+import io
+from queue import Queue
+
+import pytest
+
+
+class _ChunkedStream(io.RawIOBase):
+    """
+    Provides the contents in small chunks (to check partial reads).
+    """
+
+    def __init__(self, contents: bytes, chunk_size: int = 3):
+        self._contents = contents
+        self._pos = 0
+        self._chunk_size = chunk_size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._contents[self._pos : self._pos + min(len(b), self._chunk_size)]
+        b[: len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+
+@pytest.mark.parametrize("framing", ["headers", "binary-json", "binary-msgpack"])
+def test_framing_roundtrip(framing) -> None:
+    from sema4ai.action_server._preload_actions.preload_actions_streams import (
+        create_framing,
+    )
+
+    f = create_framing(framing)
+    messages = [{"command": "run_action", "headers": {"a": "b" * 1000}}, {}, [1, 2]]
+
+    stream = io.BytesIO()
+    for message in messages:
+        f.write(stream, message)
+
+    # Partial reads are handled.
+    reader = _ChunkedStream(stream.getvalue())
+    for message in messages:
+        assert f.decode(f.read(reader)) == message
+    assert f.read(reader) is None
+
+
+def test_framing_switch() -> None:
+    from sema4ai.action_server._preload_actions.preload_actions_streams import (
+        SWITCH_FRAMING_KEY,
+        JsonRpcStreamReaderThread,
+        JsonRpcStreamWriter,
+        choose_framing,
+    )
+
+    assert choose_framing(["unknown", "binary-json"]) == "binary-json"
+    assert choose_framing(["unknown"]) == "headers"
+
+    stream = io.BytesIO()
+    writer = JsonRpcStreamWriter(stream)
+    writer.write({"command": "handshake"})
+    assert writer.framing == "headers"
+    writer.write({"framing": "binary-json", SWITCH_FRAMING_KEY: "binary-json"})
+    assert writer.framing == "binary-json"
+    writer.write({"command": "run_action"})
+
+    queue: Queue = Queue()
+    reader = JsonRpcStreamReaderThread(
+        io.BufferedReader(_ChunkedStream(stream.getvalue())), queue, lambda msg: None
+    )
+    reader.start()
+    reader.join(5)
+    assert not reader.is_alive()
+
+    found = []
+    while True:
+        msg = queue.get_nowait()
+        if msg is None:
+            break
+        found.append(msg)
+    assert found == [
+        {"command": "handshake"},
+        {"framing": "binary-json", SWITCH_FRAMING_KEY: "binary-json"},
+        {"command": "run_action"},
+    ]
@@ -0,0 +1,115 @@
+from pathlib import Path
+
+import pytest
+
+
+def _insert_run(db, numbered_id: int) -> None:
+    from sema4ai.action_server._models import Run, RunStatus
+
+    db.insert(
+        Run(
+            id=f"run-{numbered_id}",
+            status=RunStatus.PASSED,
+            action_id="action-1",
+            start_time="",
+            run_time=None,
+            inputs="{}",
+            result=None,
+            error_message=None,
+            relative_artifacts_dir="",
+            numbered_id=numbered_id,
+        )
+    )
+
+
+def _get_counter_value(db) -> int:
+    from sema4ai.action_server._models import RUN_ID_COUNTER, Counter
+
+    return db.first(
+        Counter, "SELECT * FROM counter WHERE id = ?", [RUN_ID_COUNTER]
+    ).value
+
+
+def test_run_number_allocator(tmpdir) -> None:
+    from sema4ai.action_server._models import (
+        Action,
+        ActionPackage,
+        create_db,
+        load_db,
+    )
+    from sema4ai.action_server._run_numbers import RunNumberAllocator
+
+    db_path = Path(tmpdir) / "server.db"
+    with create_db(db_path) as db:
+        with db.transaction():
+            db.insert(ActionPackage("pack-1", "pack", "", "", ""))
+            db.insert(
+                Action("action-1", "pack-1", "action", "", "", 1, "{}", "{}", True)
+            )
+
+        allocator = RunNumberAllocator(db, block_size=10)
+        with db.transaction():
+            assert allocator.allocate(1) == 1
+            _insert_run(db, 1)
+        # A block was reserved.
+        assert _get_counter_value(db) == 11
+
+        with db.transaction():
+            assert allocator.allocate(3) == 2
+            assert allocator.allocate(5) == 5
+            _insert_run(db, 9)
+        assert _get_counter_value(db) == 11
+
+        with db.transaction():
+            # Over the reserved block.
+            assert allocator.allocate(5) == 10
+            _insert_run(db, 14)
+        assert _get_counter_value(db) == 24
+
+    # When restarted the numbering resumes from the max numbered_id.
+    with load_db(db_path) as db:
+        allocator = RunNumberAllocator(db, block_size=10)
+        with db.transaction():
+            assert allocator.allocate(1) == 15
+        assert _get_counter_value(db) == 25
+
+        # Without runs the counter is used.
+        with db.transaction():
+            db.execute("DELETE FROM run")
+        allocator = RunNumberAllocator(db, block_size=10)
+        with db.transaction():
+            assert allocator.allocate(1) == 26
+
+
+def test_run_number_allocator_rollback(tmpdir) -> None:
+    from sema4ai.action_server._models import create_db
+    from sema4ai.action_server._run_numbers import RunNumberAllocator
+
+    with create_db(Path(tmpdir) / "server.db") as db:
+        allocator = RunNumberAllocator(db, block_size=10)
+
+        # The savepoint which reserved the block is rolled back.
+        with db.transaction():
+            with pytest.raises(RuntimeError):
+                with db.transaction():
+                    assert allocator.allocate(1) == 1
+                    raise RuntimeError("rollback")
+        assert _get_counter_value(db) == 0
+
+        # The block is reserved again (numbers given are never over the
+        # counter).
+        with db.transaction():
+            assert allocator.allocate(1) == 2
+        assert _get_counter_value(db) == 12
+
+        # The savepoint is released but the outer transaction is rolled back.
+        with pytest.raises(RuntimeError):
+            with db.transaction():
+                with db.transaction():
+                    assert allocator.allocate(20) == 3
+                raise RuntimeError("rollback")
+        assert _get_counter_value(db) == 12
+
+        with db.transaction():
+            assert allocator.allocate(1) == 23
+        assert _get_counter_value(db) == 33
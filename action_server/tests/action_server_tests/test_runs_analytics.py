@@ -0,0 +1,161 @@
+import datetime
+from pathlib import Path
+
+import pytest
+
+
+def test_parse_duration() -> None:
+    from sema4ai.action_server._runs_analytics import parse_duration
+
+    assert parse_duration("90") == 90
+    assert parse_duration("30m") == 30 * 60
+    assert parse_duration("24h") == 24 * 60 * 60
+    assert parse_duration("1.5d") == 1.5 * 24 * 60 * 60
+
+    for invalid in ("", "0h", "-1h", "1w", "h"):
+        with pytest.raises(ValueError):
+            parse_duration(invalid)
+
+
+def test_bins() -> None:
+    from sema4ai.action_server._runs_analytics import bin_to_value, value_to_bin
+
+    # Values up to 1ms are in the bin 0 (represented as 0).
+    assert value_to_bin(0) == 0
+    assert value_to_bin(0.001) == 0
+    assert bin_to_value(0) == 0
+    for value in (0.0015, 0.02, 0.5, 1, 3.3, 60, 3600):
+        # The relative error of the value representing the bin is under 10%.
+        assert abs(bin_to_value(value_to_bin(value)) - value) / value < 0.1
+
+
+def test_runs_analytics(tmpdir) -> None:
+    from sema4ai.action_server._database import datetime_to_str
+    from sema4ai.action_server._models import (
+        Action,
+        ActionPackage,
+        Run,
+        RunStats,
+        RunStatsBin,
+        RunStatus,
+        create_db,
+    )
+    from sema4ai.action_server._runs_analytics import (
+        compute_runs_analytics,
+        prune_run_stats,
+        record_finished_run,
+    )
+
+    # 4 minutes after the start of a bucket (of 5 minutes).
+    now = datetime.datetime(2024, 1, 31, 10, 4, tzinfo=datetime.timezone.utc)
+
+    def finish_run(action_id: str, status: int, run_time: float, queued: float, ago):
+        finished_at = now - datetime.timedelta(seconds=ago)
+        start_time = finished_at - datetime.timedelta(seconds=run_time + queued)
+        run = Run(
+            id=f"run-{len(runs)}",
+            status=RunStatus.RUNNING,
+            action_id=action_id,
+            start_time=datetime_to_str(start_time),
+            run_time=run_time,
+            inputs="{}",
+            result=None,
+            error_message=None,
+            relative_artifacts_dir="",
+            numbered_id=len(runs),
+        )
+        runs.append(run)
+        with db.transaction():
+            db.insert(run)
+
+        run.status = status
+        with db.transaction():
+            record_finished_run(db, run, finished_at)
+            db.update_by_id(Run, run.id, {"status": status})
+        return run
+
+    runs: list = []
+    with create_db(Path(tmpdir) / "server.db") as db:
+        with db.transaction():
+            db.insert(ActionPackage("pack-1", "pack", "", "", ""))
+            for name in ("action1", "action2"):
+                db.insert(Action(name, "pack-1", name, "", "", 1, "{}", "{}"))
+
+        # action1: 98 runs of 1s in the current bucket and 2 failures (of 10s)
+        # in the previous bucket.
+        for i in range(98):
+            finish_run("action1", RunStatus.PASSED, 1, 0.5, ago=i)
+        for i in range(2):
+            finish_run("action1", RunStatus.FAILED, 10, 0, ago=60 * 7)
+
+        # action2: a run 1 hour ago.
+        finish_run("action2", RunStatus.CANCELLED, 0, 2, ago=60 * 60)
+
+        # A run which is set as finished again is not counted again.
+        run = finish_run("action2", RunStatus.CANCELLED, 0, 2, ago=60 * 60)
+        run.status = RunStatus.FAILED
+        with db.transaction():
+            record_finished_run(db, run, now)
+            db.update_by_id(Run, run.id, {"status": RunStatus.FAILED})
+
+        assert sorted((stats.action_id, stats.runs) for stats in db.all(RunStats)) == [
+            ("action1", 2),
+            ("action1", 98),
+            ("action2", 2),
+        ]
+
+        analytics = compute_runs_analytics(db, 10 * 60, now=now)
+        assert len(analytics) == 1
+        action1 = analytics[0]
+        assert (action1.action_name, action1.action_package_name) == (
+            "action1",
+            "pack",
+        )
+        assert (action1.runs, action1.passed, action1.failed) == (100, 98, 2)
+        assert action1.error_rate == 0.02
+        # 100 runs in 9 minutes (a full bucket + 4 minutes).
+        assert action1.throughput == pytest.approx(100 / 9)
+        assert action1.window_start == "2024-01-31T09:55:00+00:00"
+        assert action1.window_end == "2024-01-31T10:05:00+00:00"
+
+        assert action1.run_time.p50 == pytest.approx(1, rel=0.1)
+        assert action1.run_time.p90 == pytest.approx(1, rel=0.1)
+        assert action1.run_time.p99 == pytest.approx(10, rel=0.1)
+        assert action1.run_time.mean == pytest.approx((98 + 20) / 100)
+        assert action1.queue_wait.p50 == pytest.approx(0.5, rel=0.1)
+        assert action1.queue_wait.p99 == pytest.approx(0.5, rel=0.1)
+
+        # A bigger window with one interval per 30 minutes (intervals start
+        # at multiples of 30 minutes and the last one ends at the end of the
+        # current bucket).
+        analytics = compute_runs_analytics(db, 2 * 60 * 60, step=30 * 60, now=now)
+        assert [
+            (a.window_start, a.window_end, a.action_id, a.runs) for a in analytics
+        ] == [
+            ("2024-01-31T09:00:00+00:00", "2024-01-31T09:30:00+00:00", "action2", 2),
+            ("2024-01-31T09:30:00+00:00", "2024-01-31T10:00:00+00:00", "action1", 2),
+            ("2024-01-31T10:00:00+00:00", "2024-01-31T10:05:00+00:00", "action1", 98),
+        ]
+        assert analytics[0].cancelled == 2
+        assert analytics[0].queue_wait.p50 == pytest.approx(2, rel=0.1)
+        assert analytics[1].failed == 2
+        assert analytics[1].error_rate == 1
+        # 98 runs in the 4 minutes since the start of the interval.
+        assert analytics[2].throughput == pytest.approx(98 / 4)
+
+        # Filtered by action.
+        analytics = compute_runs_analytics(
+            db, 2 * 60 * 60, action_id="action2", now=now
+        )
+        assert [(a.action_id, a.runs) for a in analytics] == [("action2", 2)]
+
+        # Rollups older than the max age are removed (along with their bins).
+        assert prune_run_stats(db, 30 / (24 * 60), now=now) == 1
+        assert sorted((stats.action_id, stats.runs) for stats in db.all(RunStats)) == [
+            ("action1", 2),
+            ("action1", 98),
+        ]
+        assert {b.run_stats_id.split(":")[0] for b in db.all(RunStatsBin)} == {
+            "action1"
+        }
+        assert prune_run_stats(db, 30 / (24 * 60), now=now) == 0
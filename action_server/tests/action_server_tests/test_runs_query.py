@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import pytest
+
+
+def test_parse_run_status() -> None:
+    from sema4ai.action_server._models import RunStatus
+    from sema4ai.action_server._runs_query import parse_run_status
+
+    assert parse_run_status("passed") == RunStatus.PASSED
+    assert parse_run_status("NOT_RUN") == RunStatus.NOT_RUN
+    assert parse_run_status("4") == RunStatus.CANCELLED
+    with pytest.raises(ValueError):
+        parse_run_status("unknown")
+
+
+def test_create_runs_query() -> None:
+    from sema4ai.action_server._models import RunStatus
+    from sema4ai.action_server._runs_query import (
+        DEFAULT_PAGE_SIZE,
+        MAX_PAGE_SIZE,
+        create_runs_query,
+    )
+
+    query = create_runs_query()
+    assert query.limit == DEFAULT_PAGE_SIZE
+    assert query.before is None
+
+    query = create_runs_query(
+        before="10",
+        limit=MAX_PAGE_SIZE,
+        status=["passed", "4"],
+        started_after="2024-01-03T00:00:00",
+        started_before="2024-01-05T01:00:00+01:00",
+    )
+    assert query.before == 10
+    assert query.limit == MAX_PAGE_SIZE
+    assert query.status == (RunStatus.PASSED, RunStatus.CANCELLED)
+    assert query.started_after == "2024-01-03T00:00:00+00:00"
+    assert query.started_before == "2024-01-05T00:00:00+00:00"
+
+    for kwargs in (
+        dict(limit=0),
+        dict(limit=-1),
+        dict(limit=MAX_PAGE_SIZE + 1),
+        dict(limit="abc"),
+        dict(before=[1]),
+        dict(status=["unknown"]),
+        dict(started_after="yesterday"),
+    ):
+        with pytest.raises(ValueError):
+            create_runs_query(**kwargs)
+
+
+def test_query_runs(tmpdir) -> None:
+    from sema4ai.action_server._models import (
+        Action,
+        ActionPackage,
+        Run,
+        RunStatus,
+        create_db,
+    )
+    from sema4ai.action_server._runs_query import RunsQuery, query_runs
+
+    with create_db(Path(tmpdir) / "server.db") as db:
+        with db.transaction():
+            for package_id in ("pack1", "pack2"):
+                db.insert(ActionPackage(package_id, package_id, "", "", ""))
+                db.insert(
+                    Action(f"{package_id}-action", package_id, "a", "", "", 1, "", "")
+                )
+            for i in range(1, 11):
+                db.insert(
+                    Run(
+                        id=f"run-{i}",
+                        status=RunStatus.PASSED if i % 2 else RunStatus.FAILED,
+                        action_id="pack1-action" if i <= 6 else "pack2-action",
+                        start_time=f"2024-01-{i:02}T00:00:00+00:00",
+                        run_time=1,
+                        inputs="{}",
+                        result=None,
+                        error_message=None,
+                        relative_artifacts_dir="",
+                        numbered_id=i,
+                        request_id=f"request-{i}",
+                    )
+                )
+
+        def get_ids(query):
+            page = query_runs(db, query)
+            return [run.numbered_id for run in page.runs], page.next_cursor
+
+        # Pages (most recent first).
+        assert get_ids(RunsQuery(limit=4)) == ([10, 9, 8, 7], 7)
+        assert get_ids(RunsQuery(limit=4, before=7)) == ([6, 5, 4, 3], 3)
+        assert get_ids(RunsQuery(limit=4, before=3)) == ([2, 1], None)
+        assert get_ids(RunsQuery(limit=2, before=3)) == ([2, 1], None)
+
+        # Filters.
+        assert get_ids(RunsQuery(action_id="pack2-action")) == ([10, 9, 8, 7], None)
+        assert get_ids(RunsQuery(action_package_id="pack1", limit=3)) == (
+            [6, 5, 4],
+            4,
+        )
+        assert get_ids(
+            RunsQuery(action_package_id="pack1", status=(RunStatus.FAILED,))
+        ) == ([6, 4, 2], None)
+        assert get_ids(
+            RunsQuery(
+                started_after="2024-01-03T00:00:00+00:00",
+                started_before="2024-01-05T00:00:00+00:00",
+            )
+        ) == ([4, 3], None)
+        assert get_ids(RunsQuery(request_id="request-5")) == ([5], None)
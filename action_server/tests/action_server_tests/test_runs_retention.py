@@ -0,0 +1,164 @@
+import datetime
+from pathlib import Path
+
+
+def _create_runs(db, settings, action_id: str, count: int, start: int) -> None:
+    from sema4ai.action_server._database import datetime_to_str
+    from sema4ai.action_server._models import Run, RunStatus
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with db.transaction():
+        for i in range(start, start + count):
+            run_id = f"run-{i}"
+            artifacts_dir = settings.artifacts_dir / run_id
+            artifacts_dir.mkdir(parents=True)
+            (artifacts_dir / "__action_server_output.txt").write_text("x" * 1024)
+            db.insert(
+                Run(
+                    id=run_id,
+                    status=RunStatus.PASSED,
+                    action_id=action_id,
+                    # The run i started i days ago.
+                    start_time=datetime_to_str(now - datetime.timedelta(days=i)),
+                    run_time=1,
+                    inputs="{}",
+                    result=None,
+                    error_message=None,
+                    relative_artifacts_dir=run_id,
+                    numbered_id=1000 - i,
+                )
+            )
+
+
+def test_get_retention_policy(tmpdir) -> None:
+    from sema4ai.action_server._models import ActionPackage
+    from sema4ai.action_server._runs_retention import (
+        RetentionPolicy,
+        get_retention_policy,
+    )
+    from sema4ai.action_server._settings import Settings
+
+    tmp = Path(tmpdir)
+    settings = Settings(datadir=tmp, artifacts_dir=tmp / "artifacts")
+    settings.runs_max_count = 10
+    action_package = ActionPackage("pack-1", "pack", str(tmp), "", "")
+
+    assert get_retention_policy(settings, action_package) == RetentionPolicy(
+        max_runs=10
+    )
+
+    (tmp / "package.yaml").write_text(
+        """
+retention:
+  max-age: 7
+  max-runs: 0
+  max-artifacts-size: invalid
+"""
+    )
+    assert get_retention_policy(settings, action_package) == RetentionPolicy(max_age=7)
+
+
+def test_runs_retention(tmpdir) -> None:
+    from sema4ai.action_server._models import (
+        Action,
+        ActionPackage,
+        CallbackOutbox,
+        Run,
+        create_db,
+    )
+    from sema4ai.action_server._runs_retention import (
+        RunsRetention,
+        is_incremental_vacuum_enabled,
+    )
+    from sema4ai.action_server._settings import Settings
+
+    tmp = Path(tmpdir)
+    settings = Settings(datadir=tmp, artifacts_dir=tmp / "artifacts")
+
+    package_dirs = {}
+    for name in ("pack1", "pack2"):
+        package_dirs[name] = tmp / name
+        package_dirs[name].mkdir()
+
+    def get_run_ids():
+        return sorted(int(run.id.split("-")[1]) for run in db.all(Run))
+
+    with create_db(tmp / "server.db") as db:
+        # New databases use incremental vacuum.
+        assert is_incremental_vacuum_enabled(db)
+
+        with db.transaction():
+            for name, package_dir in package_dirs.items():
+                db.insert(ActionPackage(name, name, str(package_dir), "", ""))
+                db.insert(
+                    Action(f"{name}-action", name, "action", "", "", 1, "{}", "{}")
+                )
+        _create_runs(db, settings, "pack1-action", 10, 0)
+        _create_runs(db, settings, "pack2-action", 10, 10)
+        with db.transaction():
+            for run_id in ("run-7", "run-8"):
+                db.insert(
+                    CallbackOutbox(
+                        f"callback-{run_id}", run_id, "http://x", "{}", "{}", "", "", 0
+                    )
+                )
+
+        retention = RunsRetention(settings, db)
+
+        # Nothing configured.
+        assert retention.sweep() == 0
+
+        # By age (pack2 keeps all its runs).
+        settings.runs_max_age = 7.5
+        (package_dirs["pack2"] / "package.yaml").write_text(
+            "retention:\n  max-age: 0\n"
+        )
+        assert retention.sweep() == 2
+        assert get_run_ids() == list(range(8)) + list(range(10, 20))
+        assert not (settings.artifacts_dir / "run-8").exists()
+        assert (settings.artifacts_dir / "run-7").exists()
+        # The pending callbacks of the runs removed are also removed.
+        assert [c.run_id for c in db.all(CallbackOutbox)] == ["run-7"]
+
+        # By count (the most recent runs are kept).
+        settings.runs_max_age = 0
+        settings.runs_max_count = 5
+        assert retention.sweep() == 8
+        assert get_run_ids() == list(range(5)) + list(range(10, 15))
+
+        # By artifacts size (each run has 1 KB).
+        settings.runs_max_count = 0
+        settings.runs_max_artifacts_size = 3.5 / 1024
+        assert retention.sweep() == 4
+        assert get_run_ids() == list(range(3)) + list(range(10, 13))
+        assert sorted(p.name for p in settings.artifacts_dir.iterdir()) == [
+            "run-0",
+            "run-1",
+            "run-10",
+            "run-11",
+            "run-12",
+            "run-2",
+        ]
+
+
+def test_enable_incremental_vacuum(tmpdir) -> None:
+    import sqlite3
+
+    from sema4ai.action_server._database import Database
+    from sema4ai.action_server._runs_retention import (
+        enable_incremental_vacuum,
+        is_incremental_vacuum_enabled,
+    )
+
+    # A database created without incremental vacuum (i.e.: by an older version).
+    db_path = Path(tmpdir) / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE some_table (value TEXT)")
+    conn.commit()
+    conn.close()
+
+    db = Database(db_path)
+    with db.connect():
+        assert not is_incremental_vacuum_enabled(db)
+        enable_incremental_vacuum(db)
+        assert is_incremental_vacuum_enabled(db)
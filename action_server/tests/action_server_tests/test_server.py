@@ -196,6 +196,53 @@ def test_global_return_reuse_process(
     assert found == '"2"'
 
 
+@pytest.mark.integration_test
+def test_run_batch(
+    action_server_process: ActionServerProcess,
+    client: ActionServerClient,
+) -> None:
+    from action_server_tests.fixtures import (
+        BUILD_ENV_IN_TESTS_TIMEOUT,
+        get_in_resources,
+    )
+
+    calculator = get_in_resources("no_conda", "calculator")
+    action_server_process.start(
+        db_file="server.db",
+        cwd=calculator,
+        actions_sync=True,
+        timeout=BUILD_ENV_IN_TESTS_TIMEOUT,
+    )
+    import requests
+
+    url = client.build_full_url("api/actions/calculator/calculator-sum/run-batch")
+
+    # Nothing is run if some item is not valid.
+    result = requests.post(url, json=[{"v1": 1.0, "v2": 2.0}, {"v1": "a"}])
+    assert result.status_code == 422, result.text
+    assert "Item 1" in result.text
+    assert client.get_json("/api/runs") == []
+
+    result = requests.post(
+        url,
+        json=[{"v1": 1.0, "v2": 2.0}, {"v1": 2.0, "v2": 3.0}, {"v1": 3.0, "v2": 4.0}],
+        params={"parallelism": 2},
+    )
+    assert result.status_code == 200, result.text
+    assert result.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in result.text.splitlines()]
+    assert sorted((line["index"], line["result"]) for line in lines) == [
+        (0, 3.0),
+        (1, 5.0),
+        (2, 7.0),
+    ]
+    assert set(line["status"] for line in lines) == {"passed"}
+
+    runs = client.get_json("/api/runs")
+    assert sorted(run["id"] for run in runs) == sorted(line["run_id"] for line in lines)
+    assert sorted(run["numbered_id"] for run in runs) == [1, 2, 3]
+
+
 @pytest.mark.parametrize(
     "strategy",
     ["no-conda", "package.yaml", "package.yaml:uv"],
@@ -486,7 +533,12 @@ def test_full_run(
 
     db_path = base_case.db_path
 
-    found = client.post_get_str("api/actions/greeter/greet/run", {"name": "Foo"})
+    # The inputs/result files are only created when requested.
+    found = client.post_get_str(
+        "api/actions/greeter/greet/run",
+        {"name": "Foo"},
+        headers={"x-action-artifacts": "1"},
+    )
     assert found == '"Hello Mr. Foo."', f"{found} != '\"Hello Mr. Foo.\"'"
 
     # 500 seems appropriate here as the user action didn't complete properly.
@@ -196,3 +196,34 @@ def test_server_websockets(
 
         else:
             raise AssertionError(curr)
+
+
+def test_websocket_list_runs_validation(monkeypatch) -> None:
+    from sema4ai.action_server import _server_websockets
+
+    emitted = []
+
+    async def emit(event, data=None, to=None):
+        emitted.append((event, data, to))
+
+    monkeypatch.setattr(_server_websockets._socket_server, "emit", emit)
+
+    # Same validation done in the REST API (an error is sent back).
+    for data in (
+        {"limit": -1},
+        {"limit": 0},
+        {"limit": 1001},
+        {"started_after": "yesterday"},
+        {"started_before": "2024-13-01"},
+        {"status": ["unknown"]},
+    ):
+        emitted.clear()
+        asyncio.run(
+            _server_websockets.handle_list_runs("sid", {"message_id": 1, **data})
+        )
+        assert len(emitted) == 1, data
+        event, reply, to = emitted[0]
+        assert event == "runs_listed"
+        assert to == "sid"
+        assert reply["message_id"] == 1
+        assert "error" in reply, data
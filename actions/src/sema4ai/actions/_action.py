@@ -96,6 +96,31 @@ File with @action: {filename}
     return provider_str, list(scope_strs)
 
 
+def _get_result_type(return_type: Any) -> Any:
+    """
+    Actions which are generators (or async generators) have as the result a
+    list with the values yielded, so, `Iterator[T]`, `Generator[T, ...]`,
+    `AsyncIterator[T]`, etc. are mapped to `List[T]` (any other type is
+    returned as is).
+    """
+    import collections.abc
+    from typing import get_args, get_origin
+
+    if get_origin(return_type) in (
+        collections.abc.Iterator,
+        collections.abc.Iterable,
+        collections.abc.Generator,
+        collections.abc.AsyncIterator,
+        collections.abc.AsyncIterable,
+        collections.abc.AsyncGenerator,
+    ):
+        args = get_args(return_type)
+        if args:
+            return List[args[0]]  # type: ignore
+        return list
+    return return_type
+
+
 class Action:
     def __init__(
         self,
@@ -330,7 +355,11 @@ class Action:
                 description = returns.description
 
         schema = self._build_properties(
-            method_name, None, type_hints.get("return"), description, "return"
+            method_name,
+            None,
+            _get_result_type(type_hints.get("return")),
+            description,
+            "return",
         )
         return schema
 
@@ -561,6 +590,9 @@ class Context:
             try:
                 sig = inspect.signature(action.method)
                 return_annotation = sig.return_annotation
+                if _get_result_type(return_annotation) is not return_annotation:
+                    # Streamed (generator) results are collected in a list.
+                    return_annotation = list
                 if return_annotation is not sig.empty and return_annotation is not None:
                     if hasattr(return_annotation, "model_validate"):
                         return_annotation.model_validate(dump)
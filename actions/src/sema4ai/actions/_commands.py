@@ -274,6 +274,39 @@ def _has_response_schema(action: IAction) -> bool:
     return False
 
 
+def _consume_result_chunks(action: IAction, result: Any) -> List[Any]:
+    """
+    Consumes the values yielded by an action which is a generator (or an async
+    generator), notifying `on_action_result_chunk` for each one.
+
+    Returns:
+        The list with all the values yielded (as json).
+    """
+    from sema4ai.actions._hooks import on_action_result_chunk
+
+    chunks: List[Any] = []
+
+    def on_chunk(chunk):
+        if hasattr(chunk, "model_dump"):
+            # Support for pydantic
+            chunk = chunk.model_dump(mode="json")
+        chunks.append(chunk)
+        on_action_result_chunk(action, chunk)
+
+    if inspect.isasyncgen(result):
+        import asyncio
+
+        async def consume():
+            async for chunk in result:
+                on_chunk(chunk)
+
+        asyncio.run(consume())
+    else:
+        for chunk in result:
+            on_chunk(chunk)
+    return chunks
+
+
 def run(
     *,
     output_dir: str,
@@ -650,6 +683,14 @@ def run(
 
                                 result = asyncio.run(result)
 
+                            if inspect.isgenerator(result) or inspect.isasyncgen(
+                                result
+                            ):
+                                # Values yielded are streamed as they're
+                                # available and the result is the list of all
+                                # the values yielded.
+                                result = _consume_result_chunks(action, result)
+
                             action.result = result
                             action.status = Status.PASS
 
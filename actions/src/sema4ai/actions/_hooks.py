@@ -10,6 +10,7 @@ from sema4ai.actions._protocols import (
     IBeforeAllActionsRunCallback,
     IBeforeCollectActionsCallback,
     IOnActionFuncFoundCallback,
+    IOnActionResultChunkCallback,
 )
 
 logger = getLogger(__name__)
@@ -67,6 +68,11 @@ before_all_actions_run: IBeforeAllActionsRunCallback = SessionCallback(
 # Called as before_action_run(action: IAction)
 before_action_run: IBeforeActionRunCallback = Callback(raise_exceptions=True)
 
+# Called as on_action_result_chunk(action: IAction, chunk: Any) for each value
+# yielded by an action which is a generator (or an async generator). The chunk
+# is already converted to its json representation.
+on_action_result_chunk: IOnActionResultChunkCallback = Callback()
+
 # Called as after_action_run(action: IAction)
 # Note that this one is done in reversed registry order (as is usually
 # expected from tear-downs).
@@ -271,6 +271,22 @@ class IAfterActionRunCallback(ICallback, typing.Protocol):
         pass
 
 
+IActionResultChunkCallback = Callable[[IAction, Any], Any]
+
+
+class IOnActionResultChunkCallback(ICallback, typing.Protocol):
+    def __call__(self, action: IAction, chunk: Any):
+        pass
+
+    def register(
+        self, callback: IActionResultChunkCallback
+    ) -> IAutoUnregisterContextManager:
+        pass
+
+    def unregister(self, callback: IActionResultChunkCallback) -> None:
+        pass
+
+
 class ActionsListActionTypedDict(TypedDict):
     """
     When python -m sema4ai.actions list is run, the output is a
@@ -0,0 +1,61 @@
+import json
+
+
+def test_actions_streaming_list(datadir):
+    from devutils.fixtures import sema4ai_actions_run
+
+    result = sema4ai_actions_run(
+        ["list", "--skip-lint"], returncode=0, cwd=str(datadir)
+    )
+    found = json.loads(result.stdout)
+    name_to_output_schema = {f["name"]: f["output_schema"] for f in found}
+    assert name_to_output_schema["count_up_to"]["type"] == "array"
+    assert name_to_output_schema["count_up_to"]["items"] == {"type": "integer"}
+    assert name_to_output_schema["async_greetings"]["items"] == {"type": "string"}
+
+
+def test_actions_streaming_run(datadir, tmpdir):
+    from devutils.fixtures import sema4ai_actions_run
+
+    for action_name, inputs, expected in (
+        ("count_up_to", {"limit": 3}, [1, 2, 3]),
+        ("async_greetings", {"name": "Foo"}, ["Hello Foo", "Hola Foo", "Olá Foo"]),
+    ):
+        input_json = tmpdir.join(f"{action_name}_input.json")
+        input_json.write_text(json.dumps(inputs), "utf-8")
+        output_json = tmpdir.join(f"{action_name}_output.json")
+
+        result = sema4ai_actions_run(
+            [
+                "run",
+                f"-a={action_name}",
+                f"--json-input={input_json}",
+                f"--json-output={output_json}",
+                "--print-result",
+            ],
+            returncode=0,
+            cwd=str(datadir),
+        )
+        stdout = result.stdout.decode("utf-8")
+        assert "PASS" in stdout
+        assert "Unable to validate return type" not in stdout
+        assert "expected return type" not in stdout
+
+        # The result is the list with all the values yielded.
+        assert json.loads(output_json.read_text("utf-8"))["result"] == expected
+
+
+def test_actions_streaming_chunks_hook():
+    from sema4ai.actions._commands import _consume_result_chunks
+    from sema4ai.actions._hooks import on_action_result_chunk
+
+    def gen():
+        yield 1
+        yield 2
+
+    notified = []
+    with on_action_result_chunk.register(
+        lambda action, chunk: notified.append((action, chunk))
+    ):
+        assert _consume_result_chunks("action", gen()) == [1, 2]  # type: ignore
+    assert notified == [("action", 1), ("action", 2)]
@@ -0,0 +1,33 @@
+from typing import AsyncIterator, Iterator
+
+from sema4ai.actions import action
+
+
+@action
+def count_up_to(limit: int) -> Iterator[int]:
+    """
+    Provides the numbers from 1 up to the given limit.
+
+    Args:
+        limit: The last number to provide.
+
+    Returns:
+        The numbers.
+    """
+    for i in range(1, limit + 1):
+        yield i
+
+
+@action
+async def async_greetings(name: str) -> AsyncIterator[str]:
+    """
+    Provides greetings in multiple languages.
+
+    Args:
+        name: The name of the person to greet.
+
+    Returns:
+        The greetings.
+    """
+    for greeting in ("Hello", "Hola", "Olá"):
+        yield f"{greeting} {name}"